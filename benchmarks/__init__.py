@@ -0,0 +1,9 @@
+"""
+Reproducible benchmarks for the distributed indexing system.
+
+``python -m benchmarks run`` starts vector nodes and the API in-process,
+replaces Gemini with a deterministic local model, loads a synthetic corpus
+and drives the upload, search, ask and ask_csv workloads at a fixed
+concurrency. It reports QPS and p50/p95/p99 latency per stage as JSON;
+``python -m benchmarks compare`` diffs two reports, e.g. from two commits.
+"""
@@ -0,0 +1,135 @@
+"""
+Benchmark command line.
+
+    python -m benchmarks run --corpus 10k --nodes 3 --concurrency 16 --output results/base.json
+    python -m benchmarks compare results/base.json results/change.json --max-regression 10
+"""
+
+import argparse
+import asyncio
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+from typing import List, Optional
+
+from .environment import describe_environment, prepare_environment
+
+
+def _run(args: argparse.Namespace) -> int:
+    workdir = args.workdir or tempfile.mkdtemp(prefix="rag-bench-")
+    # Resolve before prepare_environment changes the working directory
+    output = str(Path(args.output).resolve()) if args.output else None
+    prepare_environment(workdir, shard_count=args.shards, embedder=args.embedder)
+
+    # Repository modules read settings at import, so import them only now
+    from core.utils.logging import setup_logging
+    from .cluster import BenchmarkCluster
+    from .corpus import SyntheticCorpus, parse_corpus_size
+    from .report import build_report, write_report
+    from .workloads import WorkloadRunner, parse_stages
+
+    setup_logging(args.log_level, "text")
+    stages = parse_stages(args.stages)
+    corpus = SyntheticCorpus(parse_corpus_size(args.corpus), seed=args.seed)
+    cluster = BenchmarkCluster(workdir=Path(workdir),
+                               node_count=args.nodes,
+                               api_port=args.api_port,
+                               base_port=args.api_port + 1,
+                               search_workers=args.search_workers,
+                               embedder=args.embedder,
+                               llm_latency=args.llm_latency,
+                               llm_chunk_latency=args.llm_chunk_latency,
+                               llm_concurrency=args.llm_concurrency)
+    config = {
+        "nodes": args.nodes,
+        "shards": args.shards,
+        "corpus_chunks": corpus.chunk_count,
+        "seed": args.seed,
+        "concurrency": args.concurrency,
+        "requests": args.requests,
+        "score_threshold": args.score_threshold,
+        "embedder": args.embedder,
+        "search_workers": args.search_workers,
+        "llm_latency": args.llm_latency,
+        "llm_chunk_latency": args.llm_chunk_latency,
+        "llm_concurrency": args.llm_concurrency,
+    }
+
+    try:
+        cluster.start()
+        runner = WorkloadRunner(cluster, corpus,
+                                concurrency=args.concurrency,
+                                requests=args.requests,
+                                score_threshold=args.score_threshold)
+        results = asyncio.run(runner.run(stages))
+    finally:
+        cluster.stop()
+        if not args.workdir and not args.keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = build_report(config, describe_environment(), results)
+    if output:
+        write_report(report, output)
+        print(f"Report written to {output}")
+    return 1 if any(stage.errors for stage in results) else 0
+
+
+def _compare(args: argparse.Namespace) -> int:
+    from .report import compare_reports, config_differences, load_report
+
+    baseline, candidate = load_report(args.baseline), load_report(args.candidate)
+    for key, (before, after) in config_differences(baseline, candidate).items():
+        print(f"warning: config {key} differs ({before} -> {after})")
+
+    regressions = 0
+    print(f"{'stage':<10} {'metric':<8} {'baseline':>12} {'candidate':>12} {'change':>9}")
+    for row in compare_reports(baseline, candidate):
+        regressed = args.max_regression is not None and row["worse_pct"] > args.max_regression
+        regressions += regressed
+        print(f"{row['stage']:<10} {row['metric']:<8} {row['baseline']:>12.2f} {row['candidate']:>12.2f} "
+              f"{row['change_pct']:>+8.1f}%{'  REGRESSION' if regressed else ''}")
+    return 1 if regressions else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Start a local cluster, drive workloads, report latencies")
+    run.add_argument("--corpus", default="10k", help="Chunks to load: 10k, 100k, 1m or a number")
+    run.add_argument("--nodes", type=int, default=3, help="Vector nodes")
+    run.add_argument("--shards", type=int, default=1, help="Shards per collection")
+    run.add_argument("--stages", default=",".join(["load", "upload", "search", "ask", "ask_csv"]),
+                     help="Comma-separated stages to run")
+    run.add_argument("--concurrency", type=int, default=8, help="Requests in flight per stage")
+    run.add_argument("--requests", type=int, default=200, help="Requests per query stage")
+    run.add_argument("--score-threshold", type=float, default=0.1, help="Similarity threshold for queries")
+    run.add_argument("--embedder", choices=["hash", "model"], default="hash",
+                     help="hash: hashing embeddings; model: the real sentence model")
+    run.add_argument("--search-workers", type=int, default=0, help="Search worker processes per node")
+    run.add_argument("--llm-latency", type=float, default=0.05, help="Fake Gemini time to first token (s)")
+    run.add_argument("--llm-chunk-latency", type=float, default=0.0, help="Fake Gemini delay per streamed chunk (s)")
+    run.add_argument("--llm-concurrency", type=int, default=64, help="Concurrent Gemini calls")
+    run.add_argument("--seed", type=int, default=0, help="Corpus seed")
+    run.add_argument("--api-port", type=int, default=18100, help="API port; nodes use the following ports")
+    run.add_argument("--workdir", help="Data directory (a temporary one is used and removed if not given)")
+    run.add_argument("--keep-workdir", action="store_true", help="Keep the temporary data directory")
+    run.add_argument("--output", help="Write the JSON report here")
+    run.add_argument("--log-level", default="ERROR", help="Log level of the servers")
+    run.set_defaults(handler=_run)
+
+    compare = commands.add_parser("compare", help="Compare two JSON reports")
+    compare.add_argument("baseline")
+    compare.add_argument("candidate")
+    compare.add_argument("--max-regression", type=float,
+                         help="Exit non-zero if any metric is this many percent worse")
+    compare.set_defaults(handler=_compare)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
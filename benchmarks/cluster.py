@@ -0,0 +1,195 @@
+"""
+Benchmark Cluster
+
+Runs vector nodes and the API in one process, each server on its own
+thread and event loop, and points the API at those nodes with a fake
+Gemini model (and by default hashing embeddings). Everything binds to
+loopback ports, so a run needs no external services.
+
+Import this module only after ``benchmarks.environment.prepare_environment``:
+settings are read from the environment when ``config.config`` is imported.
+"""
+
+import asyncio
+import threading
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, List, Optional
+
+import aiohttp
+import uvicorn
+
+from core.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class _ServerThread(threading.Thread):
+    """Builds a uvicorn server inside a fresh event loop and serves it."""
+
+    def __init__(self, name: str, build: Callable[[], Awaitable[uvicorn.Server]]):
+        super().__init__(name=name, daemon=True)
+        self.build = build
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.server: Optional[uvicorn.Server] = None
+        self.error: Optional[BaseException] = None
+
+    def run(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.server = self.loop.run_until_complete(self.build())
+            self.loop.run_until_complete(self.server.serve())
+        except BaseException as e:
+            self.error = e
+            logger.error("Benchmark server failed", server=self.name, error=str(e))
+
+    def stop(self, timeout: float = 10.0) -> None:
+        if self.server:
+            self.server.should_exit = True
+        self.join(timeout)
+
+
+class BenchmarkCluster:
+    """In-process vector nodes plus the API, wired to local stand-ins."""
+
+    def __init__(self,
+                 workdir: Path,
+                 node_count: int = 3,
+                 host: str = "127.0.0.1",
+                 api_port: int = 18100,
+                 base_port: int = 18101,
+                 search_workers: int = 0,
+                 embedder: str = "hash",
+                 llm_latency: float = 0.05,
+                 llm_chunk_latency: float = 0.0,
+                 llm_concurrency: int = 64):
+        """
+        Initialize benchmark cluster.
+
+        Args:
+            workdir: Directory prepared by ``prepare_environment``
+            node_count: Number of vector nodes
+            host: Interface every server binds to
+            api_port: API port
+            base_port: Port of the first node (the others follow)
+            search_workers: Search worker processes per node (0 searches in-process)
+            embedder: "hash" for hashing embeddings, "model" for the real sentence model
+            llm_latency: Fake Gemini time to first token in seconds
+            llm_chunk_latency: Fake Gemini delay per streamed chunk in seconds
+            llm_concurrency: Concurrent Gemini calls allowed by the scheduler
+        """
+        self.workdir = workdir
+        self.node_count = node_count
+        self.host = host
+        self.api_port = api_port
+        self.base_port = base_port
+        self.search_workers = search_workers
+        self.embedder = embedder
+        self.llm_latency = llm_latency
+        self.llm_chunk_latency = llm_chunk_latency
+        self.llm_concurrency = llm_concurrency
+
+        self.api: Any = None  # core.api.main, imported on the API thread
+        self.fake_model: Any = None
+        self._threads: List[_ServerThread] = []
+        self._api_thread: Optional[_ServerThread] = None
+
+    @property
+    def api_url(self) -> str:
+        return f"http://{self.host}:{self.api_port}"
+
+    @property
+    def node_ports(self) -> List[int]:
+        return [self.base_port + i for i in range(self.node_count)]
+
+    def _node_builder(self, node_id: str, port: int) -> Callable[[], Awaitable[uvicorn.Server]]:
+        async def build() -> uvicorn.Server:
+            from data.storage.vector_node_server import create_node_server
+
+            data_dir = self.workdir / "node_data" / node_id
+            data_dir.mkdir(parents=True, exist_ok=True)
+            node = create_node_server(node_id, self.host, port, str(data_dir), self.search_workers)
+            return uvicorn.Server(uvicorn.Config(node.app, host=self.host, port=port, log_level="warning"))
+        return build
+
+    async def _build_api(self) -> uvicorn.Server:
+        # The API builds its storage manager at import, which needs a running loop
+        from core.api import main as api
+        from data.storage.distributed_vector_store import VectorNode
+        from .embeddings import HashingEmbeddingModel
+        from .fake_gemini import install_fake_gemini
+
+        self.api = api
+        self.fake_model = install_fake_gemini(api.gemini_client,
+                                              latency=self.llm_latency,
+                                              chunk_latency=self.llm_chunk_latency,
+                                              max_concurrency=self.llm_concurrency)
+        if self.embedder == "hash":
+            api.storage_manager.embedding_model = HashingEmbeddingModel()
+
+        # Swap the API's hard-coded nodes for the benchmark nodes; the manager
+        # object is kept because other components hold references into it
+        store = api.storage_manager.distributed_store
+        for node_id in list(store.nodes):
+            store.remove_node(node_id)
+        for i, port in enumerate(self.node_ports):
+            store.add_node(VectorNode(f"bench-node{i + 1}", self.host, port), redistribute=False)
+
+        return uvicorn.Server(uvicorn.Config(api.app, host=self.host, port=self.api_port, log_level="warning"))
+
+    def start(self, timeout: float = 60.0) -> None:
+        """Start the nodes, then the API, and wait until all of them serve."""
+        for i, port in enumerate(self.node_ports):
+            thread = _ServerThread(f"bench-node{i + 1}", self._node_builder(f"bench-node{i + 1}", port))
+            thread.start()
+            self._threads.append(thread)
+        asyncio.run(self._wait_healthy([f"http://{self.host}:{port}" for port in self.node_ports], timeout))
+
+        self._api_thread = _ServerThread("bench-api", self._build_api)
+        self._api_thread.start()
+        self._threads.append(self._api_thread)
+        asyncio.run(self._wait_healthy([self.api_url], timeout))
+        self._wait_nodes_joined(timeout)
+        logger.info("Benchmark cluster started", nodes=self.node_count, api=self.api_url)
+
+    async def _wait_healthy(self, urls: List[str], timeout: float) -> None:
+        deadline = time.monotonic() + timeout
+        pending = list(urls)
+        async with aiohttp.ClientSession() as session:
+            while pending:
+                for thread in self._threads:
+                    if thread.error:
+                        raise RuntimeError(f"{thread.name} failed to start: {thread.error}")
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Servers not healthy after {timeout}s: {pending}")
+                url = pending[0]
+                try:
+                    async with session.get(f"{url}/health", timeout=aiohttp.ClientTimeout(total=2)) as response:
+                        if response.status == 200:
+                            pending.pop(0)
+                            continue
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    pass
+                await asyncio.sleep(0.1)
+
+    def _wait_nodes_joined(self, timeout: float) -> None:
+        from data.storage.distributed_vector_store import NodeStatus
+
+        store = self.api.storage_manager.distributed_store
+        deadline = time.monotonic() + timeout
+        while any(node.status != NodeStatus.HEALTHY for node in store.nodes.values()):
+            if time.monotonic() > deadline:
+                raise TimeoutError("Benchmark nodes did not join the API's cluster")
+            time.sleep(0.1)
+
+    async def call(self, coroutine: Awaitable[Any]) -> Any:
+        """Run a coroutine on the API's event loop (e.g. a storage manager call)."""
+        future = asyncio.run_coroutine_threadsafe(coroutine, self._api_thread.loop)
+        return await asyncio.wrap_future(future)
+
+    def stop(self) -> None:
+        """Stop the API first, then the nodes."""
+        for thread in reversed(self._threads):
+            thread.stop()
+        self._threads.clear()
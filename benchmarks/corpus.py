@@ -0,0 +1,167 @@
+"""
+Synthetic Corpora
+
+Deterministic documents, CSV files and queries for benchmarks. Every chunk
+belongs to one topic and draws most of its words from that topic's
+vocabulary, so topical queries have real nearest neighbours under a
+bag-of-words embedding. The same seed always yields the same corpus.
+"""
+
+import csv
+import io
+import random
+import zlib
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from core.models.base import BaseDocument, DataType
+
+CORPUS_SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+TOPICS: Dict[str, List[str]] = {
+    "astronomy": ["galaxy", "telescope", "orbit", "nebula", "comet", "planet", "stellar", "eclipse",
+                  "asteroid", "supernova", "gravity", "cosmic", "lunar", "solar", "quasar", "spectrum"],
+    "finance": ["equity", "bond", "dividend", "portfolio", "liquidity", "inflation", "interest", "hedge",
+                "market", "capital", "revenue", "audit", "ledger", "credit", "valuation", "yield"],
+    "medicine": ["diagnosis", "vaccine", "clinical", "patient", "therapy", "dosage", "symptom", "surgery",
+                 "antibody", "cardiac", "neural", "pathogen", "immune", "trial", "prescription", "chronic"],
+    "cooking": ["recipe", "simmer", "garlic", "oven", "pastry", "spice", "marinade", "broth",
+                "saute", "dough", "butter", "roast", "flavor", "skillet", "herb", "glaze"],
+    "networking": ["packet", "router", "latency", "protocol", "bandwidth", "socket", "firewall", "subnet",
+                   "gateway", "throughput", "handshake", "routing", "switch", "ethernet", "tcp", "dns"],
+    "geology": ["sediment", "tectonic", "basalt", "erosion", "magma", "fossil", "mineral", "quartz",
+                "volcano", "granite", "fault", "crust", "strata", "glacier", "seismic", "limestone"],
+    "music": ["melody", "harmony", "rhythm", "chord", "tempo", "orchestra", "violin", "sonata",
+              "lyric", "octave", "rehearsal", "symphony", "guitar", "chorus", "timbre", "cadence"],
+    "sports": ["tournament", "athlete", "stadium", "referee", "league", "sprint", "coach", "goal",
+               "marathon", "season", "playoff", "defense", "score", "training", "medal", "transfer"],
+}
+
+COMMON_WORDS = ["the", "report", "describes", "several", "important", "results", "during", "recent",
+                "analysis", "shows", "clear", "evidence", "about", "overall", "approach", "notes",
+                "further", "study", "between", "levels", "across", "groups", "while", "research"]
+
+CSV_REGIONS = ["north", "south", "east", "west"]
+CSV_PRODUCTS = ["widget", "gadget", "sprocket", "gizmo", "doohickey"]
+
+
+def parse_corpus_size(value: str) -> int:
+    """Chunk count from ``10k``/``100k``/``1m`` or a plain integer."""
+    key = value.strip().lower()
+    if key in CORPUS_SIZES:
+        return CORPUS_SIZES[key]
+    return int(key.replace("_", ""))
+
+
+def topic_for_text(text: str) -> str:
+    """Topic whose vocabulary occurs most often in ``text``."""
+    words = text.lower().split()
+    counts = {topic: sum(words.count(word) for word in vocabulary) for topic, vocabulary in TOPICS.items()}
+    return max(counts, key=lambda topic: (counts[topic], topic))
+
+
+class SyntheticCorpus:
+    """Reproducible chunks, upload files, CSV files and queries."""
+
+    def __init__(self,
+                 chunk_count: int,
+                 seed: int = 0,
+                 words_per_chunk: int = 60,
+                 topic_ratio: float = 0.7):
+        """
+        Initialize synthetic corpus.
+
+        Args:
+            chunk_count: Number of chunks in the corpus
+            seed: Seed for all generated text
+            words_per_chunk: Words per chunk
+            topic_ratio: Share of a chunk's words taken from its topic vocabulary
+        """
+        self.chunk_count = chunk_count
+        self.seed = seed
+        self.words_per_chunk = words_per_chunk
+        self.topic_ratio = topic_ratio
+        self.topics = sorted(TOPICS)
+
+    def _rng(self, kind: str, index: int) -> random.Random:
+        return random.Random(zlib.crc32(f"{self.seed}:{kind}:{index}".encode()))
+
+    def _text(self, rng: random.Random, topic: str, word_count: int) -> str:
+        vocabulary = TOPICS[topic]
+        words = [rng.choice(vocabulary) if rng.random() < self.topic_ratio else rng.choice(COMMON_WORDS)
+                 for _ in range(word_count)]
+        return " ".join(words)
+
+    def topic_of(self, index: int) -> str:
+        return self.topics[index % len(self.topics)]
+
+    def chunk_text(self, index: int) -> str:
+        return self._text(self._rng("chunk", index), self.topic_of(index), self.words_per_chunk)
+
+    def topic_size(self, topic: str) -> int:
+        return len(range(self.topics.index(topic), self.chunk_count, len(self.topics)))
+
+    def iter_documents(self, topic: str, offset: int = 0, count: Optional[int] = None) -> Iterator[BaseDocument]:
+        """
+        Chunks of one topic, generated lazily (the corpus may not fit in memory).
+
+        Args:
+            topic: Topic name
+            offset: Position of the first chunk within the topic
+            count: Maximum number of chunks (all remaining if not provided)
+        """
+        indexes = range(self.topics.index(topic), self.chunk_count, len(self.topics))[offset:]
+        if count is not None:
+            indexes = indexes[:count]
+        for index in indexes:
+            yield BaseDocument(
+                id=f"bench-{self.seed}-{index}",
+                type=DataType.DOCUMENT,
+                content=self.chunk_text(index),
+                metadata={"topic": topic, "source": "synthetic", "chunk_index": index}
+            )
+
+    def queries(self, count: int, words: int = 6) -> List[str]:
+        """Short keyword queries, each about one topic."""
+        return [self._text(self._rng("query", i), self.topic_of(i), words) for i in range(count)]
+
+    def questions(self, count: int) -> List[str]:
+        """Natural-language questions for the ask workload."""
+        questions = []
+        for i in range(count):
+            rng = self._rng("question", i)
+            first, second = rng.sample(TOPICS[self.topic_of(i)], 2)
+            questions.append(f"What do the documents say about {first} and {second}?")
+        return questions
+
+    def upload_files(self, count: int, paragraphs: int = 4) -> List[Tuple[str, bytes]]:
+        """Plain-text documents for the upload workload."""
+        files = []
+        for i in range(count):
+            rng = self._rng("upload", i)
+            topic = self.topic_of(i)
+            text = "\n\n".join(self._text(rng, topic, self.words_per_chunk * 3) for _ in range(paragraphs))
+            files.append((f"bench_{topic}_{i}.txt", text.encode()))
+        return files
+
+    def csv_files(self, count: int, rows: int = 200) -> List[Tuple[str, bytes]]:
+        """Sales tables for the ask_csv workload."""
+        files = []
+        for i in range(count):
+            rng = self._rng("csv", i)
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(["month", "region", "product", "units", "revenue"])
+            for row in range(rows):
+                units = rng.randint(1, 500)
+                writer.writerow([f"2024-{row % 12 + 1:02d}", rng.choice(CSV_REGIONS), rng.choice(CSV_PRODUCTS),
+                                 units, round(units * rng.uniform(2.0, 40.0), 2)])
+            files.append((f"bench_sales_{i}.csv", buffer.getvalue().encode()))
+        return files
+
+    def csv_questions(self, count: int) -> List[str]:
+        questions = []
+        for i in range(count):
+            rng = self._rng("csv_question", i)
+            questions.append(f"What was the total revenue for {rng.choice(CSV_PRODUCTS)} "
+                             f"sales in the {rng.choice(CSV_REGIONS)} region?")
+        return questions
@@ -0,0 +1,54 @@
+"""
+Hashing Embeddings
+
+A bag-of-words stand-in for the sentence embedding model. Each word maps
+to a fixed pseudo-random unit vector and a text embeds to the normalised
+sum of its words, so texts that share vocabulary stay close. It costs
+microseconds instead of a transformer forward pass, which keeps benchmark
+runs about the storage and serving path and makes them independent of the
+model download. Use ``--embedder model`` to measure the real model.
+"""
+
+import re
+import zlib
+from typing import Dict, List
+
+import numpy as np
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+class HashingEmbeddingModel:
+    """Mirrors the ``encode`` call of a SentenceTransformer."""
+
+    def __init__(self, dimension: int = 384, seed: int = 0):
+        """
+        Initialize hashing embedding model.
+
+        Args:
+            dimension: Embedding size (must match the collections' vector size)
+            seed: Seed mixed into every word vector
+        """
+        self.dimension = dimension
+        self.seed = seed
+        self._word_vectors: Dict[str, np.ndarray] = {}
+
+    def _word_vector(self, word: str) -> np.ndarray:
+        vector = self._word_vectors.get(word)
+        if vector is None:
+            rng = np.random.default_rng(zlib.crc32(f"{self.seed}:{word}".encode()))
+            vector = rng.standard_normal(self.dimension).astype(np.float32)
+            vector /= np.linalg.norm(vector)
+            self._word_vectors[word] = vector
+        return vector
+
+    def encode(self, texts: List[str], convert_to_tensor: bool = False, **kwargs) -> np.ndarray:
+        """Embed ``texts`` as an (n, dimension) float32 array of unit vectors."""
+        embeddings = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in _WORD.findall(text.lower()):
+                embeddings[row] += self._word_vector(word)
+            norm = np.linalg.norm(embeddings[row])
+            if norm > 0:
+                embeddings[row] /= norm
+        return embeddings
@@ -0,0 +1,68 @@
+"""
+Benchmark Environment
+
+Process setup that has to happen before any repository module is imported,
+and a description of the machine and commit a run was made on. Only the
+standard library is used here.
+"""
+
+import os
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+# Never contacted: the hashing embedder replaces the remote model before first use
+_PLACEHOLDER_EMBEDDING_URL = "http://127.0.0.1:9"
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def prepare_environment(workdir: str, shard_count: int = 1, embedder: str = "hash") -> Path:
+    """
+    Point settings and relative data paths at a scratch directory.
+
+    Args:
+        workdir: Directory for the catalog, node data and CSV databases
+        shard_count: Shards per collection
+        embedder: "hash" for hashing embeddings, "model" for the real sentence model
+
+    Returns:
+        Resolved working directory (also the new current directory)
+    """
+    path = Path(workdir).resolve()
+    path.mkdir(parents=True, exist_ok=True)
+    os.environ["CLUSTER_CATALOG_PATH"] = str(path / "coordinator_data" / "cluster_catalog.db")
+    os.environ["SHARD_COUNT"] = str(shard_count)
+    os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+    if embedder == "hash":
+        os.environ["EMBEDDING_SERVICE_URL"] = _PLACEHOLDER_EMBEDDING_URL
+    # csv_databases/ and the log file are resolved against the working directory
+    (path / "logs").mkdir(exist_ok=True)
+    os.chdir(path)
+    if str(REPO_ROOT) not in sys.path:
+        sys.path.insert(0, str(REPO_ROOT))
+    return path
+
+
+def _git(*args: str) -> Optional[str]:
+    try:
+        return subprocess.run(["git", *args], cwd=REPO_ROOT, capture_output=True,
+                              text=True, timeout=10, check=True).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def describe_environment() -> Dict[str, Any]:
+    """Commit, interpreter and machine a report was produced on."""
+    status = _git("status", "--porcelain", "--untracked-files=no")
+    return {
+        "git_commit": _git("rev-parse", "HEAD"),
+        "git_dirty": bool(status) if status is not None else None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
@@ -0,0 +1,226 @@
+"""
+Fake Gemini
+
+A deterministic local stand-in for ``genai.GenerativeModel``. It replaces
+the models inside a real ``GeminiClient``, so benchmarks still exercise the
+client, its request scheduler and every response parser; only the network
+call is simulated. Replies depend on the prompt alone and follow the
+formats the system's prompts ask for (metadata JSON, collection names,
+index lists, SQL, answers). Latency is modelled as a time to first token
+plus a per-chunk delay.
+"""
+
+import ast
+import asyncio
+import json
+import re
+import zlib
+from typing import Any, List, Optional
+
+from core.services.inference.gemini_client import GeminiClient
+from core.services.inference.request_scheduler import GeminiRequestScheduler
+
+from .corpus import COMMON_WORDS, CSV_PRODUCTS, CSV_REGIONS, TOPICS, topic_for_text
+
+_NUMBERED = re.compile(r"^\s*(\d+)\.\s+(.*)$", re.MULTILINE)
+_TABLE_NAME = re.compile(r"Table Name:\s*(\w+)")
+_COLUMNS = re.compile(r"Columns:\s*(.*)")
+_QUESTION = re.compile(r'Question:\s*"(.*?)"', re.DOTALL)
+_QUOTED = re.compile(r'"(.*?)"', re.DOTALL)
+_AVAILABLE = re.compile(r"Available indexes:\s*(\[.*?\])", re.DOTALL)
+
+
+class FakePart:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeResponse:
+    """Just enough of ``GenerateContentResponse`` for ``extract_gemini_text``."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.parts = [FakePart(text)]
+        self.candidates: List[Any] = []
+
+
+class FakeStream:
+    """Async iterator of response chunks, paced like a streaming reply."""
+
+    def __init__(self, chunks: List[str], chunk_latency: float):
+        self.chunks = chunks
+        self.chunk_latency = chunk_latency
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            if self.chunk_latency > 0:
+                await asyncio.sleep(self.chunk_latency)
+            yield FakeResponse(chunk)
+
+
+class FakeGenerativeModel:
+    """Drop-in for ``genai.GenerativeModel`` with canned, prompt-derived replies."""
+
+    def __init__(self, latency: float = 0.05, chunk_latency: float = 0.0,
+                 answer_words: int = 60, words_per_chunk: int = 8):
+        """
+        Initialize fake model.
+
+        Args:
+            latency: Seconds before the first token
+            chunk_latency: Seconds between streamed chunks (also added per chunk to unary calls)
+            answer_words: Length of free-text answers in words
+            words_per_chunk: Words per streamed chunk
+        """
+        self.latency = latency
+        self.chunk_latency = chunk_latency
+        self.answer_words = answer_words
+        self.words_per_chunk = words_per_chunk
+        self.calls = 0
+
+    async def generate_content_async(self, contents: Any, generation_config: Any = None,
+                                     stream: bool = False, **kwargs) -> Any:
+        self.calls += 1
+        prompt = contents if isinstance(contents, str) else " ".join(str(part) for part in contents)
+        text = respond(prompt, self.answer_words)
+        words = text.split(" ")
+        chunks = [" ".join(words[i:i + self.words_per_chunk]) + " "
+                  for i in range(0, len(words), self.words_per_chunk)]
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+        if stream:
+            return FakeStream(chunks, self.chunk_latency)
+        if self.chunk_latency > 0:
+            await asyncio.sleep(self.chunk_latency * len(chunks))
+        return FakeResponse(text)
+
+
+def _answer_text(question: str, answer_words: int) -> str:
+    """Deterministic prose about the question's topic."""
+    topic = topic_for_text(question)
+    vocabulary = TOPICS[topic] + COMMON_WORDS
+    seed = zlib.crc32(question.encode())
+    words = [vocabulary[(seed + i * 7919) % len(vocabulary)] for i in range(max(answer_words - 6, 0))]
+    return f"Based on the {topic} sources, " + " ".join(words) + "."
+
+
+def _index_recommendation(prompt: str) -> List[str]:
+    """Base document index plus the topical index matching the query, if available."""
+    match = _AVAILABLE.search(prompt)
+    try:
+        available = ast.literal_eval(match.group(1)) if match else []
+    except (ValueError, SyntaxError):
+        available = []
+    query = _QUOTED.search(prompt)
+    wanted = ["index_document", f"index_{topic_for_text(query.group(1) if query else prompt)}"]
+    return [name for name in wanted if name in available] or wanted
+
+
+def _sql(prompt: str) -> str:
+    table = _TABLE_NAME.search(prompt)
+    table_name = table.group(1) if table else "csv_data"
+    columns_match = _COLUMNS.search(prompt)
+    columns = {c.strip() for c in columns_match.group(1).split(",")} if columns_match else set()
+    question = prompt.lower()
+    product = next((p for p in CSV_PRODUCTS if p in question), None)
+    region = next((r for r in CSV_REGIONS if r in question), None)
+    if {"revenue", "product", "region"} <= columns and product and region:
+        return (f"SELECT SUM(revenue) AS total_revenue, SUM(units) AS total_units FROM {table_name} "
+                f"WHERE product = '{product}' AND region = '{region}'")
+    return f"SELECT * FROM {table_name} LIMIT 10"
+
+
+def respond(prompt: str, answer_words: int = 60) -> str:
+    """
+    Reply to one of the system's prompts.
+
+    Args:
+        prompt: Full prompt text
+        answer_words: Length of free-text answers in words
+
+    Returns:
+        Reply text in the format the prompt asks for
+    """
+    if "topical collection names" in prompt:
+        documents = prompt.split("Documents:", 1)[-1]
+        return json.dumps({number: [f"index_{topic_for_text(summary)}"]
+                           for number, summary in _NUMBERED.findall(documents)})
+
+    if "extract relevant metadata" in prompt:
+        content = prompt.split("Content:", 1)[-1]
+        topic = topic_for_text(content)
+        return json.dumps({
+            "topics": [topic],
+            "category": "report",
+            "language": "en",
+            "sentiment": "neutral",
+            "entities": {"people": [], "places": [], "organizations": []},
+            "summary": " ".join(content.split()[:30])
+        })
+
+    if "recommend which indexes" in prompt:
+        return json.dumps(_index_recommendation(prompt))
+
+    if "which indexes would be most relevant" in prompt:
+        return json.dumps({
+            "recommended_indexes": _index_recommendation(prompt),
+            "reasoning": "Topic match",
+            "search_strategy": "semantic",
+            "confidence": 0.8,
+            "query_type": "factual"
+        })
+
+    if "Generate a SQL query" in prompt:
+        return _sql(prompt)
+
+    if "Analyze the following search results" in prompt:
+        query = _QUOTED.search(prompt)
+        return json.dumps({
+            "answer": _answer_text(query.group(1) if query else prompt, answer_words),
+            "confidence": 0.8,
+            "result_assessment": [],
+            "missing_info": [],
+            "follow_up_queries": []
+        })
+
+    question_match = _QUESTION.search(prompt)
+    question = question_match.group(1) if question_match else prompt
+    if "Format your response as JSON" in prompt:
+        return json.dumps({
+            "answer": _answer_text(question, answer_words),
+            "confidence": 0.8,
+            "reasoning": "Synthesised from the retrieved sources",
+            "limitations": [],
+            "sources_used": ["documents"]
+        })
+    return _answer_text(question, answer_words)
+
+
+def install_fake_gemini(client: GeminiClient,
+                        latency: float = 0.05,
+                        chunk_latency: float = 0.0,
+                        max_concurrency: int = 64,
+                        model: Optional[FakeGenerativeModel] = None) -> FakeGenerativeModel:
+    """
+    Swap a client's Gemini models for a fake and lift its rate limits.
+
+    The client object itself is kept, since other components hold bound
+    references to its methods.
+
+    Args:
+        client: Client to rewire in place
+        latency: Seconds before the first token
+        chunk_latency: Seconds between streamed chunks
+        max_concurrency: Concurrent fake calls allowed by the scheduler
+        model: Fake model to install (built from the latencies if not provided)
+
+    Returns:
+        The installed fake model (its ``calls`` counter tracks LLM calls)
+    """
+    model = model or FakeGenerativeModel(latency=latency, chunk_latency=chunk_latency)
+    client.text_model = model
+    client.vision_model = model
+    client.scheduler = GeminiRequestScheduler(max_concurrency=max_concurrency,
+                                              requests_per_minute=0,
+                                              tokens_per_minute=0)
+    return model
@@ -0,0 +1,152 @@
+"""
+Benchmark Reports
+
+Per-stage throughput and latency percentiles, written as JSON so runs on
+different commits can be compared with ``python -m benchmarks compare``.
+Only the standard library and numpy are used here.
+"""
+
+import json
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+REPORT_VERSION = 1
+
+# Metrics compared between reports, and whether higher is better
+COMPARED_METRICS: List[Tuple[str, bool]] = [
+    ("qps", True),
+    ("p50_ms", False),
+    ("p95_ms", False),
+    ("p99_ms", False),
+]
+
+
+@dataclass
+class StageStats:
+    """Outcome of one workload stage."""
+    name: str
+    requests: int
+    errors: int
+    empty: int
+    concurrency: int
+    wall_seconds: float
+    qps: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    mean_ms: float
+    max_ms: float
+    items_per_second: Optional[float] = None  # e.g. chunks/s for the load stage
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+    @classmethod
+    def from_latencies(cls,
+                       name: str,
+                       latencies: List[float],
+                       errors: int,
+                       empty: int,
+                       concurrency: int,
+                       wall_seconds: float) -> "StageStats":
+        """
+        Summarise a stage.
+
+        Args:
+            name: Stage name
+            latencies: Seconds per successful request
+            errors: Failed requests
+            empty: Successful requests that returned no results
+            concurrency: Requests kept in flight
+            wall_seconds: Duration of the whole stage
+        """
+        values = np.asarray(latencies, dtype=np.float64) * 1000.0
+        if values.size:
+            p50, p95, p99 = (float(v) for v in np.percentile(values, [50, 95, 99]))
+            mean, maximum = float(values.mean()), float(values.max())
+        else:
+            p50 = p95 = p99 = mean = maximum = 0.0
+        wall = max(wall_seconds, 1e-9)
+        return cls(
+            name=name,
+            requests=len(latencies) + errors,
+            errors=errors,
+            empty=empty,
+            concurrency=concurrency,
+            wall_seconds=round(wall_seconds, 3),
+            qps=round(len(latencies) / wall, 2),
+            p50_ms=round(p50, 2),
+            p95_ms=round(p95, 2),
+            p99_ms=round(p99, 2),
+            mean_ms=round(mean, 2),
+            max_ms=round(maximum, 2),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    def summary_line(self) -> str:
+        line = (f"{self.name:<10} {self.requests:>7} req  {self.errors:>4} err  {self.empty:>4} empty  "
+                f"{self.qps:>9.1f} qps  "
+                f"p50 {self.p50_ms:>8.1f}  p95 {self.p95_ms:>8.1f}  p99 {self.p99_ms:>8.1f} ms")
+        if self.items_per_second is not None:
+            line += f"  ({self.items_per_second:.0f} items/s)"
+        return line
+
+
+def build_report(config: Dict[str, Any], environment: Dict[str, Any], stages: List[StageStats]) -> Dict[str, Any]:
+    return {
+        "version": REPORT_VERSION,
+        "environment": environment,
+        "config": config,
+        "stages": {stage.name: stage.to_dict() for stage in stages},
+    }
+
+
+def write_report(report: Dict[str, Any], path: str) -> None:
+    output = Path(path)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, sort_keys=True) + "\n")
+
+
+def load_report(path: str) -> Dict[str, Any]:
+    report = json.loads(Path(path).read_text())
+    if report.get("version") != REPORT_VERSION:
+        raise ValueError(f"Unsupported report version in {path}: {report.get('version')}")
+    return report
+
+
+def compare_reports(baseline: Dict[str, Any], candidate: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Relative change of every compared metric for stages present in both reports.
+
+    Returns:
+        One row per stage and metric with baseline, candidate, change in percent
+        and whether the change is a regression (positive ``worse_pct``)
+    """
+    rows = []
+    for name, old in baseline["stages"].items():
+        new = candidate["stages"].get(name)
+        if new is None:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS:
+            before, after = old.get(metric) or 0.0, new.get(metric) or 0.0
+            change = (after - before) / before * 100.0 if before else 0.0
+            rows.append({
+                "stage": name,
+                "metric": metric,
+                "baseline": before,
+                "candidate": after,
+                "change_pct": round(change, 1),
+                "worse_pct": round(-change if higher_is_better else change, 1),
+            })
+    return rows
+
+
+def config_differences(baseline: Dict[str, Any], candidate: Dict[str, Any]) -> Dict[str, Tuple[Any, Any]]:
+    """Config keys whose values differ, which usually makes a comparison meaningless."""
+    keys = set(baseline.get("config", {})) | set(candidate.get("config", {}))
+    return {key: (baseline["config"].get(key), candidate["config"].get(key))
+            for key in sorted(keys)
+            if baseline["config"].get(key) != candidate["config"].get(key)}
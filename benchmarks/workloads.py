@@ -0,0 +1,215 @@
+"""
+Benchmark Workloads
+
+Each stage keeps a fixed number of requests in flight and times every
+request from the client side. ``load`` writes the synthetic corpus
+straight through the storage manager (the bulk ingest path); every other
+stage goes through the API over HTTP, like a real client would.
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Sequence
+
+import aiohttp
+
+from core.utils.logging import get_logger
+
+from .cluster import BenchmarkCluster
+from .corpus import SyntheticCorpus
+from .report import StageStats
+
+logger = get_logger(__name__)
+
+STAGES = ["load", "upload", "search", "ask", "ask_csv"]
+
+# A request returns False when it succeeded but found nothing; raising marks it failed
+RequestFn = Callable[[Any], Awaitable[bool]]
+
+
+async def run_stage(name: str,
+                    request: RequestFn,
+                    items: Sequence[Any],
+                    concurrency: int) -> StageStats:
+    """
+    Send one request per item with ``concurrency`` requests in flight.
+
+    Args:
+        name: Stage name
+        request: Coroutine function called with each item
+        items: Request inputs
+        concurrency: Number of concurrent workers
+
+    Returns:
+        Stage statistics
+    """
+    latencies: List[float] = []
+    errors = 0
+    empty = 0
+    next_item = iter(items)
+    first_error: List[str] = []
+
+    async def worker() -> None:
+        nonlocal errors, empty
+        for item in next_item:
+            started = time.perf_counter()
+            try:
+                found = await request(item)
+            except Exception as e:
+                errors += 1
+                if not first_error:
+                    first_error.append(f"{type(e).__name__}: {e}")
+                continue
+            latencies.append(time.perf_counter() - started)
+            if not found:
+                empty += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    wall_seconds = time.perf_counter() - started
+
+    stats = StageStats.from_latencies(name, latencies, errors, empty, concurrency, wall_seconds)
+    if first_error:
+        stats.extra["first_error"] = first_error[0]
+    return stats
+
+
+async def _post_json(session: aiohttp.ClientSession, url: str, body: Dict[str, Any]) -> Dict[str, Any]:
+    async with session.post(url, json=body) as response:
+        if response.status != 200:
+            raise RuntimeError(f"HTTP {response.status}: {(await response.text())[:200]}")
+        return await response.json()
+
+
+async def _post_file(session: aiohttp.ClientSession, url: str, filename: str, content: bytes) -> Dict[str, Any]:
+    form = aiohttp.FormData()
+    form.add_field("file", content, filename=filename)
+    async with session.post(url, data=form) as response:
+        if response.status != 200:
+            raise RuntimeError(f"HTTP {response.status}: {(await response.text())[:200]}")
+        return await response.json()
+
+
+class WorkloadRunner:
+    """Runs the benchmark stages against a started ``BenchmarkCluster``."""
+
+    def __init__(self,
+                 cluster: BenchmarkCluster,
+                 corpus: SyntheticCorpus,
+                 concurrency: int = 8,
+                 requests: int = 200,
+                 score_threshold: float = 0.1,
+                 load_batch: int = 1024,
+                 csv_files: int = 4):
+        """
+        Initialize workload runner.
+
+        Args:
+            cluster: Started benchmark cluster
+            corpus: Synthetic corpus to load and query
+            concurrency: Requests in flight per stage
+            requests: Requests per query stage (search, ask, ask_csv)
+            score_threshold: Minimum similarity for search and ask requests
+            load_batch: Chunks per timed request in the load stage
+            csv_files: CSV files uploaded before the ask_csv stage
+        """
+        self.cluster = cluster
+        self.corpus = corpus
+        self.concurrency = concurrency
+        self.requests = requests
+        self.score_threshold = score_threshold
+        self.load_batch = load_batch
+        self.csv_files = csv_files
+        self.api_url = cluster.api_url
+
+    async def run(self, stages: List[str]) -> List[StageStats]:
+        """Run ``stages`` in the given order."""
+        results = []
+        timeout = aiohttp.ClientTimeout(total=300)
+        connector = aiohttp.TCPConnector(limit=max(self.concurrency * 2, 100))
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+            for stage in stages:
+                logger.info("Running benchmark stage", stage=stage)
+                llm_calls = self.cluster.fake_model.calls
+                stats = await getattr(self, f"_stage_{stage}")(session)
+                stats.extra["llm_calls"] = self.cluster.fake_model.calls - llm_calls
+                print(stats.summary_line(), flush=True)
+                if "first_error" in stats.extra:
+                    print(f"  first error: {stats.extra['first_error']}", flush=True)
+                results.append(stats)
+        return results
+
+    async def _stage_load(self, session: aiohttp.ClientSession) -> StageStats:
+        manager = self.cluster.api.storage_manager
+        jobs = []
+        for topic in self.corpus.topics:
+            collection = f"index_{topic}"
+            await self.cluster.call(manager.create_index(collection, 384, base_index="index_document"))
+            jobs.extend((collection, topic, offset)
+                        for offset in range(0, self.corpus.topic_size(topic), self.load_batch))
+
+        async def load(job: Any) -> bool:
+            collection, topic, offset = job
+            documents = self.corpus.iter_documents(topic, offset, self.load_batch)
+            counts = await self.cluster.call(manager.upsert_document_stream([collection], documents))
+            if not counts.get(collection):
+                raise RuntimeError(f"No chunks stored for {collection} at offset {offset}")
+            return True
+
+        # Interleave topics so concurrent batches write to different collections
+        jobs.sort(key=lambda job: (job[2], job[1]))
+        stats = await run_stage("load", load, jobs, self.concurrency)
+        stats.items_per_second = round(self.corpus.chunk_count / max(stats.wall_seconds, 1e-9), 1)
+        return stats
+
+    async def _stage_upload(self, session: aiohttp.ClientSession) -> StageStats:
+        files = self.corpus.upload_files(max(1, self.requests // 4))
+
+        async def upload(file: Any) -> bool:
+            filename, content = file
+            result = await _post_file(session, f"{self.api_url}/upload", filename, content)
+            return result.get("chunks_created", 0) > 0
+
+        return await run_stage("upload", upload, files, self.concurrency)
+
+    async def _stage_search(self, session: aiohttp.ClientSession) -> StageStats:
+        async def search(query: str) -> bool:
+            result = await _post_json(session, f"{self.api_url}/search", {
+                "query": query, "limit": 10, "score_threshold": self.score_threshold
+            })
+            return result["total_results"] > 0
+
+        return await run_stage("search", search, self.corpus.queries(self.requests), self.concurrency)
+
+    async def _stage_ask(self, session: aiohttp.ClientSession) -> StageStats:
+        async def ask(question: str) -> bool:
+            result = await _post_json(session, f"{self.api_url}/ask", {
+                "question": question, "limit": 5, "score_threshold": self.score_threshold
+            })
+            return bool(result["sources"])
+
+        return await run_stage("ask", ask, self.corpus.questions(self.requests), self.concurrency)
+
+    async def _stage_ask_csv(self, session: aiohttp.ClientSession) -> StageStats:
+        # Untimed setup: the tables the questions are asked about
+        for filename, content in self.corpus.csv_files(self.csv_files):
+            await _post_file(session, f"{self.api_url}/upload", filename, content)
+
+        async def ask_csv(question: str) -> bool:
+            result = await _post_json(session, f"{self.api_url}/ask_csv", {
+                "question": question, "limit": 5, "score_threshold": self.score_threshold
+            })
+            if result["query_analysis"].get("status") == "error":
+                raise RuntimeError(result["reasoning"].get("error", "ask_csv failed"))
+            return bool((result["reasoning"].get("sql_results") or {}).get("results"))
+
+        return await run_stage("ask_csv", ask_csv, self.corpus.csv_questions(self.requests), self.concurrency)
+
+
+def parse_stages(value: str) -> List[str]:
+    stages = [stage.strip() for stage in value.split(",") if stage.strip()]
+    unknown = [stage for stage in stages if stage not in STAGES]
+    if unknown:
+        raise ValueError(f"Unknown stages {unknown}; choose from {STAGES}")
+    # Keep the canonical order: queries need the corpus loaded first
+    return [stage for stage in STAGES if stage in stages]
@@ -55,6 +55,17 @@ class DatabaseSettings(BaseSettings):
     minio_secret_key: str = Field(default="minioadmin", validation_alias="MINIO_SECRET_KEY")
     minio_bucket: str = Field(default="rag-llm", validation_alias="MINIO_BUCKET")
     
+    # Distributed vector store settings
+    search_hedge_budget: float = Field(default=0.05, validation_alias="SEARCH_HEDGE_BUDGET")
+    search_first_wave_shards: int = Field(default=2, validation_alias="SEARCH_FIRST_WAVE_SHARDS")
+    cluster_catalog_path: str = Field(default="./coordinator_data/cluster_catalog.db",
+                                      validation_alias="CLUSTER_CATALOG_PATH")
+    # Hash-range shards: new collections start with shard_count ranges, which split and merge with load
+    shard_count: int = Field(default=1, validation_alias="SHARD_COUNT")
+    shard_max_vectors: int = Field(default=100_000, validation_alias="SHARD_MAX_VECTORS")
+    shard_max_qps: float = Field(default=50.0, validation_alias="SHARD_MAX_QPS")
+    shard_min_vectors: int = Field(default=20_000, validation_alias="SHARD_MIN_VECTORS")
+    
     @validator("cassandra_hosts", pre=True)
     def parse_cassandra_hosts(cls, v):
         if isinstance(v, str):
@@ -116,6 +127,24 @@ class ProcessingSettings(BaseSettings):
     gemini_model: str = Field(default="gemini-2.5-pro", validation_alias="GEMINI_MODEL")
     gemini_temperature: float = Field(default=0.7, validation_alias="GEMINI_TEMPERATURE")
     gemini_max_tokens: int = Field(default=1000, validation_alias="GEMINI_MAX_TOKENS")
+    
+    # Gemini request scheduling
+    gemini_max_concurrency: int = Field(default=4, validation_alias="GEMINI_MAX_CONCURRENCY")
+    gemini_requests_per_minute: float = Field(default=60, validation_alias="GEMINI_REQUESTS_PER_MINUTE")
+    gemini_tokens_per_minute: float = Field(default=1000000, validation_alias="GEMINI_TOKENS_PER_MINUTE")
+    gemini_max_retries: int = Field(default=4, validation_alias="GEMINI_MAX_RETRIES")
+    
+    # Collection routing for /search when no index names are given ("embedding" or "llm")
+    collection_routing: str = Field(default="embedding", validation_alias="COLLECTION_ROUTING")
+    collection_router_top_n: int = Field(default=3, validation_alias="COLLECTION_ROUTER_TOP_N")
+    collection_assign_threshold: float = Field(default=0.5, validation_alias="COLLECTION_ASSIGN_THRESHOLD")
+    collection_naming_batch_window: float = Field(default=0.05, validation_alias="COLLECTION_NAMING_BATCH_WINDOW")
+    
+    # Largest number of queries accepted by one /search_batch request
+    search_batch_max_queries: int = Field(default=1024, validation_alias="SEARCH_BATCH_MAX_QUERIES")
+    
+    # Shared embedding server for all API workers (empty = load the model in each worker)
+    embedding_service_url: Optional[str] = Field(default=None, validation_alias="EMBEDDING_SERVICE_URL")
 
 
 class MonitoringSettings(BaseSettings):
@@ -139,6 +168,15 @@ class MonitoringSettings(BaseSettings):
     log_level: str = Field(default="INFO", validation_alias="LOG_LEVEL")
     log_format: str = Field(default="json", validation_alias="LOG_FORMAT")
     log_file: Optional[str] = Field(default=None, validation_alias="LOG_FILE")
+    
+    # Request tracing
+    trace_sample_rate: float = Field(default=0.01, validation_alias="TRACE_SAMPLE_RATE")
+    trace_buffer_size: int = Field(default=500, validation_alias="TRACE_BUFFER_SIZE")
+    trace_max_spans: int = Field(default=2000, validation_alias="TRACE_MAX_SPANS")
+    # Shared by the API workers so any of them can serve /debug/trace lookups; opened by the API
+    # on startup (defaults to traces.db next to the cluster catalog)
+    trace_store_path: Optional[str] = Field(default=None, validation_alias="TRACE_STORE_PATH")
+    otlp_endpoint: Optional[str] = Field(default=None, validation_alias="OTLP_ENDPOINT")
 
 
 class SecuritySettings(BaseSettings):
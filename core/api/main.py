@@ -3,25 +3,28 @@ Main FastAPI application for the distributed indexing system.
 """
 
 import asyncio
-from typing import List, Dict, Any, Optional
+import os
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
 from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Depends, Query, Path
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 import uvicorn
 from pydantic import BaseModel
 import requests
 import json
-from typing import cast
 import time
 
 from config.config import settings
 from core.utils.logging import get_logger
 from core.utils.metrics import metrics_collector
+from core.utils.tracing import TRACE_ID_HEADER, TraceMiddleware, span, tracer
 from core.types.document_processor import DocumentProcessor
 from core.types.image_processor import ImageProcessor
 from core.types.tabular_processor import TabularProcessor
 from core.services.ingestion.chunker import TextChunker
 from core.services.inference.gemini_client import GeminiClient, extract_gemini_text
+from core.services.inference.request_scheduler import RequestPriority
+from core.services.inference.collection_assigner import CollectionAssigner, BatchedCollectionNamer
 from data.storage.distributed_storage_manager import create_distributed_storage_manager
 from data.storage.distributed_vector_store import VectorNode
 from core.models.base import BaseDocument, DataType
@@ -47,69 +50,52 @@ storage_manager = create_distributed_storage_manager(
     ],
     replication_factor=2,
     consistency_level="quorum",
-    shard_count=8,
-    vector_size=384
+    shard_count=settings.database.shard_count,
+    vector_size=384,
+    hedge_budget=settings.database.search_hedge_budget,
+    first_wave_shards=settings.database.search_first_wave_shards,
+    catalog_path=settings.database.cluster_catalog_path,
+    embedding_service_url=settings.processing.embedding_service_url,
+    max_shard_vectors=settings.database.shard_max_vectors,
+    max_shard_qps=settings.database.shard_max_qps,
+    min_shard_vectors=settings.database.shard_min_vectors
 )
 
 # Initialize auto-scaler
 auto_scaler = create_auto_scaler(storage_manager)
 
+async def _generate_collection_names(prompt: str) -> str:
+    """Send a batched collection naming prompt to Gemini."""
+    response = await gemini_client.generate_text(prompt, temperature=0.3,
+                                                 priority=RequestPriority.BACKGROUND)
+    return extract_gemini_text(response)
+
+# Assigns uploads to existing collections locally; Gemini only names new topics, in batches
+collection_assigner = CollectionAssigner(
+    embed_text=storage_manager.embed_query,
+    score_collections=storage_manager.collection_centroids.score,
+    namer=BatchedCollectionNamer(
+        _generate_collection_names,
+        batch_window=settings.processing.collection_naming_batch_window
+    ),
+    claim_names=storage_manager.claim_collection_names,
+    similarity_threshold=settings.processing.collection_assign_threshold
+)
+
 async def determine_collections(document: BaseDocument, ai_metadata: Dict[str, Any], existing_collections: Optional[List[str]] = None) -> List[str]:
     """
-    Use AI to determine which collections this document should be stored in.
-    The AI is encouraged to always create new, specific, and combination collections for new topics, even if a broad collection exists.
+    Determine which collections this document should be stored in.
+    Documents join existing collections whose centroids are similar enough;
+    the LLM is only asked to name a new collection when nothing matches.
     """
     try:
         # Get existing collections if not provided
         if existing_collections is None:
             collections = await storage_manager.list_indexes()
             existing_collections = [col["name"] for col in collections]
-        
-        # Base collections based on document type
-        base_collections = [f"index_{document.type.value}"]
-        
-        # Reduce content preview to avoid overwhelming the model
-        content_preview = document.content[:1000] if document.content else "No content available"
-        
-        # Extract key metadata for better analysis
-        file_metadata = document.metadata or {}
-        file_name = file_metadata.get('filename', 'unknown')
-        file_type = file_metadata.get('mime_type', 'unknown')
-        file_size = file_metadata.get('file_size', 0)
-        
-        # Minimal prompt for debugging Gemini response
-        minimal_prompt = f"""
-        Given the following document content, return a JSON list of 1-3 relevant collection names (as strings) that describe the main topics. Example: ["index_ai", "index_machine_learning"]
-        Document Content: {content_preview}
-        """
-        try:
-            response = await gemini_client.generate_text(minimal_prompt, temperature=0.5)
-            logger.info(f"Full Gemini API response object: {response}")
-            response_text = extract_gemini_text(response)
-            logger.info(f"Raw Gemini response for collection determination (minimal prompt): {response_text}")
-        except Exception as gemini_exc:
-            logger.error(f"Gemini API call failed (minimal prompt): {gemini_exc}")
-            return base_collections
-        # Try to parse a simple list from the response
-        try:
-            import ast
-            # Remove Markdown code block formatting if present
-            cleaned = response_text.strip()
-            if cleaned.startswith('```'):
-                cleaned = cleaned.split('\n', 1)[-1]  # Remove the first line (``` or ```json)
-                if cleaned.endswith('```'):
-                    cleaned = cleaned.rsplit('```', 1)[0]
-            cleaned = cleaned.strip()
-            collections = ast.literal_eval(cleaned)
-            if isinstance(collections, list) and all(isinstance(x, str) for x in collections):
-                # Always append the base collection if not present
-                if base_collections[0] not in collections:
-                    collections.append(base_collections[0])
-                return collections
-        except Exception as parse_exc:
-            logger.warning(f"Failed to parse minimal Gemini response: {parse_exc}")
-        return base_collections
-        
+
+        return await collection_assigner.assign(document, ai_metadata, existing_collections)
+
     except Exception as e:
         logger.error(f"Collection determination failed: {e}")
         return [f"index_{document.type.value}"]
@@ -128,8 +114,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allow all methods
     allow_headers=["*"],  # Allow all headers
+    expose_headers=[TRACE_ID_HEADER, "Server-Timing"],
 )
 
+# Trace a sample of requests (and any request sent with "X-Trace: 1")
+app.add_middleware(TraceMiddleware, tracer=tracer)
+
 # Request/Response models
 class UploadResponse(BaseModel):
     document_id: str
@@ -146,6 +136,7 @@ class SearchRequest(BaseModel):
     limit: int = 10
     score_threshold: float = 0.7
     search_strategy: str = "hybrid"
+    routing: Optional[str] = None  # "embedding" (default) or "llm"
 
 class SearchResult(BaseModel):
     document_id: str
@@ -160,6 +151,22 @@ class SearchResponse(BaseModel):
     query_analysis: Dict[str, Any]
     reasoning: Dict[str, Any]
 
+class SearchBatchRequest(BaseModel):
+    queries: List[str]
+    index_names: List[str] = []
+    limit: int = 10
+    score_threshold: float = 0.7
+
+class SearchBatchResult(BaseModel):
+    query: str
+    results: List[SearchResult]
+    total_results: int
+    searched_indexes: List[str]
+
+class SearchBatchResponse(BaseModel):
+    results: List[SearchBatchResult]
+    total_queries: int
+
 class AskRequest(BaseModel):
     question: str
     index_names: List[str] = []
@@ -167,6 +174,7 @@ class AskRequest(BaseModel):
     score_threshold: float = 0.5
     search_strategy: str = "hybrid"
     include_sources: bool = True
+    routing: Optional[str] = None
 
 class AskResponse(BaseModel):
     answer: str
@@ -269,7 +277,8 @@ async def upload_file(
                 try:
                     ai_metadata = await gemini_client.extract_metadata(
                         document.content, 
-                        document.type.value
+                        document.type.value,
+                        priority=RequestPriority.BACKGROUND
                     )
                     document.metadata.update(ai_metadata)
                     logger.info(f"AI metadata extracted for document: {document.id}")
@@ -279,121 +288,119 @@ async def upload_file(
             else:
                 logger.warning(f"No content extracted from document: {document.id}")
             
-            # Chunk document if needed
-            chunked_docs = text_chunker.chunk_document(document, chunk_strategy)
-            logger.info(f"Document chunked: {len(chunked_docs)} chunks")
+            # Get existing collections for AI analysis
+            existing_collections = await storage_manager.list_indexes()
+            existing_collection_names = [col["name"] for col in existing_collections]
             
-            # Ensure chunked_docs is List[Document] for upsert_documents
-            if chunked_docs and hasattr(chunked_docs[0], 'dict'):
-                # Convert BaseDocument to Document if needed
-                chunked_docs = [DocModel(**doc.dict()) if hasattr(doc, 'dict') else doc for doc in chunked_docs]
+            # Determine collection names using AI analysis (now considers existing collections)
+            collection_names = await determine_collections(document, ai_metadata, existing_collection_names)
+            logger.info(f"Determined collections: {collection_names}")
             
-            # Generate embeddings
-            embeddings = await gemini_client.generate_embeddings(document.content)
+            # Chunks are stored once in the base collection for the data type;
+            # topical collections are virtual (tags over the base collection)
+            vector_size = 384  # Use 384 for sentence-transformers embeddings
+            base_collection = f"index_{document.type.value}"
+            target_collections = []
             
-            if embeddings:
-                # Get existing collections for AI analysis
-                existing_collections = await storage_manager.list_indexes()
-                existing_collection_names = [col["name"] for col in existing_collections]
-                
-                # Determine collection names using AI analysis (now considers existing collections)
-                collection_names = await determine_collections(document, ai_metadata, existing_collection_names)
-                logger.info(f"AI determined collections: {collection_names}")
-                
-                # Store in multiple collections
-                vector_size = 384  # Use 384 for sentence-transformers embeddings
-                stored_collections = []
-                
-                for collection_name in collection_names:
-                    try:
-                        # Check if collection exists before creating
-                        collection_exists = await storage_manager.index_exists(collection_name)
-                        
-                        if not collection_exists:
-                            # Create collection only if it doesn't exist
-                            await storage_manager.create_index(collection_name, vector_size)
-                            logger.info(f"Created new collection: {collection_name}")
-                        else:
-                            logger.info(f"Using existing collection: {collection_name}")
-                        
-                        # Store documents in this collection (append mode)
-                        success = await storage_manager.upsert_documents(
-                            index_name=collection_name,
-                            documents=cast(List[DocModel], chunked_docs)  # Cast to proper type
-                        )
-                        
-                        if success:
-                            stored_collections.append(collection_name)
-                            logger.info(f"Document stored in collection: {collection_name}")
-                        else:
-                            logger.warning(f"Failed to store in collection: {collection_name}")
-                            
-                    except Exception as e:
-                        logger.error(f"Error storing in collection {collection_name}: {e}")
-                        continue
-                
-                # Handle CSV indexing
-                csv_index_id = None
-                if file_extension == '.csv' and document.metadata.get('csv_index'):
-                    try:
-                        # Create CSV index collection if it doesn't exist
-                        csv_index_collection = "csv_indexes"
-                        if not await storage_manager.index_exists(csv_index_collection):
-                            await storage_manager.create_index(csv_index_collection, vector_size)
-                            logger.info(f"Created CSV index collection: {csv_index_collection}")
+            for collection_name in collection_names:
+                try:
+                    # Check if collection exists before creating
+                    collection_exists = await storage_manager.index_exists(collection_name)
+                    
+                    if not collection_exists:
+                        # Create collection only if it doesn't exist
+                        await storage_manager.create_index(collection_name, vector_size, base_index=base_collection)
+                        logger.info(f"Created new collection: {collection_name}")
+                    else:
+                        logger.info(f"Using existing collection: {collection_name}")
+                    
+                    target_collections.append(collection_name)
                         
-                        # Create CSV index document
-                        csv_index_data = document.metadata['csv_index']
-                        csv_index = CSVIndex.from_dict(csv_index_data)
-                        csv_index_doc = tabular_processor.create_csv_index_document(csv_index)
+                except Exception as e:
+                    logger.error(f"Error preparing collection {collection_name}: {e}")
+                    continue
+            
+            # Stream chunks through embed -> route -> upsert in bounded batches;
+            # each batch is embedded once and written to every target collection
+            stored_counts = await storage_manager.upsert_document_stream(
+                index_names=target_collections,
+                documents=text_chunker.iter_chunk_documents(document, chunk_strategy)
+            )
+            stored_collections = [name for name, count in stored_counts.items() if count > 0]
+            for collection_name in target_collections:
+                if collection_name in stored_collections:
+                    logger.info(f"Document stored in collection: {collection_name}")
+                else:
+                    logger.warning(f"Failed to store in collection: {collection_name}")
+            chunks_created = max(stored_counts.values(), default=0)
+            
+            # Handle CSV indexing
+            csv_index_id = None
+            if file_extension == '.csv' and document.metadata.get('csv_index'):
+                try:
+                    # Create CSV index collection if it doesn't exist
+                    csv_index_collection = "csv_indexes"
+                    if not await storage_manager.index_exists(csv_index_collection):
+                        await storage_manager.create_index(csv_index_collection, vector_size)
+                        logger.info(f"Created CSV index collection: {csv_index_collection}")
+                    
+                    # Create CSV index document
+                    csv_index_data = document.metadata['csv_index']
+                    csv_index = CSVIndex.from_dict(csv_index_data)
+                    csv_index_doc = tabular_processor.create_csv_index_document(csv_index)
+                    
+                    # Store CSV index in dedicated collection
+                    success = await storage_manager.upsert_documents(
+                        index_name=csv_index_collection,
+                        documents=[DocModel(**csv_index_doc.to_dict())]
+                    )
+                    
+                    if success:
+                        csv_index_id = csv_index.id
+                        logger.info(f"CSV index stored: {csv_index_id}")
                         
-                        # Store CSV index in dedicated collection
-                        success = await storage_manager.upsert_documents(
-                            index_name=csv_index_collection,
-                            documents=[DocModel(**csv_index_doc.to_dict())]
-                        )
+                        # Store CSV data in SQLite database for query execution
+                        try:
+                            db_path = csv_db_manager.store_csv_data(csv_index, temp_file_path)
+                            logger.info(f"CSV data stored in database: {db_path}")
+                            # Add database path to metadata
+                            document.update_metadata("sqlite_db_path", db_path)
+                        except Exception as db_error:
+                            logger.error(f"Failed to store CSV data in database: {db_error}")
+                    else:
+                        logger.warning("Failed to store CSV index")
                         
-                        if success:
-                            csv_index_id = csv_index.id
-                            logger.info(f"CSV index stored: {csv_index_id}")
-                            
-                            # Store CSV data in SQLite database for query execution
-                            try:
-                                db_path = csv_db_manager.store_csv_data(csv_index, temp_file_path)
-                                logger.info(f"CSV data stored in database: {db_path}")
-                                # Add database path to metadata
-                                document.update_metadata("sqlite_db_path", db_path)
-                            except Exception as db_error:
-                                logger.error(f"Failed to store CSV data in database: {db_error}")
-                        else:
-                            logger.warning("Failed to store CSV index")
-                            
-                    except Exception as e:
-                        logger.error(f"Error storing CSV index: {e}")
-                
-                if not stored_collections:
-                    # Fallback to default collection
-                    default_collection = f"index_{document.type.value}"
-                    await storage_manager.create_index(default_collection, vector_size)
-                    # Cast to proper type
-                    await storage_manager.upsert_documents(default_collection, cast(List[DocModel], chunked_docs))
-                    stored_collections = [default_collection]
-                    logger.info(f"Fallback to default collection: {default_collection}")
-                
-                # Clean up temporary file
-                os.unlink(temp_file_path)
-                
-                return UploadResponse(
-                    document_id=document.id,
-                    status="success",
-                    message=f"Document processed and stored in {len(stored_collections)} collections",
-                    chunks_created=len(chunked_docs),
-                    metadata=document.metadata,
-                    content=document.content[:500] + "..." if len(document.content) > 500 else document.content,
-                    csv_index_id=csv_index_id
+                except Exception as e:
+                    logger.error(f"Error storing CSV index: {e}")
+            
+            if not stored_collections:
+                # Fallback to default collection
+                default_collection = f"index_{document.type.value}"
+                await storage_manager.create_index(default_collection, vector_size)
+                stored_counts = await storage_manager.upsert_document_stream(
+                    index_names=[default_collection],
+                    documents=text_chunker.iter_chunk_documents(document, chunk_strategy)
                 )
-            else:
-                raise HTTPException(status_code=500, detail="No embeddings generated")
+                chunks_created = stored_counts.get(default_collection, 0)
+                if not chunks_created:
+                    raise HTTPException(status_code=500, detail="No embeddings generated")
+                stored_collections = [default_collection]
+                logger.info(f"Fallback to default collection: {default_collection}")
+            
+            logger.info(f"Document chunked: {chunks_created} chunks")
+            
+            # Clean up temporary file
+            os.unlink(temp_file_path)
+            
+            return UploadResponse(
+                document_id=document.id,
+                status="success",
+                message=f"Document processed and stored in {len(stored_collections)} collections",
+                chunks_created=chunks_created,
+                metadata=document.metadata,
+                content=document.content[:500] + "..." if len(document.content) > 500 else document.content,
+                csv_index_id=csv_index_id
+            )
             
         finally:
             # Clean up temporary file
@@ -404,6 +411,120 @@ async def upload_file(
         logger.error("File upload failed", error=str(e), filename=file.filename)
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
+def _to_search_result(result: Dict[str, Any]) -> SearchResult:
+    """Shape a storage search hit for an API response."""
+    return SearchResult(
+        document_id=result["document_id"],
+        content=result["content"],
+        score=result["score"],
+        metadata=result["metadata"],
+        source_index=result["source_index"]
+    )
+
+async def _route_with_llm(query: str, available_collection_names: List[str]) -> List[str]:
+    """Ask Gemini which indexes to search (opt-in routing); falls back to the first two indexes."""
+    # Use AI to analyze query and recommend indexes
+    query_analysis_prompt = f"""
+    Analyze this search query and recommend which indexes to search:
+    
+    Query: "{query}"
+    Available indexes: {available_collection_names}
+    
+    Consider:
+    - Content type (document, image, tabular)
+    - Topic relevance
+    - Search intent
+    
+    Return a JSON list of recommended index names:
+    ["index_document", "index_technology"]
+    """
+    
+    try:
+        response = await gemini_client.generate_text(query_analysis_prompt, temperature=0.3)
+        response_text = extract_gemini_text(response)
+        
+        # Parse response
+        if "[" in response_text and "]" in response_text:
+            start = response_text.find("[")
+            end = response_text.rfind("]") + 1
+            json_str = response_text[start:end]
+            recommended_indexes = json.loads(json_str)
+            
+            # Filter to available indexes
+            selected_indexes = [idx for idx in recommended_indexes if idx in available_collection_names]
+            if not selected_indexes:
+                selected_indexes = available_collection_names[:2]  # Fallback
+        else:
+            selected_indexes = available_collection_names[:2]  # Fallback
+            
+    except Exception as e:
+        logger.warning(f"Query analysis failed: {e}")
+        selected_indexes = available_collection_names[:2]  # Fallback
+    return selected_indexes
+
+async def _retrieve_documents(request: SearchRequest) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Pick the indexes for a search request and search them, without LLM reasoning.
+    
+    Returns:
+        (search results, query analysis)
+    """
+    # Get available indexes
+    collections = await storage_manager.list_indexes()
+    available_indexes = [
+        {
+            "name": col["name"],
+            "type": "vector",
+            "size": col["vectors_count"],
+            "description": f"Distributed vector index with {col['vectors_count']} vectors",
+            "status": "active"
+        }
+        for col in collections
+    ]
+    available_collection_names = [idx["name"] for idx in available_indexes]
+    
+    query_analysis: Dict[str, Any] = {}
+    query_vector = await storage_manager.embed_query(request.query)
+    routing = request.routing or settings.processing.collection_routing
+    
+    with span("route", routing=routing if not request.index_names else "explicit") as route_span:
+        # If no indexes specified, route by collection centroids (or ask the LLM if opted in)
+        if not request.index_names and routing == "llm":
+            selected_indexes = await _route_with_llm(request.query, available_collection_names)
+            query_analysis = {"routing": "llm", "selected_indexes": selected_indexes}
+        elif not request.index_names:
+            routed = storage_manager.route_query(
+                query_vector,
+                candidates=available_collection_names,
+                top_n=settings.processing.collection_router_top_n
+            )
+            # Collections without a centroid are routed unranked; with no candidates search everything
+            selected_indexes = [item["name"] for item in routed] or available_collection_names
+            query_analysis = {"routing": "embedding", "routed_collections": routed}
+        else:
+            selected_indexes = request.index_names
+    
+        # Search in selected indexes
+        search_index_names = [name for name in selected_indexes if name in available_collection_names]
+        if not search_index_names:
+            # Search in all available collections as fallback
+            search_index_names = available_collection_names
+    
+        route_span.set(indexes=len(search_index_names))
+    
+    # One pass over the selected collections: virtual collections sharing a
+    # base are scanned together and each chunk is returned once, ranked by score
+    with span("search", indexes=len(search_index_names)) as search_span:
+        search_results = await storage_manager.search_across_indexes(
+            index_names=search_index_names,
+            query=request.query,
+            limit=request.limit,
+            score_threshold=request.score_threshold,
+            query_vector=query_vector
+        )
+        search_span.set(results=len(search_results))
+    return search_results, query_analysis
+
 # Search endpoint
 @app.post("/search", response_model=SearchResponse)
 async def search_documents(request: SearchRequest):
@@ -417,122 +538,17 @@ async def search_documents(request: SearchRequest):
     4. AI-powered reasoning about results
     """
     try:
-        # Get available indexes
-        collections = await storage_manager.list_indexes()
-        available_indexes = [
-            {
-                "name": col["name"],
-                "type": "vector",
-                "size": col["vectors_count"],
-                "description": f"Distributed vector index with {col['vectors_count']} vectors",
-                "status": "active"
-            }
-            for col in collections
-        ]
-        available_collection_names = [idx["name"] for idx in available_indexes]
-        
-        # If no indexes specified, use AI to recommend
-        if not request.index_names:
-            # Use AI to analyze query and recommend indexes
-            query_analysis_prompt = f"""
-            Analyze this search query and recommend which indexes to search:
-            
-            Query: "{request.query}"
-            Available indexes: {[idx["name"] for idx in available_indexes]}
-            
-            Consider:
-            - Content type (document, image, tabular)
-            - Topic relevance
-            - Search intent
-            
-            Return a JSON list of recommended index names:
-            ["index_document", "index_technology"]
-            """
-            
-            try:
-                response = await gemini_client.generate_text(query_analysis_prompt, temperature=0.3)
-                response_text = extract_gemini_text(response)
-                
-                # Parse response
-                if "[" in response_text and "]" in response_text:
-                    start = response_text.find("[")
-                    end = response_text.rfind("]") + 1
-                    json_str = response_text[start:end]
-                    recommended_indexes = json.loads(json_str)
-                    
-                    # Filter to available indexes
-                    selected_indexes = [idx for idx in recommended_indexes if idx in available_collection_names]
-                    if not selected_indexes:
-                        selected_indexes = available_collection_names[:2]  # Fallback
-                else:
-                    selected_indexes = available_collection_names[:2]  # Fallback
-                    
-            except Exception as e:
-                logger.warning(f"Query analysis failed: {e}")
-                selected_indexes = available_collection_names[:2]  # Fallback
-        else:
-            selected_indexes = request.index_names
-        
-        # Search in selected indexes
-        search_tasks = []
-        for index_name in selected_indexes:
-            if index_name in available_collection_names:
-                task = storage_manager.search_documents(
-                    index_name=index_name,
-                    query=request.query,
-                    limit=request.limit,
-                    score_threshold=request.score_threshold
-                )
-                search_tasks.append((index_name, task))
-        
-        if not search_tasks:
-            # Search in all available collections as fallback
-            for col in collections:
-                task = storage_manager.search_documents(
-                    index_name=col["name"],
-                    query=request.query,
-                    limit=request.limit,
-                    score_threshold=request.score_threshold
-                )
-                search_tasks.append((col["name"], task))
-        
-        # Execute searches in parallel
-        search_results = []
-        for index_name, task in search_tasks:
-            try:
-                results = await task
-                for result in results:
-                    result["source_index"] = index_name
-                    search_results.append(result)
-            except Exception as e:
-                logger.warning(f"Search failed for index {index_name}", error=str(e))
-        
-        # Sort results by score
-        search_results.sort(key=lambda x: x["score"], reverse=True)
-        
-        # Limit results
-        search_results = search_results[:request.limit]
+        search_results, query_analysis = await _retrieve_documents(request)
         
         # Use Gemini to reason about results
-        reasoning = await gemini_client.reason_about_results(
-            request.query, 
-            search_results
-        )
+        with span("reasoning", results=len(search_results)):
+            reasoning = await gemini_client.reason_about_results(
+                request.query, 
+                search_results
+            )
         
         # Format response
-        formatted_results = [
-            SearchResult(
-                document_id=result["document_id"],
-                content=result["content"],
-                score=result["score"],
-                metadata=result["metadata"],
-                source_index=result["source_index"]
-            )
-            for result in search_results
-        ]
-        # Ensure query_analysis is defined
-        if 'query_analysis' not in locals():
-            query_analysis = {}
+        formatted_results = [_to_search_result(result) for result in search_results]
         return SearchResponse(
             results=formatted_results,
             total_results=len(formatted_results),
@@ -544,6 +560,326 @@ async def search_documents(request: SearchRequest):
         logger.error("Search failed", error=str(e), query=request.query)
         raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
 
+# Batch search endpoint
+@app.post("/search_batch", response_model=SearchBatchResponse)
+async def search_documents_batch(request: SearchBatchRequest):
+    """
+    Search many queries in one request, for evaluation and enrichment jobs.
+    
+    All queries are embedded in one encoder batch. Queries routed to the same
+    indexes are sent to every shard together and scored with one matrix
+    multiply per shard. There is no per-query LLM routing or reasoning: without
+    index names, each query is routed by collection centroids.
+    """
+    if len(request.queries) > settings.processing.search_batch_max_queries:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.processing.search_batch_max_queries} queries per batch"
+        )
+    try:
+        if not request.queries:
+            return SearchBatchResponse(results=[], total_queries=0)
+        
+        collections = await storage_manager.list_indexes()
+        available_collection_names = [col["name"] for col in collections]
+        query_vectors = await storage_manager.embed_queries(request.queries)
+        
+        # Indexes to search per query; queries with the same indexes are searched as one batch
+        if request.index_names:
+            selected = [name for name in request.index_names if name in available_collection_names]
+            query_indexes = [selected or available_collection_names] * len(request.queries)
+        else:
+            query_indexes = []
+            for query_vector in query_vectors:
+                routed = storage_manager.route_query(
+                    query_vector,
+                    candidates=available_collection_names,
+                    top_n=settings.processing.collection_router_top_n
+                )
+                query_indexes.append([item["name"] for item in routed] or available_collection_names)
+        
+        batches: Dict[Tuple[str, ...], List[int]] = {}
+        for i, index_names in enumerate(query_indexes):
+            batches.setdefault(tuple(index_names), []).append(i)
+        
+        batch_results = await asyncio.gather(*(
+            storage_manager.search_batch(
+                index_names=list(index_names),
+                queries=[request.queries[i] for i in positions],
+                limit=request.limit,
+                score_threshold=request.score_threshold,
+                query_vectors=[query_vectors[i] for i in positions]
+            )
+            for index_names, positions in batches.items()
+        ))
+        
+        per_query: List[List[Dict[str, Any]]] = [[] for _ in request.queries]
+        for positions, results in zip(batches.values(), batch_results):
+            for i, query_results in zip(positions, results):
+                per_query[i] = query_results
+        
+        return SearchBatchResponse(
+            results=[
+                SearchBatchResult(
+                    query=query,
+                    results=[_to_search_result(result) for result in results],
+                    total_results=len(results),
+                    searched_indexes=index_names
+                )
+                for query, results, index_names in zip(request.queries, per_query, query_indexes)
+            ],
+            total_queries=len(request.queries)
+        )
+        
+    except Exception as e:
+        logger.error("Batch search failed", error=str(e), queries=len(request.queries))
+        raise HTTPException(status_code=500, detail=f"Batch search failed: {str(e)}")
+
+def _parse_csv_search_results(csv_search_results: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[CSVIndex]]:
+    """
+    Extract CSV file descriptions from hits in the CSV index collection.
+    
+    Returns:
+        (relevant CSV dicts for responses, CSVIndex objects for prompts)
+    """
+    relevant_csvs = []
+    csv_indexes = []
+    
+    for result in csv_search_results:
+        try:
+            # Extract CSV index data from metadata
+            metadata = result.get("metadata", {})
+            csv_filename = metadata.get("csv_filename", "unknown")
+            column_headers_raw = metadata.get("column_headers", "[]")
+            total_rows = metadata.get("total_rows", 0)
+            total_columns = metadata.get("total_columns", 0)
+            csv_file_id = metadata.get("csv_file_id", result.get("document_id", ""))
+            
+            # Parse column_headers from JSON string
+            try:
+                if isinstance(column_headers_raw, str):
+                    column_headers = json.loads(column_headers_raw)
+                else:
+                    column_headers = column_headers_raw or []
+            except json.JSONDecodeError:
+                column_headers = []
+            
+            relevant_csvs.append({
+                "filename": csv_filename,
+                "score": result.get("score", 0.0),
+                "column_headers": column_headers,
+                "total_rows": total_rows,
+                "total_columns": total_columns,
+                "document_id": result.get("document_id", ""),
+                "csv_file_id": csv_file_id
+            })
+            
+            # Create CSV index object for reasoning
+            csv_index = CSVIndex(
+                csv_file_id=csv_file_id,
+                csv_filename=csv_filename,
+                column_headers=column_headers,
+                total_rows=total_rows,
+                total_columns=total_columns,
+                sample_data=None,  # We don't have sample data from search results
+                inferred_types=None  # We don't have inferred types from search results
+            )
+            csv_indexes.append(csv_index)
+            
+        except Exception as e:
+            logger.warning(f"Error processing CSV search result: {e}")
+            continue
+    
+    return relevant_csvs, csv_indexes
+
+async def _find_relevant_csvs(question: str, score_threshold: float) -> Tuple[List[Dict[str, Any]], List[CSVIndex]]:
+    """Search the CSV index collection for the top 5 CSV files; empty if none were uploaded."""
+    csv_index_collection = "csv_indexes"
+    if not await storage_manager.index_exists(csv_index_collection):
+        return [], []
+    with span("csv_search") as csv_span:
+        csv_search_results = await storage_manager.search_documents(
+            index_name=csv_index_collection,
+            query=question,
+            limit=5,  # Get top 5 most relevant CSV files
+            score_threshold=score_threshold
+        )
+        csv_span.set(results=len(csv_search_results))
+    return _parse_csv_search_results(csv_search_results)
+
+async def _query_best_csv(question: str, best_csv: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Generate a SQL query for the question with Gemini and run it on the CSV's table.
+    
+    Returns:
+        SQL query with its first 10 result rows (or the execution error), or
+        None if no SELECT query could be generated
+    """
+    # Extract the csv_file_id from metadata, not the document_id
+    csv_file_id = best_csv.get("csv_file_id", best_csv["document_id"])
+    
+    # Generate SQL query using AI
+    sql_prompt = f"""
+    Generate a SQL query to answer this question: "{question}"
+    
+    CSV Structure:
+    - File: {best_csv['filename']}
+    - Columns: {', '.join(best_csv['column_headers'])}
+    - Total Rows: {best_csv['total_rows']}
+    - Table Name: csv_data_{csv_file_id.replace('-', '_')}
+    
+    Instructions:
+    - Return ONLY the SQL query, nothing else
+    - Use the exact table name: csv_data_{csv_file_id.replace('-', '_')}
+    - Focus on getting actual data values, not just structure
+    - If the question asks for specific values, use WHERE clauses to find them
+    - If the question asks for calculations, use appropriate SQL functions
+    """
+    
+    try:
+        with span("sql_generate"):
+            sql_response = await gemini_client.generate_text(sql_prompt, temperature=0.1)
+        sql_query = extract_gemini_text(sql_response).strip()
+        
+        # Clean up SQL query (remove markdown, etc.)
+        if sql_query.startswith('```sql'):
+            sql_query = sql_query[7:]
+        if sql_query.endswith('```'):
+            sql_query = sql_query[:-3]
+        sql_query = sql_query.strip()
+        
+        # Execute the SQL query
+        if sql_query and sql_query.upper().startswith('SELECT'):
+            try:
+                with span("sql_execute", csv_file_id=csv_file_id) as sql_span:
+                    results, columns = csv_db_manager.execute_query(csv_file_id, sql_query)
+                    sql_span.set(rows=len(results))
+                logger.info(f"Executed SQL query: {sql_query}")
+                return {
+                    "csv_file": best_csv['filename'],
+                    "sql_query": sql_query,
+                    "results": results[:10],  # Limit to first 10 results
+                    "total_results": len(results),
+                    "columns": columns
+                }
+                
+            except Exception as sql_error:
+                logger.warning(f"SQL execution failed: {sql_error}")
+                return {"error": str(sql_error)}
+        
+    except Exception as sql_gen_error:
+        logger.warning(f"SQL generation failed: {sql_gen_error}")
+    return None
+
+def _csv_confidence(relevant_csvs: List[Dict[str, Any]]) -> float:
+    """Confidence from the CSV index search scores."""
+    avg_score = sum(csv["score"] for csv in relevant_csvs) / len(relevant_csvs)
+    return min(avg_score * 1.2, 1.0)  # Boost confidence slightly
+
+def _csv_sources(relevant_csvs: List[Dict[str, Any]]) -> List[SearchResult]:
+    """CSV files as answer sources."""
+    return [
+        SearchResult(
+            document_id=csv["document_id"],
+            content=f"CSV File: {csv['filename']} - Columns: {', '.join(csv['column_headers'])} - Rows: {csv['total_rows']}",
+            score=csv["score"],
+            metadata={"type": "csv", "filename": csv["filename"]},
+            source_index="csv_indexes"
+        )
+        for csv in relevant_csvs
+    ]
+
+def _csv_data_info(relevant_csvs: List[Dict[str, Any]], sql_results: Any) -> str:
+    """CSV files and SQL results as context for the answer prompt."""
+    return f"""
+    CSV Data Available:
+    {chr(10).join([f"- {csv['filename']}: {csv['total_rows']} rows, {csv['total_columns']} columns ({', '.join(csv['column_headers'])})" for csv in relevant_csvs])}
+    
+    SQL Query Results:
+    {json.dumps(sql_results, indent=2) if sql_results else "No SQL results available"}
+    """
+
+def _csv_query_analysis(relevant_csvs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        "question_type": "csv_query",
+        "relevant_csv_count": len(relevant_csvs),
+        "best_match_score": max([csv["score"] for csv in relevant_csvs]) if relevant_csvs else 0.0
+    }
+
+def _csv_reasoning_prompt(question: str, csv_indexes: List[CSVIndex]) -> str:
+    """Prompt for answering a question from CSV file structure."""
+    csv_context = "\n\n".join([
+        f"CSV: {csv.csv_filename}\nColumns: {', '.join(csv.column_headers)}\nRows: {csv.total_rows}"
+        for csv in csv_indexes
+    ])
+    
+    return f"""
+    You are a data analyst with access to CSV files. The user has asked: "{question}"
+    
+    Available CSV Files:
+    {csv_context}
+    
+    Your task is to:
+    1. Identify which CSV file(s) contain the data needed to answer the question
+    2. Generate appropriate SQL queries to extract the required data
+    3. Execute the SQL queries to get actual results
+    4. Provide a clear answer based on the real data, not just the structure
+    
+    Focus on getting actual data values, not just describing what data would be needed.
+    """
+
+def _answer_prompt(question: str, csv_data_info: str, document_sources_text: str, structured: bool = True) -> str:
+    """
+    Prompt for the final /ask answer.
+    
+    Args:
+        question: User question
+        csv_data_info: CSV files and SQL results ("" if none)
+        document_sources_text: Top document sources ("" if none)
+        structured: Ask for a JSON answer with confidence and reasoning; plain text otherwise (for streaming)
+    """
+    if structured:
+        response_format = """Format your response as JSON:
+    {
+        "answer": "Your comprehensive answer here",
+        "confidence": 0.85,
+        "reasoning": "Explanation of how you arrived at this answer",
+        "limitations": ["Any limitations or uncertainties"],
+        "sources_used": ["csv", "documents"] or ["csv"] or ["documents"]
+    }"""
+    else:
+        response_format = "Respond with the answer only, as plain text (no JSON and no code fences)."
+    
+    return f"""
+    You are an AI assistant with access to multiple sources of information. Please answer the user's question comprehensively.
+
+    Question: "{question}"
+
+    Available Information:
+
+    {f"CSV Data:{csv_data_info}" if csv_data_info else "No CSV data available"}
+
+    {f"Document Sources:{chr(10)}{document_sources_text}" if document_sources_text else "No document sources available"}
+
+    Instructions:
+    1. Provide a comprehensive answer that uses all available information
+    2. If CSV data is available and relevant, use the actual data values from the SQL results
+    3. If document sources provide relevant information, incorporate that as well
+    4. If there are conflicts between sources, acknowledge them
+    5. If one source is more specific or relevant, emphasize that
+    6. Be direct and comprehensive in your answer
+    7. If the sources don't fully answer the question, acknowledge this
+
+    {response_format}
+    """
+
+def _document_sources_text(results: List[SearchResult]) -> str:
+    """Top 5 document sources as context for the answer prompt."""
+    return "\n\n".join([
+        f"Document Source {i+1} (Score: {result.score:.3f}):\n{result.content[:1000]}"
+        for i, result in enumerate(results[:5])
+    ])
+
 # Ask endpoint - AI-powered question answering
 @app.post("/ask", response_model=AskResponse)
 async def ask_question(request: AskRequest):
@@ -570,146 +906,32 @@ async def ask_question(request: AskRequest):
         if await storage_manager.index_exists(csv_index_collection):
             try:
                 # Search for relevant CSV indexes
-                csv_search_results = await storage_manager.search_documents(
-                    index_name=csv_index_collection,
-                    query=request.question,
-                    limit=5,  # Get top 5 most relevant CSV files
-                    score_threshold=request.score_threshold
-                )
+                with span("csv_search") as csv_span:
+                    csv_search_results = await storage_manager.search_documents(
+                        index_name=csv_index_collection,
+                        query=request.question,
+                        limit=5,  # Get top 5 most relevant CSV files
+                        score_threshold=request.score_threshold
+                    )
+                    csv_span.set(results=len(csv_search_results))
                 
                 if csv_search_results:
-                    # Extract CSV index information from search results
-                    relevant_csvs = []
-                    csv_indexes = []
-                    
-                    for result in csv_search_results:
-                        try:
-                            # Extract CSV index data from metadata
-                            metadata = result.get("metadata", {})
-                            csv_filename = metadata.get("csv_filename", "unknown")
-                            column_headers_raw = metadata.get("column_headers", "[]")
-                            total_rows = metadata.get("total_rows", 0)
-                            total_columns = metadata.get("total_columns", 0)
-                            csv_file_id = metadata.get("csv_file_id", result.get("document_id", ""))
-                            
-                            # Parse column_headers from JSON string
-                            try:
-                                if isinstance(column_headers_raw, str):
-                                    column_headers = json.loads(column_headers_raw)
-                                else:
-                                    column_headers = column_headers_raw or []
-                            except json.JSONDecodeError:
-                                column_headers = []
-                            
-                            relevant_csvs.append({
-                                "filename": csv_filename,
-                                "score": result.get("score", 0.0),
-                                "column_headers": column_headers,
-                                "total_rows": total_rows,
-                                "total_columns": total_columns,
-                                "document_id": result.get("document_id", ""),
-                                "csv_file_id": csv_file_id
-                            })
-                            
-                            # Create CSV index object for reasoning
-                            csv_index = CSVIndex(
-                                csv_file_id=csv_file_id,
-                                csv_filename=csv_filename,
-                                column_headers=column_headers,
-                                total_rows=total_rows,
-                                total_columns=total_columns,
-                                sample_data=None,  # We don't have sample data from search results
-                                inferred_types=None  # We don't have inferred types from search results
-                            )
-                            csv_indexes.append(csv_index)
-                            
-                        except Exception as e:
-                            logger.warning(f"Error processing CSV search result: {e}")
-                            continue
+                    relevant_csvs, csv_indexes = _parse_csv_search_results(csv_search_results)
                     
                     # Try to generate and execute SQL queries for the most relevant CSV
                     sql_results = []
-                    
                     if relevant_csvs:
-                        # Get the most relevant CSV
-                        best_csv = relevant_csvs[0]
-                        # Extract the csv_file_id from metadata, not the document_id
-                        csv_file_id = best_csv.get("csv_file_id", best_csv["document_id"])
-                        
-                        # Generate SQL query using AI
-                        sql_prompt = f"""
-                        Generate a SQL query to answer this question: "{request.question}"
-                        
-                        CSV Structure:
-                        - File: {best_csv['filename']}
-                        - Columns: {', '.join(best_csv['column_headers'])}
-                        - Total Rows: {best_csv['total_rows']}
-                        - Table Name: csv_data_{csv_file_id.replace('-', '_')}
-                        
-                        Instructions:
-                        - Return ONLY the SQL query, nothing else
-                        - Use the exact table name: csv_data_{csv_file_id.replace('-', '_')}
-                        - Focus on getting actual data values, not just structure
-                        - If the question asks for specific values, use WHERE clauses to find them
-                        - If the question asks for calculations, use appropriate SQL functions
-                        """
-                        
-                        try:
-                            sql_response = await gemini_client.generate_text(sql_prompt, temperature=0.1)
-                            sql_query = extract_gemini_text(sql_response).strip()
-                            
-                            # Clean up SQL query (remove markdown, etc.)
-                            if sql_query.startswith('```sql'):
-                                sql_query = sql_query[7:]
-                            if sql_query.endswith('```'):
-                                sql_query = sql_query[:-3]
-                            sql_query = sql_query.strip()
-                            
-                            # Execute the SQL query
-                            if sql_query and sql_query.upper().startswith('SELECT'):
-                                try:
-                                    results, columns = csv_db_manager.execute_query(csv_file_id, sql_query)
-                                    sql_results = {
-                                        "csv_file": best_csv['filename'],
-                                        "sql_query": sql_query,
-                                        "results": results[:10],  # Limit to first 10 results
-                                        "total_results": len(results),
-                                        "columns": columns
-                                    }
-                                    logger.info(f"Executed SQL query: {sql_query}")
-                                    
-                                except Exception as sql_error:
-                                    logger.warning(f"SQL execution failed: {sql_error}")
-                                    sql_results = {"error": str(sql_error)}
-                            
-                        except Exception as sql_gen_error:
-                            logger.warning(f"SQL generation failed: {sql_gen_error}")
+                        sql_results = await _query_best_csv(request.question, relevant_csvs[0]) or []
                     
                     # Calculate confidence based on search scores
                     if relevant_csvs:
-                        avg_score = sum(csv["score"] for csv in relevant_csvs) / len(relevant_csvs)
-                        csv_confidence = min(avg_score * 1.2, 1.0)  # Boost confidence slightly
+                        csv_confidence = _csv_confidence(relevant_csvs)
                     
                     # Create CSV sources for response
-                    csv_sources = [
-                        SearchResult(
-                            document_id=csv["document_id"],
-                            content=f"CSV File: {csv['filename']} - Columns: {', '.join(csv['column_headers'])} - Rows: {csv['total_rows']}",
-                            score=csv["score"],
-                            metadata={"type": "csv", "filename": csv["filename"]},
-                            source_index="csv_indexes"
-                        )
-                        for csv in relevant_csvs
-                    ]
+                    csv_sources = _csv_sources(relevant_csvs)
                     
                     # Prepare CSV data information for the LLM
-                    csv_data_info = f"""
-                    CSV Data Available:
-                    {chr(10).join([f"- {csv['filename']}: {csv['total_rows']} rows, {csv['total_columns']} columns ({', '.join(csv['column_headers'])})" for csv in relevant_csvs])}
-                    
-                    SQL Query Results:
-                    {json.dumps(sql_results, indent=2) if sql_results else "No SQL results available"}
-                    """
+                    csv_data_info = _csv_data_info(relevant_csvs, sql_results)
                     
                     csv_reasoning = {
                         "csv_files_analyzed": len(csv_indexes),
@@ -727,7 +949,8 @@ async def ask_question(request: AskRequest):
             index_names=request.index_names,
             limit=request.limit,
             score_threshold=request.score_threshold,
-            search_strategy=request.search_strategy
+            search_strategy=request.search_strategy,
+            routing=request.routing
         )
         
         # Get search results
@@ -746,10 +969,7 @@ async def ask_question(request: AskRequest):
             
             if non_csv_results:
                 # Prepare document sources text for the LLM
-                document_sources_text = "\n\n".join([
-                    f"Document Source {i+1} (Score: {result.score:.3f}):\n{result.content[:1000]}"
-                    for i, result in enumerate(non_csv_results[:5])  # Top 5 sources
-                ])
+                document_sources_text = _document_sources_text(non_csv_results)
                 
                 # Add document sources
                 all_sources.extend(non_csv_results if request.include_sources else [])
@@ -758,38 +978,11 @@ async def ask_question(request: AskRequest):
         all_sources.extend(csv_sources if request.include_sources else [])
         
         # Step 4: Generate comprehensive answer using LLM with all information
-        final_prompt = f"""
-        You are an AI assistant with access to multiple sources of information. Please answer the user's question comprehensively.
-
-        Question: "{request.question}"
-
-        Available Information:
-
-        {f"CSV Data:{csv_data_info}" if csv_data_info else "No CSV data available"}
-
-        {f"Document Sources:{chr(10)}{document_sources_text}" if document_sources_text else "No document sources available"}
-
-        Instructions:
-        1. Provide a comprehensive answer that uses all available information
-        2. If CSV data is available and relevant, use the actual data values from the SQL results
-        3. If document sources provide relevant information, incorporate that as well
-        4. If there are conflicts between sources, acknowledge them
-        5. If one source is more specific or relevant, emphasize that
-        6. Be direct and comprehensive in your answer
-        7. If the sources don't fully answer the question, acknowledge this
-
-        Format your response as JSON:
-        {{
-            "answer": "Your comprehensive answer here",
-            "confidence": 0.85,
-            "reasoning": "Explanation of how you arrived at this answer",
-            "limitations": ["Any limitations or uncertainties"],
-            "sources_used": ["csv", "documents"] or ["csv"] or ["documents"]
-        }}
-        """
+        final_prompt = _answer_prompt(request.question, csv_data_info, document_sources_text)
         
         try:
-            final_response = await gemini_client.generate_text(final_prompt, temperature=0.3)
+            with span("answer"):
+                final_response = await gemini_client.generate_text(final_prompt, temperature=0.3)
             final_text = extract_gemini_text(final_response)
             
             # Parse the final answer
@@ -900,12 +1093,14 @@ async def ask_csv_question(request: AskCSVRequest):
             )
         
         # Search for relevant CSV indexes
-        csv_search_results = await storage_manager.search_documents(
-            index_name=csv_index_collection,
-            query=request.question,
-            limit=5,  # Get top 5 most relevant CSV files
-            score_threshold=request.score_threshold
-        )
+        with span("csv_search") as csv_span:
+            csv_search_results = await storage_manager.search_documents(
+                index_name=csv_index_collection,
+                query=request.question,
+                limit=5,  # Get top 5 most relevant CSV files
+                score_threshold=request.score_threshold
+            )
+            csv_span.set(results=len(csv_search_results))
         
         if not csv_search_results:
             return AskCSVResponse(
@@ -916,78 +1111,14 @@ async def ask_csv_question(request: AskCSVRequest):
                 query_analysis={"status": "no_relevant_csvs"}
             )
         
-        # Extract CSV index information from search results
-        relevant_csvs = []
-        csv_indexes = []
-        
-        for result in csv_search_results:
-            try:
-                # Extract CSV index data from metadata
-                metadata = result.get("metadata", {})
-                csv_filename = metadata.get("csv_filename", "unknown")
-                column_headers_raw = metadata.get("column_headers", "[]")
-                total_rows = metadata.get("total_rows", 0)
-                total_columns = metadata.get("total_columns", 0)
-                csv_file_id = metadata.get("csv_file_id", result.get("document_id", ""))
-                
-                # Parse column_headers from JSON string
-                try:
-                    if isinstance(column_headers_raw, str):
-                        column_headers = json.loads(column_headers_raw)
-                    else:
-                        column_headers = column_headers_raw or []
-                except json.JSONDecodeError:
-                    column_headers = []
-                
-                relevant_csvs.append({
-                    "filename": csv_filename,
-                    "score": result.get("score", 0.0),
-                    "column_headers": column_headers,
-                    "total_rows": total_rows,
-                    "total_columns": total_columns,
-                    "document_id": result.get("document_id", ""),
-                    "csv_file_id": csv_file_id
-                })
-                
-                # Create CSV index object for reasoning
-                csv_index = CSVIndex(
-                    csv_file_id=csv_file_id,
-                    csv_filename=csv_filename,
-                    column_headers=column_headers,
-                    total_rows=total_rows,
-                    total_columns=total_columns,
-                    sample_data=None,  # We don't have sample data from search results
-                    inferred_types=None  # We don't have inferred types from search results
-                )
-                csv_indexes.append(csv_index)
-                
-            except Exception as e:
-                logger.warning(f"Error processing CSV search result: {e}")
-                continue
+        relevant_csvs, csv_indexes = _parse_csv_search_results(csv_search_results)
         
         # Use AI to analyze the question and generate SQL/answer
-        csv_context = "\n\n".join([
-            f"CSV: {csv.csv_filename}\nColumns: {', '.join(csv.column_headers)}\nRows: {csv.total_rows}"
-            for csv in csv_indexes
-        ])
-        
-        reasoning_prompt = f"""
-        You are a data analyst with access to CSV files. The user has asked: "{request.question}"
-        
-        Available CSV Files:
-        {csv_context}
-        
-        Your task is to:
-        1. Identify which CSV file(s) contain the data needed to answer the question
-        2. Generate appropriate SQL queries to extract the required data
-        3. Execute the SQL queries to get actual results
-        4. Provide a clear answer based on the real data, not just the structure
-        
-        Focus on getting actual data values, not just describing what data would be needed.
-        """
+        reasoning_prompt = _csv_reasoning_prompt(request.question, csv_indexes)
         
         try:
-            response = await gemini_client.generate_text(reasoning_prompt, temperature=0.3)
+            with span("answer"):
+                response = await gemini_client.generate_text(reasoning_prompt, temperature=0.3)
             answer = extract_gemini_text(response)
             
             # Try to generate and execute SQL queries for the most relevant CSV
@@ -995,86 +1126,31 @@ async def ask_csv_question(request: AskCSVRequest):
             final_answer = answer  # Start with the AI-generated answer
             
             if relevant_csvs:
-                # Get the most relevant CSV
-                best_csv = relevant_csvs[0]
-                # Extract the csv_file_id from metadata, not the document_id
-                csv_file_id = best_csv.get("csv_file_id", best_csv["document_id"])
-                
-                # Generate SQL query using AI
-                sql_prompt = f"""
-                Generate a SQL query to answer this question: "{request.question}"
-                
-                CSV Structure:
-                - File: {best_csv['filename']}
-                - Columns: {', '.join(best_csv['column_headers'])}
-                - Total Rows: {best_csv['total_rows']}
-                - Table Name: csv_data_{csv_file_id.replace('-', '_')}
+                sql_results = await _query_best_csv(request.question, relevant_csvs[0]) or []
                 
-                Instructions:
-                - Return ONLY the SQL query, nothing else
-                - Use the exact table name: csv_data_{csv_file_id.replace('-', '_')}
-                - Focus on getting actual data values, not just structure
-                - If the question asks for specific values, use WHERE clauses to find them
-                - If the question asks for calculations, use appropriate SQL functions
-                """
-                
-                try:
-                    sql_response = await gemini_client.generate_text(sql_prompt, temperature=0.1)
-                    sql_query = extract_gemini_text(sql_response).strip()
+                # Generate a data-driven answer based on actual results
+                if sql_results and sql_results.get("results"):
+                    data_answer_prompt = f"""
+                    Based on the SQL query results, provide a clear answer to: "{request.question}"
                     
-                    # Clean up SQL query (remove markdown, etc.)
-                    if sql_query.startswith('```sql'):
-                        sql_query = sql_query[7:]
-                    if sql_query.endswith('```'):
-                        sql_query = sql_query[:-3]
-                    sql_query = sql_query.strip()
+                    SQL Query: {sql_results['sql_query']}
+                    Results: {sql_results['results'][:5]}  # Show first 5 results
+                    Total Results: {sql_results['total_results']}
                     
-                    # Execute the SQL query
-                    if sql_query and sql_query.upper().startswith('SELECT'):
-                        try:
-                            results, columns = csv_db_manager.execute_query(csv_file_id, sql_query)
-                            sql_results = {
-                                "csv_file": best_csv['filename'],
-                                "sql_query": sql_query,
-                                "results": results[:10],  # Limit to first 10 results
-                                "total_results": len(results),
-                                "columns": columns
-                            }
-                            logger.info(f"Executed SQL query: {sql_query}")
-                            
-                            # Generate a data-driven answer based on actual results
-                            if results:
-                                data_answer_prompt = f"""
-                                Based on the SQL query results, provide a clear answer to: "{request.question}"
-                                
-                                SQL Query: {sql_query}
-                                Results: {results[:5]}  # Show first 5 results
-                                Total Results: {len(results)}
-                                
-                                Provide a concise answer based on the actual data, not just the structure.
-                                """
-                                
-                                try:
-                                    data_response = await gemini_client.generate_text(data_answer_prompt, temperature=0.3)
-                                    data_answer = extract_gemini_text(data_response)
-                                    csv_answer = data_answer
-                                except Exception as data_error:
-                                    logger.warning(f"Data answer generation failed: {data_error}")
-                                    # Fall back to original answer
-                            
-                        except Exception as sql_error:
-                            logger.warning(f"SQL execution failed: {sql_error}")
-                            sql_results = {"error": str(sql_error)}
+                    Provide a concise answer based on the actual data, not just the structure.
+                    """
                     
-                except Exception as sql_gen_error:
-                    logger.warning(f"SQL generation failed: {sql_gen_error}")
+                    try:
+                        with span("data_answer"):
+                            data_response = await gemini_client.generate_text(data_answer_prompt, temperature=0.3)
+                        data_answer = extract_gemini_text(data_response)
+                        csv_answer = data_answer
+                    except Exception as data_error:
+                        logger.warning(f"Data answer generation failed: {data_error}")
+                        # Fall back to original answer
                 
                 # Calculate confidence based on search scores
-                if relevant_csvs:
-                    avg_score = sum(csv["score"] for csv in relevant_csvs) / len(relevant_csvs)
-                    confidence = min(avg_score * 1.2, 1.0)  # Boost confidence slightly
-                else:
-                    confidence = 0.0
+                confidence = _csv_confidence(relevant_csvs)
                 
                 return AskCSVResponse(
                     answer=final_answer,
@@ -1086,11 +1162,7 @@ async def ask_csv_question(request: AskCSVRequest):
                         "analysis_method": "csv_index_search",
                         "sql_results": sql_results
                     },
-                    query_analysis={
-                        "question_type": "csv_query",
-                        "relevant_csv_count": len(relevant_csvs),
-                        "best_match_score": max([csv["score"] for csv in relevant_csvs]) if relevant_csvs else 0.0
-                    }
+                    query_analysis=_csv_query_analysis(relevant_csvs)
                 )
                 
         except Exception as e:
@@ -1107,6 +1179,188 @@ async def ask_csv_question(request: AskCSVRequest):
         logger.error(f"CSV question processing failed: {e}")
         raise HTTPException(status_code=500, detail=f"CSV question processing failed: {str(e)}")
 
+def _sse_event(event: str, data: Any) -> str:
+    """Format one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+# Proxies must pass events through as they are written
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+async def _ask_events(request: AskRequest) -> AsyncIterator[str]:
+    """Server-sent events for /ask/stream."""
+    tasks: List[asyncio.Task] = []
+    try:
+        # Document and CSV retrieval run concurrently; each is sent as soon as it is ready
+        documents_task = asyncio.create_task(_retrieve_documents(SearchRequest(
+            query=request.question,
+            index_names=request.index_names,
+            limit=request.limit,
+            score_threshold=request.score_threshold,
+            search_strategy=request.search_strategy,
+            routing=request.routing
+        )))
+        csv_task = asyncio.create_task(_find_relevant_csvs(request.question, request.score_threshold))
+        sql_task: Optional[asyncio.Task] = None
+        tasks = [documents_task, csv_task]
+        
+        document_results: List[SearchResult] = []
+        query_analysis: Dict[str, Any] = {}
+        relevant_csvs: List[Dict[str, Any]] = []
+        sql_results: Any = []
+        
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task is documents_task:
+                    search_results, query_analysis = task.result()
+                    document_results = [
+                        _to_search_result(result) for result in search_results
+                        if result["source_index"] != "csv_indexes"
+                    ]
+                    if request.include_sources and document_results:
+                        yield _sse_event("sources", {
+                            "origin": "documents",
+                            "sources": [result.dict() for result in document_results]
+                        })
+                elif task is csv_task:
+                    try:
+                        relevant_csvs, _ = task.result()
+                    except Exception as csv_error:
+                        logger.warning(f"CSV processing failed: {csv_error}")
+                    if relevant_csvs:
+                        if request.include_sources:
+                            yield _sse_event("sources", {
+                                "origin": "csv",
+                                "sources": [result.dict() for result in _csv_sources(relevant_csvs)]
+                            })
+                        sql_task = asyncio.create_task(_query_best_csv(request.question, relevant_csvs[0]))
+                        tasks.append(sql_task)
+                        pending.add(sql_task)
+                elif task is sql_task:
+                    sql_results = task.result() or []
+                    if sql_results:
+                        yield _sse_event("sql", sql_results)
+        
+        csv_data_info = _csv_data_info(relevant_csvs, sql_results) if relevant_csvs else ""
+        document_sources_text = _document_sources_text(document_results)
+        final_prompt = _answer_prompt(request.question, csv_data_info, document_sources_text, structured=False)
+        
+        with span("answer", streamed=True) as answer_span:
+            async for text in gemini_client.stream_text(final_prompt, temperature=0.3):
+                answer_span.mark("first_token_ms")
+                yield _sse_event("token", {"text": text})
+        
+        sources_used = []
+        if csv_data_info:
+            sources_used.append("csv")
+        if document_sources_text:
+            sources_used.append("documents")
+        # The plain-text answer carries no self-rated confidence; estimate it from retrieval scores
+        scores = [_csv_confidence(relevant_csvs)] if relevant_csvs else []
+        if document_results:
+            top = document_results[:5]
+            scores.append(sum(result.score for result in top) / len(top))
+        yield _sse_event("done", {
+            "confidence": max(scores) if scores else 0.0,
+            "sources_used": sources_used,
+            "query_analysis": query_analysis
+        })
+        
+    except Exception as e:
+        logger.error("Streaming answer failed", error=str(e), question=request.question)
+        yield _sse_event("error", {"detail": f"Ask question failed: {str(e)}"})
+    finally:
+        # The client may disconnect mid-stream
+        for task in tasks:
+            task.cancel()
+
+@app.post("/ask/stream")
+async def ask_question_stream(request: AskRequest):
+    """
+    Streaming variant of ``/ask`` as server-sent events.
+    
+    Events, each sent as soon as it is available:
+    - ``sources``: retrieved documents, and separately the relevant CSV files
+    - ``sql``: the SQL query run on the most relevant CSV file and its results
+    - ``token``: answer text as Gemini generates it
+    - ``done``: confidence (from retrieval scores), sources used and query analysis
+    - ``error``: the request failed; nothing follows
+    
+    The answer is generated as plain text rather than JSON so it can be shown
+    while it streams, and the document search skips the LLM reasoning pass.
+    """
+    return StreamingResponse(_ask_events(request), media_type="text/event-stream", headers=SSE_HEADERS)
+
+async def _ask_csv_events(request: AskCSVRequest) -> AsyncIterator[str]:
+    """Server-sent events for /ask_csv/stream."""
+    sql_task: Optional[asyncio.Task] = None
+    try:
+        csv_index_collection = "csv_indexes"
+        if not await storage_manager.index_exists(csv_index_collection):
+            yield _sse_event("token", {"text": "No CSV files have been uploaded yet. Please upload some CSV files first."})
+            yield _sse_event("done", {"confidence": 0.0, "reasoning": {"error": "No CSV indexes found"},
+                                      "query_analysis": {"status": "no_csv_files"}})
+            return
+        
+        relevant_csvs, csv_indexes = await _find_relevant_csvs(request.question, request.score_threshold)
+        if not relevant_csvs:
+            yield _sse_event("token", {"text": "I couldn't find any CSV files relevant to your question. "
+                                               "Please try rephrasing or upload relevant CSV files."})
+            yield _sse_event("done", {"confidence": 0.0, "reasoning": {"error": "No relevant CSV files found"},
+                                      "query_analysis": {"status": "no_relevant_csvs"}})
+            return
+        
+        if request.include_sources:
+            yield _sse_event("sources", {"origin": "csv", "sources": relevant_csvs})
+        
+        # The SQL query runs while the answer streams; its event goes out as soon as it finishes
+        sql_task = asyncio.create_task(_query_best_csv(request.question, relevant_csvs[0]))
+        sql_results: Any = []
+        sql_sent = False
+        
+        with span("answer", streamed=True) as answer_span:
+            async for text in gemini_client.stream_text(_csv_reasoning_prompt(request.question, csv_indexes),
+                                                        temperature=0.3):
+                answer_span.mark("first_token_ms")
+                yield _sse_event("token", {"text": text})
+                if not sql_sent and sql_task.done():
+                    sql_results = sql_task.result() or []
+                    sql_sent = True
+                    if sql_results:
+                        yield _sse_event("sql", sql_results)
+        if not sql_sent:
+            sql_results = await sql_task or []
+            if sql_results:
+                yield _sse_event("sql", sql_results)
+        
+        yield _sse_event("done", {
+            "confidence": _csv_confidence(relevant_csvs),
+            "reasoning": {
+                "csv_files_analyzed": len(csv_indexes),
+                "search_scores": [csv["score"] for csv in relevant_csvs],
+                "analysis_method": "csv_index_search",
+                "sql_results": sql_results
+            },
+            "query_analysis": _csv_query_analysis(relevant_csvs)
+        })
+        
+    except Exception as e:
+        logger.error(f"Streaming CSV answer failed: {e}")
+        yield _sse_event("error", {"detail": f"CSV question processing failed: {str(e)}"})
+    finally:
+        if sql_task is not None:
+            sql_task.cancel()
+
+@app.post("/ask_csv/stream")
+async def ask_csv_question_stream(request: AskCSVRequest):
+    """
+    Streaming variant of ``/ask_csv`` as server-sent events: ``sources`` (the
+    relevant CSV files), ``token`` (answer text), ``sql`` (sent as soon as the
+    SQL query has run, possibly between tokens), then ``done`` or ``error``.
+    """
+    return StreamingResponse(_ask_csv_events(request), media_type="text/event-stream", headers=SSE_HEADERS)
+
 # List CSV databases endpoint
 @app.get("/csv_databases")
 async def list_csv_databases():
@@ -1179,6 +1433,20 @@ async def startup_event():
     """Initialize system on startup."""
     logger.info("Starting distributed indexing system")
     
+    logger.info("Worker coordination", pid=os.getpid(), leader=storage_manager.is_leader)
+    
+    # Kept traces go next to the catalog, so any worker can serve a trace lookup
+    tracer.open_store(settings.monitoring.trace_store_path or
+                      os.path.join(os.path.dirname(settings.database.cluster_catalog_path), "traces.db"))
+    
+    # Adopt collections and shards already on the nodes before creating defaults;
+    # other workers pick the result up from the shared catalog
+    if storage_manager.is_leader:
+        await storage_manager.reconcile_catalog()
+    
+    # Every worker runs the loop; only the leader scales, and only while enabled
+    asyncio.create_task(auto_scaler.run())
+    
     # Initialize default collections
     try:
         default_collections = ["index_document", "index_image", "index_tabular"]
@@ -1197,6 +1465,10 @@ async def startup_event():
 async def shutdown_event():
     """Cleanup on shutdown."""
     logger.info("Shutting down distributed indexing system")
+    # Keep counts and routing centroids gathered since the last periodic flush
+    storage_manager.flush_catalog()
+    storage_manager.deregister_worker()
+    metrics_collector.mark_process_dead()
 
 @app.get("/documents")
 async def list_documents(
@@ -1295,6 +1567,8 @@ class ClusterStatus(BaseModel):
     replication_factor: int
     consistency_level: str
     nodes: List[NodeInfo]
+    replication: Optional[Dict[str, Any]] = None
+    catalog: Optional[Dict[str, Any]] = None
 
 class AddNodeRequest(BaseModel):
     node_id: str
@@ -1340,7 +1614,9 @@ async def get_cluster_status():
             total_vectors=cluster_info.get("total_vectors", 0),
             replication_factor=cluster_info.get("replication_factor", 2),
             consistency_level=cluster_info.get("consistency_level", "quorum"),
-            nodes=nodes
+            nodes=nodes,
+            replication=cluster_info.get("replication"),
+            catalog=cluster_info.get("catalog")
         )
         
     except Exception as e:
@@ -1442,6 +1718,19 @@ async def cluster_health_check():
         logger.error(f"Cluster health check failed: {e}")
         raise HTTPException(status_code=500, detail=f"Cluster health check failed: {str(e)}")
 
+@app.get("/cluster/metrics")
+async def get_cluster_metrics():
+    """
+    Measured cluster performance over the rolling metrics window: search
+    latency percentiles and throughput, and node RPC request rate, error
+    rate, bytes and latency per node, shard and collection.
+    """
+    try:
+        return storage_manager.get_performance_metrics()
+    except Exception as e:
+        logger.error("Failed to get cluster metrics", error=str(e))
+        raise HTTPException(status_code=500, detail=f"Failed to get cluster metrics: {str(e)}")
+
 @app.get("/cluster/sharding")
 async def get_sharding_info():
     """
@@ -1451,17 +1740,68 @@ async def get_sharding_info():
     try:
         cluster_status = await storage_manager.get_cluster_status()
         return {
-            "sharding_strategy": "consistent_hashing",
+            "sharding_strategy": "hash_range",
             "shard_count": cluster_status.get("total_shards", 0),
             "replication_factor": cluster_status.get("replication_factor", 2),
             "consistency_level": cluster_status.get("consistency_level", "quorum"),
             "shard_distribution": cluster_status.get("shards", []),
-            "node_distribution": cluster_status.get("nodes", [])
+            "node_distribution": cluster_status.get("nodes", []),
+            "ring": cluster_status.get("ring", {}),
+            "shard_ranges": cluster_status.get("shard_ranges", {}),
+            "pending_moves": storage_manager.plan_shard_movement()
         }
     except Exception as e:
         logger.error("Failed to get sharding info", error=str(e))
         raise HTTPException(status_code=500, detail=f"Failed to get sharding info: {str(e)}")
 
+@app.get("/cluster/sharding/plan")
+async def get_shard_range_plan():
+    """
+    Dry-run shard splitting and merging.
+    Shows the hash-range splits and merges the next cycle would start, based on shard size and QPS.
+    """
+    try:
+        return await storage_manager.plan_shard_ranges()
+    except Exception as e:
+        logger.error("Failed to plan shard splits", error=str(e))
+        raise HTTPException(status_code=500, detail=f"Failed to plan shard splits: {str(e)}")
+
+@app.post("/cluster/shards/{shard_id}/split")
+async def split_shard(shard_id: str):
+    """
+    Split a hash-range shard into two halves online.
+    Runs on the leader worker; writes continue during the split.
+    """
+    if not storage_manager.is_leader:
+        raise HTTPException(status_code=409, detail="Shard splits run on the leader worker; retry the request")
+    if not await storage_manager.split_shard(shard_id):
+        raise HTTPException(status_code=400, detail=f"Shard {shard_id} was not split (see logs)")
+    return {"status": "split", "shard_id": shard_id}
+
+@app.post("/cluster/catalog/reconcile")
+async def reconcile_cluster_catalog():
+    """
+    Reconcile the coordinator's catalog with the shards the nodes actually hold.
+    Adopts collections and shards missing from the catalog and refreshes vector counts.
+    """
+    try:
+        return await storage_manager.reconcile_catalog()
+    except Exception as e:
+        logger.error("Failed to reconcile cluster catalog", error=str(e))
+        raise HTTPException(status_code=500, detail=f"Failed to reconcile cluster catalog: {str(e)}")
+
+@app.get("/cluster/rebalance/plan")
+async def get_rebalance_plan():
+    """
+    Dry-run the load rebalancer.
+    Shows the replica moves the next cycle would make, based on measured shard size and QPS.
+    """
+    try:
+        return await storage_manager.plan_rebalance()
+    except Exception as e:
+        logger.error("Failed to plan rebalance", error=str(e))
+        raise HTTPException(status_code=500, detail=f"Failed to plan rebalance: {str(e)}")
+
 # Auto-scaling endpoints
 class AutoScalingStatus(BaseModel):
     is_running: bool
@@ -1484,6 +1824,11 @@ class UpdateThresholdsRequest(BaseModel):
     error_rate_threshold_low: Optional[float] = None
     min_nodes: Optional[int] = None
     max_nodes: Optional[int] = None
+    scale_up_cooldown: Optional[int] = None
+    scale_down_cooldown: Optional[int] = None
+    scale_up_confirmations: Optional[int] = None
+    scale_down_confirmations: Optional[int] = None
+    forecast_horizon: Optional[int] = None
 
 @app.get("/autoscaling/status", response_model=AutoScalingStatus)
 async def get_autoscaling_status():
@@ -1563,6 +1908,16 @@ async def update_autoscaling_thresholds(request: UpdateThresholdsRequest):
             current_thresholds.min_nodes = request.min_nodes
         if request.max_nodes is not None:
             current_thresholds.max_nodes = request.max_nodes
+        if request.scale_up_cooldown is not None:
+            current_thresholds.scale_up_cooldown = request.scale_up_cooldown
+        if request.scale_down_cooldown is not None:
+            current_thresholds.scale_down_cooldown = request.scale_down_cooldown
+        if request.scale_up_confirmations is not None:
+            current_thresholds.scale_up_confirmations = request.scale_up_confirmations
+        if request.scale_down_confirmations is not None:
+            current_thresholds.scale_down_confirmations = request.scale_down_confirmations
+        if request.forecast_horizon is not None:
+            current_thresholds.forecast_horizon = request.forecast_horizon
         
         # Update the auto-scaler
         auto_scaler.update_thresholds(current_thresholds)
@@ -1593,7 +1948,8 @@ async def manual_scale_up():
             raise HTTPException(status_code=400, detail="Maximum number of nodes reached")
         
         # Trigger scale up using the existing method
-        await auto_scaler._scale_up("Manual scale-up triggered", current_nodes)
+        if not await auto_scaler._scale_up("Manual scale-up triggered", current_nodes):
+            raise HTTPException(status_code=500, detail="Scale-up failed: the new node did not join the cluster")
         
         return {
             "status": "scaled_up",
@@ -1619,8 +1975,9 @@ async def manual_scale_down():
         if current_nodes <= auto_scaler.thresholds.min_nodes:
             raise HTTPException(status_code=400, detail="Minimum number of nodes reached")
         
-        # Trigger scale down using the existing method
-        await auto_scaler._scale_down("Manual scale-down triggered", current_nodes)
+        # Trigger scale down using the existing method; a node is only removed once drained
+        if not await auto_scaler._scale_down("Manual scale-down triggered", current_nodes):
+            raise HTTPException(status_code=500, detail="Scale-down failed: no node could be drained and removed")
         
         return {
             "status": "scaled_down",
@@ -1631,6 +1988,25 @@ async def manual_scale_down():
         logger.error("Failed to manually scale down", error=str(e))
         raise HTTPException(status_code=500, detail=f"Failed to scale down: {str(e)}")
 
+@app.get("/debug/traces")
+async def list_traces(limit: int = Query(20, ge=1, le=500, description="Traces to return"),
+                      slowest: bool = Query(False, description="Slowest first instead of most recent")):
+    """Summaries of recently kept request traces."""
+    return {"sample_rate": tracer.sample_rate, "traces": tracer.recent(limit=limit, slowest=slowest)}
+
+@app.get("/debug/trace/{trace_id}")
+async def get_trace(trace_id: str):
+    """
+    Full span tree of a kept trace.
+    
+    Send ``X-Trace: 1`` with any request to trace it; the response's
+    ``X-Trace-Id`` header names the trace.
+    """
+    trace = tracer.get(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail=f"Trace {trace_id} not found (not sampled or evicted)")
+    return trace
+
 @app.get("/debug/collections")
 async def debug_collections():
     """
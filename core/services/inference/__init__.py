@@ -3,12 +3,18 @@ AI integration module for reasoning and intelligent processing.
 """
 
 from .gemini_client import GeminiClient
+from .request_scheduler import GeminiRequestScheduler, RequestPriority
+from .collection_assigner import CollectionAssigner, BatchedCollectionNamer
 from .reasoning_engine import ReasoningEngine
 from .query_analyzer import QueryAnalyzer
 from .index_selector import IndexSelector
 
 __all__ = [
     "GeminiClient",
+    "GeminiRequestScheduler",
+    "RequestPriority",
+    "CollectionAssigner",
+    "BatchedCollectionNamer",
     "ReasoningEngine",
     "QueryAnalyzer",
     "IndexSelector",
@@ -0,0 +1,239 @@
+"""
+Local collection assignment for uploaded documents.
+
+Documents are matched against existing collection centroids by embedding
+similarity; the LLM is only asked (in batches) to name a new collection
+when nothing existing is close enough.
+"""
+
+import asyncio
+import json
+import re
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from core.models.base import BaseDocument
+from core.utils.logging import LoggerMixin
+
+# Collections that are not topical and never take part in matching
+DEFAULT_EXCLUDED_COLLECTIONS = frozenset({
+    "index_document",
+    "index_image",
+    "index_tabular",
+    "csv_indexes",
+})
+
+_COLLECTION_NAME_PATTERN = re.compile(r"[^a-z0-9_]+")
+
+
+def normalize_collection_name(name: str) -> str:
+    """Normalize an LLM-proposed name to the index_<topic> convention."""
+    cleaned = _COLLECTION_NAME_PATTERN.sub("_", name.strip().lower()).strip("_")
+    if not cleaned:
+        return ""
+    return cleaned if cleaned.startswith("index_") else f"index_{cleaned}"
+
+
+class BatchedCollectionNamer(LoggerMixin):
+    """
+    Collects naming requests for a short window and resolves them with a
+    single LLM prompt.
+    """
+
+    def __init__(self,
+                 generate: Callable[[str], Awaitable[str]],
+                 batch_window: float = 0.05,
+                 max_batch_size: int = 8,
+                 max_names: int = 3):
+        """
+        Initialize batched namer.
+
+        Args:
+            generate: Async callable sending a prompt to the LLM and returning its text
+            batch_window: Seconds to wait for more requests before sending a batch
+            max_batch_size: Send immediately once this many requests are queued
+            max_names: Maximum collection names per document
+        """
+        super().__init__()
+        self.generate = generate
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.max_names = max_names
+        self.llm_calls = 0
+
+        self._pending: List[Tuple[str, Sequence[str], asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+
+    async def name(self, summary: str, existing_collections: Sequence[str] = ()) -> List[str]:
+        """Get collection names for one document summary."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((summary, existing_collections, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._schedule_flush(0)
+        elif self._flush_handle is None:
+            self._schedule_flush(self.batch_window)
+        return await future
+
+    def _schedule_flush(self, delay: float) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+        loop = asyncio.get_running_loop()
+        self._flush_handle = loop.call_later(delay, lambda: asyncio.ensure_future(self._flush()))
+
+    async def _flush(self) -> None:
+        self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        existing = sorted({name for _, names, _ in batch for name in names})
+        documents = "\n".join(f"{i + 1}. {summary[:1000]}" for i, (summary, _, _) in enumerate(batch))
+        prompt = f"""
+        For each numbered document below, return 1-{self.max_names} topical collection names.
+        Reuse one of the existing collections whenever it fits; only invent a new name for a genuinely new topic.
+        Existing collections: {existing}
+
+        Documents:
+        {documents}
+
+        Return ONLY a JSON object mapping each document number to a list of names, e.g.
+        {{"1": ["index_ai", "index_machine_learning"], "2": ["index_finance"]}}
+        """
+
+        try:
+            self.llm_calls += 1
+            response_text = await self.generate(prompt)
+            assignments = self._parse(response_text)
+        except Exception as e:
+            self.logger.warning("Batched collection naming failed", error=str(e), batch_size=len(batch))
+            assignments = {}
+
+        for i, (_, _, future) in enumerate(batch):
+            if not future.done():
+                future.set_result(assignments.get(str(i + 1), []))
+
+    def _parse(self, response_text: str) -> Dict[str, List[str]]:
+        start = response_text.find("{")
+        end = response_text.rfind("}") + 1
+        if start < 0 or end <= start:
+            raise ValueError("No JSON object found in response")
+
+        raw = json.loads(response_text[start:end])
+        parsed: Dict[str, List[str]] = {}
+        for key, names in raw.items():
+            if isinstance(names, str):
+                names = [names]
+            normalized = [normalize_collection_name(n) for n in names if isinstance(n, str)]
+            parsed[str(key)] = [n for n in dict.fromkeys(normalized) if n][:self.max_names]
+        return parsed
+
+
+class CollectionAssigner(LoggerMixin):
+    """
+    Assigns documents to collections by matching a summary embedding against
+    existing collection centroids.
+    """
+
+    def __init__(self,
+                 embed_text: Callable[[str], Awaitable[List[float]]],
+                 score_collections: Callable[[List[float], Iterable[str]], List[Tuple[str, float]]],
+                 namer: BatchedCollectionNamer,
+                 claim_names: Optional[Callable[[List[str], List[float], float], List[str]]] = None,
+                 similarity_threshold: float = 0.5,
+                 max_collections: int = 3,
+                 excluded_collections: Iterable[str] = DEFAULT_EXCLUDED_COLLECTIONS):
+        """
+        Initialize collection assigner.
+
+        Args:
+            embed_text: Async callable embedding a text
+            score_collections: Callable scoring (vector, candidates) against collection centroids
+            namer: Batched LLM namer used when no collection matches
+            claim_names: Callable (names, vector, threshold) returning the names other
+                workers already chose for similar content, or the given ones if none
+            similarity_threshold: Minimum centroid similarity to join an existing collection
+            max_collections: Maximum topical collections per document
+            excluded_collections: Non-topical collections never used for matching
+        """
+        super().__init__()
+        self.embed_text = embed_text
+        self.score_collections = score_collections
+        self.namer = namer
+        self.claim_names = claim_names
+        self.similarity_threshold = similarity_threshold
+        self.max_collections = max_collections
+        self.excluded_collections = set(excluded_collections)
+
+        self.stats = {"assigned_locally": 0, "named_by_llm": 0, "fallback_to_base": 0}
+
+    @staticmethod
+    def build_summary(document: BaseDocument, ai_metadata: Optional[Dict[str, Any]] = None) -> str:
+        """Build the text that represents a document for assignment."""
+        ai_metadata = ai_metadata or {}
+        parts = []
+        if ai_metadata.get("summary"):
+            parts.append(str(ai_metadata["summary"]))
+        topics = ai_metadata.get("topics")
+        if isinstance(topics, list) and topics:
+            parts.append("Topics: " + ", ".join(str(t) for t in topics))
+        parts.append((document.content or "")[:1000])
+        return "\n".join(p for p in parts if p)
+
+    async def assign(self,
+                     document: BaseDocument,
+                     ai_metadata: Optional[Dict[str, Any]] = None,
+                     existing_collections: Optional[Sequence[str]] = None) -> List[str]:
+        """
+        Determine collections for a document.
+
+        Args:
+            document: Uploaded document
+            ai_metadata: Metadata extracted by the LLM (summary/topics are used if present)
+            existing_collections: Names of collections that already exist
+
+        Returns:
+            Topical collections followed by the document's base collection
+        """
+        base_collection = f"index_{document.type.value}"
+        existing_collections = list(existing_collections or [])
+        candidates = [
+            name for name in existing_collections
+            if name not in self.excluded_collections and name != base_collection
+        ]
+
+        summary = self.build_summary(document, ai_metadata)
+        if not summary:
+            self.stats["fallback_to_base"] += 1
+            return [base_collection]
+
+        vector = None
+        if candidates:
+            vector = await self.embed_text(summary)
+            scored = self.score_collections(vector, candidates)
+            matched = [name for name, score in scored if score >= self.similarity_threshold]
+            if matched:
+                self.stats["assigned_locally"] += 1
+                self.logger.info("Assigned document to existing collections",
+                                 document_id=document.id,
+                                 collections=matched[:self.max_collections])
+                return matched[:self.max_collections] + [base_collection]
+
+        # Nothing close enough: let the (batched) LLM name a new collection
+        names = await self.namer.name(summary, candidates)
+        names = [n for n in names if n not in self.excluded_collections and n != base_collection]
+        if not names:
+            self.stats["fallback_to_base"] += 1
+            return [base_collection]
+
+        new_names = [n for n in names if n not in existing_collections]
+        if new_names and self.claim_names:
+            # Another worker may have named the same topic before its collection exists
+            if vector is None:
+                vector = await self.embed_text(summary)
+            claimed = self.claim_names(new_names, vector, self.similarity_threshold)
+            names = [n for n in names if n in existing_collections] + claimed
+            names = list(dict.fromkeys(names))
+
+        self.stats["named_by_llm"] += 1
+        return names[:self.max_collections] + [base_collection]
@@ -3,13 +3,15 @@ Gemini AI client for reasoning and intelligent processing.
 """
 
 import os
-from typing import List, Dict, Any, Optional
+from typing import AsyncIterator, List, Dict, Any, Optional
 import google.generativeai as genai
 from pydantic import BaseModel, Field
 
 from core.utils.logging import LoggerMixin
 from core.utils.metrics import monitor_function
+from core.utils.tracing import current_span
 from config.config import settings
+from .request_scheduler import GeminiRequestScheduler, RequestPriority
 
 
 class GeminiResponse(BaseModel):
@@ -23,12 +25,14 @@ class GeminiResponse(BaseModel):
 class GeminiClient(LoggerMixin):
     """Client for interacting with Google's Gemini AI."""
     
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None,
+                 scheduler: Optional[GeminiRequestScheduler] = None):
         """
         Initialize Gemini client.
         
         Args:
             api_key: Gemini API key (if not provided, will use environment variable)
+            scheduler: Request scheduler shared by all calls (built from settings if not provided)
         """
         super().__init__()
         
@@ -44,21 +48,29 @@ class GeminiClient(LoggerMixin):
         self.text_model = genai.GenerativeModel('gemini-2.5-flash')
         self.vision_model = genai.GenerativeModel('gemini-2.5-flash')
         
+        self.scheduler = scheduler or GeminiRequestScheduler.from_settings(settings.processing)
+        
         self.logger.info("Gemini client initialized successfully")
     
     @monitor_function("gemini_client", "generate_text", "text")
     async def generate_text(self, prompt: str, 
                            context: Optional[str] = None,
                            temperature: float = 0.7,
-                           max_tokens: int = 1000) -> GeminiResponse:
+                           max_tokens: int = 1000,
+                           priority: RequestPriority = RequestPriority.INTERACTIVE) -> GeminiResponse:
         """
         Generate text response using Gemini.
         
+        Requests go through the client's scheduler, so they are rate limited,
+        retried on quota/transient errors, and identical concurrent prompts
+        share a single API call.
+        
         Args:
             prompt: The input prompt
             context: Additional context for the prompt
             temperature: Creativity level (0.0 to 1.0)
             max_tokens: Maximum tokens to generate
+            priority: Scheduling lane (interactive requests are served before background ones)
             
         Returns:
             GeminiResponse object
@@ -70,16 +82,22 @@ class GeminiClient(LoggerMixin):
                 full_prompt = f"Context: {context}\n\nPrompt: {prompt}"
             
             # Generate response
-            response = await self.text_model.generate_content_async(
-                full_prompt,
-                generation_config=genai.types.GenerationConfig(
-                    temperature=temperature,
-                    max_output_tokens=max_tokens,
-                )
+            response = await self.scheduler.submit(
+                lambda: self.text_model.generate_content_async(
+                    full_prompt,
+                    generation_config=genai.types.GenerationConfig(
+                        temperature=temperature,
+                        max_output_tokens=max_tokens,
+                    )
+                ),
+                key=(full_prompt, temperature, max_tokens),
+                priority=priority,
+                estimated_tokens=len(full_prompt) // 4 + max_tokens
             )
             
             # Extract response
             response_text = extract_gemini_text(response)
+            current_span().set(prompt_chars=len(full_prompt), response_chars=len(response_text))
             
             # Create response object
             gemini_response = GeminiResponse(
@@ -105,6 +123,58 @@ class GeminiClient(LoggerMixin):
             self.logger.error("Text generation failed", error=str(e), prompt=prompt[:100])
             raise
     
+    async def stream_text(self, prompt: str,
+                          context: Optional[str] = None,
+                          temperature: float = 0.7,
+                          max_tokens: int = 1000,
+                          priority: RequestPriority = RequestPriority.INTERACTIVE) -> AsyncIterator[str]:
+        """
+        Stream a text response from Gemini as it is generated.
+        
+        The request is rate limited like ``generate_text``, but only opening
+        the stream is retried and identical prompts are not coalesced. The SDK
+        reads one chunk ahead, so each chunk is yielded once the next arrives.
+        
+        Args:
+            prompt: The input prompt
+            context: Additional context for the prompt
+            temperature: Creativity level (0.0 to 1.0)
+            max_tokens: Maximum tokens to generate
+            priority: Scheduling lane
+            
+        Yields:
+            Text chunks in generation order
+        """
+        full_prompt = prompt
+        if context:
+            full_prompt = f"Context: {context}\n\nPrompt: {prompt}"
+        
+        chunk_count = 0
+        try:
+            async with self.scheduler.stream(
+                lambda: self.text_model.generate_content_async(
+                    full_prompt,
+                    generation_config=genai.types.GenerationConfig(
+                        temperature=temperature,
+                        max_output_tokens=max_tokens,
+                    ),
+                    stream=True
+                ),
+                priority=priority,
+                estimated_tokens=len(full_prompt) // 4 + max_tokens
+            ) as response:
+                async for chunk in response:
+                    chunk_count += 1
+                    text = _chunk_text(chunk)
+                    if text:
+                        yield text
+            
+            self.logger.debug("Text stream completed", prompt_length=len(prompt), chunks=chunk_count)
+            
+        except Exception as e:
+            self.logger.error("Text streaming failed", error=str(e), prompt=prompt[:100], chunks=chunk_count)
+            raise
+    
     @monitor_function("gemini_client", "analyze_query", "query")
     async def analyze_query(self, query: str, 
                            available_indexes: List[Dict[str, Any]]) -> Dict[str, Any]:
@@ -225,13 +295,15 @@ class GeminiClient(LoggerMixin):
     
     @monitor_function("gemini_client", "extract_metadata", "metadata")
     async def extract_metadata(self, content: str, 
-                              content_type: str = "text") -> Dict[str, Any]:
+                              content_type: str = "text",
+                              priority: RequestPriority = RequestPriority.INTERACTIVE) -> Dict[str, Any]:
         """
         Extract metadata from content using Gemini.
         
         Args:
             content: Content to analyze
             content_type: Type of content (text, image, document)
+            priority: Scheduling lane for the underlying request
             
         Returns:
             Extracted metadata
@@ -262,7 +334,7 @@ class GeminiClient(LoggerMixin):
             }}
             """
             
-            response = await self.generate_text(prompt, temperature=0.3)
+            response = await self.generate_text(prompt, temperature=0.3, priority=priority)
             
             # Parse JSON response
             import json
@@ -399,6 +471,13 @@ class GeminiClient(LoggerMixin):
             self.logger.error("Result reasoning failed", error=str(e))
             raise
 
+def _chunk_text(chunk) -> str:
+    """Text of a streamed chunk; chunks without candidates (e.g. usage-only) have none."""
+    try:
+        return extract_gemini_text(chunk) or ""
+    except ValueError:
+        return ""
+
 def extract_gemini_text(response):
     # For multi-part responses (Gemini 2.5+)
     if hasattr(response, "parts") and response.parts:
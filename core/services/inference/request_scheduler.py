@@ -0,0 +1,318 @@
+"""
+Request scheduling for LLM calls: concurrency limits, rate limiting,
+retries with backoff and single-flight coalescing.
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple, TypeVar
+
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+
+from core.utils.logging import LoggerMixin
+from core.utils.tracing import current_span, span
+
+try:
+    from google.api_core import exceptions as google_exceptions
+    _PROVIDER_RETRYABLE_ERRORS: Tuple[type, ...] = (
+        google_exceptions.ResourceExhausted,
+        google_exceptions.TooManyRequests,
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.InternalServerError,
+        google_exceptions.DeadlineExceeded,
+    )
+except ImportError:
+    _PROVIDER_RETRYABLE_ERRORS = ()
+
+RETRYABLE_ERRORS: Tuple[type, ...] = _PROVIDER_RETRYABLE_ERRORS + (asyncio.TimeoutError, ConnectionError)
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+T = TypeVar("T")
+
+
+class RequestPriority(IntEnum):
+    """Scheduling lanes; lower values are served first."""
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+def is_retryable_error(error: BaseException) -> bool:
+    """Return True for quota, overload and transient transport errors."""
+    if isinstance(error, RETRYABLE_ERRORS):
+        return True
+    if getattr(error, "retryable", False):
+        return True
+    status = getattr(error, "code", None) or getattr(error, "status_code", None)
+    return isinstance(status, int) and status in RETRYABLE_STATUS_CODES
+
+
+class TokenBucket:
+    """Async token bucket refilled continuously at a per-minute rate."""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        """
+        Initialize token bucket.
+
+        Args:
+            rate_per_minute: Tokens added per minute (<= 0 disables limiting)
+            capacity: Maximum burst size (defaults to one minute of tokens)
+        """
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else max(rate_per_minute, 1.0)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        """Wait until ``amount`` tokens are available and consume them."""
+        if self.rate <= 0:
+            return
+        # A single oversized request may drain the bucket but never deadlocks it
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+class PrioritySemaphore:
+    """Semaphore that hands freed slots to the highest-priority waiter first."""
+
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self.active = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for _, _, waiter in self._waiters if not waiter.done())
+
+    async def acquire(self, priority: int) -> None:
+        if self.active < self.limit and not self.queued:
+            self.active += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), waiter))
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Slot was handed over just before cancellation; pass it on
+                self.release()
+            raise
+
+    def release(self) -> None:
+        while self._waiters:
+            _, _, waiter = heapq.heappop(self._waiters)
+            if not waiter.done():
+                # Hand the slot over directly; the active count is unchanged
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: int):
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+class GeminiRequestScheduler(LoggerMixin):
+    """
+    Schedules LLM requests behind a priority-aware concurrency limit, RPM/TPM
+    token buckets and jittered exponential backoff, and coalesces identical
+    in-flight requests so they are sent only once.
+
+    The scheduler is transport-agnostic: it runs any zero-argument coroutine
+    factory, so it can be exercised against a local stub.
+    """
+
+    def __init__(self,
+                 max_concurrency: int = 4,
+                 requests_per_minute: float = 60,
+                 tokens_per_minute: float = 1_000_000,
+                 max_retries: int = 4,
+                 base_delay: float = 1.0,
+                 max_delay: float = 30.0):
+        """
+        Initialize request scheduler.
+
+        Args:
+            max_concurrency: Maximum number of requests in flight
+            requests_per_minute: Request rate limit (<= 0 disables it)
+            tokens_per_minute: Token rate limit (<= 0 disables it)
+            max_retries: Retries after the first attempt for retryable errors
+            base_delay: Backoff multiplier in seconds
+            max_delay: Upper bound for a single backoff sleep in seconds
+        """
+        super().__init__()
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._slots = PrioritySemaphore(max_concurrency)
+        self._request_bucket = TokenBucket(requests_per_minute)
+        self._token_bucket = TokenBucket(tokens_per_minute)
+        self._in_flight: Dict[Hashable, "asyncio.Task[Any]"] = {}
+
+        self.stats = {
+            "submitted": 0,
+            "coalesced": 0,
+            "retries": 0,
+            "completed": 0,
+            "failed": 0,
+        }
+
+    @classmethod
+    def from_settings(cls, processing_settings: Any) -> "GeminiRequestScheduler":
+        """Create a scheduler from ProcessingSettings."""
+        return cls(
+            max_concurrency=processing_settings.gemini_max_concurrency,
+            requests_per_minute=processing_settings.gemini_requests_per_minute,
+            tokens_per_minute=processing_settings.gemini_tokens_per_minute,
+            max_retries=processing_settings.gemini_max_retries,
+        )
+
+    async def submit(self,
+                     call: Callable[[], Awaitable[T]],
+                     key: Optional[Hashable] = None,
+                     priority: RequestPriority = RequestPriority.INTERACTIVE,
+                     estimated_tokens: int = 0) -> T:
+        """
+        Run ``call`` under the scheduler's limits.
+
+        Args:
+            call: Zero-argument coroutine factory performing one attempt
+            key: Single-flight key; concurrent submits with the same key share one request
+            priority: Scheduling lane
+            estimated_tokens: Prompt plus completion tokens charged to the TPM bucket
+
+        Returns:
+            Result of the call
+        """
+        self.stats["submitted"] += 1
+        if key is None:
+            return await self._run(call, priority, estimated_tokens)
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+            current_span().set(coalesced=True)
+        else:
+            task = asyncio.ensure_future(self._run(call, priority, estimated_tokens))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        # Shield so one caller being cancelled does not cancel the shared request
+        return await asyncio.shield(task)
+
+    async def _run(self, call: Callable[[], Awaitable[T]], priority: RequestPriority, estimated_tokens: int) -> T:
+        retrying = AsyncRetrying(
+            stop=stop_after_attempt(self.max_retries + 1),
+            wait=wait_random_exponential(multiplier=self.base_delay, max=self.max_delay),
+            retry=retry_if_exception(is_retryable_error),
+            before_sleep=self._before_retry,
+            reraise=True,
+        )
+        try:
+            async for attempt in retrying:
+                with attempt, span("llm.attempt", attempt=attempt.retry_state.attempt_number) as attempt_span:
+                    waited = time.perf_counter()
+                    # The slot is held per attempt, never across a backoff sleep
+                    async with self._slots.slot(int(priority)):
+                        await self._request_bucket.acquire(1)
+                        await self._token_bucket.acquire(estimated_tokens)
+                        attempt_span.set(wait_ms=round((time.perf_counter() - waited) * 1000, 3))
+                        result = await call()
+        except Exception:
+            self.stats["failed"] += 1
+            raise
+        self.stats["completed"] += 1
+        return result
+
+    @asynccontextmanager
+    async def stream(self,
+                     open_stream: Callable[[], Awaitable[T]],
+                     priority: RequestPriority = RequestPriority.INTERACTIVE,
+                     estimated_tokens: int = 0) -> AsyncIterator[T]:
+        """
+        Open a streaming call under the scheduler's limits.
+
+        Only opening the stream is retried: once it is handed to the caller,
+        chunks may already have been sent on, so a failure propagates instead
+        of repeating output. The concurrency slot is held until the ``async
+        with`` block exits. Streams are never coalesced.
+
+        Args:
+            open_stream: Zero-argument coroutine factory returning the opened stream
+            priority: Scheduling lane
+            estimated_tokens: Prompt plus completion tokens charged to the TPM bucket
+
+        Yields:
+            The opened stream
+        """
+        self.stats["submitted"] += 1
+        retrying = AsyncRetrying(
+            stop=stop_after_attempt(self.max_retries + 1),
+            wait=wait_random_exponential(multiplier=self.base_delay, max=self.max_delay),
+            retry=retry_if_exception(is_retryable_error),
+            before_sleep=self._before_retry,
+            reraise=True,
+        )
+        try:
+            async for attempt in retrying:
+                with attempt, span("llm.attempt", attempt=attempt.retry_state.attempt_number) as attempt_span:
+                    waited = time.perf_counter()
+                    # As in ``_run``, no slot is held across a backoff sleep
+                    await self._slots.acquire(int(priority))
+                    try:
+                        await self._request_bucket.acquire(1)
+                        await self._token_bucket.acquire(estimated_tokens)
+                        attempt_span.set(wait_ms=round((time.perf_counter() - waited) * 1000, 3))
+                        opened = await open_stream()
+                    except BaseException:
+                        self._slots.release()
+                        raise
+        except Exception:
+            self.stats["failed"] += 1
+            raise
+
+        try:
+            yield opened
+        except Exception:
+            self.stats["failed"] += 1
+            raise
+        finally:
+            self._slots.release()
+        self.stats["completed"] += 1
+
+    def _before_retry(self, retry_state) -> None:
+        self.stats["retries"] += 1
+        error = retry_state.outcome.exception() if retry_state.outcome else None
+        self.logger.warning("Retrying LLM request",
+                            attempt=retry_state.attempt_number,
+                            error_type=type(error).__name__,
+                            error=str(error))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get scheduler counters and current queue state."""
+        return {
+            **self.stats,
+            "active": self._slots.active,
+            "queued": self._slots.queued,
+            "in_flight_keys": len(self._in_flight),
+        }
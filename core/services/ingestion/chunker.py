@@ -3,7 +3,7 @@ Document chunking module for splitting large documents into smaller chunks.
 """
 
 import re
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator
 from pathlib import Path
 import numpy as np
 from sentence_transformers import SentenceTransformer
@@ -53,10 +53,14 @@ class TextChunker(LoggerMixin):
     
     def _fixed_size_chunking(self, text: str) -> List[str]:
         """Split text into fixed-size chunks with overlap."""
+        return list(self._iter_fixed_size_chunks(text))
+    
+    def _iter_fixed_size_chunks(self, text: str) -> Iterator[str]:
+        """Lazily yield fixed-size chunks with overlap."""
         if len(text) <= self.chunk_size:
-            return [text]
+            yield text
+            return
         
-        chunks = []
         start = 0
         
         while start < len(text):
@@ -74,13 +78,11 @@ class TextChunker(LoggerMixin):
             
             chunk = text[start:end].strip()
             if chunk:
-                chunks.append(chunk)
+                yield chunk
             
             start = end - self.chunk_overlap
             if start >= len(text):
                 break
-        
-        return chunks
     
     def _semantic_chunking(self, text: str) -> List[str]:
         """Chunk text based on semantic similarity."""
@@ -159,6 +161,18 @@ class TextChunker(LoggerMixin):
         
         # return chunks if chunks else [text]
     
+    def _iter_paragraph_chunks(self, text: str) -> Iterator[str]:
+        """Lazily yield paragraphs without materializing the split list."""
+        start = 0
+        for separator in re.finditer(r'\n\s*\n', text):
+            paragraph = text[start:separator.start()].strip()
+            if paragraph:
+                yield paragraph
+            start = separator.end()
+        paragraph = text[start:].strip()
+        if paragraph:
+            yield paragraph
+    
     def _split_into_sentences(self, text: str) -> List[str]:
         """Split text into sentences."""
         # Simple sentence splitting
@@ -166,6 +180,52 @@ class TextChunker(LoggerMixin):
         sentences = [s.strip() for s in sentences if s.strip()]
         return sentences
     
+    def iter_chunks(self, text: str, strategy: str = "fixed_size") -> Iterator[str]:
+        """
+        Lazily chunk text using specified strategy.
+        
+        Args:
+            text: Text to chunk
+            strategy: Chunking strategy ('fixed_size', 'semantic', 'paragraph')
+            
+        Returns:
+            Iterator over text chunks
+        """
+        if strategy == "fixed_size":
+            return self._iter_fixed_size_chunks(text)
+        elif strategy == "paragraph":
+            return self._iter_paragraph_chunks(text)
+        elif strategy == "semantic":
+            # Clustering needs every sentence up front, so it cannot be lazy
+            return iter(self._semantic_chunking(text))
+        else:
+            raise ValueError(f"Unknown chunking strategy: {strategy}")
+    
+    def _resolve_strategy(self, document: BaseDocument, strategy: str) -> str:
+        """Auto-select strategy based on document type."""
+        if strategy != "auto":
+            return strategy
+        if document.type == DataType.DOCUMENT:
+            return "paragraph"#semantic
+        elif document.type == DataType.TABULAR:
+            return "paragraph"
+        return "fixed_size"
+    
+    def _make_chunk_document(self, document: BaseDocument, chunk: str, index: int, strategy: str) -> BaseDocument:
+        """Create a chunk document carrying the parent's metadata."""
+        chunk_doc = BaseDocument(
+            type=document.type,
+            content=chunk,
+            metadata=document.metadata.copy()
+        )
+        
+        # Add chunk-specific metadata
+        chunk_doc.update_metadata("chunk_index", index)
+        chunk_doc.update_metadata("parent_document_id", document.id)
+        chunk_doc.update_metadata("chunk_strategy", strategy)
+        chunk_doc.update_metadata("chunk_size", len(chunk))
+        return chunk_doc
+    
     def chunk_document(self, document: BaseDocument, strategy: str = "auto") -> List[BaseDocument]:
         """
         Chunk a document into smaller documents.
@@ -180,14 +240,7 @@ class TextChunker(LoggerMixin):
         if not document.content:
             return [document]
         
-        # Auto-select strategy based on document type
-        if strategy == "auto":
-            if document.type == DataType.DOCUMENT:
-                strategy = "paragraph"#semantic
-            elif document.type == DataType.TABULAR:
-                strategy = "paragraph"
-            else:
-                strategy = "fixed_size"
+        strategy = self._resolve_strategy(document, strategy)
         
         # Chunk the text
         text_chunks = self.chunk_text(document.content, strategy)
@@ -195,19 +248,8 @@ class TextChunker(LoggerMixin):
         # Create chunked documents
         chunked_docs = []
         for i, chunk in enumerate(text_chunks):
-            chunk_doc = BaseDocument(
-                type=document.type,
-                content=chunk,
-                metadata=document.metadata.copy()
-            )
-            
-            # Add chunk-specific metadata
-            chunk_doc.update_metadata("chunk_index", i)
+            chunk_doc = self._make_chunk_document(document, chunk, i, strategy)
             chunk_doc.update_metadata("total_chunks", len(text_chunks))
-            chunk_doc.update_metadata("parent_document_id", document.id)
-            chunk_doc.update_metadata("chunk_strategy", strategy)
-            chunk_doc.update_metadata("chunk_size", len(chunk))
-            
             chunked_docs.append(chunk_doc)
         
         self.logger.info("Document chunked successfully", 
@@ -216,6 +258,28 @@ class TextChunker(LoggerMixin):
                         strategy=strategy)
         
         return chunked_docs
+    
+    def iter_chunk_documents(self, document: BaseDocument, strategy: str = "auto") -> Iterator[BaseDocument]:
+        """
+        Lazily chunk a document, yielding one chunk document at a time.
+        
+        Unlike chunk_document, the total chunk count is unknown while
+        streaming, so chunks carry no "total_chunks" metadata.
+        
+        Args:
+            document: Document to chunk
+            strategy: Chunking strategy ('auto', 'fixed_size', 'semantic', 'paragraph')
+            
+        Returns:
+            Iterator over chunked documents
+        """
+        if not document.content:
+            yield document
+            return
+        
+        strategy = self._resolve_strategy(document, strategy)
+        for i, chunk in enumerate(self.iter_chunks(document.content, strategy)):
+            yield self._make_chunk_document(document, chunk, i, strategy)
 
 
 class ImageChunker(LoggerMixin):
@@ -1,14 +1,22 @@
 """
 Metrics collection and monitoring utilities.
+
+Every API worker process has its own Prometheus registry. To scrape the
+sum over all workers, set ``PROMETHEUS_MULTIPROC_DIR`` to an empty
+directory before the workers start; ``/metrics`` then aggregates the
+files every worker writes there.
 """
 
+import inspect
+import os
 import time
 from typing import Dict, Any, Optional, Callable
 from functools import wraps
-from prometheus_client import Counter, Histogram, Gauge, Summary, generate_latest
+from prometheus_client import CollectorRegistry, Counter, Histogram, Gauge, Summary, generate_latest, multiprocess
 import structlog
 
 from .logging import get_logger
+from .tracing import span
 
 
 class MetricsCollector:
@@ -88,6 +96,39 @@ class MetricsCollector:
             ['service']
         )
         
+        # Cluster RPC metrics, measured by the coordinator. Range shards split and
+        # merge, so per-shard detail stays in the windowed ClusterMetrics only
+        self.cluster_rpc_counter = Counter(
+            'rag_cluster_rpc_total',
+            'Total number of RPCs to vector nodes',
+            ['node', 'collection', 'operation', 'status']
+        )
+        
+        self.cluster_rpc_duration = Histogram(
+            'rag_cluster_rpc_duration_seconds',
+            'Vector node RPC duration in seconds',
+            ['node', 'collection', 'operation'],
+            buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+        )
+        
+        self.cluster_rpc_bytes = Counter(
+            'rag_cluster_rpc_bytes_total',
+            'Bytes sent to and received from vector nodes',
+            ['node', 'collection', 'direction']
+        )
+        
+        self.cluster_query_duration = Histogram(
+            'rag_cluster_query_duration_seconds',
+            'Distributed search duration (whole shard fan-out) in seconds',
+            ['status'],
+            buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+        )
+        
+        self.cluster_query_shards = Summary(
+            'rag_cluster_query_shards',
+            'Shards searched per distributed search'
+        )
+        
         # Error metrics
         self.error_counter = Counter(
             'rag_errors_total',
@@ -199,14 +240,51 @@ class MetricsCollector:
             operation=operation
         ).inc()
     
+    def record_cluster_rpc(self, node: str, collection: str, operation: str,
+                           status: str, duration: Optional[float],
+                           bytes_sent: int = 0, bytes_received: int = 0) -> None:
+        """Record a coordinator-to-node RPC (duration None if it was never sent)."""
+        self.cluster_rpc_counter.labels(
+            node=node,
+            collection=collection,
+            operation=operation,
+            status=status
+        ).inc()
+        
+        if duration is not None:
+            self.cluster_rpc_duration.labels(
+                node=node,
+                collection=collection,
+                operation=operation
+            ).observe(duration)
+        
+        if bytes_sent:
+            self.cluster_rpc_bytes.labels(node=node, collection=collection, direction="sent").inc(bytes_sent)
+        if bytes_received:
+            self.cluster_rpc_bytes.labels(node=node, collection=collection, direction="received").inc(bytes_received)
+    
+    def record_cluster_query(self, duration: float, status: str = "success", shards: int = 0) -> None:
+        """Record a distributed search."""
+        self.cluster_query_duration.labels(status=status).observe(duration)
+        self.cluster_query_shards.observe(shards)
+    
     def add_custom_metric(self, name: str, metric: Any) -> None:
         """Add custom metric."""
         self._custom_metrics[name] = metric
     
     def get_metrics(self) -> str:
-        """Get all metrics in Prometheus format."""
+        """Get all metrics in Prometheus format (summed over workers in multiprocess mode)."""
+        if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+            return generate_latest(registry)
         return generate_latest()
     
+    def mark_process_dead(self) -> None:
+        """Drop this worker's live gauges from the multiprocess directory on exit."""
+        if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+            multiprocess.mark_process_dead(os.getpid())
+    
     def get_custom_metric(self, name: str) -> Optional[Any]:
         """Get custom metric by name."""
         return self._custom_metrics.get(name)
@@ -217,37 +295,53 @@ metrics_collector = MetricsCollector()
 
 
 def monitor_function(service: str, operation: str, data_type: str = "unknown"):
-    """Decorator to monitor function execution time and success/failure."""
+    """
+    Decorator to monitor function execution time and success/failure.
+    
+    Works on sync and async functions; in a traced request the call is also
+    recorded as a ``service.operation`` span.
+    """
+    def record(duration: float, error: Optional[Exception]) -> None:
+        metrics_collector.record_processing(
+            service=service,
+            operation=operation,
+            data_type=data_type,
+            duration=duration,
+            status="error" if error else "success"
+        )
+        if error:
+            metrics_collector.record_error(
+                service=service,
+                error_type=type(error).__name__,
+                operation=operation
+            )
+    
     def decorator(func: Callable) -> Callable:
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start_time = time.time()
+                with span(f"{service}.{operation}"):
+                    try:
+                        result = await func(*args, **kwargs)
+                    except Exception as e:
+                        record(time.time() - start_time, e)
+                        raise
+                record(time.time() - start_time, None)
+                return result
+            return async_wrapper
+        
         @wraps(func)
         def wrapper(*args, **kwargs):
             start_time = time.time()
-            try:
-                result = func(*args, **kwargs)
-                duration = time.time() - start_time
-                metrics_collector.record_processing(
-                    service=service,
-                    operation=operation,
-                    data_type=data_type,
-                    duration=duration,
-                    status="success"
-                )
-                return result
-            except Exception as e:
-                duration = time.time() - start_time
-                metrics_collector.record_processing(
-                    service=service,
-                    operation=operation,
-                    data_type=data_type,
-                    duration=duration,
-                    status="error"
-                )
-                metrics_collector.record_error(
-                    service=service,
-                    error_type=type(e).__name__,
-                    operation=operation
-                )
-                raise
+            with span(f"{service}.{operation}"):
+                try:
+                    result = func(*args, **kwargs)
+                except Exception as e:
+                    record(time.time() - start_time, e)
+                    raise
+            record(time.time() - start_time, None)
+            return result
         return wrapper
     return decorator
 
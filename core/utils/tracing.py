@@ -0,0 +1,504 @@
+"""
+Lightweight request tracing.
+
+A sampled request gets a ``Trace``; code on its path opens nested spans with
+``span(name, **attributes)``. The current trace and span live in
+contextvars, so spans opened in tasks spawned by the request (e.g.
+``asyncio.gather`` fan-outs) attach to the right parent. Outside a sampled
+request ``span`` does nothing but one contextvar lookup.
+
+Finished traces are kept in a bounded in-memory buffer and, when a trace
+store path is set, in a SQLite file shared by the API worker processes, so
+``/debug/trace/{trace_id}`` finds a trace whichever worker served the
+request. They can also be exported over OTLP when the OpenTelemetry SDK
+and OTLP exporter are installed.
+"""
+
+import json
+import os
+import random
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+from config.config import settings
+from core.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+TRACE_HEADER = "x-trace"
+TRACE_ID_HEADER = "X-Trace-Id"
+
+
+class Span:
+    """One timed stage of a trace."""
+
+    __slots__ = ("name", "span_id", "parent_id", "start_ms", "duration_ms", "attributes", "error", "_trace")
+
+    def __init__(self, trace: "Trace", name: str, span_id: int, parent_id: Optional[int],
+                 attributes: Dict[str, Any]):
+        self._trace = trace
+        self.name = name
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.start_ms = trace.elapsed_ms()
+        self.duration_ms: Optional[float] = None
+        self.attributes = attributes
+        self.error: Optional[str] = None
+
+    @property
+    def recording(self) -> bool:
+        return True
+
+    def set(self, **attributes: Any) -> None:
+        """Add attributes (sizes, counts, the replica that answered, ...)."""
+        self.attributes.update(attributes)
+
+    def mark(self, name: str) -> None:
+        """Record, once, milliseconds since the span started (e.g. ``first_token_ms``)."""
+        if name not in self.attributes:
+            self.attributes[name] = round(self._trace.elapsed_ms() - self.start_ms, 3)
+
+    def finish(self) -> None:
+        if self.duration_ms is None:
+            self.duration_ms = self._trace.elapsed_ms() - self.start_ms
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ms": round(self.start_ms, 3),
+            "duration_ms": round(self.duration_ms, 3) if self.duration_ms is not None else None,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class _NoopSpan:
+    """Stands in for a span when the request is not traced."""
+
+    __slots__ = ()
+    recording = False
+
+    def set(self, **attributes: Any) -> None:
+        pass
+
+    def mark(self, name: str) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+AnySpan = Union[Span, _NoopSpan]
+
+
+class Trace:
+    """Spans recorded for one request."""
+
+    def __init__(self, name: str, max_spans: int = 2000, trace_id: Optional[str] = None):
+        self.trace_id = trace_id or secrets.token_hex(8)
+        self.name = name
+        self.max_spans = max_spans
+        self.started_at = time.time()
+        self.started_ns = time.time_ns()
+        self._origin = time.perf_counter()
+        self.spans: List[Span] = []
+        self.dropped_spans = 0
+        self.closed = False
+        self.root = self.open_span(name, None, {})
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self._origin) * 1000.0
+
+    def open_span(self, name: str, parent: Optional[Span], attributes: Dict[str, Any]) -> AnySpan:
+        # Late spans (background work the request started) and runaway fan-outs are not recorded
+        if self.closed or len(self.spans) >= self.max_spans:
+            self.dropped_spans += 1
+            return NOOP_SPAN
+        span = Span(self, name, len(self.spans), parent.span_id if parent else None, attributes)
+        self.spans.append(span)
+        return span
+
+    def close(self) -> None:
+        self.root.finish()
+        self.closed = True
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        return self.root.duration_ms
+
+    def stage_totals(self) -> Dict[str, float]:
+        """Milliseconds per top-level stage name (children of the root span)."""
+        totals: Dict[str, float] = {}
+        for span in self.spans[1:]:
+            if span.parent_id == self.root.span_id and span.duration_ms is not None:
+                totals[span.name] = totals.get(span.name, 0.0) + span.duration_ms
+        return totals
+
+    def server_timing(self) -> str:
+        """``Server-Timing`` header value for the stages finished so far."""
+        entries = [f"{name};dur={duration:.1f}" for name, duration in self.stage_totals().items()]
+        entries.append(f"total;dur={self.elapsed_ms():.1f}")
+        return ", ".join(entries)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration_ms, 3) if self.duration_ms is not None else None,
+            "stages": {name: round(duration, 3) for name, duration in self.stage_totals().items()},
+            "dropped_spans": self.dropped_spans,
+            "spans": [span.to_dict() for span in self.spans],
+        }
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def current_span() -> AnySpan:
+    """The innermost open span, or a no-op span outside a traced request."""
+    return _current_span.get() or NOOP_SPAN
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[AnySpan]:
+    """
+    Time a stage of the current request.
+
+    Args:
+        name: Stage name (use short dotted names, e.g. ``rpc`` or ``llm.answer``)
+        **attributes: Initial span attributes
+
+    Yields:
+        The span (a no-op span if the request is not traced)
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield NOOP_SPAN
+        return
+
+    opened = trace.open_span(name, _current_span.get(), attributes)
+    if not opened.recording:
+        yield opened
+        return
+
+    token = _current_span.set(opened)
+    try:
+        yield opened
+    except BaseException as e:
+        # CancelledError included: a hedged read's losing replica shows up as cancelled
+        opened.error = type(e).__name__
+        raise
+    finally:
+        opened.finish()
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # An async generator finalized in another task (client gone mid-stream)
+            pass
+
+
+class OTLPExporter:
+    """Exports finished traces through the OpenTelemetry SDK's OTLP/HTTP exporter."""
+
+    def __init__(self, endpoint: str, service_name: str = "rag-llm-api"):
+        """
+        Initialize OTLP exporter.
+
+        Args:
+            endpoint: Collector traces URL, e.g. http://localhost:4318/v1/traces
+            service_name: ``service.name`` resource attribute
+
+        Raises:
+            ImportError: If the OpenTelemetry SDK or OTLP exporter is not installed
+        """
+        from opentelemetry import trace as otel_trace
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.trace import Status, StatusCode
+
+        self._otel_trace = otel_trace
+        self._error_status = lambda description: Status(StatusCode.ERROR, description)
+        self.provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+        # Batches and sends on the processor's own thread, off the event loop
+        self.provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=endpoint)))
+        self.tracer = self.provider.get_tracer("rag-llm.tracing")
+
+    @staticmethod
+    def _attribute_value(value: Any) -> Any:
+        if isinstance(value, (str, bool, int, float)):
+            return value
+        if isinstance(value, (list, tuple)) and all(isinstance(v, (str, bool, int, float)) for v in value):
+            return list(value)
+        return str(value)
+
+    def export(self, trace: Trace) -> None:
+        end_ms = trace.duration_ms or trace.elapsed_ms()
+        exported: Dict[int, Any] = {}
+        # Spans are stored in open order, so a parent is always exported before its children
+        for recorded in trace.spans:
+            parent = exported.get(recorded.parent_id) if recorded.parent_id is not None else None
+            context = self._otel_trace.set_span_in_context(parent) if parent is not None else None
+            attributes = {key: self._attribute_value(value)
+                          for key, value in recorded.attributes.items() if value is not None}
+            if recorded.parent_id is None:
+                attributes["trace.local_id"] = trace.trace_id
+            otel_span = self.tracer.start_span(
+                recorded.name,
+                context=context,
+                start_time=trace.started_ns + int(recorded.start_ms * 1e6),
+                attributes=attributes
+            )
+            if recorded.error:
+                otel_span.set_status(self._error_status(recorded.error))
+            duration = recorded.duration_ms if recorded.duration_ms is not None else end_ms - recorded.start_ms
+            otel_span.end(end_time=trace.started_ns + int((recorded.start_ms + duration) * 1e6))
+            exported[recorded.span_id] = otel_span
+
+    def shutdown(self) -> None:
+        self.provider.shutdown()
+
+
+def _summary(trace_id: str, name: str, started_at: float, duration_ms: Optional[float],
+             status: Any, stages: Dict[str, float]) -> Dict[str, Any]:
+    return {
+        "trace_id": trace_id,
+        "name": name,
+        "started_at": started_at,
+        "duration_ms": round(duration_ms or 0.0, 3),
+        "status": status,
+        "stages": {stage: round(duration, 3) for stage, duration in stages.items()},
+    }
+
+
+class TraceStore:
+    """
+    Kept traces in a SQLite file that every API worker process writes to,
+    bounded to the most recent ``buffer_size`` traces.
+    """
+
+    def __init__(self, path: str, buffer_size: int = 500):
+        """
+        Initialize trace store.
+
+        Args:
+            path: Database file (created with its directory if missing)
+            buffer_size: Traces kept across all workers
+        """
+        self.path = path
+        self.buffer_size = buffer_size
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS traces ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, trace_id TEXT UNIQUE NOT NULL, name TEXT NOT NULL, "
+            "started_at REAL NOT NULL, duration_ms REAL, status TEXT, stages TEXT NOT NULL, body TEXT NOT NULL)"
+        )
+
+    def put(self, trace: Trace) -> None:
+        body = json.dumps(trace.to_dict(), default=str)
+        status = trace.root.attributes.get("status")
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR REPLACE INTO traces (trace_id, name, started_at, duration_ms, status, stages, body) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (trace.trace_id, trace.name, trace.started_at, trace.duration_ms,
+                 json.dumps(status), json.dumps(trace.stage_totals()), body)
+            )
+            self._conn.execute("DELETE FROM traces WHERE seq <= ?", (cursor.lastrowid - self.buffer_size,))
+
+    def get(self, trace_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT body FROM traces WHERE trace_id = ?", (trace_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def recent(self, limit: int = 20, slowest: bool = False) -> List[Dict[str, Any]]:
+        order = "duration_ms DESC" if slowest else "seq DESC"
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT trace_id, name, started_at, duration_ms, status, stages FROM traces "
+                f"ORDER BY {order} LIMIT ?", (limit,)
+            ).fetchall()
+        return [_summary(trace_id, name, started_at, duration_ms, json.loads(status), json.loads(stages))
+                for trace_id, name, started_at, duration_ms, status, stages in rows]
+
+
+class Tracer:
+    """Samples requests into traces and keeps the most recent ones."""
+
+    def __init__(self,
+                 sample_rate: float = 0.01,
+                 buffer_size: int = 500,
+                 max_spans: int = 2000,
+                 otlp_endpoint: Optional[str] = None,
+                 store_path: Optional[str] = None):
+        """
+        Initialize tracer.
+
+        Args:
+            sample_rate: Share of requests traced (requests asking for a trace are always traced)
+            buffer_size: Finished traces kept for lookup
+            max_spans: Spans recorded per trace; further spans are counted as dropped
+            otlp_endpoint: OTLP/HTTP traces URL to export to (no export if not set)
+            store_path: SQLite file shared by the API workers for trace lookup
+                (lookups only see this process's traces if not set)
+        """
+        self.sample_rate = sample_rate
+        self.buffer_size = buffer_size
+        self.max_spans = max_spans
+        self._traces: "OrderedDict[str, Trace]" = OrderedDict()
+        self.store: Optional[TraceStore] = None
+        if store_path:
+            self.open_store(store_path)
+        self.exporter: Optional[OTLPExporter] = None
+        if otlp_endpoint:
+            try:
+                self.exporter = OTLPExporter(otlp_endpoint)
+                logger.info("Exporting traces over OTLP", endpoint=otlp_endpoint)
+            except ImportError as e:
+                logger.warning("OTLP export disabled: OpenTelemetry SDK or OTLP exporter not installed",
+                               error=str(e))
+
+    @classmethod
+    def from_settings(cls, monitoring_settings: Any) -> "Tracer":
+        """Create a tracer from MonitoringSettings."""
+        return cls(
+            sample_rate=monitoring_settings.trace_sample_rate,
+            buffer_size=monitoring_settings.trace_buffer_size,
+            max_spans=monitoring_settings.trace_max_spans,
+            otlp_endpoint=monitoring_settings.otlp_endpoint,
+        )
+
+    def open_store(self, path: str) -> None:
+        """Keep traces in a SQLite file shared by the API workers (e.g. from the app's startup hook)."""
+        try:
+            self.store = TraceStore(path, self.buffer_size)
+        except sqlite3.Error as e:
+            logger.warning("Shared trace store disabled", path=path, error=str(e))
+
+    def should_sample(self, forced: bool = False) -> bool:
+        return forced or (self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    @contextmanager
+    def start_trace(self, name: str, **attributes: Any) -> Iterator[Trace]:
+        """Make a new trace current for the enclosed block, then keep (and export) it."""
+        trace = Trace(name, self.max_spans)
+        trace.root.set(**attributes)
+        trace_token = _current_trace.set(trace)
+        span_token = _current_span.set(trace.root)
+        try:
+            yield trace
+        except BaseException as e:
+            trace.root.error = type(e).__name__
+            raise
+        finally:
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+            trace.close()
+            self._keep(trace)
+
+    def _keep(self, trace: Trace) -> None:
+        self._traces[trace.trace_id] = trace
+        while len(self._traces) > self.buffer_size:
+            self._traces.popitem(last=False)
+        if self.store:
+            try:
+                self.store.put(trace)
+            except sqlite3.Error as e:
+                logger.warning("Failed to store trace", trace_id=trace.trace_id, error=str(e))
+        if self.exporter:
+            try:
+                self.exporter.export(trace)
+            except Exception as e:
+                logger.warning("OTLP trace export failed", trace_id=trace.trace_id, error=str(e))
+
+    def get(self, trace_id: str) -> Optional[Dict[str, Any]]:
+        """A kept trace, from this process or (with a trace store) any other worker."""
+        trace = self._traces.get(trace_id)
+        if trace:
+            return trace.to_dict()
+        if self.store:
+            try:
+                return self.store.get(trace_id)
+            except sqlite3.Error as e:
+                logger.warning("Failed to read stored trace", trace_id=trace_id, error=str(e))
+        return None
+
+    def recent(self, limit: int = 20, slowest: bool = False) -> List[Dict[str, Any]]:
+        """Summaries of the most recent (or slowest) kept traces, across workers with a trace store."""
+        if self.store:
+            try:
+                return self.store.recent(limit, slowest)
+            except sqlite3.Error as e:
+                logger.warning("Failed to read stored traces", error=str(e))
+        traces = list(self._traces.values())
+        if slowest:
+            traces.sort(key=lambda trace: trace.duration_ms or 0.0, reverse=True)
+        else:
+            traces.reverse()
+        return [
+            _summary(trace.trace_id, trace.name, trace.started_at, trace.duration_ms,
+                     trace.root.attributes.get("status"), trace.stage_totals())
+            for trace in traces[:limit]
+        ]
+
+
+class TraceMiddleware:
+    """
+    ASGI middleware that traces a sample of HTTP requests.
+
+    A request is traced if it is sampled or sends an ``X-Trace: 1`` header.
+    Traced responses carry ``X-Trace-Id`` and a ``Server-Timing`` header with
+    the top-level stage durations; the full trace is kept by the tracer. The
+    trace stays open until the response body has been sent, so streamed
+    responses are timed to their last event.
+    """
+
+    def __init__(self, app: Any, tracer: Tracer, exclude_paths: tuple = ("/health", "/metrics", "/debug/trace")):
+        self.app = app
+        self.tracer = tracer
+        self.exclude_paths = exclude_paths
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http" or scope["path"].startswith(self.exclude_paths):
+            await self.app(scope, receive, send)
+            return
+
+        requested = any(name == TRACE_HEADER.encode() and value.lower() in (b"1", b"true")
+                        for name, value in scope.get("headers", []))
+        if not self.tracer.should_sample(requested):
+            await self.app(scope, receive, send)
+            return
+
+        with self.tracer.start_trace(f"{scope['method']} {scope['path']}", sampled=not requested) as trace:
+            async def send_with_trace(message: Dict[str, Any]) -> None:
+                if message["type"] == "http.response.start":
+                    trace.root.set(status=message["status"])
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (TRACE_ID_HEADER.lower().encode(), trace.trace_id.encode()),
+                        (b"server-timing", trace.server_timing().encode()),
+                    ]
+                await send(message)
+
+            await self.app(scope, receive, send_with_trace)
+
+
+# Global tracer instance
+tracer = Tracer.from_settings(settings.monitoring)
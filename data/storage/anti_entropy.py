@@ -0,0 +1,203 @@
+"""
+Anti-Entropy Repair
+
+Coordinator-side replica repair. Two replicas of a shard compare their
+Merkle digests top-down, descending only into subtrees whose hashes
+differ, then exchange version lists for the differing leaf buckets and
+copy just the rows where one side is missing or older. The cost of a
+repair scales with the size of the divergence, not with the shard size.
+"""
+
+import asyncio
+import json
+import time
+from dataclasses import dataclass, asdict, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from core.utils.logging import get_logger
+from data.storage.shard_transfer import CallNodeFunction
+
+logger = get_logger(__name__)
+
+_EMPTY_HASH = "0" * 16
+
+
+@dataclass
+class RepairResult:
+    """Outcome of one replica-pair comparison."""
+    shard_id: str
+    reference_node: str
+    replica_node: str
+    digest_requests: int = 0
+    differing_buckets: int = 0
+    rows_to_replica: int = 0
+    rows_to_reference: int = 0
+    bytes_copied: int = 0
+    duration: float = 0.0
+    completed_at: float = field(default_factory=time.time)
+
+    @property
+    def in_sync(self) -> bool:
+        return self.differing_buckets == 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class AntiEntropyRepairer:
+    """
+    Finds and copies the rows two replicas disagree on.
+
+    Rows are resolved last-writer-wins by version, and a newer copy replaces
+    the row's tag set. When versions tie but row hashes differ (different
+    tags) the row is copied both ways and the tags merge. Copied pages carry
+    the source's tag tombstones, so a tag removed while a replica was down
+    is removed there rather than copied back.
+    """
+
+    def __init__(self,
+                 call_node: CallNodeFunction,
+                 fanout: int = 16,
+                 depth: int = 3,
+                 max_rows_per_request: int = 256,
+                 request_timeout: float = 30.0,
+                 history_size: int = 100):
+        """
+        Initialize anti-entropy repairer.
+
+        Args:
+            call_node: Coroutine sending one RPC to a node (through its circuit breaker)
+            fanout: Digest tree fanout (must match the nodes)
+            depth: Digest tree depth (must match the nodes)
+            max_rows_per_request: Rows copied per request
+            request_timeout: Timeout per request in seconds
+            history_size: Number of recent repair results kept for stats
+        """
+        self.call_node = call_node
+        self.fanout = fanout
+        self.depth = depth
+        self.max_rows_per_request = max_rows_per_request
+        self.request_timeout = request_timeout
+        self.history_size = history_size
+        self.history: List[RepairResult] = []
+        self.totals = {"comparisons": 0, "repairs": 0, "rows_copied": 0, "bytes_copied": 0, "failures": 0}
+
+    async def repair(self, shard_id: str, collection_name: str,
+                     reference_node: Any, replica_node: Any) -> Optional[RepairResult]:
+        """
+        Bring two replicas of a shard in sync.
+
+        Returns:
+            Repair result, or None if the comparison or copy failed
+        """
+        result = RepairResult(shard_id=shard_id, reference_node=reference_node.id, replica_node=replica_node.id)
+        started = time.monotonic()
+        try:
+            buckets = await self._differing_buckets(shard_id, reference_node, replica_node, result)
+            result.differing_buckets = len(buckets)
+            if buckets:
+                reference_entries, replica_entries = await asyncio.gather(
+                    self._bucket_entries(shard_id, reference_node, buckets),
+                    self._bucket_entries(shard_id, replica_node, buckets)
+                )
+                to_replica, to_reference = self._resolve(reference_entries, replica_entries)
+                result.rows_to_replica = await self._copy_rows(shard_id, collection_name,
+                                                               reference_node, replica_node, to_replica, result)
+                result.rows_to_reference = await self._copy_rows(shard_id, collection_name,
+                                                                 replica_node, reference_node, to_reference, result)
+        except Exception as e:
+            self.totals["failures"] += 1
+            logger.warning(f"Anti-entropy repair of shard {shard_id} between "
+                           f"{reference_node.id} and {replica_node.id} failed: {e}")
+            return None
+
+        result.duration = time.monotonic() - started
+        self._record(result)
+        if not result.in_sync:
+            logger.info(f"Repaired shard {shard_id} between {reference_node.id} and {replica_node.id}",
+                        buckets=result.differing_buckets, to_replica=result.rows_to_replica,
+                        to_reference=result.rows_to_reference)
+        return result
+
+    async def _request(self, node: Any, method: str, path: str, payload: Optional[Dict[str, Any]] = None,
+                       params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        body = await self.call_node(node, method, path, payload, params=params, timeout=self.request_timeout)
+        if body is None:
+            raise RuntimeError(f"{method} {path} on {node.id} failed")
+        return body
+
+    async def _digest(self, shard_id: str, node: Any, level: int, indices: List[int]) -> Dict[int, str]:
+        params = {"level": level, "indices": ",".join(map(str, indices))}
+        body = await self._request(node, "GET", f"/shards/{shard_id}/digest", params=params)
+        return {int(i): value for i, value in body.get("hashes", {}).items()}
+
+    async def _differing_buckets(self, shard_id: str, reference_node: Any, replica_node: Any,
+                                 result: RepairResult) -> List[int]:
+        """Descend both digests from the root, keeping only nodes whose hashes differ."""
+        frontier = [0]
+        for level in range(self.depth + 1):
+            reference_hashes, replica_hashes = await asyncio.gather(
+                self._digest(shard_id, reference_node, level, frontier),
+                self._digest(shard_id, replica_node, level, frontier)
+            )
+            result.digest_requests += 2
+            differing = [
+                i for i in frontier
+                if reference_hashes.get(i, _EMPTY_HASH) != replica_hashes.get(i, _EMPTY_HASH)
+            ]
+            if not differing or level == self.depth:
+                return differing
+            frontier = [child for i in differing for child in range(i * self.fanout, (i + 1) * self.fanout)]
+        return []
+
+    async def _bucket_entries(self, shard_id: str, node: Any, buckets: List[int]) -> Dict[str, Dict[str, Any]]:
+        body = await self._request(node, "POST", f"/shards/{shard_id}/buckets", {"buckets": buckets})
+        return body.get("entries", {})
+
+    @staticmethod
+    def _resolve(reference_entries: Dict[str, Dict[str, Any]],
+                 replica_entries: Dict[str, Dict[str, Any]]) -> Tuple[List[str], List[str]]:
+        """Split differing documents into (copy to replica, copy to reference)."""
+        to_replica: Set[str] = set()
+        to_reference: Set[str] = set()
+        for document_id in set(reference_entries) | set(replica_entries):
+            ours = reference_entries.get(document_id)
+            theirs = replica_entries.get(document_id)
+            if theirs is None:
+                to_replica.add(document_id)
+            elif ours is None:
+                to_reference.add(document_id)
+            elif ours["hash"] != theirs["hash"]:
+                if ours["version"] >= theirs["version"]:
+                    to_replica.add(document_id)
+                if theirs["version"] >= ours["version"]:
+                    to_reference.add(document_id)
+        return sorted(to_replica), sorted(to_reference)
+
+    async def _copy_rows(self, shard_id: str, collection_name: str, source_node: Any, target_node: Any,
+                         document_ids: List[str], result: RepairResult) -> int:
+        copied = 0
+        for start in range(0, len(document_ids), self.max_rows_per_request):
+            ids = document_ids[start:start + self.max_rows_per_request]
+            page = await self._request(source_node, "POST", f"/shards/{shard_id}/rows", {"ids": ids})
+            page.setdefault("collection_name", collection_name)
+            body = await self._request(target_node, "POST", f"/shards/{shard_id}/import", page)
+            copied += body.get("imported_count", 0)
+            result.bytes_copied += len(json.dumps(page))
+        return copied
+
+    def _record(self, result: RepairResult) -> None:
+        self.totals["comparisons"] += 1
+        if not result.in_sync:
+            self.totals["repairs"] += 1
+        self.totals["rows_copied"] += result.rows_to_replica + result.rows_to_reference
+        self.totals["bytes_copied"] += result.bytes_copied
+        self.history.append(result)
+        del self.history[:-self.history_size]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Repair totals and the most recent repairs that found differences."""
+        return {
+            **self.totals,
+            "recent_repairs": [r.to_dict() for r in self.history if not r.in_sync][-10:],
+        }
@@ -1,19 +1,39 @@
 """
-Simple Auto-Scaling System for Distributed RAG
+Metric-Driven Auto-Scaling for Distributed RAG
+
+Decisions are made from node resource telemetry (CPU, memory, storage
+reported by each node's health endpoint) and the coordinator's measured
+search latency and RPC error rate. A metric above its high threshold, now
+or in a short-horizon linear forecast, is pressure; scale-down needs every
+metric below its low threshold now, in the forecast, and after spreading
+the load over one node fewer. Both must hold for several consecutive
+cycles (hysteresis) and respect cooldowns, so the cluster does not
+oscillate. A node is removed only after its replicas have been migrated.
 """
 
 import asyncio
+import os
+import signal
+import socket
+import subprocess
+import sys
 import time
 import logging
-from typing import Dict, List, Optional, Tuple
-from dataclasses import dataclass
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from dataclasses import dataclass, asdict
 from enum import Enum
 
+import aiohttp
+
 from .distributed_storage_manager import DistributedStorageManager
 from .distributed_vector_store import VectorNode
 
 logger = logging.getLogger(__name__)
 
+# Port of the first auto-scaled node when the cluster has no local node to count from
+DEFAULT_BASE_PORT = 8000
+
 class ScalingAction(Enum):
     SCALE_UP = "scale_up"
     SCALE_DOWN = "scale_down"
@@ -25,7 +45,7 @@ class ScalingThresholds:
     cpu_threshold_high: float = 0.75
     memory_threshold_high: float = 0.80
     storage_threshold_high: float = 0.85
-    latency_threshold_high: float = 1000.0
+    latency_threshold_high: float = 1000.0  # p95 search latency, ms
     error_rate_threshold_high: float = 0.05
     cpu_threshold_low: float = 0.30
     memory_threshold_low: float = 0.40
@@ -37,9 +57,75 @@ class ScalingThresholds:
     scale_up_cooldown: int = 300
     scale_down_cooldown: int = 600
     health_check_interval: int = 30
+    # Consecutive cycles a condition must hold before acting
+    scale_up_confirmations: int = 2
+    scale_down_confirmations: int = 5
+    # Seconds ahead the linear trend is extrapolated, and samples it is fitted on
+    forecast_horizon: int = 300
+    forecast_samples: int = 10
+    # Latency and error rate are ignored over fewer requests than this in the metrics window
+    min_window_requests: int = 20
+    node_start_timeout: int = 60
+
+# Shared between API workers so start/stop applies whichever worker receives it
+ENABLED_SETTING = "autoscaling_enabled"
+# node id -> pid of nodes started by scale-up, so any worker can stop them on scale-down
+NODE_PIDS_SETTING = "autoscaled_node_pids"
+
+@dataclass
+class ClusterSignals:
+    """One sample of the metrics scaling decisions are made on."""
+    timestamp: float
+    node_count: int
+    healthy_nodes: int
+    cpu: Optional[float] = None  # Mean over healthy nodes reporting it
+    memory: Optional[float] = None  # Mean over healthy nodes reporting it
+    storage: Optional[float] = None  # Fullest healthy node
+    latency: Optional[float] = None  # p95 search latency over the metrics window, ms
+    error_rate: Optional[float] = None  # Node RPC error rate over the metrics window
+    qps: float = 0.0
+    transfers_running: bool = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+class TrendForecaster:
+    """Least-squares linear trend over each metric's recent samples."""
+
+    def __init__(self, max_samples: int = 10):
+        self.max_samples = max_samples
+        self._samples: Dict[str, Deque[Tuple[float, float]]] = {}
+
+    def add(self, metric: str, timestamp: float, value: Optional[float]) -> None:
+        if value is None:
+            return
+        samples = self._samples.setdefault(metric, deque(maxlen=self.max_samples))
+        samples.append((timestamp, value))
+
+    def forecast(self, metric: str, horizon: float) -> Optional[float]:
+        """Value expected ``horizon`` seconds after the latest sample; None with under 3 samples."""
+        samples = self._samples.get(metric)
+        if not samples or len(samples) < 3:
+            return None
+        t0 = samples[0][0]
+        xs = [t - t0 for t, _ in samples]
+        ys = [v for _, v in samples]
+        mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+        variance = sum((x - mean_x) ** 2 for x in xs)
+        if variance == 0:
+            return ys[-1]
+        slope = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / variance
+        return max(0.0, mean_y + slope * (xs[-1] + horizon - mean_x))
+
+    def reset(self) -> None:
+        """Forget history, e.g. after the node count changed what per-node metrics mean."""
+        self._samples.clear()
 
 class AutoScaler:
-    """Simple auto-scaler for distributed vector storage."""
+    """Auto-scaler for distributed vector storage driven by measured load."""
+    
+    # Metrics whose load is spread over the nodes, so removing one raises them by n / (n - 1)
+    SHARED_METRICS = ("cpu", "memory", "storage")
     
     def __init__(self, storage_manager: DistributedStorageManager, thresholds: Optional[ScalingThresholds] = None):
         self.storage_manager = storage_manager
@@ -47,136 +133,339 @@ class AutoScaler:
         self.last_scale_up = 0
         self.last_scale_down = 0
         self.scaling_history: List[Dict] = []
-        self.is_running = False
-        
+        self.forecaster = TrendForecaster(self.thresholds.forecast_samples)
+        self.last_signals: Optional[ClusterSignals] = None
+        self.last_decision: Optional[Dict[str, Any]] = None
+        self._pressure_cycles = 0
+        self._idle_cycles = 0
+        self._loop_running = False
+        # Node processes started by this worker's scale-ups
+        self._node_processes: Dict[str, subprocess.Popen] = {}
+        self.node_stop_timeout = 10.0
+    
+    @property
+    def is_running(self) -> bool:
+        """Whether auto-scaling is enabled for the cluster."""
+        return bool(self.storage_manager.get_shared_setting(ENABLED_SETTING, False))
+    
     async def start_monitoring(self):
-        """Start the auto-scaling monitoring loop."""
-        self.is_running = True
+        """Enable auto-scaling and run the monitoring loop in this worker."""
+        self.storage_manager.set_shared_setting(ENABLED_SETTING, True)
         logger.info("Starting auto-scaler monitoring")
+        await self.run()
+    
+    async def run(self):
+        """
+        Monitoring loop, started in every API worker.
         
-        while self.is_running:
-            try:
-                await self._monitoring_cycle()
-                await asyncio.sleep(self.thresholds.health_check_interval)
-            except Exception as e:
-                logger.error(f"Auto-scaler monitoring error: {e}")
-                await asyncio.sleep(10)
+        Only the leader worker acts, and only while auto-scaling is enabled,
+        so the cluster is scaled once no matter how many workers run.
+        """
+        if self._loop_running:
+            return
+        self._loop_running = True
+        try:
+            while True:
+                try:
+                    if self.storage_manager.is_leader and self.is_running:
+                        await self._monitoring_cycle()
+                    await asyncio.sleep(self.thresholds.health_check_interval)
+                except Exception as e:
+                    logger.error(f"Auto-scaler monitoring error: {e}")
+                    await asyncio.sleep(10)
+        finally:
+            self._loop_running = False
     
     async def stop_monitoring(self):
-        """Stop the auto-scaling monitoring loop."""
-        self.is_running = False
+        """Disable auto-scaling in every worker."""
+        self.storage_manager.set_shared_setting(ENABLED_SETTING, False)
         logger.info("Stopped auto-scaler monitoring")
     
+    async def collect_signals(self) -> ClusterSignals:
+        """Sample node telemetry and the coordinator's metrics window."""
+        cluster_status = await self.storage_manager.get_cluster_status()
+        performance = self.storage_manager.get_performance_metrics()
+        healthy = [n for n in cluster_status.get("nodes", []) if n.get("status") == "healthy"]
+        
+        def mean(key: str) -> Optional[float]:
+            values = [n[key] for n in healthy if n.get(key) is not None]
+            return sum(values) / len(values) if values else None
+        
+        storage_values = [n["storage_usage"] for n in healthy if n.get("storage_usage") is not None]
+        enough_searches = performance.get("search_requests", 0) >= self.thresholds.min_window_requests
+        enough_rpcs = performance.get("rpc_requests", 0) >= self.thresholds.min_window_requests
+        return ClusterSignals(
+            timestamp=time.time(),
+            node_count=cluster_status.get("total_nodes", 0),
+            healthy_nodes=cluster_status.get("healthy_nodes", 0),
+            cpu=mean("cpu_usage"),
+            memory=mean("memory_usage"),
+            storage=max(storage_values) if storage_values else None,
+            latency=performance.get("p95_search_latency") if enough_searches else None,
+            error_rate=performance.get("error_rate") if enough_rpcs else None,
+            qps=performance.get("query_throughput", 0.0),
+            transfers_running=any(t.get("status") == "running" for t in cluster_status.get("transfers") or [])
+        )
+    
+    def evaluate(self, signals: ClusterSignals) -> Tuple[ScalingAction, List[str]]:
+        """
+        Classify one sample as pressure (scale up), idle (scale down) or neither.
+        
+        Returns:
+            The action the sample points to, with the reasons
+        """
+        t = self.thresholds
+        if signals.healthy_nodes < t.min_nodes and signals.node_count < t.max_nodes:
+            return ScalingAction.SCALE_UP, [f"{signals.healthy_nodes} healthy nodes < min_nodes {t.min_nodes}"]
+        
+        limits = {
+            "cpu": (t.cpu_threshold_high, t.cpu_threshold_low),
+            "memory": (t.memory_threshold_high, t.memory_threshold_low),
+            "storage": (t.storage_threshold_high, t.storage_threshold_low),
+            "latency": (t.latency_threshold_high, t.latency_threshold_low),
+            "error_rate": (t.error_rate_threshold_high, t.error_rate_threshold_low),
+        }
+        pressure, busy = [], []
+        for metric, (high, low) in limits.items():
+            value = getattr(signals, metric)
+            if value is None:
+                continue
+            forecast = self.forecaster.forecast(metric, t.forecast_horizon)
+            if value > high:
+                pressure.append(f"{metric} {value:.3g} > {high:g}")
+            elif forecast is not None and forecast > high:
+                pressure.append(f"{metric} forecast {forecast:.3g} in {t.forecast_horizon}s > {high:g}")
+            
+            projected = value
+            if metric in self.SHARED_METRICS and signals.node_count > 1:
+                projected = value * signals.node_count / (signals.node_count - 1)
+            if value >= low or (forecast is not None and forecast >= low) or projected >= high:
+                busy.append(metric)
+        
+        if pressure:
+            if signals.node_count >= t.max_nodes:
+                return ScalingAction.MAINTAIN, pressure + [f"at max_nodes {t.max_nodes}"]
+            return ScalingAction.SCALE_UP, pressure
+        
+        if signals.node_count <= t.min_nodes:
+            return ScalingAction.MAINTAIN, [f"at min_nodes {t.min_nodes}"]
+        if signals.cpu is None and signals.memory is None:
+            return ScalingAction.MAINTAIN, ["no node resource telemetry"]
+        if signals.healthy_nodes < signals.node_count or signals.transfers_running:
+            return ScalingAction.MAINTAIN, ["cluster not settled (unhealthy nodes or transfers running)"]
+        if busy:
+            return ScalingAction.MAINTAIN, [f"{', '.join(busy)} not below low thresholds"]
+        return ScalingAction.SCALE_DOWN, ["all metrics below low thresholds, also after removing a node"]
+    
     async def _monitoring_cycle(self):
         """Single monitoring cycle."""
         try:
-            # Get cluster status
-            cluster_status = await self.storage_manager.get_cluster_status()
-            node_count = cluster_status.get("total_nodes", 0)
-            healthy_nodes = cluster_status.get("healthy_nodes", 0)
+            signals = await self.collect_signals()
+            for metric in ("cpu", "memory", "storage", "latency", "error_rate"):
+                self.forecaster.add(metric, signals.timestamp, getattr(signals, metric))
+            action, reasons = self.evaluate(signals)
             
-            # Simple scaling logic
-            current_time = time.time()
+            # Hysteresis: act only on a condition that held for several consecutive cycles
+            self._pressure_cycles = self._pressure_cycles + 1 if action == ScalingAction.SCALE_UP else 0
+            self._idle_cycles = self._idle_cycles + 1 if action == ScalingAction.SCALE_DOWN else 0
+            self.last_signals = signals
+            self.last_decision = {
+                "timestamp": signals.timestamp,
+                "action": action.value,
+                "reasons": reasons,
+                "pressure_cycles": self._pressure_cycles,
+                "idle_cycles": self._idle_cycles
+            }
             
-            # Scale up if healthy nodes are low
-            if (healthy_nodes < self.thresholds.min_nodes and 
-                node_count < self.thresholds.max_nodes and
-                current_time - self.last_scale_up > self.thresholds.scale_up_cooldown):
-                await self._scale_up("Low healthy nodes", node_count)
+            current_time = time.time()
+            reason = "; ".join(reasons)
+            if (action == ScalingAction.SCALE_UP and
+                    self._pressure_cycles >= self.thresholds.scale_up_confirmations and
+                    current_time - self.last_scale_up > self.thresholds.scale_up_cooldown):
+                await self._scale_up(reason, signals.node_count)
             
-            # Scale down if we have excess nodes
-            elif (node_count > self.thresholds.min_nodes and
-                  current_time - self.last_scale_down > self.thresholds.scale_down_cooldown):
-                await self._scale_down("Excess capacity", node_count)
-                
+            # A scale-up also holds off scale-down, so capacity just added is not removed again
+            elif (action == ScalingAction.SCALE_DOWN and
+                  self._idle_cycles >= self.thresholds.scale_down_confirmations and
+                  current_time - max(self.last_scale_down, self.last_scale_up) > self.thresholds.scale_down_cooldown):
+                await self._scale_down(reason, signals.node_count)
+        
         except Exception as e:
             logger.error(f"Monitoring cycle error: {e}")
     
-    async def _scale_up(self, reason: str, current_nodes: int):
-        """Add a new node to the cluster."""
+    def _after_scaling(self):
+        # Per-node averages mean something else with a different node count
+        self.forecaster.reset()
+        self._pressure_cycles = 0
+        self._idle_cycles = 0
+    
+    @staticmethod
+    def _port_is_free(host: str, port: int) -> bool:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            try:
+                sock.bind((host, port))
+                return True
+            except OSError:
+                return False
+    
+    def _next_node_slot(self, nodes: List[Dict[str, Any]], host: str = "localhost") -> Tuple[str, int]:
+        """A node ID and a local port no current node uses (removed nodes leave gaps)."""
+        node_ids = {n["id"] for n in nodes}
+        number = 1
+        while f"node{number}" in node_ids:
+            number += 1
+        
+        used_ports = {n["port"] for n in nodes}
+        port = max(used_ports, default=DEFAULT_BASE_PORT) + 1
+        while port in used_ports or not self._port_is_free(host, port):
+            port += 1
+        return f"node{number}", port
+    
+    async def _wait_for_node(self, host: str, port: int, timeout: float) -> bool:
+        """Poll a starting node's health endpoint until it answers."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=2)) as session:
+                    async with session.get(f"http://{host}:{port}/health") as response:
+                        if response.status == 200:
+                            return True
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                pass
+            await asyncio.sleep(1)
+        return False
+    
+    def _remember_node_process(self, node_id: str, process: subprocess.Popen) -> None:
+        self._node_processes[node_id] = process
+        pids = dict(self.storage_manager.get_shared_setting(NODE_PIDS_SETTING, {}) or {})
+        pids[node_id] = process.pid
+        self.storage_manager.set_shared_setting(NODE_PIDS_SETTING, pids)
+    
+    async def _terminate_process(self, node_id: str, process: subprocess.Popen) -> None:
+        """Terminate a node process and reap it, killing it if SIGTERM is ignored."""
+        process.terminate()
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, process.wait, self.node_stop_timeout)
+        except subprocess.TimeoutExpired:
+            logger.warning(f"Node {node_id} did not exit after SIGTERM; killing it")
+            process.kill()
+            await loop.run_in_executor(None, process.wait)
+    
+    async def _stop_node_process(self, node_id: str) -> None:
+        """Terminate the process of a removed node, if a scale-up started it."""
+        pids = dict(self.storage_manager.get_shared_setting(NODE_PIDS_SETTING, {}) or {})
+        pid = pids.pop(node_id, None)
+        if pid is not None:
+            self.storage_manager.set_shared_setting(NODE_PIDS_SETTING, pids)
+        
+        process = self._node_processes.pop(node_id, None)
+        if process is not None:
+            await self._terminate_process(node_id, process)
+        elif pid is not None:
+            # Started by another API worker on this host
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        else:
+            return
+        logger.info(f"Stopped process of node {node_id}")
+    
+    async def _scale_up(self, reason: str, current_nodes: int) -> bool:
+        """Start a new node, wait until it is healthy, then add it to the cluster."""
         try:
-            new_node_id = f"node{current_nodes + 1}"
-            new_port = 8000 + current_nodes + 1
+            cluster_status = await self.storage_manager.get_cluster_status()
+            new_node_id, new_port = self._next_node_slot(cluster_status.get("nodes", []))
             
-            import subprocess
-            import sys
-            import os
-
             # Xác định script khởi động node mới (ví dụ: start_node4.py hoặc start_vector_node.py)
             script_path = os.path.join(os.path.dirname(__file__), "../../scripts/start_vector_node.py")
             script_path = os.path.abspath(script_path)
-
+            
             # Khởi động process node mới (chạy ngầm)
-            subprocess.Popen([
+            process = subprocess.Popen([
                 sys.executable, script_path,
                 "--node-id", new_node_id,
                 "--host", "localhost",
                 "--port", str(new_port)
             ])
-
+            
+            # Only a node that answers joins; its shards are moved to it right away
+            if not await self._wait_for_node("localhost", new_port, self.thresholds.node_start_timeout):
+                logger.error(f"Failed to scale UP: node {new_node_id} did not become healthy on port {new_port}")
+                await self._terminate_process(new_node_id, process)
+                return False
+            
             # Sau đó mới thêm metadata node vào cluster
             new_node = VectorNode(id=new_node_id, host="localhost", port=new_port)
             success = await self.storage_manager.add_node(new_node)
             
             if success:
+                self._remember_node_process(new_node_id, process)
                 self.last_scale_up = time.time()
-                logger.info(f"Successfully scaled UP: Added node {new_node_id}")
+                self._after_scaling()
+                logger.info(f"Successfully scaled UP: Added node {new_node_id} ({reason})")
                 
                 self.scaling_history.append({
                     "timestamp": time.time(),
                     "action": "scale_up",
                     "reason": reason,
-                    "node_id": new_node_id
+                    "node_id": new_node_id,
+                    "signals": self.last_signals.to_dict() if self.last_signals else None
                 })
             else:
                 logger.error(f"Failed to scale UP: Could not add node {new_node_id}")
-                
+                await self._terminate_process(new_node_id, process)
+            return success
+        
         except Exception as e:
             logger.error(f"Error during scale UP: {e}")
+            return False
     
-    async def _scale_down(self, reason: str, current_nodes: int):
-        """Remove a node from the cluster and migrate its data."""
+    async def _scale_down(self, reason: str, current_nodes: int) -> bool:
+        """Migrate a node's replicas to the other nodes, then remove it."""
         try:
             cluster_status = await self.storage_manager.get_cluster_status()
             nodes = cluster_status.get("nodes", [])
-
+            
             # Không xóa node1, chỉ xóa khi còn nhiều hơn min_nodes
             removable_nodes = [n for n in nodes if n["id"] != "node1"]
             if len(removable_nodes) == 0 or current_nodes <= self.thresholds.min_nodes:
                 logger.info("No removable node or already at min_nodes")
-                return
-
+                return False
+            
             # Chọn node ít vectors nhất để xóa
             node_to_remove = min(removable_nodes, key=lambda n: n["vector_count"])
             node_id = node_to_remove["id"]
             logger.info(f"Preparing to remove node {node_id}")
-
-            # Di chuyển dữ liệu nếu có hàm migrate_shards_from_node
-            if hasattr(self.storage_manager, "migrate_shards_from_node"):
-                await self.storage_manager.migrate_shards_from_node(node_id)
-            else:
-                logger.warning("No migrate_shards_from_node method implemented, skipping migration!")
-
-            # Xóa node khỏi cluster
+            
+            # Drain first; a node that still holds replicas is never removed
+            if not await self.storage_manager.migrate_shards_from_node(node_id):
+                logger.error(f"Failed to scale DOWN: could not migrate every shard off node {node_id}")
+                return False
+            
             success = await self.storage_manager.remove_node(node_id)
-
+            
             if success:
-                # Gọi sharding lại sau khi xóa node
-                await self.storage_manager.rebalance_shards()
+                await self._stop_node_process(node_id)
                 self.last_scale_down = time.time()
-                logger.info(f"Successfully scaled DOWN: Removed node {node_id}")
-
+                self._after_scaling()
+                logger.info(f"Successfully scaled DOWN: Removed node {node_id} ({reason})")
+                
                 self.scaling_history.append({
                     "timestamp": time.time(),
                     "action": "scale_down",
                     "reason": reason,
-                    "node_id": node_id
+                    "node_id": node_id,
+                    "signals": self.last_signals.to_dict() if self.last_signals else None
                 })
             else:
                 logger.error(f"Failed to scale DOWN: Could not remove node {node_id}")
-
+            return success
+        
         except Exception as e:
             logger.error(f"Error during scale DOWN: {e}")
+            return False
     
     def get_scaling_status(self) -> Dict:
         """Get current scaling status and history."""
@@ -185,29 +474,25 @@ class AutoScaler:
             "last_scale_up": self.last_scale_up,
             "last_scale_down": self.last_scale_down,
             "scaling_history": self.scaling_history[-10:],
-            "current_metrics": None,
-            "thresholds": {
-                "cpu_threshold_high": self.thresholds.cpu_threshold_high,
-                "memory_threshold_high": self.thresholds.memory_threshold_high,
-                "storage_threshold_high": self.thresholds.storage_threshold_high,
-                "latency_threshold_high": self.thresholds.latency_threshold_high,
-                "error_rate_threshold_high": self.thresholds.error_rate_threshold_high,
-                "cpu_threshold_low": self.thresholds.cpu_threshold_low,
-                "memory_threshold_low": self.thresholds.memory_threshold_low,
-                "storage_threshold_low": self.thresholds.storage_threshold_low,
-                "latency_threshold_low": self.thresholds.latency_threshold_low,
-                "error_rate_threshold_low": self.thresholds.error_rate_threshold_low,
-                "min_nodes": self.thresholds.min_nodes,
-                "max_nodes": self.thresholds.max_nodes
-            }
+            "current_metrics": {
+                **self.storage_manager.get_performance_metrics(),
+                "signals": self.last_signals.to_dict() if self.last_signals else None,
+                "decision": self.last_decision,
+                "forecast": {
+                    metric: self.forecaster.forecast(metric, self.thresholds.forecast_horizon)
+                    for metric in ("cpu", "memory", "storage", "latency", "error_rate")
+                }
+            },
+            "thresholds": asdict(self.thresholds)
         }
     
     def update_thresholds(self, new_thresholds: ScalingThresholds):
         """Update scaling thresholds dynamically."""
         self.thresholds = new_thresholds
+        self.forecaster = TrendForecaster(new_thresholds.forecast_samples)
         logger.info("Updated auto-scaling thresholds")
 
-def create_auto_scaler(storage_manager: DistributedStorageManager, 
+def create_auto_scaler(storage_manager: DistributedStorageManager,
                       custom_thresholds: Optional[ScalingThresholds] = None) -> AutoScaler:
     """Create an auto-scaler with the specified configuration."""
-    return AutoScaler(storage_manager, custom_thresholds) 
\ No newline at end of file
+    return AutoScaler(storage_manager, custom_thresholds)
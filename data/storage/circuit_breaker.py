@@ -0,0 +1,228 @@
+"""
+Circuit Breakers
+
+Per-node circuit breakers driven by the outcome of real RPCs rather than
+by periodic health polls. A node is ejected (breaker OPEN) after a run of
+consecutive failures, a high error rate over a sliding window, or a
+latency far above the rest of the cluster. While open, calls fail fast;
+after the ejection time a single probe request is let through
+(HALF_OPEN) and its outcome closes or re-opens the breaker. Repeated
+ejections back off exponentially.
+"""
+
+import statistics
+import time
+from collections import deque
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from core.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class BreakerState(Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+@dataclass
+class BreakerConfig:
+    """Ejection thresholds shared by all node breakers."""
+    consecutive_failures: int = 5
+    error_rate: float = 0.5
+    min_requests: int = 20
+    window_seconds: float = 30.0
+    base_ejection_time: float = 5.0
+    max_ejection_time: float = 120.0
+    latency_outlier_factor: float = 5.0
+    min_outlier_latency: float = 0.2
+    min_latency_samples: int = 20
+    max_ejection_ratio: float = 0.5
+    latency_alpha: float = 0.2
+
+
+class CircuitBreaker:
+    """Breaker state for one node."""
+
+    def __init__(self, node_id: str, config: BreakerConfig):
+        self.node_id = node_id
+        self.config = config
+        self.state = BreakerState.CLOSED
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.open_until = 0.0
+        self.probe_in_flight = False
+        self.ewma_latency: Optional[float] = None
+        self.latency_samples = 0
+        self.last_reason: Optional[str] = None
+        self._outcomes: Deque[Tuple[float, bool]] = deque()
+
+    def _prune(self, now: float) -> None:
+        horizon = now - self.config.window_seconds
+        while self._outcomes and self._outcomes[0][0] < horizon:
+            self._outcomes.popleft()
+
+    def error_rate(self) -> float:
+        self._prune(time.monotonic())
+        if not self._outcomes:
+            return 0.0
+        return sum(1 for _, ok in self._outcomes if not ok) / len(self._outcomes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "state": self.state.value,
+            "consecutive_failures": self.consecutive_failures,
+            "error_rate": self.error_rate(),
+            "requests_in_window": len(self._outcomes),
+            "ewma_latency": self.ewma_latency,
+            "ejections": self.ejections,
+            "open_for": max(0.0, self.open_until - time.monotonic()) if self.state == BreakerState.OPEN else 0.0,
+            "last_reason": self.last_reason,
+        }
+
+
+StateListener = Callable[[str, BreakerState, BreakerState], None]
+
+
+class CircuitBreakerRegistry:
+    """
+    Circuit breakers for every node, plus cluster-relative latency outlier ejection.
+    """
+
+    def __init__(self, config: Optional[BreakerConfig] = None, on_state_change: Optional[StateListener] = None):
+        """
+        Initialize circuit breaker registry.
+
+        Args:
+            config: Ejection thresholds
+            on_state_change: Called with (node_id, old_state, new_state) on every transition
+        """
+        self.config = config or BreakerConfig()
+        self.on_state_change = on_state_change
+        self.breakers: Dict[str, CircuitBreaker] = {}
+
+    def _breaker(self, node_id: str) -> CircuitBreaker:
+        breaker = self.breakers.get(node_id)
+        if breaker is None:
+            breaker = CircuitBreaker(node_id, self.config)
+            self.breakers[node_id] = breaker
+        return breaker
+
+    def _transition(self, breaker: CircuitBreaker, state: BreakerState, reason: Optional[str] = None) -> None:
+        old = breaker.state
+        if old == state:
+            return
+        breaker.state = state
+        if state == BreakerState.OPEN:
+            breaker.ejections += 1
+            ejection_time = min(self.config.base_ejection_time * 2 ** (breaker.ejections - 1),
+                                self.config.max_ejection_time)
+            breaker.open_until = time.monotonic() + ejection_time
+            breaker.last_reason = reason
+            logger.warning(f"Circuit opened for node {breaker.node_id}", reason=reason, ejection_time=ejection_time)
+        elif state == BreakerState.CLOSED:
+            breaker.ejections = 0
+            breaker.consecutive_failures = 0
+            breaker._outcomes.clear()
+            logger.info(f"Circuit closed for node {breaker.node_id}")
+        if self.on_state_change:
+            self.on_state_change(breaker.node_id, old, state)
+
+    def state(self, node_id: str) -> BreakerState:
+        breaker = self._breaker(node_id)
+        if breaker.state == BreakerState.OPEN and time.monotonic() >= breaker.open_until:
+            self._transition(breaker, BreakerState.HALF_OPEN)
+        return breaker.state
+
+    def is_available(self, node_id: str) -> bool:
+        """True unless the node is ejected (a half-open node may still take a probe)."""
+        return self.state(node_id) != BreakerState.OPEN
+
+    def allow(self, node_id: str) -> bool:
+        """
+        Admit a call to the node.
+
+        Returns:
+            False to fail fast (open, or half-open with its probe already in flight)
+        """
+        state = self.state(node_id)
+        if state == BreakerState.CLOSED:
+            return True
+        if state == BreakerState.HALF_OPEN:
+            breaker = self.breakers[node_id]
+            if not breaker.probe_in_flight:
+                breaker.probe_in_flight = True
+                return True
+        return False
+
+    def release(self, node_id: str) -> None:
+        """Give back a probe slot for a call that ended without an outcome (e.g. cancelled)."""
+        self._breaker(node_id).probe_in_flight = False
+
+    def record_success(self, node_id: str, latency: float) -> None:
+        breaker = self._breaker(node_id)
+        now = time.monotonic()
+        breaker._outcomes.append((now, True))
+        breaker._prune(now)
+        breaker.consecutive_failures = 0
+        breaker.latency_samples += 1
+        if breaker.ewma_latency is None:
+            breaker.ewma_latency = latency
+        else:
+            breaker.ewma_latency += self.config.latency_alpha * (latency - breaker.ewma_latency)
+
+        if breaker.state == BreakerState.HALF_OPEN:
+            breaker.probe_in_flight = False
+            breaker.ewma_latency = latency  # Judge the node on how it responds now
+            self._transition(breaker, BreakerState.CLOSED)
+        elif breaker.state == BreakerState.CLOSED and self._is_latency_outlier(breaker):
+            self._transition(breaker, BreakerState.OPEN, "latency outlier")
+
+    def record_failure(self, node_id: str, reason: str = "request failed") -> None:
+        breaker = self._breaker(node_id)
+        now = time.monotonic()
+        breaker._outcomes.append((now, False))
+        breaker._prune(now)
+        breaker.consecutive_failures += 1
+
+        if breaker.state == BreakerState.HALF_OPEN:
+            breaker.probe_in_flight = False
+            self._transition(breaker, BreakerState.OPEN, f"probe failed: {reason}")
+        elif breaker.state == BreakerState.CLOSED:
+            if breaker.consecutive_failures >= self.config.consecutive_failures:
+                self._transition(breaker, BreakerState.OPEN, f"{breaker.consecutive_failures} consecutive failures")
+            elif (len(breaker._outcomes) >= self.config.min_requests and
+                  breaker.error_rate() >= self.config.error_rate):
+                self._transition(breaker, BreakerState.OPEN, f"error rate {breaker.error_rate():.0%}")
+
+    def _is_latency_outlier(self, breaker: CircuitBreaker) -> bool:
+        if breaker.latency_samples < self.config.min_latency_samples or breaker.ewma_latency is None:
+            return False
+        if breaker.ewma_latency < self.config.min_outlier_latency:
+            return False
+        peers = [
+            b.ewma_latency for b in self.breakers.values()
+            if b is not breaker and b.state == BreakerState.CLOSED and b.ewma_latency is not None
+            and b.latency_samples >= self.config.min_latency_samples
+        ]
+        if not peers:
+            return False
+        if breaker.ewma_latency < self.config.latency_outlier_factor * statistics.median(peers):
+            return False
+        # Never eject so many nodes that the rest get overloaded
+        ejected = sum(1 for b in self.breakers.values() if b.state != BreakerState.CLOSED)
+        return ejected + 1 <= self.config.max_ejection_ratio * len(self.breakers)
+
+    def forget(self, node_id: str) -> None:
+        self.breakers.pop(node_id, None)
+
+    def open_nodes(self) -> List[str]:
+        return [node_id for node_id in self.breakers if self.state(node_id) == BreakerState.OPEN]
+
+    def get_stats(self) -> Dict[str, Any]:
+        for node_id in list(self.breakers):
+            self.state(node_id)  # Apply elapsed ejection timers
+        return {node_id: breaker.to_dict() for node_id, breaker in self.breakers.items()}
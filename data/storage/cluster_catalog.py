@@ -0,0 +1,656 @@
+"""
+Cluster Catalog
+
+Durable coordinator metadata: collections, virtual collections, the
+shard -> node placement map, shard vector counts and placement epochs.
+The catalog is a small SQLite database so an API restart reloads the
+exact placement it had (including moves made by the rebalancer) instead
+of re-deriving it from the hash ring. Placement changes are written
+through immediately; vector counts change on every write and are
+buffered and flushed in batches as increments.
+
+Collection centroids used for query routing are stored here as well;
+like vector counts, each process buffers its additions and merges them
+in on flush.
+
+The catalog is also the state shared by API worker processes on one
+host: node membership and health, in-flight shard migrations and small
+cluster-wide settings live here too, and workers notice each other's
+commits through SQLite's ``data_version``. Each worker heartbeats the
+sync barrier it has applied, so the leader can wait until every worker
+sees a migration before copying, and new topic names are claimed here so
+workers agree on one name for the same content. Workers also publish
+their request metrics windows, so any of them can report (and scale on)
+the traffic of all, and the replicas their replication queues marked
+stale, so the leader repairs them and every worker reads from them again.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from core.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS collections (
+    name TEXT PRIMARY KEY,
+    vector_size INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS virtual_collections (
+    name TEXT PRIMARY KEY,
+    base_collection TEXT NOT NULL,
+    vector_count INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS shards (
+    shard_id TEXT PRIMARY KEY,
+    collection_name TEXT NOT NULL,
+    node_ids TEXT NOT NULL,
+    vector_count INTEGER NOT NULL DEFAULT 0,
+    epoch INTEGER NOT NULL DEFAULT 0,
+    state TEXT NOT NULL DEFAULT 'active',
+    pinned INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS shards_by_collection ON shards (collection_name);
+CREATE TABLE IF NOT EXISTS nodes (
+    node_id TEXT PRIMARY KEY,
+    host TEXT NOT NULL,
+    port INTEGER NOT NULL,
+    weight REAL NOT NULL DEFAULT 1.0,
+    tags TEXT NOT NULL DEFAULT '{}',
+    status TEXT NOT NULL DEFAULT 'unknown',
+    load REAL NOT NULL DEFAULT 0.0,
+    vector_count INTEGER NOT NULL DEFAULT 0,
+    last_heartbeat REAL NOT NULL DEFAULT 0.0
+);
+CREATE TABLE IF NOT EXISTS migrations (
+    shard_id TEXT NOT NULL,
+    target_node TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    PRIMARY KEY (shard_id, target_node)
+);
+CREATE TABLE IF NOT EXISTS collection_centroids (
+    collection_name TEXT PRIMARY KEY,
+    vector_size INTEGER NOT NULL,
+    sums BLOB NOT NULL,
+    counts BLOB NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS workers (
+    worker_id TEXT PRIMARY KEY,
+    barrier INTEGER NOT NULL DEFAULT 0,
+    heartbeat_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS topic_claims (
+    name TEXT PRIMARY KEY,
+    vector BLOB NOT NULL,
+    claimed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS worker_metrics (
+    worker_id TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS stale_replicas (
+    node_id TEXT NOT NULL,
+    shard_id TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'stale',
+    marked_at REAL NOT NULL,
+    repair_started_at REAL NOT NULL DEFAULT 0.0,
+    PRIMARY KEY (node_id, shard_id)
+);
+"""
+
+# Settings key of the latest sync barrier
+_BARRIER_KEY = "sync_barrier"
+
+
+@dataclass
+class CatalogShard:
+    """Persisted placement of one shard."""
+    shard_id: str
+    collection_name: str
+    node_ids: List[str]
+    vector_count: int = 0
+    epoch: int = 0
+    created_at: float = 0.0
+    state: str = "active"  # "pending" while a split or merge fills it
+    pinned: bool = False  # Placed off the ring by the load rebalancer
+
+
+@dataclass
+class CatalogNode:
+    """Persisted membership and last observed health of one node."""
+    node_id: str
+    host: str
+    port: int
+    weight: float = 1.0
+    tags: Dict[str, str] = field(default_factory=dict)
+    status: str = "unknown"
+    load: float = 0.0
+    vector_count: int = 0
+    last_heartbeat: float = 0.0
+
+
+@dataclass
+class CatalogSnapshot:
+    """Everything the coordinator needs to rebuild its routing state."""
+    collections: Dict[str, int] = field(default_factory=dict)  # name -> vector size
+    virtual_collections: Dict[str, str] = field(default_factory=dict)  # name -> base collection
+    virtual_counts: Dict[str, int] = field(default_factory=dict)
+    shards: List[CatalogShard] = field(default_factory=list)
+    nodes: List[CatalogNode] = field(default_factory=list)
+    migrations: Dict[str, List[str]] = field(default_factory=dict)  # shard -> target nodes
+    centroids: Dict[str, Tuple[int, bytes, bytes]] = field(default_factory=dict)  # name -> (size, sums, counts)
+    barrier: int = 0  # Latest sync barrier; applying this snapshot acknowledges it
+    stale_replicas: Dict[Tuple[str, str], str] = field(default_factory=dict)  # (node, shard) -> state
+
+
+class ClusterCatalog:
+    """
+    SQLite-backed store for the coordinator's cluster metadata.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialize cluster catalog.
+
+        Args:
+            path: Database file (created with its directory if missing)
+        """
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        # WAL lets worker processes read while one of them writes
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        # Catalogs written before range sharding have no shard state column
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(shards)")}
+        if "state" not in columns:
+            self._conn.execute("ALTER TABLE shards ADD COLUMN state TEXT NOT NULL DEFAULT 'active'")
+        if "pinned" not in columns:
+            self._conn.execute("ALTER TABLE shards ADD COLUMN pinned INTEGER NOT NULL DEFAULT 0")
+        # Count increments not yet flushed
+        self._pending_shard_counts: Dict[str, int] = defaultdict(int)
+        self._pending_virtual_counts: Dict[str, int] = defaultdict(int)
+        self.last_flush_at: Optional[float] = None
+
+    def data_version(self) -> int:
+        """Changes whenever another connection (e.g. another worker) commits."""
+        with self._lock:
+            return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def load(self) -> CatalogSnapshot:
+        """
+        Read the whole catalog in one consistent snapshot.
+
+        Vector counts include this process's increments that are not flushed yet.
+        """
+        snapshot = CatalogSnapshot()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for name, vector_size in self._conn.execute("SELECT name, vector_size FROM collections"):
+                    snapshot.collections[name] = vector_size
+                for name, base, count in self._conn.execute(
+                        "SELECT name, base_collection, vector_count FROM virtual_collections"):
+                    snapshot.virtual_collections[name] = base
+                    snapshot.virtual_counts[name] = count + self._pending_virtual_counts.get(name, 0)
+                shard_rows = self._conn.execute(
+                    "SELECT shard_id, collection_name, node_ids, vector_count, epoch, created_at, state, pinned "
+                    "FROM shards ORDER BY collection_name, shard_id"
+                ).fetchall()
+                node_rows = self._conn.execute(
+                    "SELECT node_id, host, port, weight, tags, status, load, vector_count, last_heartbeat "
+                    "FROM nodes ORDER BY node_id"
+                ).fetchall()
+                for shard_id, target_node in self._conn.execute("SELECT shard_id, target_node FROM migrations"):
+                    snapshot.migrations.setdefault(shard_id, []).append(target_node)
+                for name, vector_size, sums, counts in self._conn.execute(
+                        "SELECT collection_name, vector_size, sums, counts FROM collection_centroids"):
+                    snapshot.centroids[name] = (vector_size, sums, counts)
+                row = self._conn.execute("SELECT value FROM settings WHERE key = ?", (_BARRIER_KEY,)).fetchone()
+                snapshot.barrier = json.loads(row[0]) if row else 0
+                for node_id, shard_id, state in self._conn.execute(
+                        "SELECT node_id, shard_id, state FROM stale_replicas"):
+                    snapshot.stale_replicas[(node_id, shard_id)] = state
+            finally:
+                self._conn.execute("COMMIT")
+            pending = dict(self._pending_shard_counts)
+        for shard_id, collection_name, node_ids, vector_count, epoch, created_at, state, pinned in shard_rows:
+            snapshot.shards.append(CatalogShard(
+                shard_id=shard_id,
+                collection_name=collection_name,
+                node_ids=json.loads(node_ids),
+                vector_count=vector_count + pending.get(shard_id, 0),
+                epoch=epoch,
+                created_at=created_at,
+                state=state,
+                pinned=bool(pinned)
+            ))
+        for node_id, host, port, weight, tags, status, load, vector_count, last_heartbeat in node_rows:
+            snapshot.nodes.append(CatalogNode(
+                node_id=node_id, host=host, port=port, weight=weight, tags=json.loads(tags),
+                status=status, load=load, vector_count=vector_count, last_heartbeat=last_heartbeat
+            ))
+        return snapshot
+
+    def save_collection(self, name: str, vector_size: int) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO collections (name, vector_size, created_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET vector_size = excluded.vector_size",
+                (name, vector_size, time.time())
+            )
+
+    def delete_collection(self, name: str) -> None:
+        """Remove a collection with its shards and the virtual collections over it."""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                shard_ids = [row[0] for row in self._conn.execute(
+                    "SELECT shard_id FROM shards WHERE collection_name = ?", (name,))]
+                virtual_names = [row[0] for row in self._conn.execute(
+                    "SELECT name FROM virtual_collections WHERE base_collection = ? OR name = ?", (name, name))]
+                self._conn.execute("DELETE FROM shards WHERE collection_name = ?", (name,))
+                self._conn.execute("DELETE FROM virtual_collections WHERE base_collection = ? OR name = ?",
+                                   (name, name))
+                self._conn.execute("DELETE FROM collections WHERE name = ?", (name,))
+                self._conn.executemany("DELETE FROM collection_centroids WHERE collection_name = ?",
+                                       [(n,) for n in [name] + virtual_names])
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            for shard_id in shard_ids:
+                self._pending_shard_counts.pop(shard_id, None)
+            for virtual_name in virtual_names:
+                self._pending_virtual_counts.pop(virtual_name, None)
+
+    def save_virtual_collection(self, name: str, base_collection: str, vector_count: int = 0) -> None:
+        with self._lock:
+            self._pending_virtual_counts.pop(name, None)
+            self._conn.execute(
+                "INSERT INTO virtual_collections (name, base_collection, vector_count, created_at) "
+                "VALUES (?, ?, ?, ?) ON CONFLICT(name) DO UPDATE SET "
+                "base_collection = excluded.base_collection, vector_count = excluded.vector_count",
+                (name, base_collection, vector_count, time.time())
+            )
+
+    def save_shard(self, shard_id: str, collection_name: str, node_ids: List[str],
+                   vector_count: int, epoch: int, created_at: float, state: str = "active",
+                   pinned: bool = False) -> None:
+        """Write a shard's placement through to disk."""
+        with self._lock:
+            self._save_shard(CatalogShard(shard_id, collection_name, node_ids, vector_count, epoch, created_at,
+                                          state, pinned))
+
+    def _save_shard(self, shard: CatalogShard) -> None:
+        self._conn.execute(
+            "INSERT INTO shards (shard_id, collection_name, node_ids, vector_count, epoch, state, pinned, "
+            "created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(shard_id) DO UPDATE SET "
+            "collection_name = excluded.collection_name, node_ids = excluded.node_ids, "
+            "vector_count = excluded.vector_count, epoch = excluded.epoch, state = excluded.state, "
+            "pinned = excluded.pinned, updated_at = excluded.updated_at",
+            (shard.shard_id, shard.collection_name, json.dumps(shard.node_ids), shard.vector_count, shard.epoch,
+             shard.state, int(shard.pinned), shard.created_at, time.time())
+        )
+        # The saved count is absolute; increments buffered before it are included
+        self._pending_shard_counts.pop(shard.shard_id, None)
+
+    def delete_shard(self, shard_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM shards WHERE shard_id = ?", (shard_id,))
+            self._conn.execute("DELETE FROM stale_replicas WHERE shard_id = ?", (shard_id,))
+            self._pending_shard_counts.pop(shard_id, None)
+
+    def commit_range_change(self, retired: List[str], shards: List[CatalogShard]) -> None:
+        """
+        Cut routing over from split or merged shards to their replacements in
+        one transaction, so no worker ever sees a range covered twice or not at all.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany("DELETE FROM shards WHERE shard_id = ?", [(s,) for s in retired])
+                self._conn.executemany("DELETE FROM stale_replicas WHERE shard_id = ?", [(s,) for s in retired])
+                for shard in shards:
+                    self._save_shard(shard)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            for shard_id in retired:
+                self._pending_shard_counts.pop(shard_id, None)
+
+    def add_counts(self, shard_counts: Optional[Dict[str, int]] = None,
+                   virtual_counts: Optional[Dict[str, int]] = None) -> None:
+        """Buffer vector count increments until the next ``flush``."""
+        with self._lock:
+            for shard_id, delta in (shard_counts or {}).items():
+                self._pending_shard_counts[shard_id] += delta
+            for name, delta in (virtual_counts or {}).items():
+                self._pending_virtual_counts[name] += delta
+
+    def flush(self) -> int:
+        """
+        Apply buffered count increments in one transaction.
+
+        Increments (rather than absolute counts) let several worker
+        processes write to the same shards without overwriting each other.
+
+        Returns:
+            Number of rows updated
+        """
+        with self._lock:
+            if not self._pending_shard_counts and not self._pending_virtual_counts:
+                return 0
+            now = time.time()
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "UPDATE shards SET vector_count = vector_count + ?, updated_at = ? WHERE shard_id = ?",
+                    [(delta, now, shard_id) for shard_id, delta in self._pending_shard_counts.items()]
+                )
+                self._conn.executemany(
+                    "UPDATE virtual_collections SET vector_count = vector_count + ? WHERE name = ?",
+                    [(delta, name) for name, delta in self._pending_virtual_counts.items()]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise  # Increments stay buffered for the next attempt
+            updated = len(self._pending_shard_counts) + len(self._pending_virtual_counts)
+            self._pending_shard_counts.clear()
+            self._pending_virtual_counts.clear()
+            self.last_flush_at = now
+            return updated
+
+    def merge_centroids(self, names: List[str],
+                        merge: Callable[[str, Optional[Tuple[int, bytes, bytes]]], Optional[Tuple[int, bytes, bytes]]]
+                        ) -> Dict[str, Optional[Tuple[int, bytes, bytes]]]:
+        """
+        Read, merge and write collection centroids in one write transaction.
+
+        The write lock is taken before reading, so concurrent merges from
+        other workers are applied one after the other rather than lost.
+
+        Args:
+            names: Collections to merge
+            merge: Called with a collection name and its stored record (or None); returns the record to store
+
+        Returns:
+            Stored record per name; None for collections that no longer exist
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                existing = {row[0] for row in self._conn.execute(
+                    "SELECT name FROM collections UNION SELECT name FROM virtual_collections")}
+                stored = {row[0]: (row[1], row[2], row[3]) for row in self._conn.execute(
+                    "SELECT collection_name, vector_size, sums, counts FROM collection_centroids")}
+                merged: Dict[str, Optional[Tuple[int, bytes, bytes]]] = {}
+                now = time.time()
+                for name in names:
+                    # A collection deleted by another worker must not be brought back
+                    record = merge(name, stored.get(name)) if name in existing else None
+                    merged[name] = record
+                    if record is not None and record is not stored.get(name):
+                        self._conn.execute(
+                            "INSERT OR REPLACE INTO collection_centroids "
+                            "(collection_name, vector_size, sums, counts, updated_at) VALUES (?, ?, ?, ?, ?)",
+                            (name, record[0], record[1], record[2], now)
+                        )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return merged
+
+    def raise_barrier(self) -> int:
+        """
+        Start a sync barrier. A worker acknowledges it once it has applied a
+        snapshot that includes every change committed before this call.
+
+        Returns:
+            The new barrier
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT value FROM settings WHERE key = ?", (_BARRIER_KEY,)).fetchone()
+                barrier = (json.loads(row[0]) if row else 0) + 1
+                self._conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+                                   (_BARRIER_KEY, json.dumps(barrier)))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return barrier
+
+    def heartbeat_worker(self, worker_id: str, barrier: int) -> None:
+        """Record that a worker is alive and has applied the catalog up to ``barrier``."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO workers (worker_id, barrier, heartbeat_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(worker_id) DO UPDATE SET barrier = max(barrier, excluded.barrier), "
+                "heartbeat_at = excluded.heartbeat_at",
+                (worker_id, barrier, time.time())
+            )
+
+    def remove_worker(self, worker_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM workers WHERE worker_id = ?", (worker_id,))
+            self._conn.execute("DELETE FROM worker_metrics WHERE worker_id = ?", (worker_id,))
+
+    def save_worker_metrics(self, worker_id: str, state: str) -> None:
+        """Publish a worker's metrics window state (JSON)."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO worker_metrics (worker_id, state, updated_at) VALUES (?, ?, ?)",
+                (worker_id, state, time.time())
+            )
+
+    def load_worker_metrics(self, max_age: float) -> Dict[str, str]:
+        """Metrics window states published in the last ``max_age`` seconds, by worker."""
+        with self._lock:
+            rows = self._conn.execute("SELECT worker_id, state FROM worker_metrics WHERE updated_at >= ?",
+                                      (time.time() - max_age,)).fetchall()
+        return dict(rows)
+
+    def pending_workers(self, barrier: int, max_age: float) -> List[str]:
+        """
+        Live workers that have not acknowledged ``barrier`` yet.
+
+        Workers without a heartbeat for ``max_age`` seconds are considered
+        gone and dropped.
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM workers WHERE heartbeat_at < ?", (time.time() - max_age,))
+            rows = self._conn.execute("SELECT worker_id FROM workers WHERE barrier < ?", (barrier,)).fetchall()
+        return [row[0] for row in rows]
+
+    def claim_topics(self, names: List[str], vector: bytes,
+                     match: Callable[[Dict[str, bytes]], List[str]], max_age: float) -> List[str]:
+        """
+        Claim names for a new topic, or take the names another worker claimed
+        for similar content, in one write transaction.
+
+        Args:
+            names: Names proposed for the content
+            vector: Embedding of the content (float32 bytes)
+            match: Picks fitting names out of the current claims (name -> embedding)
+            max_age: Seconds a claim is kept; by then the topic's centroids are shared
+
+        Returns:
+            Names to use
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                self._conn.execute("DELETE FROM topic_claims WHERE claimed_at < ?", (now - max_age,))
+                claims = {row[0]: row[1] for row in self._conn.execute("SELECT name, vector FROM topic_claims")}
+                chosen = match(claims)
+                if not chosen:
+                    chosen = list(names)
+                    self._conn.executemany(
+                        "INSERT OR IGNORE INTO topic_claims (name, vector, claimed_at) VALUES (?, ?, ?)",
+                        [(name, vector, now) for name in chosen]
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return chosen
+
+    def mark_stale_replicas(self, marks: Dict[Tuple[str, str], float]) -> None:
+        """
+        Record replicas that dropped writes, as {(node, shard): time of the latest drop}.
+
+        A drop after a replica's repair began comparing digests puts it back
+        to stale, since the repair may have missed that write; earlier drops
+        are on the reference by then.
+        """
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO stale_replicas (node_id, shard_id, state, marked_at) VALUES (?, ?, 'stale', ?) "
+                "ON CONFLICT(node_id, shard_id) DO UPDATE SET "
+                "state = CASE WHEN repair_started_at > 0 AND excluded.marked_at > repair_started_at "
+                "THEN 'stale' ELSE state END, "
+                "marked_at = max(marked_at, excluded.marked_at)",
+                [(node_id, shard_id, marked_at) for (node_id, shard_id), marked_at in marks.items()]
+            )
+
+    def load_stale_replicas(self) -> Dict[Tuple[str, str], str]:
+        """(node, shard) -> "stale" or "repairing"."""
+        with self._lock:
+            rows = self._conn.execute("SELECT node_id, shard_id, state FROM stale_replicas").fetchall()
+        return {(node_id, shard_id): state for node_id, shard_id, state in rows}
+
+    def start_replica_repairs(self, replicas: List[Tuple[str, str]]) -> None:
+        """Tell every worker to queue these stale replicas' writes again ahead of their repair."""
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE stale_replicas SET state = 'repairing', repair_started_at = 0.0 "
+                "WHERE node_id = ? AND shard_id = ? AND state = 'stale'",
+                replicas
+            )
+
+    def begin_replica_repair(self, node_id: str, shard_id: str) -> None:
+        """Record that a repairing replica's digests are being compared from now on."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE stale_replicas SET repair_started_at = ? "
+                "WHERE node_id = ? AND shard_id = ? AND state = 'repairing'",
+                (time.time(), node_id, shard_id)
+            )
+
+    def finish_replica_repair(self, node_id: str, shard_id: str) -> bool:
+        """Clear a repaired replica; False if it dropped writes again during the repair."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM stale_replicas WHERE node_id = ? AND shard_id = ? AND state = 'repairing'",
+                (node_id, shard_id)
+            )
+        return cursor.rowcount > 0
+
+    def forget_stale_replica(self, node_id: str, shard_id: str) -> None:
+        """Drop the mark of a replica that no longer holds the shard."""
+        with self._lock:
+            self._conn.execute("DELETE FROM stale_replicas WHERE node_id = ? AND shard_id = ?",
+                               (node_id, shard_id))
+
+    def save_node(self, node_id: str, host: str, port: int, weight: float = 1.0,
+                  tags: Optional[Dict[str, str]] = None) -> None:
+        """Record cluster membership (health columns are left as they are)."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO nodes (node_id, host, port, weight, tags) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(node_id) DO UPDATE SET host = excluded.host, port = excluded.port, "
+                "weight = excluded.weight, tags = excluded.tags",
+                (node_id, host, port, weight, json.dumps(tags or {}))
+            )
+
+    def delete_node(self, node_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM nodes WHERE node_id = ?", (node_id,))
+            self._conn.execute("DELETE FROM stale_replicas WHERE node_id = ?", (node_id,))
+
+    def save_node_health(self, health: List[Tuple[str, str, float, int, float]]) -> None:
+        """Publish (node_id, status, load, vector_count, last_heartbeat) rows from one health round."""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "UPDATE nodes SET status = ?, load = ?, vector_count = ?, last_heartbeat = ? WHERE node_id = ?",
+                    [(status, load, vector_count, heartbeat, node_id)
+                     for node_id, status, load, vector_count, heartbeat in health]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def start_migration(self, shard_id: str, target_node: str) -> None:
+        """Announce a shard copy so every worker mirrors new writes to the target."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO migrations (shard_id, target_node, started_at) VALUES (?, ?, ?)",
+                (shard_id, target_node, time.time())
+            )
+
+    def finish_migration(self, shard_id: str, target_node: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM migrations WHERE shard_id = ? AND target_node = ?",
+                               (shard_id, target_node))
+
+    def get_setting(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM settings WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_setting(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+                               (key, json.dumps(value)))
+
+    def close(self) -> None:
+        try:
+            self.flush()
+        finally:
+            self._conn.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = {
+                table: self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ("collections", "virtual_collections", "shards", "nodes", "migrations",
+                              "collection_centroids", "workers", "topic_claims", "worker_metrics",
+                              "stale_replicas")
+            }
+            pending = len(self._pending_shard_counts) + len(self._pending_virtual_counts)
+        return {
+            "path": self.path,
+            **counts,
+            "pending_count_updates": pending,
+            "last_flush_at": self.last_flush_at,
+        }
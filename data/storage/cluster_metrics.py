@@ -0,0 +1,370 @@
+"""
+Cluster Metrics
+
+Request metrics measured by the coordinator on every node RPC, kept over a
+rolling window per node, per shard and per collection: request rate, error
+rate, bytes sent and received, and latency percentiles. Latencies go into
+HDR-style log-linear histograms, so memory per series is bounded however
+many requests are recorded. User-facing queries (a whole fan-out search)
+are tracked as a separate series.
+
+Cumulative counters and latency histograms are also exported as Prometheus
+series through ``metrics_collector`` (per node and collection; shards come
+and go as ranges split and merge, so they are only broken out here); the
+windows here are what capacity
+planning and the auto-scaler read. Every API worker only sees its own
+requests, so workers publish their window state (``export_state``) and a
+snapshot merges in the states published by the others.
+"""
+
+import time
+from typing import Any, Dict, Iterable, Optional
+
+from core.utils.metrics import metrics_collector
+
+
+class LatencyHistogram:
+    """
+    Log-linear latency histogram in microseconds (HDR-style).
+
+    Each power of two is split into ``2**SUB_BUCKET_BITS`` linear buckets,
+    so every bucket is within ~3% of the values it holds. Counts are kept
+    sparsely; there are at most ``BUCKET_COUNT`` buckets.
+    """
+
+    SUB_BUCKET_BITS = 5
+    SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+    MAX_EXPONENT = 36  # 2**36 microseconds, about 19 hours
+    BUCKET_COUNT = (MAX_EXPONENT - SUB_BUCKET_BITS + 2) * SUB_BUCKETS
+
+    __slots__ = ("counts", "total", "sum_us", "max_us")
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.total = 0
+        self.sum_us = 0
+        self.max_us = 0
+
+    @classmethod
+    def bucket_index(cls, value_us: int) -> int:
+        if value_us < cls.SUB_BUCKETS:
+            return max(value_us, 0)
+        value_us = min(value_us, (1 << (cls.MAX_EXPONENT + 1)) - 1)
+        shift = value_us.bit_length() - 1 - cls.SUB_BUCKET_BITS
+        return (shift + 1) * cls.SUB_BUCKETS + ((value_us >> shift) & (cls.SUB_BUCKETS - 1))
+
+    @classmethod
+    def bucket_value(cls, index: int) -> float:
+        """Midpoint of a bucket in microseconds."""
+        if index < cls.SUB_BUCKETS:
+            return float(index)
+        shift = index // cls.SUB_BUCKETS - 1
+        lower = (cls.SUB_BUCKETS + index % cls.SUB_BUCKETS) << shift
+        return lower + ((1 << shift) - 1) / 2.0
+
+    def record(self, seconds: float) -> None:
+        value_us = int(seconds * 1_000_000)
+        index = self.bucket_index(value_us)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.total += 1
+        self.sum_us += value_us
+        self.max_us = max(self.max_us, value_us)
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total += other.total
+        self.sum_us += other.sum_us
+        self.max_us = max(self.max_us, other.max_us)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"counts": self.counts, "total": self.total, "sum_us": self.sum_us, "max_us": self.max_us}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "LatencyHistogram":
+        histogram = cls()
+        # JSON turns the bucket indexes into strings
+        histogram.counts = {int(index): count for index, count in data["counts"].items()}
+        histogram.total = data["total"]
+        histogram.sum_us = data["sum_us"]
+        histogram.max_us = data["max_us"]
+        return histogram
+
+    def percentile(self, q: float) -> float:
+        """Latency in seconds at percentile ``q`` (0-100); 0.0 if empty."""
+        if not self.total:
+            return 0.0
+        rank = max(1, int(round(q / 100.0 * self.total)))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self.bucket_value(index), self.max_us) / 1_000_000
+        return self.max_us / 1_000_000
+
+    def mean(self) -> float:
+        return self.sum_us / self.total / 1_000_000 if self.total else 0.0
+
+
+class _Slot:
+    __slots__ = ("index", "requests", "errors", "bytes_sent", "bytes_received", "latency")
+
+    def __init__(self, index: int):
+        self.index = index
+        self.requests = 0
+        self.errors = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.latency = LatencyHistogram()
+
+    def merge(self, other: "_Slot") -> None:
+        self.requests += other.requests
+        self.errors += other.errors
+        self.bytes_sent += other.bytes_sent
+        self.bytes_received += other.bytes_received
+        self.latency.merge(other.latency)
+
+
+class WindowedRequestStats:
+    """Requests, errors, bytes and latency over a sliding window of fixed-length slots."""
+
+    def __init__(self, window_seconds: int = 60, slot_seconds: int = 10):
+        self.slot_seconds = max(1, slot_seconds)
+        self.slot_count = max(1, window_seconds // self.slot_seconds)
+        self.window_seconds = self.slot_count * self.slot_seconds
+        self._slots = [_Slot(-1) for _ in range(self.slot_count)]
+        self.created_at = time.time()
+        self.last_recorded_at = 0.0
+
+    def _slot(self, now: float) -> _Slot:
+        index = int(now // self.slot_seconds)
+        slot = self._slots[index % self.slot_count]
+        if slot.index != index:
+            slot = self._slots[index % self.slot_count] = _Slot(index)
+        return slot
+
+    def record(self,
+               latency: Optional[float],
+               error: bool = False,
+               bytes_sent: int = 0,
+               bytes_received: int = 0,
+               now: Optional[float] = None) -> None:
+        """
+        Record one request.
+
+        Args:
+            latency: Seconds the request took; None for requests rejected without being sent
+            error: Whether the request failed
+            bytes_sent: Request body size
+            bytes_received: Response body size
+            now: Timestamp (defaults to the current time)
+        """
+        now = time.time() if now is None else now
+        slot = self._slot(now)
+        slot.requests += 1
+        slot.errors += bool(error)
+        slot.bytes_sent += bytes_sent
+        slot.bytes_received += bytes_received
+        if latency is not None:
+            slot.latency.record(latency)
+        self.last_recorded_at = now
+
+    def export_state(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """The slots still in the window, as JSON-friendly data for ``merge_state``."""
+        now = time.time() if now is None else now
+        oldest = int(now // self.slot_seconds) - self.slot_count
+        return {
+            "created_at": self.created_at,
+            "last_recorded_at": self.last_recorded_at,
+            "slots": [
+                [slot.index, slot.requests, slot.errors, slot.bytes_sent, slot.bytes_received, slot.latency.to_dict()]
+                for slot in self._slots if slot.index > oldest
+            ],
+        }
+
+    def merge_state(self, state: Dict[str, Any], now: Optional[float] = None) -> None:
+        """Add another process's window (from ``export_state``) to this one."""
+        self.created_at = min(self.created_at, state["created_at"])
+        self.last_recorded_at = max(self.last_recorded_at, state["last_recorded_at"])
+        oldest = int((time.time() if now is None else now) // self.slot_seconds) - self.slot_count
+        for index, requests, errors, bytes_sent, bytes_received, latency in state["slots"]:
+            if index <= oldest:
+                continue
+            other = _Slot(index)
+            other.requests, other.errors = requests, errors
+            other.bytes_sent, other.bytes_received = bytes_sent, bytes_received
+            other.latency = LatencyHistogram.from_dict(latency)
+            slot = self._slots[index % self.slot_count]
+            if slot.index < index:
+                slot = self._slots[index % self.slot_count] = _Slot(index)
+            if slot.index == index:
+                slot.merge(other)
+
+    def snapshot(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """Totals, rates and latency percentiles (in ms) over the window."""
+        now = time.time() if now is None else now
+        oldest = int(now // self.slot_seconds) - self.slot_count
+        latency = LatencyHistogram()
+        requests = errors = bytes_sent = bytes_received = 0
+        for slot in self._slots:
+            if slot.index > oldest:
+                requests += slot.requests
+                errors += slot.errors
+                bytes_sent += slot.bytes_sent
+                bytes_received += slot.bytes_received
+                latency.merge(slot.latency)
+        # A series younger than the window is averaged over its lifetime only
+        seconds = max(1.0, min(float(self.window_seconds), now - self.created_at))
+        return {
+            "requests": requests,
+            "errors": errors,
+            "qps": round(requests / seconds, 3),
+            "error_rate": round(errors / requests, 4) if requests else 0.0,
+            "bytes_sent_per_second": round(bytes_sent / seconds, 1),
+            "bytes_received_per_second": round(bytes_received / seconds, 1),
+            "latency_ms": {
+                "p50": round(latency.percentile(50) * 1000.0, 3),
+                "p95": round(latency.percentile(95) * 1000.0, 3),
+                "p99": round(latency.percentile(99) * 1000.0, 3),
+                "mean": round(latency.mean() * 1000.0, 3),
+                "max": round(latency.max_us / 1000.0, 3),
+            },
+        }
+
+
+class ClusterMetrics:
+    """
+    Rolling-window RPC and query metrics for the whole cluster and per node,
+    shard and collection.
+    """
+
+    SCOPES = ("node", "shard", "collection")
+
+    def __init__(self, window_seconds: int = 60, slot_seconds: int = 10, export: bool = True):
+        """
+        Initialize cluster metrics.
+
+        Args:
+            window_seconds: Length of the rolling window
+            slot_seconds: Granularity at which old requests leave the window
+            export: Also update the Prometheus series in ``metrics_collector``
+        """
+        self.window_seconds = window_seconds
+        self.slot_seconds = slot_seconds
+        self.export = export
+        self.rpcs = self._new_stats()
+        self.queries = self._new_stats()
+        self._series: Dict[str, Dict[str, WindowedRequestStats]] = {scope: {} for scope in self.SCOPES}
+
+    def _new_stats(self) -> WindowedRequestStats:
+        return WindowedRequestStats(self.window_seconds, self.slot_seconds)
+
+    def _stats(self, scope: str, name: str) -> WindowedRequestStats:
+        series = self._series[scope]
+        stats = series.get(name)
+        if stats is None:
+            stats = series[name] = self._new_stats()
+        return stats
+
+    def record_rpc(self,
+                   node_id: str,
+                   operation: str,
+                   latency: Optional[float],
+                   error: bool = False,
+                   bytes_sent: int = 0,
+                   bytes_received: int = 0,
+                   shard_id: Optional[str] = None,
+                   collection: Optional[str] = None) -> None:
+        """
+        Record one RPC to a node.
+
+        Args:
+            node_id: Node the RPC was sent to
+            operation: RPC kind (first path segment, e.g. ``search`` or ``vectors``)
+            latency: Seconds until the response was read; None if the circuit breaker rejected it
+            error: Whether the RPC failed (transport error, HTTP 5xx or rejected)
+            bytes_sent: Request body size
+            bytes_received: Response body size
+            shard_id: Shard the RPC targeted, if any
+            collection: Collection of that shard
+        """
+        now = time.time()
+        sample = (latency, error, bytes_sent, bytes_received, now)
+        self.rpcs.record(*sample)
+        self._stats("node", node_id).record(*sample)
+        if shard_id:
+            self._stats("shard", shard_id).record(*sample)
+        if collection:
+            self._stats("collection", collection).record(*sample)
+
+        if self.export:
+            metrics_collector.record_cluster_rpc(
+                node=node_id,
+                collection=collection or "",
+                operation=operation,
+                status="rejected" if latency is None else ("error" if error else "success"),
+                duration=latency,
+                bytes_sent=bytes_sent,
+                bytes_received=bytes_received
+            )
+
+    def record_query(self, latency: float, error: bool = False, shards: int = 0) -> None:
+        """Record one user-facing search (the whole shard fan-out)."""
+        self.queries.record(latency, error)
+        if self.export:
+            metrics_collector.record_cluster_query(latency, "error" if error else "success", shards)
+
+    def _prune(self, now: float) -> None:
+        # Removed nodes and retired shards stop reporting; drop them once they leave the window
+        for series in self._series.values():
+            idle = [name for name, stats in series.items() if now - stats.last_recorded_at > self.window_seconds]
+            for name in idle:
+                del series[name]
+
+    def export_state(self) -> Dict[str, Any]:
+        """This process's windows, for other workers to merge into their snapshots."""
+        now = time.time()
+        self._prune(now)
+        return {
+            "rpcs": self.rpcs.export_state(now),
+            "queries": self.queries.export_state(now),
+            "series": {scope: {name: stats.export_state(now) for name, stats in series.items()}
+                       for scope, series in self._series.items()},
+        }
+
+    def _merged(self, states: Iterable[Dict[str, Any]], now: float) -> "ClusterMetrics":
+        merged = ClusterMetrics(self.window_seconds, self.slot_seconds, export=False)
+        for state in [self.export_state()] + list(states):
+            merged.rpcs.merge_state(state["rpcs"], now)
+            merged.queries.merge_state(state["queries"], now)
+            for scope, series in state["series"].items():
+                if scope in merged._series:
+                    for name, stats in series.items():
+                        merged._stats(scope, name).merge_state(stats, now)
+        return merged
+
+    def snapshot(self, scopes: Optional[tuple] = None,
+                 others: Optional[Iterable[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """
+        Window totals, rates and latency percentiles.
+
+        Args:
+            scopes: Breakdowns to include (defaults to node, shard and collection)
+            others: Window states exported by other worker processes, merged in
+
+        Returns:
+            ``rpc`` and ``query`` totals for the cluster plus one entry per
+            node, shard and collection active in the window
+        """
+        now = time.time()
+        self._prune(now)
+        source = self._merged(others, now) if others else self
+        snapshot: Dict[str, Any] = {
+            "window_seconds": self.rpcs.window_seconds,
+            "rpc": source.rpcs.snapshot(now),
+            "query": source.queries.snapshot(now),
+        }
+        for scope in scopes or self.SCOPES:
+            snapshot[f"{scope}s"] = {name: stats.snapshot(now)
+                                     for name, stats in sorted(source._series[scope].items())}
+        return snapshot
@@ -0,0 +1,320 @@
+"""
+Collection Centroid Index
+
+Keeps a few incrementally updated centroids (online k-means) of every
+collection's vectors so queries and documents can be matched to
+collections by cosine similarity without an LLM round trip.
+
+Centroids are persisted in the cluster catalog. Each process folds new
+vectors into its own view and buffers them as additions; a flush merges
+the additions into the catalog's copy, so worker processes add to the
+same centroids instead of overwriting each other.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+
+from core.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Persisted form of one collection's clusters: (vector size, float32 sums, int64 counts)
+CentroidRecord = Tuple[int, bytes, bytes]
+
+
+class _CollectionClusters:
+    """Online k-means state for a single collection."""
+
+    def __init__(self, max_clusters: int, vector_size: int):
+        self.max_clusters = max_clusters
+        self.sums = np.zeros((0, vector_size), dtype=np.float32)
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    @property
+    def vector_count(self) -> int:
+        return int(self.counts.sum())
+
+    def observe(self, vectors: np.ndarray) -> np.ndarray:
+        """Fold vectors in; returns the cluster each vector was added to."""
+        rows = np.empty(len(vectors), dtype=np.int64)
+
+        # Seed empty clusters with the first vectors seen
+        seeded = min(max(self.max_clusters - len(self.counts), 0), len(vectors))
+        if seeded:
+            rows[:seeded] = np.arange(len(self.counts), len(self.counts) + seeded)
+            self.sums = np.vstack([self.sums, vectors[:seeded]])
+            self.counts = np.concatenate([self.counts, np.ones(seeded, dtype=np.int64)])
+        if seeded == len(vectors):
+            return rows
+
+        # MacQueen update: assign to the nearest centroid and accumulate
+        assignments = np.argmax(vectors[seeded:] @ self.centroids().T, axis=1)
+        np.add.at(self.sums, assignments, vectors[seeded:])
+        self.counts += np.bincount(assignments, minlength=len(self.counts))
+        rows[seeded:] = assignments
+        return rows
+
+    def add(self, rows: np.ndarray, vectors: np.ndarray) -> None:
+        """Accumulate vectors into given clusters, growing the cluster list if needed."""
+        self.grow(int(rows.max()) + 1 if len(rows) else 0)
+        np.add.at(self.sums, rows, vectors)
+        self.counts += np.bincount(rows, minlength=len(self.counts))
+
+    def grow(self, size: int) -> None:
+        missing = size - len(self.counts)
+        if missing > 0:
+            self.sums = np.vstack([self.sums, np.zeros((missing, self.sums.shape[1]), dtype=np.float32)])
+            self.counts = np.concatenate([self.counts, np.zeros(missing, dtype=np.int64)])
+
+    def append(self, sums: np.ndarray, count: int) -> int:
+        self.sums = np.vstack([self.sums, sums[None, :]])
+        self.counts = np.concatenate([self.counts, np.asarray([count], dtype=np.int64)])
+        return len(self.counts) - 1
+
+    def copy(self) -> "_CollectionClusters":
+        clusters = _CollectionClusters(self.max_clusters, self.sums.shape[1])
+        clusters.sums = self.sums.copy()
+        clusters.counts = self.counts.copy()
+        return clusters
+
+    def centroids(self) -> np.ndarray:
+        norms = np.linalg.norm(self.sums, axis=1, keepdims=True)
+        return self.sums / np.maximum(norms, 1e-12)
+
+    def to_record(self) -> CentroidRecord:
+        return (self.sums.shape[1],
+                self.sums.astype(np.float32).tobytes(),
+                self.counts.astype(np.int64).tobytes())
+
+    @classmethod
+    def from_record(cls, record: CentroidRecord, max_clusters: int) -> "_CollectionClusters":
+        vector_size, sums, counts = record
+        clusters = cls(max_clusters, vector_size)
+        clusters.sums = np.frombuffer(sums, dtype=np.float32).reshape(-1, vector_size).copy()
+        clusters.counts = np.frombuffer(counts, dtype=np.int64).copy()
+        return clusters
+
+
+class CollectionCentroids:
+    """
+    Per-collection centroid index used for LLM-free routing.
+    """
+
+    def __init__(self, clusters_per_collection: int = 4, vector_size: int = 384):
+        self.clusters_per_collection = clusters_per_collection
+        self.vector_size = vector_size
+        self._collections: Dict[str, _CollectionClusters] = {}
+        # Additions not yet merged into the catalog, indexed like the clusters in _collections
+        self._pending: Dict[str, _CollectionClusters] = {}
+        # Leading clusters of each collection that come from the catalog (the rest are local seeds)
+        self._stored_clusters: Dict[str, int] = {}
+
+        # Stacked centroid matrix cache: (names, owner index per row, matrix)
+        self._matrix_cache: Optional[Tuple[List[str], np.ndarray, np.ndarray]] = None
+
+    @staticmethod
+    def _normalize(vectors: Any) -> np.ndarray:
+        matrix = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.maximum(norms, 1e-12)
+
+    def observe(self, collection_name: str, vectors: Any) -> None:
+        """Fold newly stored vectors into the collection's centroids."""
+        if vectors is None or not len(vectors):
+            return
+        normalized = self._normalize(vectors)
+        clusters = self._collections.get(collection_name)
+        if clusters is None:
+            clusters = _CollectionClusters(self.clusters_per_collection, normalized.shape[1])
+            self._collections[collection_name] = clusters
+        rows = clusters.observe(normalized)
+
+        pending = self._pending.get(collection_name)
+        if pending is None:
+            pending = self._pending[collection_name] = _CollectionClusters(self.clusters_per_collection,
+                                                                           normalized.shape[1])
+        pending.add(rows, normalized)
+        self._stored_clusters.setdefault(collection_name, 0)
+        self._matrix_cache = None
+
+    def remove(self, collection_name: str) -> None:
+        """Forget a collection."""
+        self._pending.pop(collection_name, None)
+        self._stored_clusters.pop(collection_name, None)
+        if self._collections.pop(collection_name, None) is not None:
+            self._matrix_cache = None
+
+    def has_collection(self, collection_name: str) -> bool:
+        return collection_name in self._collections
+
+    def pending_collections(self) -> List[str]:
+        """Collections with additions not yet merged into the catalog."""
+        return list(self._pending)
+
+    def _merge(self, stored: Optional[_CollectionClusters], pending: _CollectionClusters,
+               stored_clusters: int) -> Tuple[_CollectionClusters, np.ndarray]:
+        """
+        Add buffered additions to a stored copy of a collection's clusters.
+
+        Additions to clusters that came from the catalog go to the same
+        clusters; locally seeded clusters are appended while there is room
+        and otherwise folded into the nearest stored centroid.
+
+        Returns:
+            Merged clusters and the merged cluster of each pending row (-1 if empty)
+        """
+        merged = stored.copy() if stored is not None else _CollectionClusters(self.clusters_per_collection,
+                                                                                pending.sums.shape[1])
+        mapping = np.full(len(pending.counts), -1, dtype=np.int64)
+        shared = min(stored_clusters, len(merged.counts), len(pending.counts))
+        merged.sums[:shared] += pending.sums[:shared]
+        merged.counts[:shared] += pending.counts[:shared]
+        mapping[:shared] = np.arange(shared)
+        for row in range(shared, len(pending.counts)):
+            if not pending.counts[row]:
+                continue
+            if len(merged.counts) < self.clusters_per_collection:
+                mapping[row] = merged.append(pending.sums[row], int(pending.counts[row]))
+            else:
+                target = int(np.argmax(merged.centroids() @ self._normalize(pending.sums[row])[0]))
+                merged.sums[target] += pending.sums[row]
+                merged.counts[target] += pending.counts[row]
+                mapping[row] = target
+        return merged, mapping
+
+    def merge_record(self, collection_name: str, record: Optional[CentroidRecord]) -> Optional[CentroidRecord]:
+        """
+        Catalog record with this process's pending additions merged in.
+
+        Args:
+            collection_name: Collection to merge
+            record: The catalog's current record (None if it has none)
+
+        Returns:
+            Record to store
+        """
+        pending = self._pending.get(collection_name)
+        stored = self._from_record(collection_name, record)
+        if pending is None:
+            return record
+        if stored is not None and stored.sums.shape[1] != pending.sums.shape[1]:
+            logger.warning("Dropping centroid updates with a different vector size", collection=collection_name)
+            return record
+        merged, _ = self._merge(stored, pending, self._stored_clusters.get(collection_name, 0))
+        return merged.to_record()
+
+    def mark_flushed(self, records: Dict[str, Optional[CentroidRecord]]) -> None:
+        """Adopt the records written by a flush and clear the additions they include."""
+        for name, record in records.items():
+            self._pending.pop(name, None)
+            clusters = self._from_record(name, record)
+            if clusters is None:
+                # The collection no longer exists in the catalog
+                self.remove(name)
+                continue
+            self._collections[name] = clusters
+            self._stored_clusters[name] = len(clusters.counts)
+        self._matrix_cache = None
+
+    def load_records(self, records: Dict[str, CentroidRecord]) -> None:
+        """Replace the stored centroids with the catalog's, keeping pending additions on top."""
+        for name, record in records.items():
+            stored = self._from_record(name, record)
+            if stored is None:
+                continue
+            pending = self._pending.get(name)
+            if pending is None or pending.sums.shape[1] != stored.sums.shape[1]:
+                self._pending.pop(name, None)
+                self._collections[name] = stored
+            else:
+                view, mapping = self._merge(stored, pending, self._stored_clusters.get(name, 0))
+                # Re-index the pending additions like the new view
+                remapped = _CollectionClusters(self.clusters_per_collection, stored.sums.shape[1])
+                remapped.grow(len(view.counts))
+                used = mapping >= 0
+                np.add.at(remapped.sums, mapping[used], pending.sums[used])
+                np.add.at(remapped.counts, mapping[used], pending.counts[used])
+                self._pending[name] = remapped
+                self._collections[name] = view
+            self._stored_clusters[name] = len(stored.counts)
+        self._matrix_cache = None
+
+    def _from_record(self, collection_name: str, record: Optional[CentroidRecord]) -> Optional[_CollectionClusters]:
+        if record is None:
+            return None
+        try:
+            return _CollectionClusters.from_record(record, self.clusters_per_collection)
+        except ValueError as e:
+            logger.warning("Ignoring unreadable centroid record", collection=collection_name, error=str(e))
+            return None
+
+    def _stacked(self) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        if self._matrix_cache is None:
+            names = [name for name, clusters in self._collections.items() if len(clusters.counts)]
+            owners, blocks = [], []
+            for i, name in enumerate(names):
+                centroids = self._collections[name].centroids()
+                blocks.append(centroids)
+                owners.extend([i] * len(centroids))
+            matrix = np.vstack(blocks) if blocks else np.zeros((0, self.vector_size), dtype=np.float32)
+            self._matrix_cache = (names, np.asarray(owners, dtype=np.int64), matrix)
+        return self._matrix_cache
+
+    def score(self, query_vector: Any, candidates: Optional[Iterable[str]] = None) -> List[Tuple[str, float]]:
+        """
+        Score collections against a vector.
+
+        Args:
+            query_vector: Query (or document) embedding
+            candidates: Restrict scoring to these collections
+
+        Returns:
+            (collection name, best centroid cosine similarity) sorted by score
+        """
+        names, owners, matrix = self._stacked()
+        if not names:
+            return []
+
+        similarities = matrix @ self._normalize(query_vector)[0]
+        best = np.full(len(names), -np.inf, dtype=np.float32)
+        np.maximum.at(best, owners, similarities)
+
+        allowed = set(candidates) if candidates is not None else None
+        scored = [
+            (name, float(best[i])) for i, name in enumerate(names)
+            if allowed is None or name in allowed
+        ]
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored
+
+    def route(self, query_vector: Any,
+              candidates: Optional[Iterable[str]] = None,
+              top_n: int = 3,
+              min_score: float = -1.0) -> List[Tuple[str, Optional[float]]]:
+        """
+        Return the top-N collections for a query by centroid similarity.
+
+        Candidates without centroids (no vectors seen since the catalog was
+        created, e.g. data written before centroids were persisted) cannot
+        be ranked and are always returned after the ranked ones, with a
+        score of None, so their data is never silently skipped.
+        """
+        candidates = list(candidates) if candidates is not None else None
+        routed: List[Tuple[str, Optional[float]]] = [
+            item for item in self.score(query_vector, candidates) if item[1] >= min_score
+        ][:top_n]
+        if candidates is not None:
+            ranked = set(self._stacked()[0])
+            routed.extend((name, None) for name in dict.fromkeys(candidates) if name not in ranked)
+        return routed
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get per-collection centroid counts."""
+        return {
+            name: {
+                "clusters": len(clusters.counts),
+                "vectors_observed": clusters.vector_count,
+                "pending_vectors": self._pending[name].vector_count if name in self._pending else 0,
+            }
+            for name, clusters in self._collections.items()
+        }
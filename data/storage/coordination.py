@@ -0,0 +1,88 @@
+"""
+Worker Coordination
+
+Leader election between API worker processes on one host. Every worker
+shares the cluster catalog, but background maintenance (health polling,
+rebalancing, anti-entropy, catalog reconciliation, auto-scaling) must run
+once per host, not once per worker. The worker holding an exclusive lock
+on a file next to the catalog is the leader; the operating system drops
+the lock when that process exits, and another worker takes over on its
+next attempt.
+"""
+
+import os
+from typing import Optional
+
+from core.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    try:
+        import msvcrt
+    except ImportError:
+        msvcrt = None
+
+
+class LeaderLock:
+    """
+    Non-blocking exclusive file lock marking the leader worker.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialize leader lock.
+
+        Args:
+            path: Lock file (created if missing)
+        """
+        self.path = path
+        self._fd: Optional[int] = None
+
+    @property
+    def is_held(self) -> bool:
+        return self._fd is not None
+
+    def try_acquire(self) -> bool:
+        """
+        Take the lock if no other process holds it.
+
+        Returns:
+            True if this process is (now) the leader
+        """
+        if self._fd is not None:
+            return True
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            elif msvcrt is not None:
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        except OSError:
+            os.close(fd)
+            return False
+
+        # Record the holder for operators; the lock itself is what counts
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd = fd
+        logger.info(f"Worker {os.getpid()} acquired coordinator leadership", lock=self.path)
+        return True
+
+    def release(self) -> None:
+        if self._fd is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            elif msvcrt is not None:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(self._fd)
+            self._fd = None
@@ -7,12 +7,17 @@ multiple distributed nodes for fault tolerance and scalability.
 """
 
 import asyncio
-from typing import List, Dict, Any, Optional
+from collections import defaultdict
+from itertools import islice
+from typing import List, Dict, Any, Optional, Iterable, Iterator
 from sentence_transformers import SentenceTransformer
 import numpy as np
 
 from data.storage.distributed_vector_store import DistributedVectorStore, VectorNode, ConsistencyLevel
+from data.storage.collection_centroids import CollectionCentroids
+from data.storage.embedding_server import RemoteEmbeddingModel
 from core.utils.logging import get_logger
+from core.utils.tracing import span
 from core.models.base import BaseDocument
 from core.models.document import Document
 
@@ -28,10 +33,24 @@ class DistributedStorageManager:
                  replication_factor: int = 2,
                  consistency_level: ConsistencyLevel = ConsistencyLevel.QUORUM,
                  shard_count: int = 8,
-                 vector_size: int = 384):
+                 vector_size: int = 384,
+                 hedge_budget: float = 0.0,
+                 first_wave_shards: int = 0,
+                 catalog_path: Optional[str] = None,
+                 embedding_service_url: Optional[str] = None,
+                 max_shard_vectors: int = 100_000,
+                 max_shard_qps: float = 50.0,
+                 min_shard_vectors: int = 20_000):
         
         self.vector_size = vector_size
-        self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+        # Worker processes share one embedding server instead of loading a model each
+        if embedding_service_url:
+            self.embedding_model = RemoteEmbeddingModel(embedding_service_url)
+        else:
+            self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+        
+        # Per-collection centroids for LLM-free query routing (persisted by the store's catalog)
+        self.collection_centroids = CollectionCentroids(vector_size=vector_size)
         
         # Initialize distributed vector store
         if nodes is None:
@@ -46,7 +65,14 @@ class DistributedStorageManager:
             nodes=nodes,
             replication_factor=replication_factor,
             consistency_level=consistency_level,
-            shard_count=shard_count
+            shard_count=shard_count,
+            hedge_budget=hedge_budget,
+            first_wave_shards=first_wave_shards,
+            catalog_path=catalog_path,
+            max_shard_vectors=max_shard_vectors,
+            max_shard_qps=max_shard_qps,
+            min_shard_vectors=min_shard_vectors,
+            collection_centroids=self.collection_centroids
         )
         
         logger.info(f"Initialized distributed storage with {len(nodes)} nodes")
@@ -60,13 +86,23 @@ class DistributedStorageManager:
             logger.error(f"Error checking if index {index_name} exists: {e}")
             return False
     
-    async def create_index(self, index_name: str, vector_size: Optional[int] = None) -> bool:
-        """Create a new index (collection) in the distributed system."""
+    async def create_index(self, index_name: str, vector_size: Optional[int] = None, base_index: Optional[str] = None) -> bool:
+        """
+        Create a new index (collection) in the distributed system.
+        
+        Args:
+            index_name: Index name
+            vector_size: Vector size (defaults to the embedding size)
+            base_index: If given, create a virtual index stored as a tag in this base index
+        """
         try:
             if vector_size is None:
                 vector_size = self.vector_size
             
-            success = await self.distributed_store.create_collection(index_name, vector_size)
+            if base_index and base_index != index_name:
+                success = await self.distributed_store.create_virtual_collection(index_name, base_index, vector_size)
+            else:
+                success = await self.distributed_store.create_collection(index_name, vector_size)
             if success:
                 logger.info(f"Created distributed index: {index_name}")
             else:
@@ -82,6 +118,7 @@ class DistributedStorageManager:
         """Delete an index from the distributed system."""
         try:
             success = await self.distributed_store.delete_collection(index_name)
+            self.collection_centroids.remove(index_name)
             if success:
                 logger.info(f"Deleted distributed index: {index_name}")
             else:
@@ -143,6 +180,8 @@ class DistributedStorageManager:
             
             # Upsert to distributed system
             success = await self.distributed_store.upsert_vectors(index_name, vectors, base_documents)
+            if success:
+                self.collection_centroids.observe(index_name, vectors)
             
             if success:
                 logger.info(f"Upserted {len(documents)} documents to distributed index: {index_name}")
@@ -155,16 +194,140 @@ class DistributedStorageManager:
             logger.error(f"Error upserting documents to distributed index {index_name}: {e}")
             return False
     
+    def _encode_texts(self, texts: List[str]) -> List[List[float]]:
+        """Embed a batch of texts (blocking; run in an executor from async code)."""
+        embeddings = self.embedding_model.encode(texts, convert_to_tensor=False)
+        return embeddings.tolist() if hasattr(embeddings, 'tolist') else embeddings
+    
+    @staticmethod
+    def _iter_batches(documents: Iterable[BaseDocument], batch_size: int) -> Iterator[List[BaseDocument]]:
+        """Group a document stream into fixed-size batches of non-empty chunks."""
+        iterator = (doc for doc in documents if doc.content)
+        while True:
+            batch = list(islice(iterator, batch_size))
+            if not batch:
+                return
+            yield batch
+    
+    async def upsert_document_stream(self,
+                                     index_names: List[str],
+                                     documents: Iterable[BaseDocument],
+                                     batch_size: int = 64,
+                                     max_in_flight: int = 2) -> Dict[str, int]:
+        """
+        Embed and upsert a stream of documents in fixed-size batches.
+        
+        Each batch is embedded once in a worker thread and written once per
+        physical base index; virtual indexes in ``index_names`` only add tags
+        to that write. Up to ``max_in_flight`` batches may be on the wire
+        while the next batch is being embedded, so network transfer overlaps
+        with embedding compute and memory stays bounded by
+        ``batch_size * max_in_flight`` chunks regardless of document size.
+        
+        Args:
+            index_names: Indexes to store every chunk in
+            documents: Iterable (typically a generator) of chunk documents
+            batch_size: Number of chunks embedded and sent per batch
+            max_in_flight: Maximum number of batches being upserted concurrently
+            
+        Returns:
+            Number of chunks successfully stored per index
+        """
+        stored: Dict[str, int] = {name: 0 for name in index_names}
+        if not index_names:
+            return stored
+        
+        # Store once per base index; virtual indexes become tags on that write
+        names_by_base: Dict[str, List[str]] = defaultdict(list)
+        for index_name in index_names:
+            names_by_base[self.distributed_store.resolve_collection(index_name)].append(index_name)
+        
+        loop = asyncio.get_running_loop()
+        pending: Dict[asyncio.Task, tuple] = {}
+        
+        async def drain(return_when):
+            done, _ = await asyncio.wait(list(pending), return_when=return_when)
+            for task in done:
+                names, count, vectors = pending.pop(task)
+                try:
+                    if task.result():
+                        for index_name in names:
+                            stored[index_name] += count
+                            self.collection_centroids.observe(index_name, vectors)
+                    else:
+                        logger.warning(f"Failed to upsert batch of {count} chunks to {names}")
+                except Exception as e:
+                    logger.error(f"Error upserting batch to {names}: {e}")
+        
+        for batch in self._iter_batches(documents, batch_size):
+            # Embedding runs off the event loop so in-flight upserts keep progressing
+            vectors = await loop.run_in_executor(None, self._encode_texts, [doc.content for doc in batch])
+            
+            for base_index, names in names_by_base.items():
+                tags = [name for name in names if name != base_index]
+                task = asyncio.create_task(
+                    self.distributed_store.upsert_vectors(base_index, vectors, batch, tags=tags)
+                )
+                pending[task] = (names, len(batch), vectors)
+            
+            # Backpressure: never hold more than max_in_flight batches per base index
+            while len(pending) >= max_in_flight * len(names_by_base):
+                await drain(asyncio.FIRST_COMPLETED)
+        
+        if pending:
+            await drain(asyncio.ALL_COMPLETED)
+        
+        logger.info(f"Streamed chunks to distributed indexes: {stored}")
+        return stored
+    
+    async def embed_query(self, query: str) -> List[float]:
+        """Embed a single query without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        with span("embed", texts=1):
+            vectors = await loop.run_in_executor(None, self._encode_texts, [query])
+        return vectors[0]
+    
+    async def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Embed many queries in one encoder batch without blocking the event loop."""
+        if not queries:
+            return []
+        loop = asyncio.get_running_loop()
+        with span("embed", texts=len(queries)):
+            return await loop.run_in_executor(None, self._encode_texts, list(queries))
+    
+    def route_query(self,
+                    query_vector: List[float],
+                    candidates: Optional[List[str]] = None,
+                    top_n: int = 3,
+                    min_score: float = -1.0) -> List[Dict[str, Any]]:
+        """
+        Pick the collections whose centroids are closest to a query vector.
+        
+        Args:
+            query_vector: Query embedding
+            candidates: Collections eligible for routing (all known collections if None)
+            top_n: Maximum number of collections to return
+            min_score: Minimum centroid cosine similarity
+            
+        Returns:
+            List of {"name", "score"} dicts, best first
+        """
+        routed = self.collection_centroids.route(query_vector, candidates, top_n, min_score)
+        return [{"name": name, "score": score} for name, score in routed]
+    
     async def search_documents(self, 
                              index_name: str, 
                              query: str, 
                              limit: int = 10, 
-                             score_threshold: float = 0.0) -> List[Dict[str, Any]]:
+                             score_threshold: float = 0.0,
+                             query_vector: Optional[List[float]] = None) -> List[Dict[str, Any]]:
         """Search documents in the distributed system."""
         try:
-            # Generate query embedding
-            query_embedding = self.embedding_model.encode([query], convert_to_tensor=False)
-            query_vector = query_embedding[0].tolist() if hasattr(query_embedding[0], 'tolist') else query_embedding[0]
+            # Generate query embedding unless the caller already has one
+            if query_vector is None:
+                with span("embed", texts=1):
+                    query_embedding = self.embedding_model.encode([query], convert_to_tensor=False)
+                query_vector = query_embedding[0].tolist() if hasattr(query_embedding[0], 'tolist') else query_embedding[0]
             
             # Search in distributed system
             results = await self.distributed_store.search_vectors(
@@ -181,6 +344,74 @@ class DistributedStorageManager:
             logger.error(f"Error searching distributed index {index_name}: {e}")
             return []
     
+    async def search_across_indexes(self,
+                                    index_names: List[str],
+                                    query: str,
+                                    limit: int = 10,
+                                    score_threshold: float = 0.0,
+                                    query_vector: Optional[List[float]] = None) -> List[Dict[str, Any]]:
+        """
+        Search several indexes in one pass.
+        
+        Virtual indexes sharing a base index are searched with a single
+        filtered scan, and a chunk that belongs to several of the indexes is
+        returned once.
+        """
+        try:
+            if query_vector is None:
+                query_vector = await self.embed_query(query)
+            
+            results = await self.distributed_store.search_collections(
+                index_names,
+                query_vector,
+                limit,
+                score_threshold
+            )
+            
+            logger.info(f"Found {len(results)} results across distributed indexes: {index_names}")
+            return results
+            
+        except Exception as e:
+            logger.error(f"Error searching distributed indexes {index_names}: {e}")
+            return []
+    
+    async def search_batch(self,
+                           index_names: List[str],
+                           queries: List[str],
+                           limit: int = 10,
+                           score_threshold: float = 0.0,
+                           query_vectors: Optional[List[List[float]]] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Search several indexes for many queries in one pass.
+        
+        Args:
+            index_names: Indexes to search
+            queries: Query texts
+            limit: Results per query
+            score_threshold: Minimum score
+            query_vectors: Precomputed query embeddings (embedded in one batch if None)
+            
+        Returns:
+            Per query, results ranked by score
+        """
+        try:
+            if query_vectors is None:
+                query_vectors = await self.embed_queries(queries)
+            
+            results = await self.distributed_store.search_collections_batch(
+                index_names,
+                query_vectors,
+                limit,
+                score_threshold
+            )
+            
+            logger.info(f"Searched {len(queries)} queries across distributed indexes: {index_names}")
+            return results
+            
+        except Exception as e:
+            logger.error(f"Error batch searching distributed indexes {index_names}: {e}")
+            return [[] for _ in queries]
+    
     async def get_document_by_id(self, index_name: str, document_id: str) -> Optional[Dict[str, Any]]:
         """Get a specific document by ID from the distributed system."""
         try:
@@ -229,6 +460,14 @@ class DistributedStorageManager:
                 "total_vectors": 0
             }
     
+    def get_performance_metrics(self) -> Dict[str, Any]:
+        """Measured search latency, throughput and error rates over the metrics window."""
+        try:
+            return self.distributed_store.get_performance_metrics()
+        except Exception as e:
+            logger.error(f"Error getting performance metrics: {e}")
+            return {"error": str(e)}
+    
     async def health_check(self) -> bool:
         """Check if the distributed system is healthy."""
         try:
@@ -262,6 +501,103 @@ class DistributedStorageManager:
         except Exception as e:
             logger.error(f"Error removing node {node_id}: {e}")
             return False
+    async def reconcile_catalog(self) -> Dict[str, Any]:
+        """Reconcile the cluster catalog with the shards the nodes hold."""
+        try:
+            return await self.distributed_store.reconcile_catalog()
+        except Exception as e:
+            logger.error(f"Error reconciling cluster catalog: {e}")
+            return {"error": str(e)}
+    
+    @property
+    def is_leader(self) -> bool:
+        """Whether this worker runs the cluster's background tasks."""
+        return self.distributed_store.is_leader
+    
+    def flush_catalog(self) -> bool:
+        """Write buffered vector counts and routing centroids to the cluster catalog."""
+        try:
+            self.distributed_store.flush_catalog()
+            return True
+        except Exception as e:
+            logger.error(f"Error flushing cluster catalog: {e}")
+            return False
+    
+    def deregister_worker(self) -> bool:
+        """Leave the catalog's worker list so migrations stop waiting for this worker."""
+        try:
+            self.distributed_store.deregister_worker()
+            return True
+        except Exception as e:
+            logger.error(f"Error deregistering worker: {e}")
+            return False
+    
+    def get_shared_setting(self, key: str, default: Any = None) -> Any:
+        """Read a setting shared by every API worker."""
+        try:
+            return self.distributed_store.get_shared_setting(key, default)
+        except Exception as e:
+            logger.error(f"Error reading shared setting {key}: {e}")
+            return default
+    
+    def set_shared_setting(self, key: str, value: Any) -> bool:
+        try:
+            self.distributed_store.set_shared_setting(key, value)
+            return True
+        except Exception as e:
+            logger.error(f"Error writing shared setting {key}: {e}")
+            return False
+    
+    def claim_collection_names(self, names: List[str], vector: List[float], threshold: float) -> List[str]:
+        """Agree with the other API workers on names for a new topic collection."""
+        try:
+            return self.distributed_store.claim_collection_names(names, vector, threshold)
+        except Exception as e:
+            logger.error(f"Error claiming collection names {names}: {e}")
+            return names
+    
+    def plan_shard_movement(self) -> List[Dict[str, Any]]:
+        """Preview the shard moves needed to match the current hash ring."""
+        try:
+            return self.distributed_store.plan_shard_movement()
+        except Exception as e:
+            logger.error(f"Error planning shard movement: {e}")
+            return []
+    
+    async def plan_rebalance(self) -> Dict[str, Any]:
+        """Dry-run the next load rebalance cycle."""
+        try:
+            plan = await self.distributed_store.plan_rebalance()
+            return plan.to_dict()
+        except Exception as e:
+            logger.error(f"Error planning rebalance: {e}")
+            return {"error": str(e), "moves": []}
+    
+    async def plan_shard_ranges(self) -> Dict[str, Any]:
+        """Dry-run the next cycle of shard splits and merges."""
+        try:
+            changes = await self.distributed_store.plan_shard_ranges()
+            return {"changes": [change.to_dict() for change in changes]}
+        except Exception as e:
+            logger.error(f"Error planning shard splits and merges: {e}")
+            return {"error": str(e), "changes": []}
+    
+    async def split_shard(self, shard_id: str) -> bool:
+        """Split a hash-range shard into two halves online."""
+        try:
+            return await self.distributed_store.split_shard(shard_id)
+        except Exception as e:
+            logger.error(f"Error splitting shard {shard_id}: {e}")
+            return False
+    
+    async def migrate_shards_from_node(self, node_id: str) -> bool:
+        """Move every replica off a node so it can be removed without losing data."""
+        try:
+            return await self.distributed_store.migrate_shards_from_node(node_id)
+        except Exception as e:
+            logger.error(f"Error migrating shards from node {node_id}: {e}")
+            return False
+    
     async def rebalance_shards(self) -> bool:
         """Trigger shard redistribution across the cluster."""
         try:
@@ -277,7 +613,14 @@ def create_distributed_storage_manager(
     replication_factor: int = 2,
     consistency_level: str = "quorum",
     shard_count: int = 8,
-    vector_size: int = 384
+    vector_size: int = 384,
+    hedge_budget: float = 0.0,
+    first_wave_shards: int = 0,
+    catalog_path: Optional[str] = None,
+    embedding_service_url: Optional[str] = None,
+    max_shard_vectors: int = 100_000,
+    max_shard_qps: float = 50.0,
+    min_shard_vectors: int = 20_000
 ) -> DistributedStorageManager:
     """Create a distributed storage manager with the specified configuration."""
     
@@ -294,5 +637,12 @@ def create_distributed_storage_manager(
         replication_factor=replication_factor,
         consistency_level=consistency_enum,
         shard_count=shard_count,
-        vector_size=vector_size
+        vector_size=vector_size,
+        hedge_budget=hedge_budget,
+        first_wave_shards=first_wave_shards,
+        catalog_path=catalog_path,
+        embedding_service_url=embedding_service_url,
+        max_shard_vectors=max_shard_vectors,
+        max_shard_qps=max_shard_qps,
+        min_shard_vectors=min_shard_vectors
     ) 
\ No newline at end of file
@@ -10,10 +10,12 @@ A custom distributed vector storage implementation with:
 """
 
 import asyncio
-import hashlib
+import heapq
 import json
+import math
+import os
 import time
-from typing import List, Dict, Any, Optional, Tuple, Set
+from typing import List, Dict, Any, Optional, Tuple, Set, Callable, Awaitable
 from dataclasses import dataclass, asdict
 from enum import Enum
 import aiohttp
@@ -21,13 +23,35 @@ import numpy as np
 from collections import defaultdict
 import random
 import statistics
+import uuid
 
 from core.utils.logging import get_logger
 from core.utils.metrics import metrics_collector
+from core.utils.tracing import span
 from core.models.base import BaseDocument
+from data.storage.hash_ring import HashRing, ShardMove
+from data.storage.shard_transfer import ShardTransferManager
+from data.storage.rebalance_planner import RebalancePlanner, RebalancePlan, ShardLoad, RebalanceMove
+from data.storage.replication import ReplicationLog, ReplicationEntry
+from data.storage.anti_entropy import AntiEntropyRepairer
+from data.storage.replica_selector import ReplicaSelector
+from data.storage.hedging import HedgePolicy
+from data.storage.circuit_breaker import CircuitBreakerRegistry, BreakerState
+from data.storage.shard_segment import encode_matrix
+from data.storage.cluster_catalog import ClusterCatalog, CatalogSnapshot, CatalogShard
+from data.storage.coordination import LeaderLock
+from data.storage.cluster_metrics import ClusterMetrics
+from data.storage.collection_centroids import CollectionCentroids
+from data.storage.shard_ranges import (
+    ShardState, RangeRouter, ShardRangePlanner, RangeChange, RangeShardLoad, LEGACY_SHARD_COUNT,
+    initial_ranges, range_shard_id, parse_shard_range, shard_sort_key, select_cover
+)
 
 logger = get_logger(__name__)
 
+# Answer of one shard in the first search phase: (answering node, [[document_id, score(, tags)], ...])
+ShardHits = Tuple[str, List[List[Any]]]
+
 class NodeStatus(Enum):
     HEALTHY = "healthy"
     UNHEALTHY = "unhealthy"
@@ -49,10 +73,22 @@ class VectorNode:
     load: float = 0.0  # Current load (0.0 to 1.0)
     vector_count: int = 0
     collections: Optional[Set[str]] = None
+    weight: float = 1.0  # Relative share of the hash ring
+    tags: Optional[Dict[str, str]] = None  # e.g. {"zone": "us-east-1a"}
+    # Resource utilization (0.0 to 1.0) reported by the node's health endpoint
+    cpu_usage: Optional[float] = None
+    memory_usage: Optional[float] = None
+    storage_usage: Optional[float] = None
     
     def __post_init__(self):
         if self.collections is None:
             self.collections = set()
+        if self.tags is None:
+            self.tags = {}
+    
+    @property
+    def zone(self) -> Optional[str]:
+        return self.tags.get("zone")
     
     @property
     def url(self) -> str:
@@ -67,7 +103,12 @@ class VectorNode:
             "last_heartbeat": self.last_heartbeat,
             "load": self.load,
             "vector_count": self.vector_count,
-            "collections": list(self.collections)
+            "collections": list(self.collections),
+            "weight": self.weight,
+            "tags": dict(self.tags),
+            "cpu_usage": self.cpu_usage,
+            "memory_usage": self.memory_usage,
+            "storage_usage": self.storage_usage
         }
 
 @dataclass
@@ -80,6 +121,9 @@ class VectorShard:
     replica_nodes: List[str]
     vector_count: int = 0
     created_at: float = 0.0
+    epoch: int = 0  # Bumped on every placement change
+    state: str = ShardState.ACTIVE
+    pinned: bool = False  # Placed by the load rebalancer; the ring keeps its live holders
     
     def __post_init__(self):
         if self.created_at == 0.0:
@@ -94,18 +138,86 @@ class DistributedVectorStore:
                  nodes: Optional[List[VectorNode]] = None,
                  replication_factor: int = 2,
                  consistency_level: ConsistencyLevel = ConsistencyLevel.QUORUM,
-                 shard_count: int = 8):
+                 shard_count: int = 8,
+                 hedge_budget: float = 0.0,
+                 first_wave_shards: int = 0,
+                 catalog_path: Optional[str] = None,
+                 max_shard_vectors: int = 100_000,
+                 max_shard_qps: float = 50.0,
+                 min_shard_vectors: int = 20_000,
+                 collection_centroids: Optional[CollectionCentroids] = None):
         self.nodes: Dict[str, VectorNode] = {}
         self.shards: Dict[str, VectorShard] = {}
+        self.ring = HashRing()
+        self.transfer_manager = ShardTransferManager(self._call_node)
+        self.rebalance_planner = RebalancePlanner()
+        # Shards being copied -> target nodes that also receive new writes until cutover
+        self.migrating_shards: Dict[str, Set[str]] = defaultdict(set)
+        # Delivers quorum-acknowledged writes to the remaining replicas
+        self.replication_log = ReplicationLog(self._replicate_to_node)
+        # Compares replica digests and copies only the rows they disagree on
+        self.anti_entropy = AntiEntropyRepairer(self._call_node)
+        self.anti_entropy_interval = 30  # seconds
+        # Routes shard reads by live latency and in-flight counts
+        self.replica_selector = ReplicaSelector()
+        # Re-sends shard reads slower than p95 to a second replica (0 disables)
+        self.hedge_policy = HedgePolicy(budget=hedge_budget)
+        # Ejects nodes on failed or outlier-slow RPCs between health polls
+        self.circuit_breakers = CircuitBreakerRegistry(on_state_change=self._on_breaker_state_change)
+        # Rolling-window RPC and query metrics per node, shard and collection
+        self.cluster_metrics = ClusterMetrics()
+        self.connect_timeout = 2.0  # seconds
+        # Shards in the first search wave; later waves get the k-th score as a bound (0 = one wave)
+        self.first_wave_shards = first_wave_shards
         self.collections: Dict[str, List[str]] = defaultdict(list)
+        # Virtual (topical) collections are tags over a physical base collection
+        self.virtual_collections: Dict[str, str] = {}  # virtual name -> base collection
+        self.virtual_counts: Dict[str, int] = defaultdict(int)
+        # Routing centroids per collection, persisted in the catalog
+        self.collection_centroids = collection_centroids or CollectionCentroids()
         self.replication_factor = replication_factor
         self.consistency_level = consistency_level
+        # Hash ranges a new collection starts with; ranges then split and merge with load
         self.shard_count = shard_count
+        self.range_planner = ShardRangePlanner(max_shard_vectors=max_shard_vectors, max_shard_qps=max_shard_qps,
+                                               min_shard_vectors=min_shard_vectors)
+        # Seconds retired shards keep their data after a cutover, for in-flight requests
+        self.range_change_grace = 5.0
+        self._range_changing: Set[str] = set()  # Source and target shards of running splits and merges
+        self.range_stats = {"splits": 0, "merges": 0, "aborted": 0, "last_change": None}
+        self._routers: Dict[str, Tuple[Tuple[str, ...], RangeRouter]] = {}
         
-        # Add initial nodes
+        # Durable collections and shard placement, so a restart keeps routing to existing data.
+        # The catalog is also how API worker processes on one host share cluster state.
+        self.catalog = ClusterCatalog(catalog_path) if catalog_path else None
+        self.catalog_flush_interval = 5  # seconds
+        self.catalog_sync_interval = 1.0  # seconds
+        # This worker's heartbeat and sync barrier acknowledgements in the catalog
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.worker_timeout = 3 * self.catalog_flush_interval  # seconds without a heartbeat before a worker is gone
+        self.barrier_timeout = 30.0  # seconds to wait for every worker to apply a migration
+        self._acked_barrier = 0
+        self.topic_claim_ttl = 600.0  # seconds a new topic name claim is kept
+        self.last_reconcile: Optional[Dict[str, Any]] = None
+        self._reconcile_lock = asyncio.Lock()
+        self._redistribute_lock = asyncio.Lock()  # One ring plan runs at a time
+        self._catalog_version: Optional[int] = None
+        self._last_catalog_flush = time.monotonic()
+        # Shard copies announced by other workers -> targets to mirror writes to
+        self.shared_migrations: Dict[str, Set[str]] = {}
+        self._local_settings: Dict[str, Any] = {}
+        # One worker per host runs the background loops; without a catalog this process is alone
+        self.leader_lock = LeaderLock(f"{catalog_path}.leader") if catalog_path else None
+        if self.leader_lock:
+            self.leader_lock.try_acquire()
+        self._leader_tasks_started = False
+        
+        # Add initial nodes; placement comes from the catalog, so no redistribution
         if nodes:
             for node in nodes:
-                self.add_node(node)
+                self.add_node(node, redistribute=False)
+        if self.catalog:
+            self._sync_from_catalog(initial=True)
         
         # Load balancer state
         self.current_node_index = 0
@@ -115,36 +227,76 @@ class DistributedVectorStore:
         # Start background tasks
         self._start_background_tasks()
     
+    @property
+    def is_leader(self) -> bool:
+        """Whether this process runs the cluster's background loops."""
+        return self.leader_lock is None or self.leader_lock.is_held
+    
     def _start_background_tasks(self):
         """Start background tasks for health monitoring and load balancing."""
+        if self.catalog:
+            asyncio.create_task(self._catalog_sync_loop())
+        if self.is_leader:
+            self._start_leader_tasks()
+    
+    def _start_leader_tasks(self):
+        """Start the loops that must run once per host."""
+        if self._leader_tasks_started:
+            return
+        self._leader_tasks_started = True
         asyncio.create_task(self._health_monitor_loop())
         asyncio.create_task(self._load_balancer_loop())
+        asyncio.create_task(self._anti_entropy_loop())
+        if self.catalog:
+            asyncio.create_task(self.reconcile_catalog())
     
-    def add_node(self, node: VectorNode):
-        """Add a new node to the cluster."""
+    def add_node(self, node: VectorNode, redistribute: bool = True, persist: bool = True):
+        """
+        Add a new node to the cluster.
+        
+        Args:
+            node: Node to add
+            redistribute: Move the shards the node now owns on the ring to it
+            persist: Record the node in the shared catalog
+        """
         self.nodes[node.id] = node
+        self.ring.add_node(node.id, weight=node.weight, host=node.host, zone=node.zone)
+        if persist and self.catalog:
+            self.catalog.save_node(node.id, node.host, node.port, node.weight, node.tags)
         logger.info(f"Added node {node.id} at {node.url}")
         
-        # Perform immediate health check
-        asyncio.create_task(self._check_single_node_health(node))
-        
-        # Redistribute shards if needed
-        asyncio.create_task(self._redistribute_shards())
+        # Health check first so the new node can receive its shards right away
+        asyncio.create_task(self._join_node(node, redistribute))
+    
+    async def _join_node(self, node: VectorNode, redistribute: bool = True):
+        """Check a new node's health, then move the shards it now owns."""
+        await self._check_single_node_health(node)
+        # Followers leave shard movement to the leader, which sees the node through the catalog
+        if redistribute and self.is_leader:
+            await self._redistribute_shards()
     
-    def remove_node(self, node_id: str):
+    def remove_node(self, node_id: str, persist: bool = True):
         """Remove a node from the cluster."""
         if node_id in self.nodes:
             node = self.nodes.pop(node_id)
+            self.ring.remove_node(node_id)
+            self.replication_log.drop_node(node_id)
+            self.replica_selector.forget(node_id)
+            self.circuit_breakers.forget(node_id)
+            if persist and self.catalog:
+                self.catalog.delete_node(node_id)
             logger.info(f"Removed node {node_id}")
             
             # Redistribute shards from removed node
-            asyncio.create_task(self._redistribute_shards())
+            if self.is_leader:
+                asyncio.create_task(self._redistribute_shards())
     
     async def _health_monitor_loop(self):
         """Background task to monitor node health."""
         while True:
             try:
                 await self._check_node_health()
+                self._publish_node_health()
                 await asyncio.sleep(self.node_health_check_interval)
             except Exception as e:
                 logger.error(f"Health monitor error: {e}")
@@ -159,130 +311,1037 @@ class DistributedVectorStore:
     
     async def _check_single_node_health(self, node: VectorNode):
         """Check health of a single node."""
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f"{node.url}/health", timeout=5) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        node.status = NodeStatus.HEALTHY
-                        node.last_heartbeat = time.time()
-                        node.load = data.get("load", 0.0)
-                        node.vector_count = data.get("vector_count", 0)
-                    else:
-                        node.status = NodeStatus.UNHEALTHY
-        except Exception as e:
-            logger.warning(f"Node {node.id} health check failed: {e}")
+        # Polls bypass the breaker so an ejected node is still observed
+        data = await self._call_node(node, "GET", "/health", timeout=5, bypass_breaker=True)
+        if data is None:
+            node.status = NodeStatus.UNHEALTHY
+            return
+        node.last_heartbeat = time.time()
+        node.load = data.get("load", 0.0)
+        node.vector_count = data.get("vector_count", 0)
+        resources = data.get("resources") or {}
+        node.cpu_usage = resources.get("cpu")
+        node.memory_usage = resources.get("memory")
+        node.storage_usage = resources.get("storage")
+        # An ejected node stays out of routing until its breaker closes
+        node.status = (NodeStatus.HEALTHY if self.circuit_breakers.is_available(node.id)
+                       else NodeStatus.UNHEALTHY)
+    
+    def _on_breaker_state_change(self, node_id: str, old: BreakerState, new: BreakerState):
+        """Feed breaker transitions into routing without waiting for the next health poll."""
+        node = self.nodes.get(node_id)
+        if node is None:
+            return
+        if new == BreakerState.OPEN:
             node.status = NodeStatus.UNHEALTHY
+        elif new == BreakerState.HALF_OPEN:
+            node.status = NodeStatus.UNKNOWN  # Routable again so a probe can reach it
+        else:
+            node.status = NodeStatus.HEALTHY
+    
+    async def _call_node(self,
+                         node: VectorNode,
+                         method: str,
+                         path: str,
+                         payload: Optional[Dict[str, Any]] = None,
+                         params: Optional[Dict[str, Any]] = None,
+                         timeout: float = 30.0,
+                         bypass_breaker: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Send an RPC to a node through its circuit breaker.
+        
+        Args:
+            node: Target node
+            method: HTTP method
+            path: Request path on the node
+            payload: JSON body
+            params: Query parameters
+            timeout: Total timeout in seconds
+            bypass_breaker: Send even if the breaker is open, and do not record the outcome
+                (in the breaker or in ``cluster_metrics``)
+        
+        Returns:
+            Parsed JSON body for HTTP 200, None otherwise (including fast-fail)
+        """
+        # Shard-scoped RPCs (searches, writes) carry their shard in the body
+        shard_id = payload.get("shard_id") if isinstance(payload, dict) else None
+        shard = self.shards.get(shard_id) if shard_id else None
+        collection = shard.collection_name if shard else None
+        operation = path.strip("/").split("/")[0]
+        
+        def record(latency: Optional[float], error: bool, bytes_sent: int = 0, bytes_received: int = 0) -> None:
+            if not bypass_breaker:
+                self.cluster_metrics.record_rpc(node.id, operation, latency, error, bytes_sent, bytes_received,
+                                                shard_id=shard_id, collection=collection)
+        
+        with span("rpc", node=node.id, method=method, path=path) as rpc_span:
+            if not bypass_breaker and not self.circuit_breakers.allow(node.id):
+                rpc_span.set(fast_fail=True)
+                record(None, True)
+                return None
+            
+            # Serialized here (instead of by aiohttp) to measure the bytes sent
+            data = json.dumps(payload).encode() if payload is not None else None
+            rpc_span.set(request_bytes=len(data) if data is not None else 0)
+            
+            started = time.monotonic()
+            client_timeout = aiohttp.ClientTimeout(total=timeout, connect=min(self.connect_timeout, timeout))
+            try:
+                async with aiohttp.ClientSession(timeout=client_timeout) as session:
+                    async with session.request(
+                        method, f"{node.url}{path}",
+                        data=data,
+                        headers={"Content-Type": "application/json"} if data is not None else None,
+                        params=params
+                    ) as response:
+                        rpc_span.set(status=response.status)
+                        if response.status >= 500:
+                            raise RuntimeError(f"HTTP {response.status}")
+                        raw = await response.read() if response.status == 200 else b""
+                        rpc_span.set(response_bytes=len(raw))
+                        body = json.loads(raw) if raw else None
+                latency = time.monotonic() - started
+                if not bypass_breaker:
+                    # 4xx still means the node is up and answering
+                    self.circuit_breakers.record_success(node.id, latency)
+                record(latency, False, len(data or b""), len(raw))
+                return body
+            except asyncio.CancelledError:
+                # A hedged read's losing replica: neither a success nor a failure
+                if not bypass_breaker:
+                    self.circuit_breakers.release(node.id)
+                raise
+            except Exception as e:
+                if not bypass_breaker:
+                    self.circuit_breakers.record_failure(node.id, str(e) or type(e).__name__)
+                record(time.monotonic() - started, True, len(data or b""))
+                rpc_span.set(failure=str(e) or type(e).__name__)
+                logger.warning(f"{method} {path} failed on node {node.id}: {e}")
+                return None
     
     async def _load_balancer_loop(self):
         """Background task for load balancing."""
         while True:
             try:
+                # Retries ring moves deferred by an unhealthy target or a running split
+                await self._redistribute_shards()
+                await self._balance_shard_ranges()
                 await self._balance_load()
                 await asyncio.sleep(60)  # Balance every minute
             except Exception as e:
                 logger.error(f"Load balancer error: {e}")
     
     async def _balance_load(self):
-        """Balance load across nodes."""
-        healthy_nodes = [n for n in self.nodes.values() if n.status == NodeStatus.HEALTHY]
-        if len(healthy_nodes) < 2:
+        """Run one bounded rebalance cycle based on measured shard size and QPS."""
+        plan = await self.plan_rebalance()
+        if not plan.moves:
+            return
+        
+        logger.info(f"Rebalancing: {len(plan.moves)} moves, {plan.bytes_planned} bytes",
+                     max_load_before=plan.max_load_before, max_load_after=plan.max_load_after)
+        for move in plan.moves:
+            await self._apply_rebalance_move(move)
+    
+    async def _anti_entropy_loop(self):
+        """Background task comparing replicas and repairing divergence."""
+        while True:
+            try:
+                await asyncio.sleep(self.anti_entropy_interval)
+                await self._run_anti_entropy()
+            except Exception as e:
+                logger.error(f"Anti-entropy error: {e}")
+    
+    async def _catalog_sync_loop(self):
+        """
+        Background task run by every worker: flush vector counts, pick up
+        other workers' catalog changes, and take over leadership if the
+        leader exits.
+        """
+        while True:
+            try:
+                await asyncio.sleep(self.catalog_sync_interval)
+                if not self.is_leader and self.leader_lock.try_acquire():
+                    self._start_leader_tasks()
+                if time.monotonic() - self._last_catalog_flush >= self.catalog_flush_interval:
+                    self._last_catalog_flush = time.monotonic()
+                    self.flush_catalog()
+                self._sync_from_catalog()
+            except Exception as e:
+                logger.error(f"Catalog sync error: {e}")
+    
+    def _sync_from_catalog(self, initial: bool = False):
+        """Apply the catalog's state if another worker (or a previous run) changed it."""
+        version = self.catalog.data_version()
+        if version == self._catalog_version and not initial:
+            return
+        self._catalog_version = version
+        try:
+            snapshot = self.catalog.load()
+        except Exception as e:
+            logger.error(f"Failed to load cluster catalog {self.catalog.path}: {e}")
+            return
+        
+        self._apply_catalog_nodes(snapshot, initial)
+        self._apply_catalog_placement(snapshot)
+        self._apply_stale_replicas(snapshot.stale_replicas)
+        self.collection_centroids.load_records(snapshot.centroids)
+        # Acknowledge only after the snapshot is applied, so writes from now on mirror its migrations
+        if initial or snapshot.barrier > self._acked_barrier:
+            self._acked_barrier = max(self._acked_barrier, snapshot.barrier)
+            self.catalog.heartbeat_worker(self.worker_id, self._acked_barrier)
+        if initial:
+            logger.info(f"Loaded cluster catalog {self.catalog.path}", collections=len(snapshot.collections),
+                        virtual_collections=len(snapshot.virtual_collections), shards=len(snapshot.shards),
+                        centroids=len(snapshot.centroids), leader=self.is_leader)
+    
+    def _apply_catalog_nodes(self, snapshot: CatalogSnapshot, initial: bool):
+        """Match membership to the catalog; followers also take the leader's health view."""
+        catalog_nodes = {entry.node_id: entry for entry in snapshot.nodes}
+        for node_id, entry in catalog_nodes.items():
+            if node_id not in self.nodes:
+                node = VectorNode(entry.node_id, entry.host, entry.port, weight=entry.weight, tags=dict(entry.tags))
+                self.add_node(node, redistribute=not initial and self.is_leader, persist=False)
+        if not initial:
+            for node_id in [n for n in self.nodes if n not in catalog_nodes]:
+                self.remove_node(node_id, persist=False)
+        
+        if self.is_leader:
+            return  # The leader's own health checks are authoritative
+        for node_id, entry in catalog_nodes.items():
+            node = self.nodes.get(node_id)
+            if node is None or entry.last_heartbeat <= node.last_heartbeat:
+                continue
+            node.last_heartbeat = entry.last_heartbeat
+            node.load = entry.load
+            node.vector_count = entry.vector_count
+            # A locally ejected node stays out of routing until this worker's breaker closes
+            if self.circuit_breakers.is_available(node_id):
+                node.status = NodeStatus(entry.status)
+    
+    def _apply_catalog_placement(self, snapshot: CatalogSnapshot):
+        """Replace collections, shard placement and counts with the catalog's (pending shards are not routed)."""
+        collections: Dict[str, List[str]] = {name: [] for name in snapshot.collections}
+        seen = set()
+        for entry in snapshot.shards:
+            if not entry.node_ids:
+                continue
+            seen.add(entry.shard_id)
+            shard = self.shards.get(entry.shard_id)
+            if shard is None:
+                shard = VectorShard(
+                    id=entry.shard_id,
+                    collection_name=entry.collection_name,
+                    node_ids=entry.node_ids,
+                    primary_node=entry.node_ids[0],
+                    replica_nodes=entry.node_ids[1:],
+                    created_at=entry.created_at,
+                    state=entry.state,
+                    pinned=entry.pinned
+                )
+                self.shards[entry.shard_id] = shard
+            elif entry.epoch >= shard.epoch:
+                # Update in place; in-flight requests may hold the shard object
+                shard.node_ids = entry.node_ids
+                shard.primary_node = entry.node_ids[0]
+                shard.replica_nodes = entry.node_ids[1:]
+                shard.state = entry.state
+                shard.pinned = entry.pinned
+            shard.epoch = max(shard.epoch, entry.epoch)
+            shard.vector_count = entry.vector_count
+            if shard.state == ShardState.ACTIVE:
+                collections.setdefault(entry.collection_name, []).append(entry.shard_id)
+        
+        for shard_id in [sid for sid in self.shards if sid not in seen]:
+            del self.shards[shard_id]
+        for shard_ids in collections.values():
+            shard_ids.sort(key=shard_sort_key)
+        self.collections.clear()
+        self.collections.update(collections)
+        self.virtual_collections.clear()
+        self.virtual_collections.update(snapshot.virtual_collections)
+        self.virtual_counts.clear()
+        self.virtual_counts.update(snapshot.virtual_counts)
+        self.shared_migrations = {shard_id: set(targets) for shard_id, targets in snapshot.migrations.items()}
+    
+    def _apply_stale_replicas(self, states: Dict[Tuple[str, str], str]):
+        """Take the replicas any worker marked stale, and those the leader is repairing."""
+        self.replication_log.set_shared_stale(
+            [key for key, state in states.items() if state == "stale"],
+            [key for key, state in states.items() if state == "repairing"]
+        )
+    
+    def _publish_stale_marks(self):
+        """Share the replicas this worker's replication queues dropped writes for."""
+        if not self.catalog:
+            return
+        marks = self.replication_log.take_stale_marks()
+        if not marks:
             return
+        try:
+            self.catalog.mark_stale_replicas(marks)
+        except Exception as e:
+            logger.error(f"Failed to publish stale replicas: {e}")
+            for (node_id, shard_id), marked_at in marks.items():
+                self.replication_log.mark_stale(node_id, shard_id, marked_at)
+    
+    def flush_catalog(self):
+        """Write buffered vector counts, centroid additions and this worker's metrics window to the catalog."""
+        if not self.catalog:
+            return
+        self.catalog.flush()
+        self.catalog.heartbeat_worker(self.worker_id, self._acked_barrier)
+        self.catalog.save_worker_metrics(self.worker_id, json.dumps(self.cluster_metrics.export_state()))
+        self._publish_stale_marks()
+        pending = self.collection_centroids.pending_collections()
+        if pending:
+            merged = self.catalog.merge_centroids(pending, self.collection_centroids.merge_record)
+            self.collection_centroids.mark_flushed(merged)
+    
+    def _metrics_window(self) -> Dict[str, Any]:
+        """
+        This worker's metrics window merged with the windows the other API
+        workers published (as of their last catalog flush).
+        """
+        others = []
+        if self.catalog:
+            try:
+                states = self.catalog.load_worker_metrics(self.cluster_metrics.window_seconds)
+                others = [json.loads(state) for worker_id, state in states.items() if worker_id != self.worker_id]
+            except Exception as e:
+                logger.warning(f"Failed to load other workers' metrics: {e}")
+        return self.cluster_metrics.snapshot(others=others)
+    
+    def deregister_worker(self):
+        """Stop counting this worker in sync barriers, e.g. on shutdown."""
+        if self.catalog:
+            self.catalog.remove_worker(self.worker_id)
+    
+    async def _wait_for_workers(self, reason: str) -> bool:
+        """
+        Wait until every live worker has applied the catalog as committed now,
+        e.g. so all of them mirror writes to a migration target before the copy.
         
-        # Simple load balancing: move shards from high-load to low-load nodes
-        avg_load = sum(n.load for n in healthy_nodes) / len(healthy_nodes)
-        high_load_nodes = [n for n in healthy_nodes if n.load > avg_load * 1.2]
-        low_load_nodes = [n for n in healthy_nodes if n.load < avg_load * 0.8]
+        Returns:
+            False if a live worker did not acknowledge within ``barrier_timeout``
+        """
+        if not self.catalog:
+            return True
+        barrier = self.catalog.raise_barrier()
+        # This worker's own state already has the change
+        self._acked_barrier = barrier
+        self.catalog.heartbeat_worker(self.worker_id, barrier)
+        deadline = time.monotonic() + self.barrier_timeout
+        while True:
+            waiting = self.catalog.pending_workers(barrier, self.worker_timeout)
+            if not waiting:
+                return True
+            if time.monotonic() > deadline:
+                logger.warning(f"Workers did not acknowledge {reason}", workers=waiting)
+                return False
+            await asyncio.sleep(self.catalog_sync_interval / 2)
+    
+    def claim_collection_names(self, names: List[str], vector: List[float], threshold: float) -> List[str]:
+        """
+        Agree with the other workers on names for a new topic: names claimed
+        recently for content at least ``threshold`` similar win over ``names``.
+        """
+        if not self.catalog or not names:
+            return names
+        query = np.asarray(vector, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        
+        def match(claims: Dict[str, bytes]) -> List[str]:
+            scored = []
+            for name, blob in claims.items():
+                claimed = np.frombuffer(blob, dtype=np.float32)
+                if claimed.shape == query.shape and float(claimed @ query) >= threshold:
+                    scored.append((float(claimed @ query), name))
+            return [name for _, name in sorted(scored, reverse=True)][:len(names)]
         
-        if high_load_nodes and low_load_nodes:
-            # Move some shards from high-load to low-load nodes
-            await self._move_shards_between_nodes(high_load_nodes, low_load_nodes)
+        try:
+            return self.catalog.claim_topics(names, query.tobytes(), match, self.topic_claim_ttl)
+        except Exception as e:
+            logger.error(f"Failed to claim collection names {names}: {e}")
+            return names
     
-    async def _move_shards_between_nodes(self, source_nodes: List[VectorNode], target_nodes: List[VectorNode]):
-        """Move shards between nodes for load balancing."""
-        logger.info(f"Load balancing: moving shards from {len(source_nodes)} to {len(target_nodes)} nodes")
-        if not source_nodes or not target_nodes:
+    def _publish_node_health(self):
+        """Share the leader's latest health round with the other workers."""
+        if not self.catalog:
             return
-
-        for source_node in source_nodes:
-            for target_node in target_nodes:
-                # Tìm các shard mà source_node có nhưng target_node chưa có
-                candidate_shards = [
-                    shard for shard in self.shards.values()
-                    if source_node.id in shard.node_ids and target_node.id not in shard.node_ids
-                ]
-                for shard_to_move in candidate_shards:
+        try:
+            self.catalog.save_node_health([
+                (node.id, node.status.value, node.load, node.vector_count, node.last_heartbeat)
+                for node in self.nodes.values()
+            ])
+        except Exception as e:
+            logger.error(f"Failed to publish node health: {e}")
+    
+    def get_shared_setting(self, key: str, default: Any = None) -> Any:
+        """Read a cluster-wide setting shared by every worker."""
+        if self.catalog:
+            return self.catalog.get_setting(key, default)
+        return self._local_settings.get(key, default)
+    
+    def set_shared_setting(self, key: str, value: Any):
+        if self.catalog:
+            self.catalog.set_setting(key, value)
+        else:
+            self._local_settings[key] = value
+    
+    def _persist_shard(self, shard: VectorShard):
+        """Write a shard's placement through to the catalog."""
+        if not self.catalog:
+            return
+        try:
+            self.catalog.save_shard(shard.id, shard.collection_name, shard.node_ids,
+                                    shard.vector_count, shard.epoch, shard.created_at, shard.state,
+                                    shard.pinned)
+        except Exception as e:
+            logger.error(f"Failed to persist shard {shard.id}: {e}")
+    
+    def _set_shard_nodes(self, shard: VectorShard, node_ids: List[str]):
+        """Change a shard's replica set, bump its epoch and persist it."""
+        shard.node_ids = node_ids
+        shard.primary_node = node_ids[0]
+        shard.replica_nodes = node_ids[1:]
+        shard.epoch += 1
+        self._persist_shard(shard)
+    
+    def _persist_collection(self, collection_name: str, vector_size: int):
+        if not self.catalog:
+            return
+        try:
+            self.catalog.save_collection(collection_name, vector_size)
+            for shard_id in self.collections.get(collection_name, []):
+                if shard_id in self.shards:
+                    self._persist_shard(self.shards[shard_id])
+        except Exception as e:
+            logger.error(f"Failed to persist collection {collection_name}: {e}")
+    
+    def _add_counts(self, shard_counts: Optional[Dict[str, int]] = None, tag_counts: Optional[Dict[str, int]] = None):
+        """Queue vector count increments for the next catalog flush."""
+        if not self.catalog:
+            return
+        self.catalog.add_counts(
+            shard_counts,
+            {tag: count for tag, count in (tag_counts or {}).items() if tag in self.virtual_collections}
+        )
+    
+    async def reconcile_catalog(self) -> Dict[str, Any]:
+        """
+        Reconcile the catalog against the shards the nodes actually hold.
+        
+        Shards, collections and virtual collections found on nodes but missing
+        from the catalog are adopted with their current holders as replicas;
+        known shards take the largest vector count any holder reports. A shard
+        whose catalog replicas hold none of its data is re-pointed at the nodes
+        that do. Missing copies on listed replicas are left to anti-entropy.
+        Where both sides of a split or merge are found, one non-overlapping
+        set of range shards is adopted, and on the leader pending shards of a
+        split or merge that is no longer running are dropped.
+        
+        Returns:
+            Summary of what changed
+        """
+        async with self._reconcile_lock:
+            return await self._reconcile_catalog()
+    
+    async def _reconcile_catalog(self) -> Dict[str, Any]:
+        summary = {"nodes_listed": 0, "adopted_collections": [], "adopted_virtual_collections": [],
+                   "adopted_shards": 0, "repointed_shards": 0, "updated_counts": 0,
+                   "skipped_overlapping_shards": 0, "aborted_pending_shards": 0}
+        if self.is_leader:
+            summary["aborted_pending_shards"] = await self._abort_stale_pending_shards()
+        nodes = list(self.nodes.values())
+        shard_listings, collection_listings = await asyncio.gather(
+            asyncio.gather(*(self._call_node(node, "GET", "/shards", timeout=10) for node in nodes)),
+            asyncio.gather(*(self._call_node(node, "GET", "/collections", timeout=10) for node in nodes))
+        )
+        
+        holders: Dict[str, List[str]] = defaultdict(list)
+        stats: Dict[str, Dict[str, Any]] = {}
+        vector_sizes: Dict[str, int] = {}
+        for node, listing, collections in zip(nodes, shard_listings, collection_listings):
+            if listing is None:
+                continue
+            summary["nodes_listed"] += 1
+            for shard_id, shard_stats in listing.get("shards", {}).items():
+                holders[shard_id].append(node.id)
+                # Replicas may lag; the fullest copy is the best estimate
+                if shard_stats.get("vector_count", 0) >= stats.get(shard_id, {}).get("vector_count", -1):
+                    stats[shard_id] = shard_stats
+            for collection in (collections or {}).get("collections", []):
+                vector_sizes.setdefault(collection["name"], collection["vector_size"])
+        if not summary["nodes_listed"]:
+            logger.warning("Catalog reconcile skipped: no node answered its shard listing")
+            self.last_reconcile = {**summary, "completed_at": time.time()}
+            return self.last_reconcile
+        
+        skipped = self._overlapping_adoptions(stats)
+        if skipped:
+            logger.warning(f"Not adopting {len(skipped)} shards overlapping other shards' ranges",
+                           shards=sorted(skipped))
+            summary["skipped_overlapping_shards"] = len(skipped)
+        
+        tag_counts: Dict[str, int] = defaultdict(int)
+        tag_bases: Dict[str, str] = {}
+        for shard_id, shard_stats in stats.items():
+            collection_name = (shard_stats.get("collections") or [None])[0]
+            if not collection_name or shard_id in skipped:
+                continue
+            for tag, count in shard_stats.get("tags", {}).items():
+                tag_counts[tag] += count
+                tag_bases.setdefault(tag, collection_name)
+            
+            if collection_name not in self.collections:
+                self.collections[collection_name] = []
+                self._persist_collection(collection_name, vector_sizes.get(collection_name, 384))
+                summary["adopted_collections"].append(collection_name)
+            
+            shard = self.shards.get(shard_id)
+            # Keep the ring's preference order among the nodes that hold the data
+            preferred = [n for n in self.ring.get_nodes(shard_id, len(self.nodes)) if n in holders[shard_id]]
+            node_ids = preferred + [n for n in holders[shard_id] if n not in preferred]
+            if shard is None:
+                shard = VectorShard(
+                    id=shard_id,
+                    collection_name=collection_name,
+                    node_ids=node_ids,
+                    primary_node=node_ids[0],
+                    replica_nodes=node_ids[1:],
+                    vector_count=shard_stats.get("vector_count", 0)
+                )
+                self.shards[shard_id] = shard
+                self.collections[collection_name].append(shard_id)
+                self.collections[collection_name].sort(key=shard_sort_key)
+                self._persist_shard(shard)
+                summary["adopted_shards"] += 1
+                continue
+            if shard.state != ShardState.ACTIVE:
+                continue  # Being filled by a split or merge
+            
+            if not set(shard.node_ids) & set(node_ids):
+                logger.warning(f"Catalog replicas of shard {shard_id} hold no data; using {node_ids}")
+                shard.vector_count = shard_stats.get("vector_count", 0)
+                self._set_shard_nodes(shard, node_ids)
+                summary["repointed_shards"] += 1
+            elif shard.vector_count != shard_stats.get("vector_count", 0):
+                shard.vector_count = shard_stats.get("vector_count", 0)
+                self._persist_shard(shard)
+                summary["updated_counts"] += 1
+        
+        # Shards that never received data are not listed anywhere; place them on the ring
+        for collection_name in summary["adopted_collections"]:
+            self._fill_missing_shards(collection_name)
+        
+        for tag, count in tag_counts.items():
+            if tag in self.collections:
+                continue
+            if tag not in self.virtual_collections:
+                self.virtual_collections[tag] = tag_bases[tag]
+                summary["adopted_virtual_collections"].append(tag)
+            if self.virtual_counts.get(tag) != count or tag in summary["adopted_virtual_collections"]:
+                self.virtual_counts[tag] = count
+                if self.catalog:
                     try:
-                        async with aiohttp.ClientSession() as session:
-                            # Lấy vectors từ source_node
-                            async with session.get(f"{source_node.url}/shards/{shard_to_move.id}/vectors") as resp:
-                                if resp.status != 200:
-                                    logger.warning(f"Failed to fetch vectors from {source_node.id} for shard {shard_to_move.id}")
-                                    continue
-                                data = await resp.json()
-                                vectors = data.get("vectors", [])
-                                documents = data.get("documents", [])
-
-                            # Upsert vectors vào target_node
-                            payload = {
-                                "shard_id": shard_to_move.id,
-                                "collection_name": shard_to_move.collection_name,
-                                "vectors": vectors,
-                                "documents": documents
-                            }
-                            async with session.post(f"{target_node.url}/vectors", json=payload) as resp2:
-                                if resp2.status == 200:
-                                    # Cập nhật metadata: thêm target_node vào node_ids của shard
-                                    shard_to_move.node_ids.append(target_node.id)
-                                    shard_to_move.replica_nodes.append(target_node.id)
-                                    logger.info(f"Shard {shard_to_move.id} now replicated to {target_node.id}")
+                        self.catalog.save_virtual_collection(tag, self.virtual_collections[tag], count)
                     except Exception as e:
-                        logger.warning(f"Error moving shard: {e}")
+                        logger.error(f"Failed to persist virtual collection {tag}: {e}")
+        
+        if self.catalog:
+            try:
+                self.catalog.flush()
+            except Exception as e:
+                logger.error(f"Catalog flush error: {e}")
+        
+        self.last_reconcile = {**summary, "completed_at": time.time()}
+        logger.info("Reconciled cluster catalog with nodes", **{k: v for k, v in summary.items()
+                                                               if not isinstance(v, list)})
+        return self.last_reconcile
+    
+    def _overlapping_adoptions(self, stats: Dict[str, Dict[str, Any]]) -> Set[str]:
+        """
+        Unknown range shards listed by nodes that must not be adopted: they
+        overlap a known shard, or lose to overlapping listed shards (see
+        ``select_cover``).
+        """
+        candidates: Dict[str, Dict[str, int]] = defaultdict(dict)
+        for shard_id, shard_stats in stats.items():
+            collection_name = (shard_stats.get("collections") or [None])[0]
+            if collection_name and shard_id not in self.shards and parse_shard_range(shard_id):
+                candidates[collection_name][shard_id] = shard_stats.get("vector_count", 0)
+        
+        skipped = set()
+        for collection_name, counts in candidates.items():
+            kept = set(select_cover(counts))
+            known = self._router(collection_name) if collection_name in self.collections else None
+            for shard_id in counts:
+                if shard_id not in kept or (known is not None and known.overlapping(*parse_shard_range(shard_id))):
+                    skipped.add(shard_id)
+        return skipped
+    
+    def _fill_missing_shards(self, collection_name: str):
+        """Create the shards of an adopted collection that no node listed (they never received data)."""
+        router = self._router(collection_name)
+        if router.is_legacy:
+            missing = [f"shard_{i}_{collection_name}" for i in range(LEGACY_SHARD_COUNT)]
+        else:
+            missing = [range_shard_id(collection_name, start, end) for start, end in router.gaps()]
+        for shard_id in missing:
+            if shard_id not in self.shards:
+                self._get_nodes_for_shard(shard_id)
+                self.collections[collection_name].append(shard_id)
+        self.collections[collection_name].sort(key=shard_sort_key)
+    
+    async def _abort_stale_pending_shards(self) -> int:
+        """Drop pending shards left by a split or merge whose coordinator exited before cutover."""
+        stale = [
+            shard for shard in self.shards.values()
+            if shard.state == ShardState.PENDING and shard.id not in self._range_changing
+        ]
+        for shard in stale:
+            logger.warning(f"Dropping pending shard {shard.id} of an interrupted split or merge")
+            await self._discard_pending_shard(shard)
+        return len(stale)
+    
+    async def _start_stale_repairs(self) -> bool:
+        """
+        Move stale replicas (marked by any worker) to repairing and wait until
+        every worker queues their writes again instead of dropping them.
+        """
+        self._publish_stale_marks()
+        stale = self.replication_log.stale_replicas()
+        if not stale:
+            return True
+        if not self.catalog:
+            for node_id, shard_id in stale:
+                self.replication_log.start_repair(node_id, shard_id)
+            return True
+        try:
+            self.catalog.start_replica_repairs(stale)
+            # This worker does not see its own commit through data_version
+            self._apply_stale_replicas(self.catalog.load_stale_replicas())
+        except Exception as e:
+            logger.error(f"Failed to start repair of stale replicas: {e}")
+            return False
+        return await self._wait_for_workers("repair of stale replicas")
+    
+    def _finish_stale_repair(self, node_id: str, shard_id: str):
+        """Let every worker read from a repaired replica again."""
+        if not self.catalog:
+            if not self.replication_log.finish_repair(node_id, shard_id):
+                logger.warning(f"Replica of shard {shard_id} on {node_id} dropped writes during its repair")
+            return
+        try:
+            if not self.catalog.finish_replica_repair(node_id, shard_id):
+                logger.warning(f"Replica of shard {shard_id} on {node_id} dropped writes during its repair")
+            self._apply_stale_replicas(self.catalog.load_stale_replicas())
+        except Exception as e:
+            logger.error(f"Failed to clear stale replica of shard {shard_id} on {node_id}: {e}")
+    
+    async def _run_anti_entropy(self):
+        """Compare every shard's replicas against a caught-up reference replica."""
+        # Replicas whose workers have not all stopped dropping writes wait for the next round
+        started = await self._start_stale_repairs()
+        for shard in list(self.shards.values()):
+            if shard.state != ShardState.ACTIVE:
+                continue  # Still being filled by a split or merge
+            replicas = [
+                node_id for node_id in shard.node_ids
+                if node_id in self.nodes and self.nodes[node_id].status != NodeStatus.UNHEALTHY
+            ]
+            readable = [n for n in self._readable_replicas(shard) if n in replicas]
+            if len(replicas) < 2 or not readable:
+                continue
+            
+            reference = readable[0]
+            repairing = set(self.replication_log.repairing_replicas()) if started else set()
+            for node_id in replicas:
+                if node_id == reference:
+                    continue
+                is_repairing = (node_id, shard.id) in repairing
+                if not is_repairing and not self.replication_log.is_caught_up(node_id, shard.id):
+                    continue  # Writes still queued (or dropped) for it would show up as divergence
+                if is_repairing and self.catalog:
+                    # Writes dropped from now on may be missed by the digests and re-mark it stale
+                    self.catalog.begin_replica_repair(node_id, shard.id)
+                result = await self.anti_entropy.repair(shard.id, shard.collection_name,
+                                                        self.nodes[reference], self.nodes[node_id])
+                if result is not None and is_repairing:
+                    self._finish_stale_repair(node_id, shard.id)
+    
+    async def _collect_shard_loads(self, nodes: List[VectorNode]) -> List[ShardLoad]:
+        """Ask nodes for per-shard size and windowed QPS."""
+        async def fetch(node: VectorNode) -> Dict[str, Any]:
+            data = await self._call_node(node, "GET", "/shards", timeout=10)
+            return data.get("shards", {}) if data else {}
+        
+        reports = await asyncio.gather(*(fetch(node) for node in nodes))
+        sizes: Dict[str, int] = defaultdict(int)
+        counts: Dict[str, int] = defaultdict(int)
+        qps: Dict[str, float] = defaultdict(float)
+        for report in reports:
+            for shard_id, stats in report.items():
+                sizes[shard_id] = max(sizes[shard_id], int(stats.get("size_bytes", 0)))
+                counts[shard_id] = max(counts[shard_id], int(stats.get("vector_count", 0)))
+                qps[shard_id] += float(stats.get("qps", 0.0))
+        
+        # Shards in a split or merge are left alone until it finishes
+        return [
+            ShardLoad(shard_id=shard_id, size_bytes=sizes.get(shard_id, 0), qps=qps.get(shard_id, 0.0),
+                      node_ids=list(shard.node_ids), vector_count=counts.get(shard_id, 0))
+            for shard_id, shard in self.shards.items()
+            if shard.state == ShardState.ACTIVE and shard_id not in self._range_changing
+        ]
+    
+    async def plan_rebalance(self) -> RebalancePlan:
+        """Compute (without executing) the next rebalance cycle's moves."""
+        healthy_nodes = [n for n in self.nodes.values() if n.status == NodeStatus.HEALTHY]
+        if len(healthy_nodes) < 2:
+            return RebalancePlan(bytes_budget=self.rebalance_planner.max_bytes_per_cycle)
+        
+        shard_loads = await self._collect_shard_loads(healthy_nodes)
+        return self.rebalance_planner.plan(
+            shard_loads,
+            [n.id for n in healthy_nodes],
+            node_hosts={n.id: n.host for n in healthy_nodes}
+        )
+    
+    async def _apply_rebalance_move(self, move: RebalanceMove) -> bool:
+        """Copy a replica to the target, cut reads and writes over, then delete it from the source."""
+        shard = self.shards.get(move.shard_id)
+        source_node = self.nodes.get(move.source_node)
+        target_node = self.nodes.get(move.target_node)
+        if shard is None or source_node is None or target_node is None or move.source_node not in shard.node_ids:
+            return False
+        if shard.id in self._range_changing:
+            return False
+        
+        if not await self._transfer_shard(shard, source_node, target_node):
+            return False
+        
+        # Cutover: the target takes the source's place in the replica set. The
+        # placement is pinned so the ring plan does not move it straight back.
+        shard.pinned = True
+        self._set_shard_nodes(shard, [target_node.id if n == source_node.id else n for n in shard.node_ids])
+        
+        await self._drop_shard_from_node(source_node, shard.id)
+        logger.info(f"Rebalanced shard {shard.id} from {source_node.id} to {target_node.id}")
+        return True
+    
+    async def _transfer_shard(self, shard: VectorShard, source_node: VectorNode, target_node: VectorNode) -> bool:
+        """
+        Copy a shard's vectors, documents and tags from one node to another (paged and throttled).
+        
+        New writes to the shard are mirrored to the target while the copy runs,
+        so nothing written during the copy is lost at cutover.
+        """
+        if not self.replication_log.is_caught_up(source_node.id, shard.id):
+            # Copy from a replica that has every acknowledged write
+            source_node = next(
+                (self.nodes[n] for n in self._readable_replicas(shard) if n != target_node.id),
+                source_node
+            )
+        
+        self.migrating_shards[shard.id].add(target_node.id)
+        try:
+            if self.catalog:
+                self.catalog.start_migration(shard.id, target_node.id)
+                # Every worker must mirror writes to the target before the copy starts
+                if not await self._wait_for_workers(f"migration of shard {shard.id}"):
+                    return False
+            transferred = await self.transfer_manager.transfer(shard.id, shard.collection_name, source_node, target_node)
+            if transferred:
+                # Writes that raced the start of mirroring differ in the digests; copy them over
+                transferred = await self.anti_entropy.repair(shard.id, shard.collection_name,
+                                                             source_node, target_node) is not None
+            # A target marked stale while mirroring is cleared by anti-entropy, which every worker agrees on
+            return transferred
+        finally:
+            self.migrating_shards[shard.id].discard(target_node.id)
+            if not self.migrating_shards[shard.id]:
+                del self.migrating_shards[shard.id]
+            if self.catalog:
+                self.catalog.finish_migration(shard.id, target_node.id)
+    
+    async def _drop_shard_from_node(self, node: VectorNode, shard_id: str) -> bool:
+        """Delete a shard's data from a node that no longer owns it."""
+        self.replication_log.discard_shard(node.id, shard_id)
+        if self.catalog:
+            self.catalog.forget_stale_replica(node.id, shard_id)
+        return await self._call_node(node, "DELETE", f"/shards/{shard_id}", timeout=10) is not None
+    
+    async def _balance_shard_ranges(self):
+        """Run one cycle of size- and QPS-driven shard splits and merges."""
+        for change in await self.plan_shard_ranges():
+            await self.apply_range_change(change)
+    
+    async def plan_shard_ranges(self) -> List[RangeChange]:
+        """Compute (without executing) the splits and merges the next cycle would start."""
+        healthy_nodes = [n for n in self.nodes.values() if n.status == NodeStatus.HEALTHY]
+        if not healthy_nodes:
+            return []
+        healthy_ids = {n.id for n in healthy_nodes}
+        loads = {load.shard_id: load for load in await self._collect_shard_loads(healthy_nodes)}
+        
+        collections: Dict[str, List[RangeShardLoad]] = {}
+        for collection_name, shard_ids in self.collections.items():
+            # Skip collections with a change running, or a shard no healthy node can report on
+            if not shard_ids or any(
+                shard_id not in loads or not healthy_ids & set(loads[shard_id].node_ids) for shard_id in shard_ids
+            ):
+                continue
+            collections[collection_name] = [
+                RangeShardLoad(shard_id, loads[shard_id].vector_count, loads[shard_id].qps) for shard_id in shard_ids
+            ]
+        return self.range_planner.plan(collections)
+    
+    async def split_shard(self, shard_id: str) -> bool:
+        """Split a range shard into two halves now, whatever its load."""
+        shard = self.shards.get(shard_id)
+        key_range = parse_shard_range(shard_id)
+        if shard is None or key_range is None or key_range[1] - key_range[0] < 2:
+            logger.warning(f"Shard {shard_id} cannot be split")
+            return False
+        start, end = key_range
+        mid = start + (end - start) // 2
+        return await self.apply_range_change(RangeChange(
+            kind="split",
+            collection_name=shard.collection_name,
+            source_shards=[shard_id],
+            target_shards=[range_shard_id(shard.collection_name, start, mid),
+                           range_shard_id(shard.collection_name, mid, end)],
+            reason="manual"
+        ))
+    
+    async def apply_range_change(self, change: RangeChange) -> bool:
+        """
+        Split or merge range shards online, without blocking writes.
+        
+        The target shards are registered as pending on the first source's
+        replicas, and every worker starts mirroring writes in their ranges to
+        them. Each target replica then copies the rows in range from its local
+        source replica (a source it does not hold is pulled in temporarily),
+        and routing is cut over to the targets in one catalog transaction.
+        Sources keep their data for ``range_change_grace`` seconds for
+        in-flight requests, are swept once more for writes that raced the
+        cutover, and are then dropped.
+        
+        Returns:
+            True once routing uses the target shards
+        """
+        if not self.is_leader:
+            logger.warning("Shard splits and merges run on the leader worker only")
+            return False
+        sources = [self.shards.get(shard_id) for shard_id in change.source_shards]
+        reason = self._range_change_blocker(change, sources)
+        if reason:
+            logger.info(f"Deferring shard {change.kind} in {change.collection_name}: {reason}")
+            return False
+        
+        placement = list(sources[0].node_ids)
+        targets = [
+            VectorShard(id=shard_id, collection_name=change.collection_name, node_ids=list(placement),
+                        primary_node=placement[0], replica_nodes=placement[1:], state=ShardState.PENDING)
+            for shard_id in change.target_shards
+        ]
+        involved = set(change.source_shards) | set(change.target_shards)
+        self._range_changing.update(involved)
+        logger.info(f"Starting shard {change.kind} in {change.collection_name}", sources=change.source_shards,
+                    targets=change.target_shards, reason=change.reason)
+        try:
+            try:
+                for target in targets:
+                    self.shards[target.id] = target
+                    self._persist_shard(target)
+                # Every worker must mirror writes to the pending shards before the copy starts
+                if not await self._wait_for_workers(f"pending shards {change.target_shards}"):
+                    raise RuntimeError("not every worker is mirroring writes to the new shards")
+                
+                counts = await asyncio.gather(*(self._fill_range_shard(target, sources) for target in targets))
+                if any(count is None for count in counts):
+                    raise RuntimeError("copying rows into the new shards failed")
+                self._cut_over_ranges(change, sources, targets, counts)
+            except Exception as e:
+                logger.error(f"Shard {change.kind} in {change.collection_name} aborted: {e}")
+                self.range_stats["aborted"] += 1
+                for target in targets:
+                    await self._discard_pending_shard(target)
+                return False
+            
+            await asyncio.sleep(self.range_change_grace)
+            # Writes routed to a source just before a worker saw the cutover are not mirrored
+            swept = await asyncio.gather(*(self._fill_range_shard(target, sources) for target in targets))
+            if any(count is None for count in swept):
+                logger.warning(f"Final sweep of shard {change.kind} in {change.collection_name} failed; "
+                               f"keeping source data", sources=change.source_shards)
+                return True
+            for source in sources:
+                for node_id in source.node_ids:
+                    if node_id in self.nodes:
+                        await self._drop_shard_from_node(self.nodes[node_id], source.id)
+            return True
+        finally:
+            self._range_changing.difference_update(involved)
+    
+    def _range_change_blocker(self, change: RangeChange, sources: List[Optional[VectorShard]]) -> Optional[str]:
+        """Why a split or merge cannot start now (None if it can)."""
+        if any(s is None or s.state != ShardState.ACTIVE or s.collection_name != change.collection_name
+               for s in sources):
+            return "source shards are not active shards of the collection"
+        if any(shard_id in self.shards for shard_id in change.target_shards):
+            return "target shards already exist"
+        if self._range_changing & set(change.source_shards):
+            return "a split or merge of the sources is running"
+        
+        source_ranges = sorted(parse_shard_range(s.id) or (0, 0) for s in sources)
+        target_ranges = sorted(parse_shard_range(shard_id) or (0, 0) for shard_id in change.target_shards)
+        for ranges in (source_ranges, target_ranges):
+            if any(a[1] != b[0] for a, b in zip(ranges, ranges[1:])) or any(start >= end for start, end in ranges):
+                return "ranges are not contiguous"
+        if (source_ranges[0][0], source_ranges[-1][1]) != (target_ranges[0][0], target_ranges[-1][1]):
+            return "target ranges do not cover the source ranges"
+        
+        for source in sources:
+            if source.id in self.migrating_shards or source.id in self.shared_migrations:
+                return f"shard {source.id} is being moved"
+            for node_id in source.node_ids:
+                node = self.nodes.get(node_id)
+                if node is None or node.status != NodeStatus.HEALTHY:
+                    return f"replica {node_id} of {source.id} is not healthy"
+                if not self.replication_log.is_caught_up(node_id, source.id):
+                    return f"replica {node_id} of {source.id} is lagging"
+        return None
+    
+    async def _fill_range_shard(self, target: VectorShard, sources: List[VectorShard]) -> Optional[int]:
+        """
+        Copy the rows in the target's range from the sources into the target
+        on every target replica.
+        
+        Returns:
+            Rows in the fullest target replica, or None if a replica failed
+        """
+        target_start, target_end = parse_shard_range(target.id)
+        
+        async def fill(node_id: str) -> Optional[int]:
+            node = self.nodes.get(node_id)
+            if node is None:
+                return None
+            count = 0
+            for source in sources:
+                source_start, source_end = parse_shard_range(source.id)
+                start, end = max(target_start, source_start), min(target_end, source_end)
+                if start >= end:
+                    continue
+                local = node_id in source.node_ids
+                if not local:
+                    # Merge of shards on different nodes: pull a temporary copy of the source first
+                    holder = next((self.nodes[n] for n in self._read_order(source) if n != node_id), None)
+                    if holder is None or not await self.transfer_manager.transfer(
+                            source.id, source.collection_name, holder, node):
+                        return None
+                # A long maintenance call; its duration says nothing about the node's query latency
+                result = await self._call_node(node, "POST", f"/shards/{source.id}/copy_range",
+                                               {"target_shard_id": target.id, "start": start, "end": end},
+                                               timeout=600, bypass_breaker=True)
+                if not local:
+                    await self._call_node(node, "DELETE", f"/shards/{source.id}", timeout=10)
+                if result is None:
+                    return None
+                count = result.get("target_count", count)
+            return count
+        
+        counts = await asyncio.gather(*(fill(node_id) for node_id in target.node_ids))
+        if any(count is None for count in counts):
+            return None
+        return max(counts, default=0)
+    
+    def _cut_over_ranges(self, change: RangeChange, sources: List[VectorShard], targets: List[VectorShard],
+                         counts: List[int]):
+        """Route the changed ranges to the filled target shards and retire the sources."""
+        if change.collection_name not in self.collections:
+            raise RuntimeError(f"collection {change.collection_name} was deleted")
+        for target, count in zip(targets, counts):
+            target.state = ShardState.ACTIVE
+            target.vector_count = count
+            target.epoch += 1
+        source_ids = [source.id for source in sources]
+        if self.catalog:
+            self.catalog.commit_range_change(source_ids, [
+                CatalogShard(t.id, t.collection_name, t.node_ids, t.vector_count, t.epoch, t.created_at, t.state)
+                for t in targets
+            ])
+        
+        shard_ids = [shard_id for shard_id in self.collections[change.collection_name] if shard_id not in source_ids]
+        self.collections[change.collection_name] = sorted(shard_ids + [t.id for t in targets], key=shard_sort_key)
+        for shard_id in source_ids:
+            self.shards.pop(shard_id, None)
+        
+        self.range_stats["splits" if change.kind == "split" else "merges"] += 1
+        self.range_stats["last_change"] = {**change.to_dict(), "completed_at": time.time()}
+        logger.info(f"Cut shard {change.kind} in {change.collection_name} over", sources=source_ids,
+                    targets=[t.id for t in targets], vectors=counts)
+    
+    async def _discard_pending_shard(self, shard: VectorShard):
+        """Forget a pending shard of an aborted split or merge and drop its partial data."""
+        self.shards.pop(shard.id, None)
+        if self.catalog:
+            try:
+                self.catalog.delete_shard(shard.id)
+            except Exception as e:
+                logger.error(f"Failed to remove pending shard {shard.id} from the catalog: {e}")
+        for node_id in shard.node_ids:
+            if node_id in self.nodes:
+                await self._drop_shard_from_node(self.nodes[node_id], shard.id)
+    
+    def _router(self, collection_name: str) -> RangeRouter:
+        """Range lookup over the collection's active shards (rebuilt when they change)."""
+        shard_ids = tuple(self.collections.get(collection_name, ()))
+        cached = self._routers.get(collection_name)
+        if cached is None or cached[0] != shard_ids:
+            cached = (shard_ids, RangeRouter(collection_name, shard_ids))
+            self._routers[collection_name] = cached
+        return cached[1]
+    
+    def _pending_router(self, collection_name: str) -> Optional[RangeRouter]:
+        """Range lookup over shards a split or merge is filling, if any."""
+        pending = [
+            shard.id for shard in self.shards.values()
+            if shard.state == ShardState.PENDING and shard.collection_name == collection_name
+        ]
+        return RangeRouter(collection_name, pending) if pending else None
     
     def _get_shard_id(self, collection_name: str, document_id: str) -> str:
-        """Get shard ID for a document using consistent hashing."""
-        key = f"{collection_name}:{document_id}"
-        hash_value = int(hashlib.md5(key.encode()).hexdigest(), 16)
-        shard_index = hash_value % self.shard_count
-        return f"shard_{shard_index}_{collection_name}"
+        """Get shard ID for a document by looking its hash key up in the collection's ranges."""
+        shard_id = self._router(collection_name).lookup(document_id)
+        if shard_id is None:
+            raise ValueError(f"No shard of {collection_name} covers document {document_id}")
+        return shard_id
     
     def _get_nodes_for_shard(self, shard_id: str) -> List[str]:
         """Get node IDs responsible for a shard (primary + replicas)."""
         if shard_id in self.shards:
             return self.shards[shard_id].node_ids
         
-        # Create new shard assignment
-        # Use all nodes initially, not just healthy ones, to allow startup
-        available_nodes = [n.id for n in self.nodes.values() 
-                          if n.status in [NodeStatus.HEALTHY, NodeStatus.UNKNOWN]]
-        
-        if not available_nodes:
-            # If no nodes are available, try to use all nodes as fallback
-            available_nodes = list(self.nodes.keys())
-            
-        if not available_nodes:
+        # Placement depends on ring membership only, never on current health,
+        # so a flapping node does not remap newly created shards
+        node_ids = self.ring.get_nodes(shard_id, self.replication_factor)
+        if not node_ids:
             raise Exception("No nodes available")
-        
-        # Simple round-robin assignment for now
-        node_index = int(hashlib.md5(shard_id.encode()).hexdigest(), 16) % len(available_nodes)
-        primary_node = available_nodes[node_index]
-        
-        # Select replica nodes
-        replica_nodes = []
-        for i in range(1, self.replication_factor):
-            replica_index = (node_index + i) % len(available_nodes)
-            replica_nodes.append(available_nodes[replica_index])
+        primary_node = node_ids[0]
+        replica_nodes = node_ids[1:]
         
         # Create shard
         shard = VectorShard(
             id=shard_id,
-            collection_name=shard_id.split('_')[1] if '_' in shard_id else "default",
+            collection_name=shard_id.split('_', 2)[2] if shard_id.count('_') >= 2 else "default",
             node_ids=[primary_node] + replica_nodes,
             primary_node=primary_node,
             replica_nodes=replica_nodes
         )
         
         self.shards[shard_id] = shard
+        self._persist_shard(shard)
         return shard.node_ids
     
     async def wait_for_healthy_nodes(self, timeout: int = 30) -> bool:
@@ -303,7 +1362,43 @@ class DistributedVectorStore:
 
     def collection_exists(self, collection_name: str) -> bool:
         """Check if a collection exists in the distributed system."""
-        return collection_name in self.collections
+        return collection_name in self.collections or collection_name in self.virtual_collections
+    
+    def is_virtual_collection(self, collection_name: str) -> bool:
+        """Check if a collection is a tag over a base collection."""
+        return collection_name in self.virtual_collections
+    
+    def resolve_collection(self, collection_name: str) -> str:
+        """Get the physical collection that stores a (possibly virtual) collection."""
+        return self.virtual_collections.get(collection_name, collection_name)
+    
+    async def create_virtual_collection(self, collection_name: str, base_collection: str, vector_size: int = 384) -> bool:
+        """
+        Register a virtual collection stored as a tag in a base collection.
+        
+        Args:
+            collection_name: Virtual (topical) collection name
+            base_collection: Physical collection holding the vectors
+            vector_size: Vector size used if the base collection has to be created
+        """
+        try:
+            if collection_name in self.collections or collection_name in self.virtual_collections:
+                logger.info(f"Collection {collection_name} already exists, skipping creation")
+                return True
+            
+            if base_collection not in self.collections:
+                if not await self.create_collection(base_collection, vector_size):
+                    return False
+            
+            self.virtual_collections[collection_name] = base_collection
+            if self.catalog:
+                self.catalog.save_virtual_collection(collection_name, base_collection)
+            logger.info(f"Created virtual collection {collection_name} over {base_collection}")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Failed to create virtual collection {collection_name}: {e}")
+            return False
     
     async def create_collection(self, collection_name: str, vector_size: int = 384) -> bool:
         """Create a new collection in the distributed system."""
@@ -317,10 +1412,10 @@ class DistributedVectorStore:
             if not await self.wait_for_healthy_nodes():
                 logger.warning("No healthy nodes available, proceeding with all nodes")
             
-            # Create shards for the collection
+            # Create one shard per initial hash range; ranges split and merge as the collection grows
             shard_ids = []
-            for i in range(self.shard_count):
-                shard_id = f"shard_{i}_{collection_name}"
+            for start, end in initial_ranges(self.shard_count):
+                shard_id = range_shard_id(collection_name, start, end)
                 node_ids = self._get_nodes_for_shard(shard_id)
                 
                 shard = VectorShard(
@@ -335,6 +1430,7 @@ class DistributedVectorStore:
                 shard_ids.append(shard_id)
             
             self.collections[collection_name] = shard_ids
+            self._persist_collection(collection_name, vector_size)
             
             # Create collection on all nodes (not just healthy ones for startup)
             tasks = []
@@ -353,35 +1449,54 @@ class DistributedVectorStore:
     
     async def _create_collection_on_node(self, node: VectorNode, collection_name: str, vector_size: int) -> bool:
         """Create collection on a specific node."""
-        try:
-            async with aiohttp.ClientSession() as session:
-                payload = {
-                    "collection_name": collection_name,
-                    "vector_size": vector_size
-                }
-                async with session.post(f"{node.url}/collections", json=payload, timeout=10) as response:
-                    return response.status == 200
-        except Exception as e:
-            logger.warning(f"Failed to create collection on node {node.id}: {e}")
-            return False
+        payload = {
+            "collection_name": collection_name,
+            "vector_size": vector_size
+        }
+        return await self._call_node(node, "POST", "/collections", payload, timeout=10) is not None
     
-    async def upsert_vectors(self, collection_name: str, vectors: List[List[float]], documents: List[BaseDocument]) -> bool:
-        """Upsert vectors to the distributed system."""
+    async def upsert_vectors(self, collection_name: str, vectors: List[List[float]], documents: List[BaseDocument],
+                             tags: Optional[List[str]] = None) -> bool:
+        """
+        Upsert vectors to the distributed system.
+        
+        Vectors are always stored in the physical base collection; writing to a
+        virtual collection (or passing ``tags``) only tags the stored rows.
+        """
         try:
-            # Group documents by shard
-            shard_groups = defaultdict(lambda: {"vectors": [], "documents": []})
+            base_collection = self.resolve_collection(collection_name)
+            tags = list(tags or [])
+            if base_collection != collection_name and collection_name not in tags:
+                tags.append(collection_name)
+            
+            # Group documents by shard; documents in a range that a split or
+            # merge is filling are also written to the pending shard
+            shard_groups = defaultdict(lambda: {"vectors": [], "documents": [], "mirrors": defaultdict(list)})
+            pending_router = self._pending_router(base_collection)
             
             for i, doc in enumerate(documents):
-                shard_id = self._get_shard_id(collection_name, doc.id)
+                shard_id = self._get_shard_id(base_collection, doc.id)
                 shard_groups[shard_id]["vectors"].append(vectors[i])
                 shard_groups[shard_id]["documents"].append(doc)
+                mirror_id = pending_router.lookup(doc.id) if pending_router else None
+                if mirror_id:
+                    shard_groups[shard_id]["mirrors"][mirror_id].append(i)
             
             # Upsert to each shard
             tasks = []
             for shard_id, group in shard_groups.items():
-                if group["vectors"]:
-                    tasks.append(self._upsert_to_shard(shard_id, group["vectors"], group["documents"]))
+                if not group["vectors"]:
+                    continue
+                if group["mirrors"]:
+                    mirrors = {
+                        mirror_id: ([vectors[i] for i in rows], [documents[i] for i in rows])
+                        for mirror_id, rows in group["mirrors"].items()
+                    }
+                    tasks.append(self._upsert_with_mirrors(shard_id, group["vectors"], group["documents"], tags, mirrors))
+                else:
+                    tasks.append(self._upsert_to_shard(shard_id, group["vectors"], group["documents"], tags))
             
+            # Shards count the rows and tags their nodes report as new
             results = await asyncio.gather(*tasks, return_exceptions=True)
             success_count = sum(1 for r in results if r is True)
             
@@ -392,31 +1507,115 @@ class DistributedVectorStore:
             logger.error(f"Failed to upsert vectors: {e}")
             return False
     
-    async def _upsert_to_shard(self, shard_id: str, vectors: List[List[float]], documents: List[BaseDocument]) -> bool:
-        """Upsert vectors to a specific shard."""
+    async def _upsert_with_mirrors(self, shard_id: str, vectors: List[List[float]], documents: List[BaseDocument],
+                                   tags: Optional[List[str]],
+                                   mirrors: Dict[str, Tuple[List[List[float]], List[BaseDocument]]]) -> bool:
+        """
+        Upsert to a shard and to the pending shards filled from it; the write
+        only counts if every copy is acknowledged, because a pending shard that
+        misses a write would lose it at cutover.
+        """
+        results = await asyncio.gather(
+            self._upsert_to_shard(shard_id, vectors, documents, tags),
+            # Tagged rows are counted once, on the shard that serves them
+            *(self._upsert_to_shard(mirror_id, mirror_vectors, mirror_documents, tags, count_tags=False)
+              for mirror_id, (mirror_vectors, mirror_documents) in mirrors.items()),
+            return_exceptions=True
+        )
+        return all(r is True for r in results)
+    
+    async def _upsert_to_shard(self, shard_id: str, vectors: List[List[float]], documents: List[BaseDocument],
+                               tags: Optional[List[str]] = None, count_tags: bool = True) -> bool:
+        """
+        Upsert vectors to a specific shard.
+        
+        The shard's vector count, and with ``count_tags`` the virtual
+        collection counts, grow by what the written replicas report as new
+        rows and newly tagged rows, so re-upserts are not counted again.
+        """
         if shard_id not in self.shards:
             return False
         
         shard = self.shards[shard_id]
         node_ids = shard.node_ids
+        # One version per write; replicas keep the newest version of each document
+        versions = [time.time_ns()] * len(documents)
         
-        # Write to primary and replicas based on consistency level
-        required_nodes = self._get_required_nodes_for_consistency(node_ids)
+        # Write to primary and replicas based on consistency level; ejected
+        # replicas move to the back so the synchronous quorum uses live nodes
+        required_nodes = self._get_required_nodes_for_consistency(
+            sorted(node_ids, key=lambda n: not self.circuit_breakers.is_available(n))
+        )
         
         tasks = []
         for node_id in required_nodes:
             if node_id in self.nodes:
                 node = self.nodes[node_id]
-                tasks.append(self._upsert_to_node(node, shard_id, vectors, documents))
+                tasks.append(self._upsert_to_node(node, shard, vectors, documents, tags, versions))
         
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        success_count = sum(1 for r in results if r is True)
+        # Mirror writes to nodes a copy of this shard is in flight to (not counted for consistency)
+        mirror_tasks = [
+            self._upsert_to_node(self.nodes[node_id], shard, vectors, documents, tags, versions)
+            for node_id in self.migrating_shards.get(shard_id, set()) | self.shared_migrations.get(shard_id, set())
+            if node_id in self.nodes and node_id not in required_nodes
+        ]
         
-        # Update shard metadata
-        if success_count > 0:
-            shard.vector_count += len(vectors)
+        results = await asyncio.gather(*tasks, *mirror_tasks, return_exceptions=True)
+        results = results[:len(tasks)]
+        responses = [r for r in results if isinstance(r, dict)]
+        success_count = len(responses)
+        acknowledged = success_count >= len(required_nodes) * 0.5  # At least 50% success
         
-        return success_count >= len(required_nodes) * 0.5  # At least 50% success
+        # Update shard metadata; replicas may lag, so take the fullest copy's view
+        if responses:
+            inserted = max(r.get("inserted_count", len(vectors)) for r in responses)
+            tag_counts = {}
+            if count_tags:
+                tag_counts = {
+                    tag: max(r.get("tag_counts", {}).get(tag, len(vectors)) for r in responses)
+                    for tag in tags or []
+                }
+                for tag, count in tag_counts.items():
+                    self.virtual_counts[tag] += count
+            shard.vector_count += inserted
+            self._add_counts({shard_id: inserted}, tag_counts)
+        
+        if acknowledged:
+            # Remaining replicas, and required ones whose write failed, catch up asynchronously
+            written = {node_id for node_id, r in zip([n for n in required_nodes if n in self.nodes], results)
+                       if isinstance(r, dict)}
+            lagging = [n for n in node_ids if n in self.nodes and n not in written]
+            if lagging:
+                document_dicts = [doc.to_dict() for doc in documents]
+                await asyncio.gather(*(
+                    self.replication_log.append(node_id, shard_id, shard.collection_name, vectors, document_dicts,
+                                                tags, versions)
+                    for node_id in lagging
+                ))
+        
+        return acknowledged
+    
+    async def _replicate_to_node(self, node_id: str, entry: ReplicationEntry) -> bool:
+        """Apply a replication log batch on a node."""
+        node = self.nodes.get(node_id)
+        if node is None or node.status == NodeStatus.UNHEALTHY:
+            return False
+        payload = {
+            "shard_id": entry.shard_id,
+            "collection_name": entry.collection_name,
+            "vectors": entry.vectors,
+            "documents": entry.documents,
+            "tags": entry.tags,
+            "versions": entry.versions or None
+        }
+        return await self._call_node(node, "POST", "/vectors", payload) is not None
+    
+    def _readable_replicas(self, shard: VectorShard) -> List[str]:
+        """Replicas holding every acknowledged write for the shard."""
+        return [
+            node_id for node_id in shard.node_ids
+            if node_id in self.nodes and self.replication_log.is_caught_up(node_id, shard.id)
+        ]
     
     def _get_required_nodes_for_consistency(self, node_ids: List[str]) -> List[str]:
         """Get required nodes based on consistency level."""
@@ -427,90 +1626,386 @@ class DistributedVectorStore:
         else:  # ALL
             return node_ids
     
-    async def _upsert_to_node(self, node: VectorNode, shard_id: str, vectors: List[List[float]], documents: List[BaseDocument]) -> bool:
-        """Upsert vectors to a specific node."""
-        try:
-            async with aiohttp.ClientSession() as session:
-                payload = {
-                    "shard_id": shard_id,
-                    "collection_name": shard_id.split('_')[2] if len(shard_id.split('_')) > 2 else "default",  # Extract collection name from shard_id
-                    "vectors": vectors,
-                    "documents": [doc.to_dict() for doc in documents]
-                }
-                async with session.post(f"{node.url}/vectors", json=payload, timeout=30) as response:
-                    return response.status == 200
-        except Exception as e:
-            logger.warning(f"Failed to upsert to node {node.id}: {e}")
-            return False
+    async def _upsert_to_node(self, node: VectorNode, shard: VectorShard, vectors: List[List[float]], documents: List[BaseDocument],
+                              tags: Optional[List[str]] = None,
+                              versions: Optional[List[int]] = None) -> Optional[Dict[str, Any]]:
+        """Upsert vectors to a specific node; returns the node's response, or None on failure."""
+        payload = {
+            "shard_id": shard.id,
+            "collection_name": shard.collection_name,
+            "vectors": vectors,
+            "documents": [doc.to_dict() for doc in documents],
+            "tags": tags or [],
+            "versions": versions
+        }
+        return await self._call_node(node, "POST", "/vectors", payload)
     
     async def search_vectors(self, collection_name: str, query_vector: List[float], limit: int = 10, score_threshold: float = 0.0) -> List[Dict[str, Any]]:
         """Search vectors across the distributed system."""
+        return await self.search_collections([collection_name], query_vector, limit, score_threshold)
+    
+    async def search_collections(self, collection_names: List[str], query_vector: List[float], limit: int = 10, score_threshold: float = 0.0) -> List[Dict[str, Any]]:
+        """
+        Search several (possibly virtual) collections at once.
+        
+        Collections are grouped by base collection so every base is scanned
+        once, filtered by the union of the requested tags; a chunk tagged with
+        several requested collections is returned only once.
+        """
+        started = time.monotonic()
+        targets: List[Tuple[str, Optional[Set[str]]]] = []
+        failed = False
         try:
-            # Search all shards for the collection
-            shard_ids = self.collections.get(collection_name, [])
-            if not shard_ids:
+            groups = self._search_groups(collection_names)
+            if not groups:
                 return []
             
-            tasks = []
-            for shard_id in shard_ids:
-                tasks.append(self._search_shard(shard_id, query_vector, limit, score_threshold))
-            
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-            
-            # Combine and rank results
-            all_results = []
-            for result in results:
-                if isinstance(result, list):
-                    all_results.extend(result)
+            # Phase 1: every shard returns compact (document_id, score) hits
+            targets = [
+                (shard_id, tags)
+                for base_collection, tags in groups.items()
+                for shard_id in self.collections[base_collection]
+            ]
+            streams = await self._search_shards_in_waves(targets, query_vector, limit, score_threshold)
+            top = self._merge_hits(streams, limit)
+            if not top:
+                return []
             
-            # Sort by score and limit
-            all_results.sort(key=lambda x: x.get("score", 0), reverse=True)
-            return all_results[:limit]
+            # Phase 2: payloads for the final top-k only
+            with span("fetch_payloads", hits=len(top)):
+                payloads = await self._fetch_payloads(top)
+            return self._format_hits(top, payloads, collection_names)
             
         except Exception as e:
+            failed = True
             logger.error(f"Failed to search vectors: {e}")
             return []
+        finally:
+            self.cluster_metrics.record_query(time.monotonic() - started, failed, shards=len(targets))
     
-    async def _search_shard(self, shard_id: str, query_vector: List[float], limit: int, score_threshold: float) -> List[Dict[str, Any]]:
-        """Search a specific shard."""
-        if shard_id not in self.shards:
-            return []
+    async def search_collections_batch(self, collection_names: List[str], query_vectors: List[List[float]],
+                                       limit: int = 10, score_threshold: float = 0.0) -> List[List[Dict[str, Any]]]:
+        """
+        Search several (possibly virtual) collections for many queries at once.
         
-        shard = self.shards[shard_id]
-        node_ids = shard.node_ids
+        Each shard receives the whole query matrix in one request and scores it
+        with a single matrix multiply; payloads for every query's top-k are
+        fetched with one multi-get per node.
         
-        # Try nodes in order until one succeeds
-        for node_id in node_ids:
-            if node_id in self.nodes:
-                node = self.nodes[node_id]
-                try:
-                    result = await self._search_node(node, shard_id, query_vector, limit, score_threshold)
-                    if result:
-                        return result
-                except Exception as e:
-                    logger.warning(f"Search failed on node {node_id}: {e}")
+        Args:
+            collection_names: Collections to search
+            query_vectors: Query embeddings
+            limit: Results per query
+            score_threshold: Minimum score
+            
+        Returns:
+            Per query, results ranked by score (same shape as ``search_collections``)
+        """
+        try:
+            groups = self._search_groups(collection_names)
+            if not groups or not query_vectors:
+                return [[] for _ in query_vectors]
+            
+            targets = [
+                (shard_id, tags)
+                for base_collection, tags in groups.items()
+                for shard_id in self.collections[base_collection]
+            ]
+            query_matrix = encode_matrix(query_vectors)  # Packed once, sent to every shard
+            answers = await asyncio.gather(
+                *(self._search_shard_batch(shard_id, query_matrix, limit, score_threshold, tags)
+                  for shard_id, tags in targets),
+                return_exceptions=True
+            )
+            # streams[query] -> per-shard hit lists, best first
+            streams: List[List[List[Tuple[float, str, Any, str, str]]]] = [[] for _ in query_vectors]
+            for (shard_id, _), answer in zip(targets, answers):
+                if not isinstance(answer, tuple):
+                    continue
+                node_id, batch_hits = answer
+                for query_streams, hits in zip(streams, batch_hits):
+                    query_streams.append([(hit[1], hit[0], hit[2] if len(hit) > 2 else None, shard_id, node_id)
+                                          for hit in hits])
+            tops = [self._merge_hits(query_streams, limit) for query_streams in streams]
+            
+            # One payload round for the union of all queries' hits
+            unique_hits = {hit[1]: hit for top in tops for hit in top}
+            payloads = await self._fetch_payloads(list(unique_hits.values())) if unique_hits else {}
+            return [self._format_hits(top, payloads, collection_names) for top in tops]
+            
+        except Exception as e:
+            logger.error(f"Failed to search vector batch: {e}")
+            return [[] for _ in query_vectors]
+    
+    def _search_groups(self, collection_names: List[str]) -> Dict[str, Optional[Set[str]]]:
+        """Group requested collections by base collection: base -> tags to filter by (None = unfiltered scan)."""
+        groups: Dict[str, Optional[Set[str]]] = {}
+        for name in collection_names:
+            base_collection = self.resolve_collection(name)
+            if base_collection not in self.collections:
+                continue
+            if name == base_collection:
+                groups[base_collection] = None
+            elif base_collection not in groups:
+                groups[base_collection] = {name}
+            elif groups[base_collection] is not None:
+                groups[base_collection].add(name)
+        return groups
+    
+    @staticmethod
+    def _merge_hits(streams: List[List[Tuple[float, str, Any, str, str]]],
+                    limit: int) -> List[Tuple[float, str, Any, str, str]]:
+        """Merge per-shard hit lists into the global top-k, each document once."""
+        top = []
+        seen = set()
+        for score, document_id, hit_tags, shard_id, node_id in heapq.merge(*streams, key=lambda h: -h[0]):
+            if document_id in seen:
+                continue
+            seen.add(document_id)
+            top.append((score, document_id, hit_tags, shard_id, node_id))
+            if len(top) >= limit:
+                break
+        return top
+    
+    @staticmethod
+    def _format_hits(top: List[Tuple[float, str, Any, str, str]], payloads: Dict[str, Dict[str, Any]],
+                     collection_names: List[str]) -> List[Dict[str, Any]]:
+        """Attach payloads and scores to merged hits."""
+        results = []
+        for score, document_id, hit_tags, shard_id, node_id in top:
+            payload = payloads.get(document_id)
+            if payload is None:
+                continue
+            hit = dict(payload, score=score)
+            # Report the first requested collection the hit belongs to
+            hit_tags = set(hit_tags or [])
+            hit["source_index"] = next(
+                (name for name in collection_names if name in hit_tags or name == hit.get("source_index")),
+                hit.get("source_index")
+            )
+            results.append(hit)
+        return results
+    
+    async def _search_shards_in_waves(self, targets: List[Tuple[str, Optional[Set[str]]]], query_vector: List[float],
+                                      limit: int, score_threshold: float) -> List[List[Tuple[float, str, Any, str, str]]]:
+        """
+        Query shards for compact hits, in waves when ``first_wave_shards`` is set.
+        
+        The first wave goes to the largest shards; every later wave (doubling in
+        size) is sent the current k-th best score as its threshold, so nodes skip
+        blocks that cannot reach it and return only hits that can still make the
+        top-k. Hits below the k-th score can never enter the result, so the
+        merged top-k matches an exhaustive search.
+        
+        Returns:
+            Per-shard hit lists of (score, document_id, tags, shard_id, node_id), best first
+        """
+        if self.first_wave_shards > 0:
+            targets = sorted(targets, key=lambda t: self.shards[t[0]].vector_count if t[0] in self.shards else 0,
+                             reverse=True)
+            wave_size = self.first_wave_shards
+        else:
+            wave_size = len(targets)
+        
+        streams = []
+        # Best score per document seen so far; the same id can come back from several
+        # shards and must count once toward the k-th score, as it does in _merge_hits
+        best_by_id: Dict[str, float] = {}
+        start = 0
+        while start < len(targets):
+            wave = targets[start:start + wave_size]
+            start += len(wave)
+            threshold = score_threshold
+            if len(best_by_id) >= limit:
+                threshold = max(score_threshold, heapq.nlargest(limit, best_by_id.values())[-1])
+            
+            with span("search_wave", shards=len(wave), threshold=threshold):
+                answers = await asyncio.gather(
+                    *(self._search_shard(shard_id, query_vector, limit, threshold, tags) for shard_id, tags in wave),
+                    return_exceptions=True
+                )
+            for (shard_id, _), answer in zip(wave, answers):
+                if not isinstance(answer, tuple):
+                    continue
+                node_id, hits = answer
+                stream = [(hit[1], hit[0], hit[2] if len(hit) > 2 else None, shard_id, node_id) for hit in hits]
+                streams.append(stream)
+                for score, document_id, *_ in stream:
+                    if score > best_by_id.get(document_id, -math.inf):
+                        best_by_id[document_id] = score
+            wave_size *= 2
+        return streams
+    
+    async def _fetch_payloads(self, hits: List[Tuple[float, str, Any, str, str]]) -> Dict[str, Dict[str, Any]]:
+        """
+        Fetch payloads for the final hits with one multi-get per node, asking the
+        replica that answered the first phase; misses are retried on other replicas.
+        """
+        by_node: Dict[str, Dict[str, List[str]]] = defaultdict(lambda: defaultdict(list))
+        for _, document_id, _, shard_id, node_id in hits:
+            by_node[node_id][shard_id].append(document_id)
+        
+        async def multi_get(node_id: str, shards: Dict[str, List[str]]) -> Dict[str, Dict[str, Any]]:
+            node = self.nodes.get(node_id)
+            if node is None:
+                return {}
+            data = await self._call_node(node, "POST", "/multi_get", {"shards": shards})
+            return data.get("documents", {}) if data else {}
+        
+        payloads: Dict[str, Dict[str, Any]] = {}
+        for documents in await asyncio.gather(*(multi_get(n, shards) for n, shards in by_node.items())):
+            payloads.update(documents)
+        
+        for _, document_id, _, shard_id, node_id in hits:
+            if document_id in payloads or shard_id not in self.shards:
+                continue
+            for other in self._read_order(self.shards[shard_id]):
+                if other == node_id:
                     continue
+                documents = await multi_get(other, {shard_id: [document_id]})
+                if document_id in documents:
+                    payloads[document_id] = documents[document_id]
+                    break
+        return payloads
+    
+    async def _search_shard(self, shard_id: str, query_vector: List[float], limit: int, score_threshold: float,
+                            tags: Optional[Set[str]] = None) -> Optional[ShardHits]:
+        """Search a specific shard; returns the answering node and its compact hits."""
+        async def search(node_id: str) -> Optional[ShardHits]:
+            hits = await self._search_node(self.nodes[node_id], shard_id, query_vector, limit, score_threshold, tags)
+            return None if hits is None else (node_id, hits)
+        
+        return await self._read_shard(shard_id, search)
+    
+    async def _search_shard_batch(self, shard_id: str, query_matrix: Dict[str, Any], limit: int,
+                                  score_threshold: float, tags: Optional[Set[str]] = None) -> Optional[ShardHits]:
+        """Search a specific shard for a packed query matrix; returns the answering node and per-query compact hits."""
+        async def search(node_id: str) -> Optional[ShardHits]:
+            payload = {
+                "shard_id": shard_id,
+                "query_matrix": query_matrix,
+                "limit": limit,
+                "score_threshold": score_threshold,
+                "tags": sorted(tags) if tags is not None else None
+            }
+            with self.replica_selector.track(node_id) as outcome:
+                data = await self._call_node(self.nodes[node_id], "POST", "/search_batch", payload)
+                if data is None:
+                    outcome["ok"] = False
+                    return None
+                return node_id, data.get("hits", [])
         
-        return []
+        # Not hedged: batch latencies would skew the single-query hedge delay
+        return await self._read_shard(shard_id, search, hedge=False)
     
-    async def _search_node(self, node: VectorNode, shard_id: str, query_vector: List[float], limit: int, score_threshold: float) -> List[Dict[str, Any]]:
-        """Search a specific node."""
+    async def _read_shard(self, shard_id: str, search: Callable[[str], Awaitable[Optional[ShardHits]]],
+                          hedge: bool = True) -> Optional[ShardHits]:
+        """Run a read against the shard's replicas in read order (hedged if enabled) until one answers."""
+        if shard_id not in self.shards:
+            return None
+        
+        node_ids = self._read_order(self.shards[shard_id])
+        hedged = hedge and self.hedge_policy.enabled and len(node_ids) > 1
+        
+        with span("shard_read", shard_id=shard_id, replicas=len(node_ids), hedged=hedged) as read_span:
+            attempted: List[str] = []
+            answered: List[str] = []
+            
+            async def attempt(node_id: str) -> Optional[ShardHits]:
+                attempted.append(node_id)
+                result = await search(node_id)
+                if result is not None and not answered:
+                    answered.append(node_id)
+                    read_span.set(replica=node_id, attempts=len(attempted))
+                return result
+            
+            if hedged:
+                result = await self._hedged_search(node_ids[0], node_ids[1], attempt)
+                node_ids = node_ids[2:]
+                if result is not None:
+                    return result
+            
+            # Try nodes in order until one answers; an empty answer is still an answer
+            for node_id in node_ids:
+                result = await attempt(node_id)
+                if result is not None:
+                    return result
+            
+            read_span.set(attempts=len(attempted))
+            return None
+    
+    async def _hedged_search(self, primary: str, backup: str,
+                             search: Callable[[str], Awaitable[Optional[ShardHits]]]) -> Optional[ShardHits]:
+        """
+        Query ``primary``; if it is slower than the hedge delay (or fails), also
+        query ``backup`` (within the hedge budget) and take the first answer.
+        """
+        self.hedge_policy.on_request()
+        started = time.monotonic()
+        primary_task = asyncio.create_task(search(primary))
+        delay = self.hedge_policy.delay()
+        done, _ = await asyncio.wait({primary_task}, timeout=delay)
+        if primary_task in done and primary_task.result() is not None:
+            self.hedge_policy.record_latency(time.monotonic() - started)
+            return primary_task.result()
+        
+        if primary_task not in done and not self.hedge_policy.try_hedge():
+            result = await primary_task
+            if result is not None:
+                self.hedge_policy.record_latency(time.monotonic() - started)
+                return result
+            done = {primary_task}
+        
+        # Primary is slow or failed: race the backup against it
+        backup_task = asyncio.create_task(search(backup))
+        pending = {backup_task} if primary_task in done else {primary_task, backup_task}
         try:
-            async with aiohttp.ClientSession() as session:
-                payload = {
-                    "shard_id": shard_id,
-                    "query_vector": query_vector,
-                    "limit": limit,
-                    "score_threshold": score_threshold
-                }
-                async with session.post(f"{node.url}/search", json=payload, timeout=30) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        return data.get("results", [])
-                    return []
-        except Exception as e:
-            logger.warning(f"Search failed on node {node.id}: {e}")
-            return []
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    if result is not None:
+                        if task is backup_task and primary_task in pending:
+                            self.hedge_policy.on_hedge_win()
+                        self.hedge_policy.record_latency(time.monotonic() - started)
+                        return result
+            return None
+        finally:
+            for task in pending:
+                task.cancel()
+    
+    def _read_order(self, shard: VectorShard) -> List[str]:
+        """
+        Replicas to try for a read: a power-of-two-choices pick among caught-up
+        replicas first, then the other caught-up replicas and finally lagging
+        ones, cheapest first. Unhealthy nodes are skipped.
+        """
+        live = [
+            n for n in shard.node_ids
+            # Checking the breaker first lets an expired ejection turn half-open
+            if n in self.nodes and self.circuit_breakers.is_available(n) and self.nodes[n].status != NodeStatus.UNHEALTHY
+        ]
+        readable = [n for n in self._readable_replicas(shard) if n in live]
+        lagging = sorted((n for n in live if n not in readable), key=self.replica_selector.cost)
+        return self.replica_selector.order(readable) + lagging
+    
+    async def _search_node(self, node: VectorNode, shard_id: str, query_vector: List[float], limit: int, score_threshold: float,
+                           tags: Optional[Set[str]] = None) -> Optional[List[List[Any]]]:
+        """Search a specific node for compact [document_id, score(, tags)] hits; None if it failed to answer."""
+        payload = {
+            "shard_id": shard_id,
+            "query_vector": query_vector,
+            "limit": limit,
+            "score_threshold": score_threshold,
+            "tags": sorted(tags) if tags is not None else None,
+            "compact": True
+        }
+        with self.replica_selector.track(node.id) as outcome:
+            data = await self._call_node(node, "POST", "/search", payload)
+            if data is None:
+                outcome["ok"] = False
+                return None
+            return data.get("hits", [])
     
     async def list_collections(self) -> List[Dict[str, Any]]:
         """List all collections in the distributed system."""
@@ -522,11 +2017,20 @@ class DistributedVectorStore:
                 "vectors_count": total_vectors,
                 "shard_count": len(shard_ids)
             })
+        for collection_name, base_collection in self.virtual_collections.items():
+            collections.append({
+                "name": collection_name,
+                "vectors_count": self.virtual_counts.get(collection_name, 0),
+                "shard_count": len(self.collections.get(base_collection, [])),
+                "base_collection": base_collection
+            })
         return collections
     
     async def delete_collection(self, collection_name: str) -> bool:
         """Delete a collection from the distributed system."""
         try:
+            if collection_name in self.virtual_collections:
+                return await self._delete_virtual_collection(collection_name)
             if collection_name not in self.collections:
                 return True
             
@@ -546,6 +2050,15 @@ class DistributedVectorStore:
                 self.shards.pop(shard_id, None)
             self.collections.pop(collection_name, None)
             
+            # Virtual collections over this base lost their vectors with it
+            for virtual_name in [v for v, base in self.virtual_collections.items() if base == collection_name]:
+                self.virtual_collections.pop(virtual_name, None)
+                self.virtual_counts.pop(virtual_name, None)
+                self.collection_centroids.remove(virtual_name)
+            self.collection_centroids.remove(collection_name)
+            if self.catalog:
+                self.catalog.delete_collection(collection_name)
+            
             logger.info(f"Deleted collection {collection_name} from {success_count}/{len(tasks)} nodes")
             return success_count > 0
             
@@ -553,66 +2066,153 @@ class DistributedVectorStore:
             logger.error(f"Failed to delete collection {collection_name}: {e}")
             return False
     
+    async def _delete_virtual_collection(self, collection_name: str) -> bool:
+        """Delete a virtual collection by dropping its tag; the base keeps the vectors."""
+        # One removal version for every node; nodes that miss it get the tombstone through repair
+        version = time.time_ns()
+        tasks = []
+        for node in self.nodes.values():
+            if node.status == NodeStatus.HEALTHY:
+                tasks.append(self._delete_tag_from_node(node, collection_name, version))
+        
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        success_count = sum(1 for r in results if r is True)
+        
+        self.virtual_collections.pop(collection_name, None)
+        self.virtual_counts.pop(collection_name, None)
+        self.collection_centroids.remove(collection_name)
+        if self.catalog:
+            self.catalog.delete_collection(collection_name)
+        
+        logger.info(f"Deleted virtual collection {collection_name} from {success_count}/{len(tasks)} nodes")
+        return success_count > 0
+    
+    async def _delete_tag_from_node(self, node: VectorNode, tag: str, version: int) -> bool:
+        """Remove a virtual collection tag from a specific node."""
+        return await self._call_node(node, "DELETE", f"/tags/{tag}", params={"version": version},
+                                     timeout=10) is not None
+    
     async def _delete_collection_from_node(self, node: VectorNode, collection_name: str) -> bool:
         """Delete collection from a specific node."""
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.delete(f"{node.url}/collections/{collection_name}", timeout=10) as response:
-                    return response.status == 200
-        except Exception as e:
-            logger.warning(f"Failed to delete collection from node {node.id}: {e}")
-            return False
+        return await self._call_node(node, "DELETE", f"/collections/{collection_name}", timeout=10) is not None
     
     async def _redistribute_shards(self):
-        """Redistribute shards when nodes are added/removed."""
-        logger.info("Redistributing shards across nodes")
-        healthy_nodes = [n for n in self.nodes.values() if n.status == NodeStatus.HEALTHY]
-        if len(healthy_nodes) < 2:
-            return
-
-        # Tìm node ít vector nhất (target) và node nhiều vector nhất (source)
-        target_node = min(healthy_nodes, key=lambda n: n.vector_count)
-        source_node = max(healthy_nodes, key=lambda n: n.vector_count)
-        if target_node.id == source_node.id:
-            return
-
-        # Tìm shard thuộc source_node mà chưa có trên target_node
-        candidate_shards = [
-            shard for shard in self.shards.values()
-            if source_node.id in shard.node_ids and target_node.id not in shard.node_ids
-        ]
-        if not candidate_shards:
-            return
-
-        # Di chuyển tất cả các shard cần thiết (không chỉ 1 shard)
-        for shard_to_move in candidate_shards:
-            logger.info(f"Moving shard {shard_to_move.id} from {source_node.id} to {target_node.id}")
+        """Move shards whose ring owners changed after nodes were added or removed."""
+        async with self._redistribute_lock:
+            moves = self._plan_ring_moves()
+            if not moves:
+                return
+            
+            logger.info(f"Shard movement plan: {len(moves)} moves across {len({m.shard_id for m in moves})} shards")
+            for move in moves:
+                await self._apply_shard_move(move)
+    
+    async def _apply_shard_move(self, move: ShardMove) -> bool:
+        """Copy a shard to its new owner, then release the old owner."""
+        shard = self.shards.get(move.shard_id)
+        target_node = self.nodes.get(move.target_node)
+        if shard is None or (target_node is None and move.target_node is not None):
+            return False
+        if shard.id in self._range_changing:
+            # The split or merge places its own shards; the leader's next balance cycle retries this move
+            logger.info(f"Deferring move of shard {shard.id}: split or merge in progress")
+            return False
+        if target_node is None:
+            return await self._release_surplus_replica(shard, move.release_node)
+        if target_node.status != NodeStatus.HEALTHY:
+            # Keep serving from the current holders; the leader's next balance cycle retries this move
+            logger.warning(f"Deferring move of shard {shard.id}: target {target_node.id} is not healthy")
+            return False
+        
+        source_node = self.nodes.get(move.source_node) if move.source_node else None
+        if source_node is not None:
+            if not await self._transfer_shard(shard, source_node, target_node):
+                return False
+        elif shard.vector_count:
+            logger.warning(f"No live holder to copy shard {shard.id} from; assigning it to {target_node.id} empty")
+        
+        node_ids = list(shard.node_ids)
+        released = move.release_node in node_ids
+        if released:
+            node_ids[node_ids.index(move.release_node)] = target_node.id
+        else:
+            node_ids.append(target_node.id)
+        
+        # Cut placement over before deleting the released copy, so no reader is routed to it
+        self._set_shard_nodes(shard, node_ids)
+        if released:
+            released_node = self.nodes.get(move.release_node)
+            if released_node is not None:
+                await self._drop_shard_from_node(released_node, shard.id)
+        logger.info(f"Moved shard {shard.id} to {target_node.id}", released=move.release_node)
+        return True
+    
+    async def _release_surplus_replica(self, shard: VectorShard, node_id: Optional[str]) -> bool:
+        """Take a holder the ring no longer wants out of the replica set, then delete its copy."""
+        if node_id not in shard.node_ids or len(shard.node_ids) <= self.replication_factor:
+            return False
+        self._set_shard_nodes(shard, [n for n in shard.node_ids if n != node_id])
+        released_node = self.nodes.get(node_id)
+        if released_node is not None:
+            await self._drop_shard_from_node(released_node, shard.id)
+        logger.info(f"Released surplus replica of shard {shard.id} from {node_id}")
+        return True
+    
+    async def migrate_shards_from_node(self, node_id: str) -> bool:
+        """
+        Drain a node before it is removed: move every replica it holds elsewhere.
+        
+        The node leaves the hash ring first, so new shards are not placed on
+        it and each of its replicas goes to the node the ring now assigns.
+        Replicas are copied with writes mirrored during the copy and cut over
+        one at a time; the node keeps serving the rest meanwhile.
+        
+        Args:
+            node_id: Node to drain
+            
+        Returns:
+            True if the node holds no shard afterwards. Otherwise the node goes
+            back on the ring and keeps the replicas that were not moved.
+        """
+        node = self.nodes.get(node_id)
+        if node is None:
+            return True
+        
+        # Held for the whole drain so the periodic ring plan never sees the node half removed
+        async with self._redistribute_lock:
+            self.ring.remove_node(node_id)
             try:
-                async with aiohttp.ClientSession() as session:
-                    # Lấy vectors từ source_node
-                    async with session.get(f"{source_node.url}/shards/{shard_to_move.id}/vectors") as resp:
-                        if resp.status != 200:
-                            logger.warning(f"Failed to fetch vectors from {source_node.id} for shard {shard_to_move.id}")
-                            continue
-                        data = await resp.json()
-                        vectors = data.get("vectors", [])
-                        documents = data.get("documents", [])
-
-                    # Upsert vectors vào target_node
-                    payload = {
-                        "shard_id": shard_to_move.id,
-                        "collection_name": shard_to_move.collection_name,
-                        "vectors": vectors,
-                        "documents": documents
-                    }
-                    async with session.post(f"{target_node.url}/vectors", json=payload) as resp2:
-                        if resp2.status == 200:
-                            # Cập nhật metadata: thêm target_node vào node_ids của shard
-                            shard_to_move.node_ids.append(target_node.id)
-                            shard_to_move.replica_nodes.append(target_node.id)
-                            logger.info(f"Shard {shard_to_move.id} now replicated to {target_node.id}")
+                moves = [move for move in self._plan_ring_moves() if move.release_node == node_id]
+                logger.info(f"Draining node {node_id}: {len(moves)} replicas to move")
+                for move in moves:
+                    await self._apply_shard_move(move)
             except Exception as e:
-                logger.warning(f"Error redistributing shard: {e}")
+                logger.error(f"Draining node {node_id} failed: {e}")
+            
+            remaining = [shard.id for shard in self.shards.values() if node_id in shard.node_ids]
+            if remaining:
+                # Pending shards, deferred moves or too few nodes for the replication factor
+                logger.warning(f"Node {node_id} still holds {len(remaining)} shards; keeping it",
+                               shards=remaining[:10])
+                self.ring.add_node(node_id, weight=node.weight, host=node.host, zone=node.zone)
+                return False
+            return True
+    
+    def _ring_placements(self) -> Dict[str, List[str]]:
+        """Current replica sets of the shards the ring may move (not pending ones)."""
+        return {
+            shard_id: list(shard.node_ids)
+            for shard_id, shard in self.shards.items() if shard.state == ShardState.ACTIVE
+        }
+    
+    def _plan_ring_moves(self) -> List[ShardMove]:
+        """Moves that bring placement in line with the ring, keeping rebalancer-pinned replicas."""
+        pinned = [shard_id for shard_id, shard in self.shards.items() if shard.pinned]
+        return self.ring.plan_movement(self._ring_placements(), self.replication_factor, pinned=pinned)
+    
+    def plan_shard_movement(self) -> List[Dict[str, Any]]:
+        """Preview the moves the next redistribution would make."""
+        return [move.to_dict() for move in self._plan_ring_moves()]
         
     def get_cluster_status(self) -> Dict[str, Any]:
         """Get status of the distributed cluster."""
@@ -624,39 +2224,70 @@ class DistributedVectorStore:
             "healthy_nodes": len(healthy_nodes),
             "total_shards": len(self.shards),
             "total_collections": len(self.collections),
+            "total_virtual_collections": len(self.virtual_collections),
             "total_vectors": total_vectors,
             "replication_factor": self.replication_factor,
             "consistency_level": self.consistency_level.value,
             "nodes": [node.to_dict() for node in self.nodes.values()],
-            "shards": [asdict(shard) for shard in self.shards.values()]
+            "shards": [asdict(shard) for shard in self.shards.values()],
+            "ring": self.ring.get_stats(),
+            "replication": self.replication_log.get_stats(),
+            "anti_entropy": self.anti_entropy.get_stats(),
+            "replica_selection": self.replica_selector.get_stats(),
+            "hedging": self.hedge_policy.get_stats(),
+            "circuit_breakers": self.circuit_breakers.get_stats(),
+            "shard_ranges": {
+                **self.range_stats,
+                "in_progress": sorted(self._range_changing),
+                "max_shard_vectors": self.range_planner.max_shard_vectors,
+                "max_shard_qps": self.range_planner.max_shard_qps,
+                "min_shard_vectors": self.range_planner.min_shard_vectors
+            },
+            "catalog": {**self.catalog.get_stats(), "last_reconcile": self.last_reconcile} if self.catalog else None,
+            "coordination": {"pid": os.getpid(), "leader": self.is_leader},
+            "transfers": self.transfer_manager.get_progress()
         }
     
     def get_performance_metrics(self) -> Dict[str, Any]:
-        """Get performance metrics for the distributed system."""
+        """
+        Measured performance of the distributed system over the metrics window.
+        
+        Search latency and throughput are those of whole searches (the shard
+        fan-out as seen by callers); the error rate is that of node RPCs.
+        The window covers every API worker sharing the catalog; other
+        workers' requests are included up to their last catalog flush.
+        ``nodes``, ``shards`` and ``collections`` break the RPC window down
+        with request rate, error rate, bytes per second and latency percentiles.
+        """
         try:
-            # Calculate average load across healthy nodes
             healthy_nodes = [n for n in self.nodes.values() if n.status == NodeStatus.HEALTHY]
             avg_load = statistics.mean([n.load for n in healthy_nodes]) if healthy_nodes else 0.0
-            
-            # Calculate average vectors per node
             total_vectors = sum(shard.vector_count for shard in self.shards.values())
-            avg_vectors_per_node = total_vectors / max(len(healthy_nodes), 1)
-            
-            # Mock performance metrics (in a real system, these would be tracked over time)
-            # For now, we'll use reasonable defaults based on system state
-            avg_search_latency = 50.0 + (avg_load * 200.0)  # 50-250ms based on load
-            query_throughput = max(10.0, 100.0 - (avg_load * 80.0))  # 10-100 QPS based on load
-            error_rate = 0.001 + (avg_load * 0.01)  # 0.1%-1.1% based on load
+            window = self._metrics_window()
+            queries, rpcs = window["query"], window["rpc"]
             
             return {
-                "avg_search_latency": avg_search_latency,
-                "query_throughput": query_throughput,
-                "error_rate": error_rate,
+                "avg_search_latency": queries["latency_ms"]["mean"],
+                "p50_search_latency": queries["latency_ms"]["p50"],
+                "p95_search_latency": queries["latency_ms"]["p95"],
+                "p99_search_latency": queries["latency_ms"]["p99"],
+                "query_throughput": queries["qps"],
+                "search_requests": queries["requests"],
+                "error_rate": rpcs["error_rate"],
+                "rpc_throughput": rpcs["qps"],
+                "rpc_requests": rpcs["requests"],
+                "bytes_sent_per_second": rpcs["bytes_sent_per_second"],
+                "bytes_received_per_second": rpcs["bytes_received_per_second"],
+                "window_seconds": window["window_seconds"],
                 "avg_load": avg_load,
-                "avg_vectors_per_node": avg_vectors_per_node,
+                "avg_vectors_per_node": total_vectors / max(len(healthy_nodes), 1),
                 "healthy_node_ratio": len(healthy_nodes) / max(len(self.nodes), 1),
                 "total_vectors": total_vectors,
-                "total_shards": len(self.shards)
+                "total_shards": len(self.shards),
+                "rpc": rpcs,
+                "nodes": window["nodes"],
+                "shards": window["shards"],
+                "collections": window["collections"]
             }
             
         except Exception as e:
@@ -0,0 +1,168 @@
+"""
+Embedding Server
+
+One process that holds the sentence embedding model for every API worker
+on a host, instead of each worker loading its own copy. Concurrent
+requests are coalesced into micro-batches so the model runs one larger
+batch instead of many small ones. ``RemoteEmbeddingModel`` is the client
+used by the workers; it mirrors the ``encode`` call of a local
+SentenceTransformer, so it can be swapped in without changing callers.
+"""
+
+import asyncio
+import json
+import time
+import urllib.request
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI
+from pydantic import BaseModel
+from sentence_transformers import SentenceTransformer
+
+from core.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class EmbedRequest(BaseModel):
+    texts: List[str]
+
+
+class EmbeddingServer:
+    """Serves ``POST /embed`` from a single shared model."""
+
+    def __init__(self,
+                 model_name: str = "all-MiniLM-L6-v2",
+                 host: str = "localhost",
+                 port: int = 8010,
+                 max_batch_size: int = 64,
+                 batch_window: float = 0.005):
+        """
+        Initialize embedding server.
+
+        Args:
+            model_name: SentenceTransformer model to load
+            host: Bind host
+            port: Bind port
+            max_batch_size: Texts encoded together at most
+            batch_window: Seconds to wait for more requests to join a batch
+        """
+        self.model_name = model_name
+        self.host = host
+        self.port = port
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window
+        self.model = SentenceTransformer(model_name)
+        self._queue: "asyncio.Queue[Tuple[List[str], asyncio.Future]]" = asyncio.Queue()
+        self.stats = {"requests": 0, "texts": 0, "batches": 0, "started_at": time.time()}
+
+        self.app = FastAPI(title="Embedding Server", version="1.0.0")
+        self._setup_routes()
+
+    def _setup_routes(self):
+        @self.app.on_event("startup")
+        async def start_batcher():
+            asyncio.create_task(self._batch_loop())
+
+        @self.app.get("/health")
+        async def health_check():
+            return {"status": "healthy", "model": self.model_name, **self.stats}
+
+        @self.app.post("/embed")
+        async def embed(request: EmbedRequest):
+            if not request.texts:
+                return {"vectors": []}
+            future = asyncio.get_running_loop().create_future()
+            await self._queue.put((request.texts, future))
+            self.stats["requests"] += 1
+            self.stats["texts"] += len(request.texts)
+            return {"vectors": await future}
+
+    async def _batch_loop(self):
+        """Encode queued requests together, one model call at a time."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            size = len(batch[0][0])
+            deadline = loop.time() + self.batch_window
+            while size < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                size += len(item[0])
+
+            texts = [text for request_texts, _ in batch for text in request_texts]
+            try:
+                vectors = await loop.run_in_executor(None, self._encode, texts)
+            except Exception as e:
+                logger.error(f"Embedding batch of {len(texts)} texts failed: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.stats["batches"] += 1
+            offset = 0
+            for request_texts, future in batch:
+                if not future.done():
+                    future.set_result(vectors[offset:offset + len(request_texts)])
+                offset += len(request_texts)
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        embeddings = self.model.encode(texts, convert_to_tensor=False)
+        return embeddings.tolist() if hasattr(embeddings, 'tolist') else embeddings
+
+    def run(self):
+        """Run the embedding server."""
+        logger.info(f"Starting embedding server for {self.model_name} on {self.host}:{self.port}")
+        uvicorn.run(self.app, host=self.host, port=self.port, log_level="info")
+
+
+class RemoteEmbeddingModel:
+    """
+    Client for an ``EmbeddingServer`` with the same ``encode`` call as SentenceTransformer.
+    """
+
+    def __init__(self, url: str, timeout: float = 30.0):
+        """
+        Initialize remote embedding model.
+
+        Args:
+            url: Base URL of the embedding server
+            timeout: Request timeout in seconds
+        """
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def encode(self, texts: List[str], convert_to_tensor: bool = False, **kwargs: Any) -> np.ndarray:
+        """Embed texts on the server (blocking; run in an executor from async code)."""
+        body = json.dumps({"texts": list(texts)}).encode()
+        request = urllib.request.Request(f"{self.url}/embed", data=body,
+                                         headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            payload: Dict[str, Any] = json.loads(response.read())
+        return np.asarray(payload["vectors"], dtype=np.float32)
+
+
+def create_embedding_server(model_name: str = "all-MiniLM-L6-v2", host: str = "localhost", port: int = 8010):
+    """Factory function to create an embedding server."""
+    return EmbeddingServer(model_name, host, port)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Start the shared embedding server")
+    parser.add_argument("--model", type=str, default="all-MiniLM-L6-v2", help="SentenceTransformer model")
+    parser.add_argument("--host", type=str, default="localhost", help="Host")
+    parser.add_argument("--port", type=int, default=8010, help="Port")
+
+    args = parser.parse_args()
+    create_embedding_server(args.model, args.host, args.port).run()
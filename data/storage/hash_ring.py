@@ -0,0 +1,198 @@
+"""
+Consistent Hash Ring
+
+Places shards on nodes with a consistent-hash ring of weighted virtual
+nodes. Placement depends only on cluster membership (never on current
+health), so adding or removing a node only moves the shards whose owners
+actually change, and the movement plan can be computed up front.
+"""
+
+import bisect
+import hashlib
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from core.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+def ring_hash(key: str) -> int:
+    """Stable 64-bit position on the ring."""
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+@dataclass
+class RingMember:
+    """A node's membership in the ring."""
+    node_id: str
+    weight: float = 1.0
+    host: Optional[str] = None
+    zone: Optional[str] = None
+
+
+@dataclass
+class ShardMove:
+    """One step of a shard movement plan."""
+    shard_id: str
+    target_node: Optional[str]  # Node that must receive a copy (None for a pure release)
+    source_node: Optional[str] = None  # Current holder to copy from (None if nobody holds it)
+    release_node: Optional[str] = None  # Holder that no longer owns the shard afterwards
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class HashRing:
+    """
+    Consistent-hash ring with weighted virtual nodes.
+
+    Replica sets are picked by walking the ring clockwise from the shard's
+    position and taking distinct nodes, preferring distinct zones and then
+    distinct hosts before falling back to any distinct node.
+    """
+
+    def __init__(self, vnodes_per_weight: int = 64):
+        """
+        Initialize hash ring.
+
+        Args:
+            vnodes_per_weight: Virtual nodes per unit of node weight
+        """
+        self.vnodes_per_weight = vnodes_per_weight
+        self.members: Dict[str, RingMember] = {}
+        self._hashes: List[int] = []
+        self._owners: List[str] = []
+
+    def __contains__(self, node_id: str) -> bool:
+        return node_id in self.members
+
+    def __len__(self) -> int:
+        return len(self.members)
+
+    def add_node(self, node_id: str, weight: float = 1.0, host: Optional[str] = None, zone: Optional[str] = None) -> None:
+        """Add (or update) a node."""
+        self.members[node_id] = RingMember(node_id=node_id, weight=weight, host=host, zone=zone)
+        self._rebuild()
+
+    def remove_node(self, node_id: str) -> None:
+        """Remove a node."""
+        if self.members.pop(node_id, None) is not None:
+            self._rebuild()
+
+    def _rebuild(self) -> None:
+        points = []
+        for member in self.members.values():
+            vnode_count = max(1, int(round(self.vnodes_per_weight * member.weight)))
+            points.extend((ring_hash(f"{member.node_id}#{i}"), member.node_id) for i in range(vnode_count))
+        points.sort()
+        self._hashes = [h for h, _ in points]
+        self._owners = [owner for _, owner in points]
+
+    def _walk(self, key: str) -> Iterator[str]:
+        """Yield distinct nodes clockwise from the key's position."""
+        if not self._hashes:
+            return
+        start = bisect.bisect(self._hashes, ring_hash(key))
+        seen = set()
+        for i in range(len(self._owners)):
+            owner = self._owners[(start + i) % len(self._owners)]
+            if owner not in seen:
+                seen.add(owner)
+                yield owner
+                if len(seen) == len(self.members):
+                    return
+
+    def get_nodes(self, key: str, count: int) -> List[str]:
+        """
+        Get the ordered replica set (primary first) for a key.
+
+        Args:
+            key: Shard ID
+            count: Number of replicas wanted
+
+        Returns:
+            Up to ``count`` distinct node IDs
+        """
+        candidates = list(self._walk(key))
+        count = min(count, len(candidates))
+        selected: List[str] = []
+
+        # Strict pass keeps zones and hosts distinct, then each constraint is relaxed in turn
+        for distinct_zone, distinct_host in ((True, True), (False, True), (False, False)):
+            for node_id in candidates:
+                if len(selected) >= count:
+                    return selected
+                if node_id in selected:
+                    continue
+                member = self.members[node_id]
+                if distinct_zone and member.zone and any(self.members[s].zone == member.zone for s in selected):
+                    continue
+                if distinct_host and member.host and any(self.members[s].host == member.host for s in selected):
+                    continue
+                selected.append(node_id)
+        return selected
+
+    def desired_nodes(self, shard_id: str, current: List[str], replication_factor: int,
+                      pinned: bool = False) -> List[str]:
+        """
+        Nodes that should hold a shard.
+
+        A pinned shard keeps the current holders that are still ring members
+        and only tops up with ring owners for the ones that left.
+        """
+        if not pinned:
+            return self.get_nodes(shard_id, replication_factor)
+        kept = [n for n in current if n in self.members][:replication_factor]
+        ring_order = [n for n in self.get_nodes(shard_id, len(self.members)) if n not in kept]
+        return kept + ring_order[:replication_factor - len(kept)]
+
+    def plan_movement(self, placements: Dict[str, List[str]], replication_factor: int,
+                      pinned: Optional[Iterable[str]] = None) -> List[ShardMove]:
+        """
+        Compute the minimal moves that bring current placements in line with the ring.
+
+        Args:
+            placements: Shard ID -> nodes currently holding it
+            replication_factor: Desired copies per shard
+            pinned: Shards placed deliberately off the ring, whose live holders are kept
+
+        Returns:
+            Moves, each copying one shard to one new owner and/or releasing one holder
+        """
+        pinned = set(pinned or ())
+        moves: List[ShardMove] = []
+        for shard_id, current in placements.items():
+            desired = self.desired_nodes(shard_id, current, replication_factor, shard_id in pinned)
+            additions = [n for n in desired if n not in current]
+            # Holders that left the ring go first, so a draining node is always released
+            releases = sorted((n for n in current if n not in desired), key=lambda n: n in self.members)
+            if not additions and not releases:
+                continue
+
+            # Copy from a holder that keeps the shard if possible, else from any live holder
+            sources = [n for n in current if n in desired] or [n for n in current if n in self.members] or current
+            for i, target in enumerate(additions):
+                moves.append(ShardMove(
+                    shard_id=shard_id,
+                    target_node=target,
+                    source_node=sources[0] if sources else None,
+                    release_node=releases[i] if i < len(releases) else None
+                ))
+            # Surplus holders are released without a replacement copy
+            for release in releases[len(additions):]:
+                moves.append(ShardMove(shard_id=shard_id, target_node=None, release_node=release))
+        return moves
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get ring membership and the share of the ring each node owns."""
+        ownership: Dict[str, float] = {node_id: 0.0 for node_id in self.members}
+        span = 1 << 64
+        for i, owner in enumerate(self._owners):
+            previous = self._hashes[i - 1] if i else self._hashes[-1] - span
+            ownership[owner] += (self._hashes[i] - previous) / span
+        return {
+            "nodes": {node_id: asdict(member) for node_id, member in self.members.items()},
+            "virtual_nodes": len(self._hashes),
+            "ownership": ownership,
+        }
@@ -0,0 +1,97 @@
+"""
+Request Hedging
+
+Tail-latency control for shard reads. When a shard RPC has not answered
+within the observed p95 latency, the same request is sent to another
+replica and the first answer wins. A token budget caps hedges at a fixed
+fraction of requests so hedging cannot amplify load during an overload.
+"""
+
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+import numpy as np
+
+from core.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class HedgePolicy:
+    """
+    Hedge delay from a rolling latency window, rate-limited by a budget.
+    """
+
+    def __init__(self,
+                 budget: float = 0.05,
+                 percentile: float = 95.0,
+                 window_size: int = 1000,
+                 min_samples: int = 20,
+                 min_delay: float = 0.005,
+                 max_delay: float = 2.0,
+                 max_tokens: float = 10.0):
+        """
+        Initialize hedge policy.
+
+        Args:
+            budget: Hedges allowed per request (0 disables hedging)
+            percentile: Latency percentile after which a request is hedged
+            window_size: Number of recent shard read latencies kept
+            min_samples: Samples needed before hedging starts
+            min_delay: Lower bound for the hedge delay in seconds
+            max_delay: Upper bound for the hedge delay in seconds
+            max_tokens: Hedges that may be saved up for a burst
+        """
+        self.budget = budget
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.max_tokens = max_tokens
+        self._latencies: Deque[float] = deque(maxlen=window_size)
+        self._delay: Optional[float] = None
+        self._tokens = 0.0
+        self.stats = {"requests": 0, "hedges": 0, "hedge_wins": 0, "denied": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.budget > 0
+
+    def record_latency(self, latency: float) -> None:
+        """Add the latency a caller saw for one (possibly hedged) shard read."""
+        self._latencies.append(latency)
+        self._delay = None
+
+    def delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None while there are too few samples."""
+        if not self.enabled or len(self._latencies) < self.min_samples:
+            return None
+        if self._delay is None:
+            observed = float(np.percentile(np.fromiter(self._latencies, dtype=float), self.percentile))
+            self._delay = min(max(observed, self.min_delay), self.max_delay)
+        return self._delay
+
+    def on_request(self) -> None:
+        """Count a hedgeable request and earn its share of the budget."""
+        self.stats["requests"] += 1
+        self._tokens = min(self._tokens + self.budget, self.max_tokens)
+
+    def try_hedge(self) -> bool:
+        """Spend one hedge from the budget."""
+        if self._tokens >= 1.0:
+            self._tokens -= 1.0
+            self.stats["hedges"] += 1
+            return True
+        self.stats["denied"] += 1
+        return False
+
+    def on_hedge_win(self) -> None:
+        self.stats["hedge_wins"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "budget": self.budget,
+            "delay": self.delay(),
+            "samples": len(self._latencies),
+        }
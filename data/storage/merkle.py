@@ -0,0 +1,108 @@
+"""
+Merkle Digest
+
+Incrementally maintained hash tree over the (document id, version) pairs
+of a shard. Documents are hashed into a fixed number of leaf buckets and
+every tree node holds the XOR of the row hashes below it, so a write
+updates one node per level and two replicas can locate their differences
+by descending only into subtrees whose hashes disagree.
+"""
+
+import hashlib
+import zlib
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+
+def row_hash(document_id: str, version: int, tags: Iterable[str] = ()) -> int:
+    """64-bit hash of one row's identity, version and tags."""
+    key = f"{document_id}\0{version}\0{','.join(sorted(tags))}"
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class MerkleTree:
+    """
+    Fixed-shape XOR hash tree with ``fanout ** depth`` leaf buckets.
+
+    Level 0 is the root; level ``depth`` holds the leaf buckets.
+    """
+
+    def __init__(self, fanout: int = 16, depth: int = 3):
+        """
+        Initialize Merkle tree.
+
+        Args:
+            fanout: Children per tree node
+            depth: Levels below the root (leaf buckets = fanout ** depth)
+        """
+        self.fanout = fanout
+        self.depth = depth
+        self.leaf_count = fanout ** depth
+        self._levels = [np.zeros(fanout ** level, dtype=np.uint64) for level in range(depth + 1)]
+        self._hashes: Dict[str, int] = {}
+        self._buckets: List[Dict[str, int]] = [dict() for _ in range(self.leaf_count)]
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    @property
+    def root(self) -> int:
+        return int(self._levels[0][0])
+
+    def bucket_for(self, document_id: str) -> int:
+        return zlib.crc32(document_id.encode()) % self.leaf_count
+
+    def _apply(self, bucket: int, value: int) -> None:
+        value = np.uint64(value)
+        for level in range(self.depth, -1, -1):
+            self._levels[level][bucket] ^= value
+            bucket //= self.fanout
+
+    def update(self, document_id: str, value: int) -> None:
+        """Set (or replace) the row hash for a document."""
+        bucket = self.bucket_for(document_id)
+        old = self._hashes.get(document_id)
+        if old == value:
+            return
+        if old is not None:
+            self._apply(bucket, old)
+        self._apply(bucket, value)
+        self._hashes[document_id] = value
+        self._buckets[bucket][document_id] = value
+
+    def remove(self, document_id: str) -> None:
+        old = self._hashes.pop(document_id, None)
+        if old is None:
+            return
+        bucket = self.bucket_for(document_id)
+        self._apply(bucket, old)
+        del self._buckets[bucket][document_id]
+
+    def hashes(self, level: int, indices: Optional[Sequence[int]] = None) -> Dict[int, int]:
+        """
+        Get node hashes at a level.
+
+        Args:
+            level: Tree level (0 = root, ``depth`` = leaf buckets)
+            indices: Nodes wanted at that level (all if None)
+
+        Returns:
+            Index -> hash
+        """
+        values = self._levels[level]
+        if indices is None:
+            indices = range(len(values))
+        return {int(i): int(values[i]) for i in indices if 0 <= i < len(values)}
+
+    def children(self, index: int) -> List[int]:
+        """Indices one level down below a node."""
+        return list(range(index * self.fanout, (index + 1) * self.fanout))
+
+    def bucket_entries(self, buckets: Iterable[int]) -> Dict[str, int]:
+        """Document id -> row hash for every document in the given leaf buckets."""
+        entries: Dict[str, int] = {}
+        for bucket in buckets:
+            if 0 <= bucket < self.leaf_count:
+                entries.update(self._buckets[bucket])
+        return entries
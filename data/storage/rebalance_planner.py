@@ -0,0 +1,177 @@
+"""
+Rebalance Planner
+
+Plans a bounded set of shard replica moves that lower the maximum node
+load, using the real per-shard size and windowed QPS reported by the
+nodes. Each cycle is limited by a byte budget and a move count, and a
+move is only planned when it strictly improves the hottest node, so
+repeated cycles converge instead of copying shards back and forth.
+"""
+
+from dataclasses import dataclass, asdict, field
+from typing import Any, Dict, List, Optional
+
+from core.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class ShardLoad:
+    """Measured size and traffic of one shard."""
+    shard_id: str
+    size_bytes: int
+    qps: float
+    node_ids: List[str]
+    vector_count: int = 0
+
+
+@dataclass
+class RebalanceMove:
+    """Move one replica: copy to target, cut over, then delete from source."""
+    shard_id: str
+    source_node: str
+    target_node: str
+    size_bytes: int
+    cost: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass
+class RebalancePlan:
+    """Result of one planning cycle."""
+    moves: List[RebalanceMove] = field(default_factory=list)
+    node_loads_before: Dict[str, float] = field(default_factory=dict)
+    node_loads_after: Dict[str, float] = field(default_factory=dict)
+    bytes_planned: int = 0
+    bytes_budget: int = 0
+
+    @property
+    def max_load_before(self) -> float:
+        return max(self.node_loads_before.values(), default=0.0)
+
+    @property
+    def max_load_after(self) -> float:
+        return max(self.node_loads_after.values(), default=0.0)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "moves": [move.to_dict() for move in self.moves],
+            "node_loads_before": self.node_loads_before,
+            "node_loads_after": self.node_loads_after,
+            "max_load_before": self.max_load_before,
+            "max_load_after": self.max_load_after,
+            "bytes_planned": self.bytes_planned,
+            "bytes_budget": self.bytes_budget,
+        }
+
+
+class RebalancePlanner:
+    """
+    Greedy min-max planner: repeatedly moves the replica that best evens out
+    the hottest node and the coldest eligible node.
+    """
+
+    def __init__(self,
+                 max_bytes_per_cycle: int = 256 * 1024 * 1024,
+                 max_moves_per_cycle: int = 8,
+                 size_weight: float = 0.5,
+                 qps_weight: float = 0.5,
+                 min_improvement: float = 0.02):
+        """
+        Initialize rebalance planner.
+
+        Args:
+            max_bytes_per_cycle: Total bytes that may be copied in one cycle
+            max_moves_per_cycle: Maximum replica moves in one cycle
+            size_weight: Weight of a replica's share of cluster bytes in its cost
+            qps_weight: Weight of a replica's share of cluster QPS in its cost
+            min_improvement: Minimum drop in the hottest node's load for a move to be worth it
+        """
+        self.max_bytes_per_cycle = max_bytes_per_cycle
+        self.max_moves_per_cycle = max_moves_per_cycle
+        self.size_weight = size_weight
+        self.qps_weight = qps_weight
+        self.min_improvement = min_improvement
+
+    def _replica_costs(self, shards: List[ShardLoad]) -> Dict[str, float]:
+        """Cost of one replica of each shard, as a share of total cluster load."""
+        total_bytes = sum(s.size_bytes * len(s.node_ids) for s in shards) or 1
+        total_qps = sum(s.qps for s in shards) or 1.0
+        costs = {}
+        for shard in shards:
+            replicas = max(len(shard.node_ids), 1)
+            # Each replica stores the whole shard but serves only its share of the reads
+            costs[shard.shard_id] = (self.size_weight * shard.size_bytes / total_bytes +
+                                     self.qps_weight * (shard.qps / replicas) / total_qps)
+        return costs
+
+    def plan(self,
+             shards: List[ShardLoad],
+             nodes: List[str],
+             node_hosts: Optional[Dict[str, str]] = None) -> RebalancePlan:
+        """
+        Plan replica moves for one cycle.
+
+        Args:
+            shards: Measured shard loads with their current holders
+            nodes: Nodes eligible as sources and targets
+            node_hosts: Optional node -> host map; replicas of a shard stay on distinct hosts
+
+        Returns:
+            Plan with the moves in execution order and projected node loads
+        """
+        node_hosts = node_hosts or {}
+        plan = RebalancePlan(bytes_budget=self.max_bytes_per_cycle)
+        if len(nodes) < 2 or not shards:
+            return plan
+
+        costs = self._replica_costs(shards)
+        placements = {s.shard_id: [n for n in s.node_ids if n in nodes] for s in shards}
+        sizes = {s.shard_id: s.size_bytes for s in shards}
+        loads = {node_id: 0.0 for node_id in nodes}
+        for shard_id, holders in placements.items():
+            for node_id in holders:
+                loads[node_id] += costs[shard_id]
+        plan.node_loads_before = dict(loads)
+
+        moved = set()
+        while len(plan.moves) < self.max_moves_per_cycle:
+            hottest = max(loads, key=loads.get)
+            best = None
+            for shard_id, holders in placements.items():
+                if hottest not in holders or shard_id in moved:
+                    continue
+                if plan.bytes_planned + sizes[shard_id] > self.max_bytes_per_cycle:
+                    continue
+                holder_hosts = {node_hosts.get(n) for n in holders if n != hottest and node_hosts.get(n)}
+                for target in nodes:
+                    if target in holders or (node_hosts.get(target) and node_hosts.get(target) in holder_hosts):
+                        continue
+                    cost = costs[shard_id]
+                    new_peak = max(loads[hottest] - cost, loads[target] + cost)
+                    gain = loads[hottest] - new_peak
+                    if gain >= self.min_improvement and (best is None or gain > best[0]):
+                        best = (gain, shard_id, target)
+            if best is None:
+                break
+
+            _, shard_id, target = best
+            cost = costs[shard_id]
+            plan.moves.append(RebalanceMove(
+                shard_id=shard_id,
+                source_node=hottest,
+                target_node=target,
+                size_bytes=sizes[shard_id],
+                cost=cost
+            ))
+            plan.bytes_planned += sizes[shard_id]
+            loads[hottest] -= cost
+            loads[target] += cost
+            placements[shard_id] = [target if n == hottest else n for n in placements[shard_id]]
+            moved.add(shard_id)
+
+        plan.node_loads_after = loads
+        return plan
@@ -0,0 +1,133 @@
+"""
+Replica Selector
+
+Chooses which replica serves a shard read. Each node's cost is its
+EWMA latency scaled by the requests it currently has in flight; a read
+samples two candidate replicas at random and goes to the cheaper one
+(power of two choices), which spreads load across replicas while
+steering away from slow or overloaded nodes.
+"""
+
+import asyncio
+import random
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from core.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class ReplicaStats:
+    """Live read statistics for one node."""
+    in_flight: int = 0
+    ewma_latency: Optional[float] = None
+    requests: int = 0
+    failures: int = 0
+    last_failure_at: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class ReplicaSelector:
+    """
+    Power-of-two-choices replica selection over EWMA latency and in-flight counts.
+    """
+
+    def __init__(self,
+                 alpha: float = 0.2,
+                 default_latency: float = 0.05,
+                 failure_latency: float = 5.0,
+                 rng: Optional[random.Random] = None):
+        """
+        Initialize replica selector.
+
+        Args:
+            alpha: EWMA smoothing factor for new latency samples
+            default_latency: Assumed latency (seconds) of a node with no samples yet
+            failure_latency: Latency sample recorded for a failed request
+            rng: Random source (for reproducible selection)
+        """
+        self.alpha = alpha
+        self.default_latency = default_latency
+        self.failure_latency = failure_latency
+        self.rng = rng or random.Random()
+        self.stats: Dict[str, ReplicaStats] = {}
+
+    def _stats(self, node_id: str) -> ReplicaStats:
+        stats = self.stats.get(node_id)
+        if stats is None:
+            stats = ReplicaStats()
+            self.stats[node_id] = stats
+        return stats
+
+    def cost(self, node_id: str) -> float:
+        """Expected wait for a new request on the node."""
+        stats = self._stats(node_id)
+        latency = stats.ewma_latency if stats.ewma_latency is not None else self.default_latency
+        return latency * (stats.in_flight + 1)
+
+    def choose(self, candidates: Sequence[str]) -> Optional[str]:
+        """Pick the cheaper of two random candidates."""
+        if not candidates:
+            return None
+        if len(candidates) == 1:
+            return candidates[0]
+        first, second = self.rng.sample(list(candidates), 2)
+        return first if self.cost(first) <= self.cost(second) else second
+
+    def order(self, candidates: Sequence[str]) -> List[str]:
+        """Candidates in attempt order: a two-choice pick first, the rest cheapest first."""
+        chosen = self.choose(candidates)
+        if chosen is None:
+            return []
+        rest = sorted((c for c in candidates if c != chosen), key=self.cost)
+        return [chosen] + rest
+
+    @contextmanager
+    def track(self, node_id: str) -> Iterator[Dict[str, bool]]:
+        """
+        Count a request as in flight and record its latency when it finishes.
+
+        The yielded dict's ``ok`` flag should be set to False if the request
+        failed; failures are recorded with ``failure_latency``. A cancelled
+        request (e.g. the losing side of a hedge) records its elapsed time.
+        """
+        stats = self._stats(node_id)
+        stats.in_flight += 1
+        outcome = {"ok": True}
+        started = time.monotonic()
+        try:
+            yield outcome
+        except asyncio.CancelledError:
+            raise
+        except BaseException:
+            outcome["ok"] = False
+            raise
+        finally:
+            stats.in_flight -= 1
+            self.record(node_id, time.monotonic() - started, outcome["ok"])
+
+    def record(self, node_id: str, latency: float, success: bool = True) -> None:
+        """Fold one latency sample into the node's EWMA."""
+        stats = self._stats(node_id)
+        stats.requests += 1
+        if not success:
+            stats.failures += 1
+            stats.last_failure_at = time.time()
+            latency = max(latency, self.failure_latency)
+        if stats.ewma_latency is None:
+            stats.ewma_latency = latency
+        else:
+            stats.ewma_latency += self.alpha * (latency - stats.ewma_latency)
+
+    def forget(self, node_id: str) -> None:
+        """Drop statistics for a node that left the cluster."""
+        self.stats.pop(node_id, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {node_id: {**stats.to_dict(), "cost": self.cost(node_id)} for node_id, stats in self.stats.items()}
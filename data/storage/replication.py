@@ -0,0 +1,312 @@
+"""
+Replication Log
+
+Coordinator-side, per-node queues that deliver writes acknowledged at
+quorum to the remaining replicas asynchronously. Each node has one
+worker that sends its queue in order, merging consecutive writes to the
+same shard into batches and retrying failed batches with backoff.
+Queues are bounded: writers wait for space (backpressure), and a replica
+whose queue stays full is marked stale so it stops serving reads until
+anti-entropy repair brings it back in sync.
+
+Each API worker has its own log, so stale marks are shared through the
+cluster catalog: a worker publishes the marks it made, takes the shared
+set on every catalog sync, and stops dropping a replica's writes (but
+still keeps reads off it) once the leader starts repairing it.
+"""
+
+import asyncio
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+from core.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class ReplicationEntry:
+    """One acknowledged write waiting to reach a replica."""
+    shard_id: str
+    collection_name: str
+    vectors: List[List[float]]
+    documents: List[Dict[str, Any]]
+    tags: List[str] = field(default_factory=list)
+    versions: List[int] = field(default_factory=list)
+    enqueued_at: float = field(default_factory=time.time)
+
+
+# send(node_id, entry) -> True once the node applied the (merged) entry
+SendFunction = Callable[[str, ReplicationEntry], Awaitable[bool]]
+
+
+class ReplicationLog:
+    """
+    Per-node asynchronous replication queues with batching and backpressure.
+    """
+
+    def __init__(self,
+                 send: SendFunction,
+                 batch_size: int = 256,
+                 max_pending_documents: int = 50_000,
+                 max_wait: float = 5.0,
+                 retry_delay: float = 0.5,
+                 max_retry_delay: float = 30.0):
+        """
+        Initialize replication log.
+
+        Args:
+            send: Coroutine applying an entry on a node
+            batch_size: Maximum documents sent to a node in one request
+            max_pending_documents: Queue bound per node
+            max_wait: Seconds a writer waits for queue space before the replica is marked stale
+            retry_delay: Initial backoff after a failed batch
+            max_retry_delay: Upper bound for the backoff
+        """
+        self.send = send
+        self.batch_size = batch_size
+        self.max_pending_documents = max_pending_documents
+        self.max_wait = max_wait
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+
+        self._queues: Dict[str, Deque[ReplicationEntry]] = defaultdict(deque)
+        self._pending_documents: Dict[str, int] = defaultdict(int)
+        self._pending_by_shard: Dict[Tuple[str, str], int] = defaultdict(int)
+        self._stale: Set[Tuple[str, str]] = set()
+        # Replicas being repaired: writes are queued again, reads wait for the repair
+        self._repairing: Set[Tuple[str, str]] = set()
+        # (node, shard) -> time of the latest write dropped for it, not published yet
+        self._stale_marks: Dict[Tuple[str, str], float] = {}
+        self._wakeup: Dict[str, asyncio.Event] = {}
+        self._space: Dict[str, asyncio.Event] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+        self._stats: Dict[str, Dict[str, Any]] = defaultdict(lambda: {
+            "applied_documents": 0,
+            "applied_batches": 0,
+            "failed_batches": 0,
+            "last_error": None,
+            "last_applied_at": None,
+        })
+
+    async def append(self,
+                     node_id: str,
+                     shard_id: str,
+                     collection_name: str,
+                     vectors: List[List[float]],
+                     documents: List[Dict[str, Any]],
+                     tags: Optional[List[str]] = None,
+                     versions: Optional[List[int]] = None) -> bool:
+        """
+        Queue a write for a replica, waiting for queue space if needed.
+
+        Returns:
+            False if the replica was (or has now been) marked stale instead
+        """
+        key = (node_id, shard_id)
+        if key in self._stale:
+            self._stale_marks[key] = time.time()
+            return False
+
+        deadline = time.monotonic() + self.max_wait
+        while (self._pending_documents[node_id] and
+               self._pending_documents[node_id] + len(documents) > self.max_pending_documents):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logger.warning(f"Replication queue for {node_id} is full; marking shard {shard_id} stale there")
+                self.mark_stale(node_id, shard_id)
+                return False
+            space = self._space.setdefault(node_id, asyncio.Event())
+            space.clear()
+            try:
+                await asyncio.wait_for(space.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                pass
+
+        self._queues[node_id].append(ReplicationEntry(
+            shard_id=shard_id,
+            collection_name=collection_name,
+            vectors=vectors,
+            documents=documents,
+            tags=list(tags or []),
+            versions=list(versions or [])
+        ))
+        self._pending_documents[node_id] += len(documents)
+        self._pending_by_shard[key] += len(documents)
+
+        self._ensure_worker(node_id)
+        self._wakeup[node_id].set()
+        return True
+
+    def _ensure_worker(self, node_id: str) -> None:
+        self._wakeup.setdefault(node_id, asyncio.Event())
+        worker = self._workers.get(node_id)
+        if worker is None or worker.done():
+            self._workers[node_id] = asyncio.create_task(self._run(node_id))
+
+    def _next_batch(self, queue: Deque[ReplicationEntry]) -> Tuple[ReplicationEntry, List[ReplicationEntry]]:
+        """Merge consecutive entries for the same shard and tags; returns (batch, entries used)."""
+        first = queue[0]
+        vectors, documents, versions = list(first.vectors), list(first.documents), list(first.versions)
+        used = [first]
+        while len(used) < len(queue):
+            entry = queue[len(used)]
+            if (entry.shard_id != first.shard_id or entry.tags != first.tags or
+                    len(documents) + len(entry.documents) > self.batch_size):
+                break
+            vectors.extend(entry.vectors)
+            documents.extend(entry.documents)
+            versions.extend(entry.versions)
+            used.append(entry)
+        batch = ReplicationEntry(
+            shard_id=first.shard_id,
+            collection_name=first.collection_name,
+            vectors=vectors,
+            documents=documents,
+            tags=first.tags,
+            versions=versions if len(versions) == len(documents) else [],
+            enqueued_at=first.enqueued_at
+        )
+        return batch, used
+
+    async def _run(self, node_id: str) -> None:
+        queue = self._queues[node_id]
+        wakeup = self._wakeup[node_id]
+        stats = self._stats[node_id]
+        delay = self.retry_delay
+
+        while True:
+            if not queue:
+                wakeup.clear()
+                await wakeup.wait()
+                continue
+
+            batch, used = self._next_batch(queue)
+            try:
+                applied = await self.send(node_id, batch)
+            except Exception as e:
+                stats["last_error"] = str(e)
+                applied = False
+
+            if not applied:
+                stats["failed_batches"] += 1
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+                continue
+
+            delay = self.retry_delay
+            for entry in used:
+                # Entries discarded while the batch was in flight are already accounted for
+                if queue and queue[0] is entry:
+                    queue.popleft()
+                    self._pending_documents[node_id] -= len(entry.documents)
+                    self._pending_by_shard[(node_id, entry.shard_id)] -= len(entry.documents)
+            stats["applied_documents"] += len(batch.documents)
+            stats["applied_batches"] += 1
+            stats["last_applied_at"] = time.time()
+            if node_id in self._space:
+                self._space[node_id].set()
+
+    def is_caught_up(self, node_id: str, shard_id: str) -> bool:
+        """True if the replica has every acknowledged write for the shard."""
+        key = (node_id, shard_id)
+        return (key not in self._stale and key not in self._repairing and
+                self._pending_by_shard.get(key, 0) <= 0)
+
+    def stale_replicas(self) -> List[Tuple[str, str]]:
+        """Replicas that dropped writes and need a full re-copy."""
+        return sorted(self._stale)
+
+    def repairing_replicas(self) -> List[Tuple[str, str]]:
+        """Stale replicas whose repair has started."""
+        return sorted(self._repairing)
+
+    def mark_stale(self, node_id: str, shard_id: str, marked_at: Optional[float] = None) -> None:
+        key = (node_id, shard_id)
+        self._stale.add(key)
+        self._repairing.discard(key)
+        self._stale_marks[key] = max(self._stale_marks.get(key, 0.0), marked_at or time.time())
+
+    def take_stale_marks(self) -> Dict[Tuple[str, str], float]:
+        """Stale marks made since the last call, to publish to the other workers."""
+        marks, self._stale_marks = self._stale_marks, {}
+        return marks
+
+    def set_shared_stale(self, stale: Iterable[Tuple[str, str]], repairing: Iterable[Tuple[str, str]]) -> None:
+        """
+        Take the cluster-wide stale and repairing replicas, keeping this
+        worker's marks that are not published yet.
+        """
+        self._stale = set(stale) | set(self._stale_marks)
+        self._repairing = set(repairing) - self._stale
+
+    def start_repair(self, node_id: str, shard_id: str) -> None:
+        """Queue a stale replica's writes again; it stays unreadable until ``finish_repair``."""
+        key = (node_id, shard_id)
+        if key in self._stale:
+            self._stale.discard(key)
+            self._stale_marks.pop(key, None)
+            self._repairing.add(key)
+
+    def finish_repair(self, node_id: str, shard_id: str) -> bool:
+        """Make a repaired replica readable; False if it dropped writes again meanwhile."""
+        key = (node_id, shard_id)
+        if key not in self._repairing:
+            return False
+        self._repairing.discard(key)
+        return True
+
+    def clear_stale(self, node_id: str, shard_id: str) -> None:
+        """Mark a replica as repaired (e.g. after a full shard copy)."""
+        key = (node_id, shard_id)
+        self._stale.discard(key)
+        self._repairing.discard(key)
+        self._stale_marks.pop(key, None)
+
+    def discard_shard(self, node_id: str, shard_id: str) -> None:
+        """Forget pending writes for a replica that no longer holds the shard."""
+        queue = self._queues.get(node_id)
+        if queue:
+            kept = deque(entry for entry in queue if entry.shard_id != shard_id)
+            removed = sum(len(entry.documents) for entry in queue if entry.shard_id == shard_id)
+            queue.clear()
+            queue.extend(kept)
+            self._pending_documents[node_id] -= removed
+        self._pending_by_shard.pop((node_id, shard_id), None)
+        self.clear_stale(node_id, shard_id)
+
+    def drop_node(self, node_id: str) -> None:
+        """Stop replicating to a node that left the cluster."""
+        worker = self._workers.pop(node_id, None)
+        if worker is not None:
+            worker.cancel()
+        self._queues.pop(node_id, None)
+        self._pending_documents.pop(node_id, None)
+        self._wakeup.pop(node_id, None)
+        self._space.pop(node_id, None)
+        self._stats.pop(node_id, None)
+        for key in [k for k in self._pending_by_shard if k[0] == node_id]:
+            del self._pending_by_shard[key]
+        self._stale = {key for key in self._stale if key[0] != node_id}
+        self._repairing = {key for key in self._repairing if key[0] != node_id}
+        self._stale_marks = {key: at for key, at in self._stale_marks.items() if key[0] != node_id}
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Per-node replica lag."""
+        now = time.time()
+        nodes = {}
+        for node_id in set(self._queues) | set(self._stats):
+            queue = self._queues.get(node_id) or ()
+            nodes[node_id] = {
+                "pending_entries": len(queue),
+                "pending_documents": self._pending_documents.get(node_id, 0),
+                "lag_seconds": now - queue[0].enqueued_at if queue else 0.0,
+                "lagging_shards": sorted(s for (n, s), count in self._pending_by_shard.items()
+                                         if n == node_id and count > 0),
+                "stale_shards": sorted(s for (n, s) in self._stale if n == node_id),
+                "repairing_shards": sorted(s for (n, s) in self._repairing if n == node_id),
+                **self._stats[node_id],
+            }
+        return {"nodes": nodes, "stale_replicas": len(self._stale), "repairing_replicas": len(self._repairing)}
@@ -0,0 +1,382 @@
+"""
+Segment Snapshots
+
+Multi-process search for a vector node. The node process stays the only
+writer: it applies upserts to its ShardSegments and publishes immutable
+snapshots of them block by block, each block as a set of ``.npy`` files
+(vectors, tag bitmaps, bound centroid) plus its row ids, and a manifest
+listing the blocks of one snapshot. A pool of search worker processes
+memory-maps those files read-only, so every worker shares one copy of
+each shard matrix through the page cache and scores queries on its own
+core, outside the node's GIL.
+
+Publishing is incremental: rows never move within a segment, so a new
+snapshot only writes the blocks changed since the previous one (usually
+the last, growing block) and reuses the files of every other block. The
+copy runs on a thread; a block written to while it was being copied is
+left out and stays with its previous files.
+
+A search scores the snapshot's current blocks in a worker and the blocks
+changed since the snapshot in the node process, so writes only take
+their own blocks off the pool and results are never staler than a local
+read.
+"""
+
+import asyncio
+import heapq
+import json
+import multiprocessing
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from core.utils.logging import get_logger
+from data.storage.shard_segment import ShardSegment, search_matrix, _normalize_rows
+
+logger = get_logger(__name__)
+
+
+class SnapshotBlock:
+    """Read-only, memory-mapped rows of one published block."""
+
+    def __init__(self, directory: str):
+        path = Path(directory)
+        with open(path / "meta.json") as f:
+            meta = json.load(f)
+        self.ids: List[str] = meta["ids"]
+        self.radius: float = meta["radius"]
+        self.tag_index = {tag: i for i, tag in enumerate(meta["tag_names"])}
+        self.matrix = np.load(path / "matrix.npy", mmap_mode="r")
+        self.tag_bitmaps = np.load(path / "tags.npy", mmap_mode="r") if self.tag_index else None
+        self.centroid = np.load(path / "centroid.npy")
+
+    def mask(self, tags: Iterable[str]) -> np.ndarray:
+        mask = np.zeros(len(self.ids), dtype=bool)
+        for tag in tags:
+            i = self.tag_index.get(tag)
+            if i is not None:
+                mask |= self.tag_bitmaps[i]
+        return mask
+
+
+class SegmentSnapshot:
+    """The blocks of one published segment generation."""
+
+    def __init__(self, manifest: str, blocks: Dict[str, SnapshotBlock]):
+        """
+        Args:
+            manifest: Manifest file of the snapshot
+            blocks: Blocks already mapped by this process, by directory (reused, not reloaded)
+        """
+        with open(manifest) as f:
+            meta = json.load(f)
+        self.manifest = manifest
+        self.block_size: int = meta["block_size"]
+        self.directories: List[str] = meta["blocks"]
+        self.blocks = [blocks.get(directory) or SnapshotBlock(directory) for directory in self.directories]
+
+    def search(self, query_vector: List[float], limit: int, score_threshold: float,
+               tags: Optional[Iterable[str]] = None,
+               skip: Iterable[int] = ()) -> List[Tuple[int, float, str]]:
+        """
+        Top-k over every block except ``skip``.
+
+        Returns:
+            (row, score, document id) triples, best first
+        """
+        query = _normalize_rows(query_vector)[0]
+        skip = set(skip)
+        hits: List[Tuple[float, int, str]] = []
+        for index, block in enumerate(self.blocks):
+            if index in skip:
+                continue
+            # Same bound (and slack) as the segment's own block pruning
+            if score_threshold > -1.0 and float(block.centroid @ query) + block.radius + 1e-4 < score_threshold:
+                continue
+            mask = block.mask(tags) if tags is not None else None
+            if mask is not None and not mask.any():
+                continue
+            start = index * self.block_size
+            for row, score in search_matrix(block.matrix, query, limit, score_threshold, mask=mask):
+                hits.append((score, start + row, block.ids[row]))
+        return [(row, score, document_id) for score, row, document_id in heapq.nlargest(limit, hits)]
+
+
+def copy_block(state: Dict[str, Any], block: int) -> Dict[str, Any]:
+    """Copy one block out of a ``ShardSegment.snapshot_state`` (safe off the writer's thread)."""
+    block_size = state["block_size"]
+    start, end = block * block_size, min((block + 1) * block_size, state["size"])
+    matrix = state["matrix"][start:end].copy()
+    tag_bitmaps = {tag: bitmap[start:end].copy() for tag, bitmap in state["tags"].items()}
+    tag_names = sorted(tag for tag, bitmap in tag_bitmaps.items() if bitmap.any())
+    centroid = matrix.mean(axis=0)
+    return {
+        "generation": state["block_generations"][block],
+        "matrix": matrix,
+        "ids": state["ids"][start:end],
+        "tag_names": tag_names,
+        "tag_bitmaps": (np.stack([tag_bitmaps[tag] for tag in tag_names]) if tag_names
+                        else np.zeros((0, len(matrix)), dtype=bool)),
+        "centroid": centroid,
+        "radius": float(np.sqrt(((matrix - centroid) ** 2).sum(axis=1).max())),
+    }
+
+
+def write_block(shard_dir: Path, index: int, arrays: Dict[str, Any]) -> str:
+    """
+    Write one block generation (atomically, via a temporary directory).
+
+    Returns:
+        Directory of the block
+    """
+    final = shard_dir / f"block-{index}-{arrays['generation']}"
+    if final.exists():
+        return str(final)
+
+    staging = shard_dir / f".staging-{index}-{arrays['generation']}-{os.getpid()}"
+    staging.mkdir(exist_ok=True)
+    np.save(staging / "matrix.npy", arrays["matrix"])
+    np.save(staging / "tags.npy", arrays["tag_bitmaps"])
+    np.save(staging / "centroid.npy", arrays["centroid"])
+    with open(staging / "meta.json", "w") as f:
+        json.dump({"ids": arrays["ids"], "tag_names": arrays["tag_names"], "radius": arrays["radius"]}, f)
+    os.rename(staging, final)
+    return str(final)
+
+
+def write_snapshot(root: Path, shard_id: str, state: Dict[str, Any],
+                   published: Dict[int, Tuple[int, str]]) -> Dict[int, Tuple[int, str]]:
+    """
+    Write the blocks of a segment state that differ from ``published``.
+
+    Args:
+        root: Snapshot directory of the node
+        shard_id: Shard the state belongs to
+        state: ``ShardSegment.snapshot_state`` result
+        published: Block index -> (generation, directory) of the current snapshot
+
+    Returns:
+        Block index -> (generation, directory) for every block written
+    """
+    shard_dir = root / shard_id
+    shard_dir.mkdir(parents=True, exist_ok=True)
+    written: Dict[int, Tuple[int, str]] = {}
+    for index, generation in enumerate(state["block_generations"]):
+        current = published.get(index)
+        if current is not None and current[0] == generation:
+            continue
+        arrays = copy_block(state, index)
+        written[index] = (arrays["generation"], write_block(shard_dir, index, arrays))
+    return written
+
+
+def write_manifest(root: Path, shard_id: str, generation: int, block_size: int, directories: List[str]) -> str:
+    path = root / shard_id / f"manifest-{generation}.json"
+    staging = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(staging, "w") as f:
+        json.dump({"generation": generation, "block_size": block_size, "blocks": directories}, f)
+    os.replace(staging, path)
+    return str(path)
+
+
+def _remove_paths(paths: Iterable[str]) -> None:
+    for path in paths:
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+# Snapshots mapped by this search worker process: shard id -> latest snapshot
+_worker_snapshots: Dict[str, SegmentSnapshot] = {}
+
+
+def _search_in_worker(shard_id: str, manifest: str, query_vector: List[float], limit: int,
+                      score_threshold: float, tags: Optional[List[str]],
+                      skip: List[int]) -> Optional[List[Tuple[int, float, str]]]:
+    """Search entry point run inside a pool worker."""
+    snapshot = _worker_snapshots.get(shard_id)
+    if snapshot is None or snapshot.manifest != manifest:
+        mapped = dict(zip(snapshot.directories, snapshot.blocks)) if snapshot is not None else {}
+        try:
+            snapshot = SegmentSnapshot(manifest, mapped)
+        except FileNotFoundError:
+            return None  # Superseded and removed before this worker mapped it
+        _worker_snapshots[shard_id] = snapshot
+    return snapshot.search(query_vector, limit, score_threshold, tags, skip)
+
+
+class PublishedSnapshot:
+    """What the node knows about a shard's current snapshot."""
+
+    def __init__(self, manifest: str, blocks: Dict[int, Tuple[int, str]]):
+        self.manifest = manifest
+        self.blocks = blocks  # block index -> (generation, directory)
+
+    def stale_blocks(self, segment: ShardSegment) -> List[int]:
+        """Blocks of the segment that changed (or appeared) since this snapshot."""
+        return [index for index, generation in enumerate(segment.block_generations)
+                if self.blocks.get(index, (None,))[0] != generation]
+
+
+class SnapshotSearchPool:
+    """
+    Publishes segment snapshots and runs searches on them in worker processes.
+    """
+
+    def __init__(self,
+                 root: Path,
+                 workers: int,
+                 publish_delay: float = 0.2,
+                 min_rows: int = 4096,
+                 max_stale_fraction: float = 0.5):
+        """
+        Initialize snapshot search pool.
+
+        Args:
+            root: Directory for published snapshots (cleared on start)
+            workers: Number of search worker processes
+            publish_delay: Minimum seconds between publishes of a shard
+            min_rows: Smaller shards are scored in the node process (IPC would cost more)
+            max_stale_fraction: Search in the node process when more blocks than this changed
+        """
+        self.root = Path(root)
+        self.workers = workers
+        self.publish_delay = publish_delay
+        self.min_rows = min_rows
+        self.max_stale_fraction = max_stale_fraction
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._published: Dict[str, PublishedSnapshot] = {}
+        self._published_at: Dict[str, float] = {}
+        self._publishing: Set[str] = set()
+        self._dropped: Set[str] = set()
+        self.stats = {"pool_searches": 0, "local_searches": 0, "publishes": 0, "publish_failures": 0,
+                      "blocks_written": 0, "stale_blocks_searched": 0}
+
+    def start(self) -> None:
+        shutil.rmtree(self.root, ignore_errors=True)
+        self.root.mkdir(parents=True, exist_ok=True)
+        # Spawned workers do not inherit the server's event loop, sockets or threads
+        self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                             mp_context=multiprocessing.get_context("spawn"))
+        logger.info(f"Started {self.workers} search worker processes", snapshots=str(self.root))
+
+    def worker_pids(self) -> List[int]:
+        """Process ids of the running search workers (for resource accounting)."""
+        if self._executor is None:
+            return []
+        # ProcessPoolExecutor keeps no public list of its processes
+        return list(getattr(self._executor, "_processes", None) or {})
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    async def search(self, segment: ShardSegment, query_vector: List[float], limit: int,
+                     score_threshold: float, tags: Optional[List[str]] = None) -> Optional[List[Tuple[int, float]]]:
+        """
+        Search the segment's published snapshot in a worker process and the
+        blocks changed since then in this process.
+
+        Returns:
+            (row, score) pairs for the segment's current rows, or None if the
+            caller should search the segment itself (no usable snapshot)
+        """
+        if self._executor is None or segment.size < self.min_rows:
+            return None
+        published = self._published.get(segment.shard_id)
+        stale = published.stale_blocks(segment) if published is not None else None
+        if stale is None or stale:
+            self._maybe_publish(segment)
+        if stale is None or len(stale) > self.max_stale_fraction * len(segment.block_generations):
+            self.stats["local_searches"] += 1
+            return None
+
+        loop = asyncio.get_running_loop()
+        hits = await loop.run_in_executor(self._executor, _search_in_worker, segment.shard_id, published.manifest,
+                                          query_vector, limit, score_threshold, tags, stale)
+        if hits is None:
+            return None
+        self.stats["pool_searches"] += 1
+        segment.queries.record()
+
+        # Blocks written while the worker was scoring are searched here as well
+        stale = set(published.stale_blocks(segment))
+        merged = [(row, score) for row, score, _ in hits if row // segment.block_size not in stale]
+        if stale:
+            self.stats["stale_blocks_searched"] += len(stale)
+            merged.extend(segment.search_blocks(query_vector, sorted(stale), limit, score_threshold, tags))
+            merged.sort(key=lambda hit: hit[1], reverse=True)
+        return merged[:limit]
+
+    def _maybe_publish(self, segment: ShardSegment) -> None:
+        """Publish the changed blocks, at most once per ``publish_delay`` per shard."""
+        shard_id = segment.shard_id
+        if shard_id in self._publishing:
+            return
+        if time.monotonic() - self._published_at.get(shard_id, 0.0) < self.publish_delay:
+            return
+        self._publishing.add(shard_id)
+        self._dropped.discard(shard_id)
+        asyncio.create_task(self._publish(segment, segment.snapshot_state()))
+
+    async def _publish(self, segment: ShardSegment, state: Dict[str, Any]) -> None:
+        shard_id = segment.shard_id
+        try:
+            loop = asyncio.get_running_loop()
+            previous = self._published.get(shard_id)
+            published = dict(previous.blocks) if previous is not None else {}
+            written = await loop.run_in_executor(None, write_snapshot, self.root, shard_id, state, published)
+            # A block written to during the copy may be torn; it keeps its previous files
+            torn = [index for index in written if segment.block_generations[index] != written[index][0]]
+            replaced = [published[index][1] for index in written if index in published and index not in torn]
+            for index in torn:
+                replaced.append(written.pop(index)[1])
+            published.update(written)
+            blocks = sorted(published)
+            if blocks != list(range(len(blocks))):
+                # A new block was torn before it was ever published; try again on the next search
+                await loop.run_in_executor(None, _remove_paths, [directory for _, directory in written.values()])
+                return
+            manifest = await loop.run_in_executor(None, write_manifest, self.root, shard_id, state["generation"],
+                                                  state["block_size"], [published[i][1] for i in blocks])
+            if shard_id in self._dropped:
+                await loop.run_in_executor(None, shutil.rmtree, self.root / shard_id, True)
+                return
+            self._published[shard_id] = PublishedSnapshot(manifest, published)
+            self.stats["publishes"] += 1
+            self.stats["blocks_written"] += len(written)
+            if previous is not None and previous.manifest != manifest:
+                replaced.append(previous.manifest)
+            # Workers that still map the old files keep them until they switch
+            await loop.run_in_executor(None, _remove_paths, replaced)
+        except Exception as e:
+            self.stats["publish_failures"] += 1
+            logger.warning(f"Failed to publish snapshot of shard {shard_id}: {e}")
+        finally:
+            self._published_at[shard_id] = time.monotonic()
+            self._publishing.discard(shard_id)
+
+    def discard(self, shard_id: str) -> None:
+        """Forget a shard the node dropped."""
+        self._published.pop(shard_id, None)
+        self._published_at.pop(shard_id, None)
+        self._dropped.add(shard_id)
+        shutil.rmtree(self.root / shard_id, ignore_errors=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "workers": self.workers,
+            "published_shards": len(self._published),
+        }
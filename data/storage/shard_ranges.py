@@ -0,0 +1,301 @@
+"""
+Shard Ranges
+
+Hash-range sharding for collections. Every document id hashes to a
+64-bit key, and each shard of a collection owns one contiguous range of
+that key space, encoded in the shard id itself
+(``shard_<start>-<last>_<collection>``, both bounds in hex) so nodes and
+catalog reconciliation can recover the range from the id alone. Routing
+is a binary search over the collection's range starts.
+
+Collections start with a few ranges; the coordinator splits a range that
+grows past a size or QPS threshold into two halves and merges adjacent
+cold ranges back, so small collections are not fanned out over many
+shards and large ones gain parallelism without re-hashing anything.
+Collections created before range sharding keep their fixed
+``shard_<i>_<collection>`` modulo routing.
+"""
+
+import bisect
+import hashlib
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from core.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+HASH_SPACE = 1 << 64
+# Shard count of collections created with modulo routing
+LEGACY_SHARD_COUNT = 8
+
+
+class ShardState:
+    ACTIVE = "active"  # Routed for reads and writes
+    PENDING = "pending"  # Being filled by a split or merge; receives mirrored writes only
+
+
+def key_hash(collection_name: str, document_id: str) -> int:
+    """64-bit routing key of a document."""
+    digest = hashlib.md5(f"{collection_name}:{document_id}".encode()).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+def range_shard_id(collection_name: str, start: int, end: int) -> str:
+    """Shard id owning keys in ``[start, end)``."""
+    return f"shard_{start:016x}-{end - 1:016x}_{collection_name}"
+
+
+def parse_shard_range(shard_id: str) -> Optional[Tuple[int, int]]:
+    """``(start, end)`` of a range shard id; None for legacy modulo shards."""
+    parts = shard_id.split('_', 2)
+    if len(parts) != 3 or '-' not in parts[1]:
+        return None
+    start, last = parts[1].split('-', 1)
+    try:
+        return int(start, 16), int(last, 16) + 1
+    except ValueError:
+        return None
+
+
+def shard_sort_key(shard_id: str) -> int:
+    """Orders a collection's shards by range start (legacy shards by index)."""
+    key_range = parse_shard_range(shard_id)
+    if key_range is not None:
+        return key_range[0]
+    parts = shard_id.split('_', 2)
+    return int(parts[1]) if len(parts) == 3 and parts[1].isdigit() else 0
+
+
+def initial_ranges(count: int) -> List[Tuple[int, int]]:
+    """Split the key space into ``count`` equal ranges."""
+    count = max(1, count)
+    bounds = [i * HASH_SPACE // count for i in range(count + 1)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def select_cover(candidates: Dict[str, int]) -> List[str]:
+    """
+    Pick non-overlapping range shards out of candidates that may overlap,
+    e.g. both sides of a split or merge found on nodes after the catalog
+    was lost. Where a range is held both as one shard and as finer shards
+    covering it, the side holding more vectors wins (ties go to the coarser
+    shard): the side that was still being filled is the smaller one.
+
+    Args:
+        candidates: Range shard id -> vector count
+
+    Returns:
+        Shard ids to keep
+    """
+    ranges = {shard_id: parse_shard_range(shard_id) for shard_id in candidates}
+    ranges = {shard_id: key_range for shard_id, key_range in ranges.items() if key_range is not None}
+
+    def inside(shard_id: str, outer: Tuple[int, int]) -> bool:
+        start, end = ranges[shard_id]
+        return outer[0] <= start and end <= outer[1] and (start, end) != outer
+
+    kept: List[str] = []
+    for shard_id in sorted(ranges, key=lambda s: ranges[s][0] - ranges[s][1]):  # Widest first
+        start, end = ranges[shard_id]
+        if any(ranges[k][0] < end and start < ranges[k][1] for k in kept):
+            continue
+        finer = [s for s in ranges if inside(s, (start, end))]
+        covered = start
+        for s in sorted(finer, key=lambda s: ranges[s]):
+            if ranges[s][0] > covered:
+                break
+            covered = max(covered, ranges[s][1])
+        if covered >= end and sum(candidates[s] for s in finer) > candidates[shard_id]:
+            continue  # The finer shards are the complete side
+        kept.append(shard_id)
+    return sorted(kept, key=shard_sort_key)
+
+
+class RangeRouter:
+    """Maps documents of one collection to the shard owning their key."""
+
+    def __init__(self, collection_name: str, shard_ids: Sequence[str]):
+        """
+        Initialize range router.
+
+        Args:
+            collection_name: Collection the shards belong to
+            shard_ids: Shards to route to (range shards, or legacy modulo shards)
+        """
+        self.collection_name = collection_name
+        self._starts: List[int] = []
+        self._ends: List[int] = []
+        self._shard_ids: List[str] = []
+        self._legacy: List[str] = []
+        for shard_id in sorted(shard_ids, key=shard_sort_key):
+            key_range = parse_shard_range(shard_id)
+            if key_range is None:
+                self._legacy.append(shard_id)
+                continue
+            self._starts.append(key_range[0])
+            self._ends.append(key_range[1])
+            self._shard_ids.append(shard_id)
+
+    @property
+    def is_legacy(self) -> bool:
+        return bool(self._legacy) and not self._shard_ids
+
+    def lookup(self, document_id: str) -> Optional[str]:
+        """Shard owning the document, or None if no shard covers its key."""
+        if self.is_legacy:
+            key = f"{self.collection_name}:{document_id}"
+            index = int(hashlib.md5(key.encode()).hexdigest(), 16) % max(len(self._legacy), LEGACY_SHARD_COUNT)
+            return f"shard_{index}_{self.collection_name}"
+        return self.lookup_key(key_hash(self.collection_name, document_id))
+
+    def lookup_key(self, key: int) -> Optional[str]:
+        i = bisect.bisect_right(self._starts, key) - 1
+        if i < 0 or key >= self._ends[i]:
+            return None
+        return self._shard_ids[i]
+
+    def overlapping(self, start: int, end: int) -> List[str]:
+        """Shards whose range intersects ``[start, end)``."""
+        i = max(bisect.bisect_right(self._starts, start) - 1, 0)
+        shard_ids = []
+        while i < len(self._starts) and self._starts[i] < end:
+            if self._ends[i] > start:
+                shard_ids.append(self._shard_ids[i])
+            i += 1
+        return shard_ids
+
+    def gaps(self) -> List[Tuple[int, int]]:
+        """Parts of the key space no shard covers."""
+        gaps = []
+        covered = 0
+        for start, end in zip(self._starts, self._ends):
+            if start > covered:
+                gaps.append((covered, start))
+            covered = max(covered, end)
+        if covered < HASH_SPACE:
+            gaps.append((covered, HASH_SPACE))
+        return gaps
+
+
+@dataclass
+class RangeShardLoad:
+    """Measured size and traffic of one range shard."""
+    shard_id: str
+    vector_count: int
+    qps: float
+
+
+@dataclass
+class RangeChange:
+    """Split one shard in two, or merge adjacent shards into one."""
+    kind: str  # "split" or "merge"
+    collection_name: str
+    source_shards: List[str]
+    target_shards: List[str]
+    reason: str
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class ShardRangePlanner:
+    """
+    Decides which range shards to split or merge from their measured size
+    and QPS. Merge thresholds sit well below half the split thresholds, so
+    the halves of a split are not merged straight back.
+    """
+
+    def __init__(self,
+                 max_shard_vectors: int = 100_000,
+                 max_shard_qps: float = 50.0,
+                 min_shard_vectors: int = 20_000,
+                 min_split_vectors: int = 1_000,
+                 max_shards_per_collection: int = 64,
+                 max_changes_per_cycle: int = 2):
+        """
+        Initialize shard range planner.
+
+        Args:
+            max_shard_vectors: Split a shard holding more vectors than this
+            max_shard_qps: Split a shard serving more queries per second than this
+            min_shard_vectors: Merge adjacent shards holding fewer vectors than this together
+            min_split_vectors: Never split shards smaller than this (e.g. only hot, not big)
+            max_shards_per_collection: Stop splitting a collection at this many shards
+            max_changes_per_cycle: Splits and merges started per planning cycle
+        """
+        self.max_shard_vectors = max_shard_vectors
+        self.max_shard_qps = max_shard_qps
+        self.min_shard_vectors = min_shard_vectors
+        self.min_split_vectors = min_split_vectors
+        self.max_shards_per_collection = max_shards_per_collection
+        self.max_changes_per_cycle = max_changes_per_cycle
+
+    def plan(self, collections: Dict[str, List[RangeShardLoad]]) -> List[RangeChange]:
+        """
+        Plan at most one change per collection, largest overshoot first.
+
+        Args:
+            collections: Collection -> its active range shards
+
+        Returns:
+            Planned splits and merges
+        """
+        candidates: List[Tuple[float, RangeChange]] = []
+        for collection_name, shards in collections.items():
+            shards = sorted((s for s in shards if parse_shard_range(s.shard_id)),
+                            key=lambda s: shard_sort_key(s.shard_id))
+            candidate = self._plan_split(collection_name, shards) or self._plan_merge(collection_name, shards)
+            if candidate is not None:
+                candidates.append(candidate)
+        candidates.sort(key=lambda c: c[0], reverse=True)
+        return [change for _, change in candidates[:self.max_changes_per_cycle]]
+
+    def _plan_split(self, collection_name: str,
+                    shards: List[RangeShardLoad]) -> Optional[Tuple[float, RangeChange]]:
+        if len(shards) >= self.max_shards_per_collection:
+            return None
+        best = None
+        for shard in shards:
+            start, end = parse_shard_range(shard.shard_id)
+            if end - start < 2 or shard.vector_count < self.min_split_vectors:
+                continue
+            overshoot = max(shard.vector_count / max(self.max_shard_vectors, 1),
+                            shard.qps / self.max_shard_qps if self.max_shard_qps > 0 else 0.0)
+            if overshoot <= 1.0 or (best is not None and overshoot <= best[0]):
+                continue
+            reason = "size" if shard.vector_count > self.max_shard_vectors else "qps"
+            mid = start + (end - start) // 2
+            best = (overshoot, RangeChange(
+                kind="split",
+                collection_name=collection_name,
+                source_shards=[shard.shard_id],
+                target_shards=[range_shard_id(collection_name, start, mid),
+                               range_shard_id(collection_name, mid, end)],
+                reason=f"{reason}: {shard.vector_count} vectors, {shard.qps:.1f} qps"
+            ))
+        return best
+
+    def _plan_merge(self, collection_name: str,
+                    shards: List[RangeShardLoad]) -> Optional[Tuple[float, RangeChange]]:
+        best = None
+        for left, right in zip(shards, shards[1:]):
+            left_range, right_range = parse_shard_range(left.shard_id), parse_shard_range(right.shard_id)
+            if left_range[1] != right_range[0]:
+                continue
+            vectors = left.vector_count + right.vector_count
+            qps = left.qps + right.qps
+            if vectors >= self.min_shard_vectors or (self.max_shard_qps > 0 and qps >= self.max_shard_qps / 4):
+                continue
+            # Smallest pairs first; merges rank below every split
+            priority = -vectors / max(self.min_shard_vectors, 1)
+            if best is not None and priority <= best[0]:
+                continue
+            best = (priority, RangeChange(
+                kind="merge",
+                collection_name=collection_name,
+                source_shards=[left.shard_id, right.shard_id],
+                target_shards=[range_shard_id(collection_name, left_range[0], right_range[1])],
+                reason=f"cold: {vectors} vectors, {qps:.1f} qps"
+            ))
+        return best
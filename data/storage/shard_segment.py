@@ -0,0 +1,680 @@
+"""
+Shard Segment
+
+Node-side storage for one shard: a contiguous, L2-normalized float32 matrix
+with rows keyed by document id, plus a tag bitmap index so topical
+("virtual") collections can be searched as filtered scans of the base
+collection's shard instead of storing every chunk once per topic.
+Every row carries a write version, and a Merkle digest over the
+(document id, version) pairs lets replicas find their differences cheaply.
+Rows are grouped into fixed-size blocks with a centroid and radius each,
+giving a per-block upper bound on cosine scores so searches with a score
+threshold skip blocks that cannot reach it.
+"""
+
+import base64
+import bisect
+import json
+import time
+import zlib
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+import numpy as np
+
+from data.storage.merkle import MerkleTree, row_hash
+
+
+def _normalize_rows(vectors: Any) -> np.ndarray:
+    matrix = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def search_matrix(matrix: np.ndarray,
+                  query: np.ndarray,
+                  limit: int,
+                  score_threshold: float = 0.0,
+                  mask: Optional[np.ndarray] = None,
+                  block_size: int = 1024,
+                  block_bounds: Optional[Callable[[], Tuple[np.ndarray, np.ndarray]]] = None) -> List[Tuple[int, float]]:
+    """
+    Cosine top-k over normalized rows.
+
+    Args:
+        matrix: Normalized row vectors
+        query: Normalized query vector
+        limit: Number of results
+        score_threshold: Minimum score
+        mask: Rows eligible for the search (None = all)
+        block_size: Rows per bound block
+        block_bounds: Returns per-block (centroids, radii) for pruning against the threshold
+
+    Returns:
+        (row, score) pairs, best first
+    """
+    size = len(matrix)
+    if size == 0 or limit <= 0:
+        return []
+    rows = np.flatnonzero(mask) if mask is not None else None
+
+    scores = None
+    # Skip blocks that cannot reach the threshold (e.g. the coordinator's current k-th score)
+    if block_bounds is not None and score_threshold > -1.0 and size > block_size:
+        centroids, radii = block_bounds()
+        # Small slack keeps float32 rounding from pruning a block that just reaches the bound
+        reaching = centroids @ query + radii + 1e-4 >= score_threshold
+        if not reaching.any():
+            return []
+        if not reaching.all():
+            if rows is not None:
+                rows = rows[reaching[rows // block_size]]
+            else:
+                # Score the reaching blocks as contiguous slices (no row gather)
+                spans = [(block * block_size, min((block + 1) * block_size, size))
+                         for block in np.flatnonzero(reaching)]
+                rows = np.concatenate([np.arange(start, end) for start, end in spans])
+                scores = np.concatenate([matrix[start:end] @ query for start, end in spans])
+
+    if scores is None:
+        if rows is not None:
+            if not len(rows):
+                return []
+            scores = matrix[rows] @ query
+        else:
+            scores = matrix @ query
+
+    candidates = np.flatnonzero(scores >= score_threshold)
+    if len(candidates) > limit:
+        top = np.argpartition(scores[candidates], -limit)[-limit:]
+        candidates = candidates[top]
+    candidates = candidates[np.argsort(scores[candidates])[::-1]]
+
+    if rows is not None:
+        return [(int(rows[i]), float(scores[i])) for i in candidates]
+    return [(int(i), float(scores[i])) for i in candidates]
+
+
+def search_matrix_batch(matrix: np.ndarray,
+                        queries: np.ndarray,
+                        limit: int,
+                        score_threshold: float = 0.0,
+                        mask: Optional[np.ndarray] = None,
+                        block_size: int = 1024,
+                        block_bounds: Optional[Callable[[], Tuple[np.ndarray, np.ndarray]]] = None,
+                        query_chunk: int = 256) -> List[List[Tuple[int, float]]]:
+    """
+    Cosine top-k for many queries: one matrix multiply and a row-wise
+    partial sort per chunk of queries instead of one scan per query.
+
+    Args:
+        matrix: Normalized row vectors
+        queries: Normalized query vectors, one per row
+        limit: Number of results per query
+        score_threshold: Minimum score
+        mask: Rows eligible for the search (None = all)
+        block_size: Rows per bound block
+        block_bounds: Returns per-block (centroids, radii); blocks no query can reach are skipped
+        query_chunk: Queries scored per multiply (bounds the score matrix size)
+
+    Returns:
+        Per query, (row, score) pairs, best first
+    """
+    size = len(matrix)
+    count = len(queries)
+    if size == 0 or limit <= 0 or count == 0:
+        return [[] for _ in range(count)]
+    rows = np.flatnonzero(mask) if mask is not None else None
+
+    if block_bounds is not None and score_threshold > -1.0 and size > block_size:
+        centroids, radii = block_bounds()
+        reaching = (queries @ centroids.T).max(axis=0) + radii + 1e-4 >= score_threshold
+        if not reaching.any():
+            return [[] for _ in range(count)]
+        if not reaching.all():
+            rows = rows if rows is not None else np.arange(size)
+            rows = rows[reaching[rows // block_size]]
+    if rows is not None and not len(rows):
+        return [[] for _ in range(count)]
+    candidates = matrix[rows] if rows is not None else matrix
+
+    results: List[List[Tuple[int, float]]] = []
+    k = min(limit, len(candidates))
+    for chunk_start in range(0, count, query_chunk):
+        scores = queries[chunk_start:chunk_start + query_chunk] @ candidates.T
+        if k < scores.shape[1]:
+            top = np.argpartition(scores, -k, axis=1)[:, -k:]
+        else:
+            top = np.broadcast_to(np.arange(k), (len(scores), k))
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        for columns, values in zip(top, top_scores):
+            keep = values >= score_threshold
+            hits = rows[columns[keep]] if rows is not None else columns[keep]
+            results.append(list(zip(hits.tolist(), values[keep].tolist())))
+    return results
+
+
+def encode_matrix(vectors: Any) -> Dict[str, Any]:
+    """Pack vectors as base64 float32 for a JSON body (far cheaper to build and parse than float lists)."""
+    matrix = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    return {"shape": list(matrix.shape), "data": base64.b64encode(matrix.tobytes()).decode("ascii")}
+
+
+def decode_matrix(packed: Dict[str, Any]) -> np.ndarray:
+    """Inverse of ``encode_matrix``."""
+    data = np.frombuffer(base64.b64decode(packed["data"]), dtype=np.float32)
+    return data.reshape(packed["shape"])
+
+
+def page_checksum(vectors: Sequence[Sequence[float]], documents: Sequence[Dict[str, Any]],
+                  tags: Optional[Sequence[Iterable[str]]] = None, versions: Optional[Sequence[int]] = None) -> int:
+    """CRC32 over a transfer page's float32 vectors and canonical JSON of its documents, tags and versions."""
+    checksum = zlib.crc32(np.asarray(vectors, dtype=np.float32).tobytes())
+    checksum = zlib.crc32(json.dumps(list(documents), sort_keys=True, default=str).encode(), checksum)
+    row_tags = [sorted(row) for row in tags or ()]
+    return zlib.crc32(json.dumps([row_tags, [int(v) for v in versions or ()]]).encode(), checksum)
+
+
+class RateWindow:
+    """Events per second over a sliding window of one-second buckets."""
+
+    def __init__(self, window_seconds: int = 60):
+        self.window_seconds = window_seconds
+        self._seconds = [-1] * window_seconds
+        self._counts = [0] * window_seconds
+
+    def record(self, count: int = 1) -> None:
+        second = int(time.time())
+        slot = second % self.window_seconds
+        if self._seconds[slot] != second:
+            self._seconds[slot] = second
+            self._counts[slot] = 0
+        self._counts[slot] += count
+
+    def rate(self) -> float:
+        oldest = int(time.time()) - self.window_seconds
+        total = sum(count for second, count in zip(self._seconds, self._counts) if second > oldest)
+        return total / self.window_seconds
+
+
+class ShardSegment:
+    """
+    Vectors, documents and tag bitmaps for a single shard.
+
+    Upserts are idempotent: a document id maps to exactly one row, and
+    re-upserting it overwrites the vector and adds any new tags. Writes
+    older than the row's current version do not change the row (last writer
+    wins) but still add their tags, since tag additions commute. Copied rows
+    carry their whole tag set, which replaces the tags of an older row.
+    Removing a tag leaves a tombstone, so older writes and copies from a
+    replica that missed the removal cannot bring the tag back.
+    """
+
+    def __init__(self, shard_id: str, collection_name: str, initial_capacity: int = 256, block_size: int = 1024):
+        self.shard_id = shard_id
+        self.collection_name = collection_name
+        self.vector_size: Optional[int] = None
+        self.size = 0
+
+        self._capacity = 0
+        self._initial_capacity = max(1, initial_capacity)
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self.ids: List[str] = []
+        self.documents: List[Dict[str, Any]] = []
+        self.versions: List[int] = []
+        self._rows: Dict[str, int] = {}
+        self._tags: Dict[str, np.ndarray] = {}  # tag -> bool bitmap over rows
+        self.removed_tags: Dict[str, int] = {}  # tag -> version it was removed at
+        # Document ids in sorted order for paged export, covering the first _sorted_upto rows
+        self._sorted_ids: List[str] = []
+        self._sorted_upto = 0
+        self.queries = RateWindow()
+        self.digest = MerkleTree()
+
+        # Per-block centroid and radius for score upper bounds, refreshed lazily
+        self.block_size = block_size
+        self._centroids = np.zeros((0, 0), dtype=np.float32)
+        self._radii = np.zeros(0, dtype=np.float32)
+        self._dirty_blocks: Set[int] = set()
+
+        # Bumped on every change so published snapshots can tell they are stale
+        self.generation = 0
+        self.modified_at = time.monotonic()
+        # Generation of the last change to each block, so snapshots republish only changed blocks
+        self.block_generations: List[int] = []
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """Live rows of the vector matrix."""
+        return self._matrix[:self.size]
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.matrix.nbytes)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __contains__(self, document_id: str) -> bool:
+        return document_id in self._rows
+
+    def _ensure_capacity(self, needed: int) -> None:
+        if needed <= self._capacity:
+            return
+        capacity = max(self._initial_capacity, self._capacity)
+        while capacity < needed:
+            capacity *= 2
+
+        matrix = np.zeros((capacity, self.vector_size), dtype=np.float32)
+        if self.size:
+            matrix[:self.size] = self.matrix
+        self._matrix = matrix
+        for tag, bitmap in self._tags.items():
+            grown = np.zeros(capacity, dtype=bool)
+            grown[:self.size] = bitmap[:self.size]
+            self._tags[tag] = grown
+        self._capacity = capacity
+
+    def _bitmap(self, tag: str) -> np.ndarray:
+        bitmap = self._tags.get(tag)
+        if bitmap is None:
+            bitmap = np.zeros(self._capacity, dtype=bool)
+            self._tags[tag] = bitmap
+        return bitmap
+
+    def upsert(self,
+               vectors: Sequence[Sequence[float]],
+               documents: Sequence[Dict[str, Any]],
+               tags: Optional[Iterable[str]] = None,
+               document_tags: Optional[Sequence[Iterable[str]]] = None,
+               versions: Optional[Sequence[int]] = None) -> int:
+        """
+        Insert or overwrite rows.
+
+        Args:
+            vectors: One vector per document
+            documents: Document dicts; ``id`` is the row key
+            tags: Tags applied to every document in the batch
+            document_tags: Optional per-document tags (used when copying shards)
+            versions: Optional per-document write versions (defaults to now)
+
+        Returns:
+            Number of rows written
+        """
+        if len(vectors) != len(documents):
+            raise ValueError("vectors and documents must have the same length")
+        if not documents:
+            return 0
+
+        matrix = _normalize_rows(vectors)
+        if self.vector_size is None:
+            self.vector_size = matrix.shape[1]
+        elif matrix.shape[1] != self.vector_size:
+            raise ValueError(f"Expected vectors of size {self.vector_size}, got {matrix.shape[1]}")
+        self._ensure_capacity(self.size + len(documents))
+
+        default_version = time.time_ns()
+        written_rows: List[int] = []
+        written: List[int] = []
+        tag_versions: List[int] = []  # Version each tagged row's tags are written at
+        tagged_rows: List[int] = []
+        retagged: Set[int] = set()  # Stale rows that only gained tags
+        for i, document in enumerate(documents):
+            document_id = str(document["id"])
+            version = int(versions[i]) if versions is not None else default_version
+            row = self._rows.get(document_id)
+            if row is None:
+                row = self.size
+                self.size += 1
+                self._rows[document_id] = row
+                self.ids.append(document_id)
+                self.documents.append(document)
+                self.versions.append(version)
+            elif version < self.versions[row]:
+                # Stale write: the row keeps its content, but the write's tags still apply
+                if tags:
+                    tagged_rows.append(row)
+                    tag_versions.append(version)
+                    retagged.add(row)
+                continue
+            else:
+                if document_tags and version > self.versions[row]:
+                    self._clear_row_tags(row)
+                self.documents[row] = document
+                self.versions[row] = version
+            written_rows.append(row)
+            written.append(i)
+            tagged_rows.append(row)
+            tag_versions.append(version)
+        if not tagged_rows:
+            return 0
+
+        if written:
+            rows = np.asarray(written_rows, dtype=np.int64)
+            self._matrix[rows] = matrix[written]
+        for tag in tags or ():
+            self._add_tag(tag, tagged_rows, tag_versions)
+        if document_tags:
+            for row, i in zip(written_rows, written):
+                for tag in document_tags[i] or ():
+                    self._add_tag(tag, [row], [self.versions[row]])
+        for row in set(written_rows) | retagged:
+            self._refresh_digest(row)
+        self._dirty_blocks.update(row // self.block_size for row in written_rows)
+        self._touch(set(written_rows) | retagged)
+        return len(written)
+
+    def _add_tag(self, tag: str, rows: List[int], versions: List[int]) -> None:
+        """Set a tag on rows, except for writes older than the tag's removal."""
+        removed_at = self.removed_tags.get(tag)
+        if removed_at is not None:
+            rows = [row for row, version in zip(rows, versions) if version > removed_at]
+            if not rows:
+                return
+        self._bitmap(tag)[rows] = True
+
+    def _clear_row_tags(self, row: int) -> None:
+        for bitmap in self._tags.values():
+            bitmap[row] = False
+
+    def _touch(self, rows: Iterable[int]) -> None:
+        self.generation += 1
+        self.modified_at = time.monotonic()
+        block_count = -(-self.size // self.block_size)
+        self.block_generations.extend([self.generation] * (block_count - len(self.block_generations)))
+        for block in {row // self.block_size for row in rows}:
+            self.block_generations[block] = self.generation
+
+    def _refresh_digest(self, row: int) -> None:
+        self.digest.update(self.ids[row], row_hash(self.ids[row], self.versions[row], self.tags_for_row(row)))
+
+    def remove_tag(self, tag: str, version: Optional[int] = None) -> bool:
+        """
+        Drop a tag from every row written at or before ``version`` (default now)
+        and remember the removal, so older writes cannot set the tag again.
+
+        Returns:
+            True if any row lost the tag
+        """
+        version = time.time_ns() if version is None else int(version)
+        self.removed_tags[tag] = max(version, self.removed_tags.get(tag, version))
+        bitmap = self._tags.get(tag)
+        if bitmap is None:
+            return False
+        rows = [int(row) for row in np.flatnonzero(bitmap[:self.size]) if self.versions[row] <= version]
+        if not rows:
+            return False
+        bitmap[rows] = False
+        if not bitmap[:self.size].any():
+            del self._tags[tag]
+        for row in rows:
+            self._refresh_digest(row)
+        self._touch(rows)
+        return True
+
+    def apply_tag_removals(self, removed_tags: Dict[str, int]) -> None:
+        """Apply tag tombstones received from another replica."""
+        for tag, version in removed_tags.items():
+            if int(version) > self.removed_tags.get(tag, -1):
+                self.remove_tag(tag, int(version))
+
+    def tags_for_row(self, row: int) -> List[str]:
+        return [tag for tag, bitmap in self._tags.items() if bitmap[row]]
+
+    def tag_counts(self, tags: Optional[Iterable[str]] = None) -> Dict[str, int]:
+        """Rows carrying each tag (only ``tags`` if given)."""
+        names = self._tags if tags is None else [tag for tag in tags if tag in self._tags]
+        return {tag: int(self._tags[tag][:self.size].sum()) for tag in names}
+
+    def _tag_mask(self, tags: Iterable[str], start: int = 0, end: Optional[int] = None) -> np.ndarray:
+        end = self.size if end is None else end
+        mask = np.zeros(end - start, dtype=bool)
+        for tag in tags:
+            bitmap = self._tags.get(tag)
+            if bitmap is not None:
+                mask |= bitmap[start:end]
+        return mask
+
+    def _block_bounds(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Centroid and radius of every block, recomputing blocks changed since the last call."""
+        block_count = -(-self.size // self.block_size)
+        if self._centroids.shape != (block_count, self.vector_size or 0):
+            centroids = np.zeros((block_count, self.vector_size or 0), dtype=np.float32)
+            radii = np.zeros(block_count, dtype=np.float32)
+            kept = min(block_count, len(self._radii))
+            if kept and self._centroids.shape[1] == centroids.shape[1]:
+                centroids[:kept] = self._centroids[:kept]
+                radii[:kept] = self._radii[:kept]
+            else:
+                kept = 0
+            self._dirty_blocks.update(range(kept, block_count))
+            self._centroids, self._radii = centroids, radii
+
+        for block in self._dirty_blocks:
+            if block >= block_count:
+                continue
+            rows = self._matrix[block * self.block_size:min((block + 1) * self.block_size, self.size)]
+            centroid = rows.mean(axis=0)
+            self._centroids[block] = centroid
+            self._radii[block] = np.sqrt(((rows - centroid) ** 2).sum(axis=1).max())
+        self._dirty_blocks.clear()
+        return self._centroids, self._radii
+
+    def upper_bound(self, query_vector: Sequence[float]) -> float:
+        """Upper bound on the cosine score of any row for the query."""
+        if self.size == 0:
+            return -1.0
+        query = _normalize_rows(query_vector)[0]
+        centroids, radii = self._block_bounds()
+        return float((centroids @ query + radii).max())
+
+    def search(self,
+               query_vector: Sequence[float],
+               limit: int = 10,
+               score_threshold: float = 0.0,
+               tags: Optional[Iterable[str]] = None) -> List[Tuple[int, float]]:
+        """
+        Cosine top-k over the shard, optionally restricted to rows carrying any of ``tags``.
+
+        Returns:
+            (row, score) pairs, best first
+        """
+        self.queries.record()
+        if self.size == 0 or limit <= 0:
+            return []
+        return search_matrix(
+            self.matrix,
+            _normalize_rows(query_vector)[0],
+            limit,
+            score_threshold,
+            mask=self._tag_mask(tags) if tags is not None else None,
+            block_size=self.block_size,
+            block_bounds=self._block_bounds
+        )
+
+    def search_batch(self,
+                     query_vectors: Sequence[Sequence[float]],
+                     limit: int = 10,
+                     score_threshold: float = 0.0,
+                     tags: Optional[Iterable[str]] = None) -> List[List[Tuple[int, float]]]:
+        """
+        Cosine top-k over the shard for several queries at once.
+
+        Returns:
+            Per query, (row, score) pairs, best first
+        """
+        self.queries.record(len(query_vectors))
+        if self.size == 0 or limit <= 0 or not len(query_vectors):
+            return [[] for _ in query_vectors]
+        return search_matrix_batch(
+            self.matrix,
+            _normalize_rows(query_vectors),
+            limit,
+            score_threshold,
+            mask=self._tag_mask(tags) if tags is not None else None,
+            block_size=self.block_size,
+            block_bounds=self._block_bounds
+        )
+
+    def row_for(self, document_id: str) -> Optional[int]:
+        return self._rows.get(document_id)
+
+    def search_blocks(self,
+                      query_vector: Sequence[float],
+                      blocks: Iterable[int],
+                      limit: int = 10,
+                      score_threshold: float = 0.0,
+                      tags: Optional[Iterable[str]] = None) -> List[Tuple[int, float]]:
+        """Search only some blocks, e.g. the ones changed since a snapshot was published."""
+        query = _normalize_rows(query_vector)[0]
+        hits: List[Tuple[int, float]] = []
+        for block in blocks:
+            start, end = block * self.block_size, min((block + 1) * self.block_size, self.size)
+            if start >= end:
+                continue
+            mask = self._tag_mask(tags, start, end) if tags is not None else None
+            block_hits = search_matrix(self._matrix[start:end], query, limit, score_threshold,
+                                       mask=mask, block_size=self.block_size)
+            hits.extend((start + row, score) for row, score in block_hits)
+        hits.sort(key=lambda hit: hit[1], reverse=True)
+        return hits[:limit]
+
+    def snapshot_state(self) -> Dict[str, Any]:
+        """
+        References (not copies) to the current rows, taken on the writer's
+        thread. Blocks may be copied out of them on another thread as long
+        as their generation is unchanged once the copy is done.
+        """
+        return {
+            "generation": self.generation,
+            "size": self.size,
+            "block_size": self.block_size,
+            "block_generations": list(self.block_generations),
+            "matrix": self._matrix,
+            "ids": self.ids,
+            "tags": dict(self._tags),
+        }
+
+    def to_result(self, row: int, score: float) -> Dict[str, Any]:
+        """Format a row as a search result."""
+        document = self.documents[row]
+        return {
+            "document_id": document["id"],
+            "content": document.get("content", ""),
+            "score": score,
+            "metadata": document.get("metadata", {}),
+            "source_index": self.collection_name,
+            "tags": self.tags_for_row(row),
+        }
+
+    def get_result(self, document_id: str) -> Optional[Dict[str, Any]]:
+        """Payload of one document (without score or tags), or None if absent."""
+        row = self._rows.get(document_id)
+        if row is None:
+            return None
+        document = self.documents[row]
+        return {
+            "document_id": document["id"],
+            "content": document.get("content", ""),
+            "metadata": document.get("metadata", {}),
+            "source_index": self.collection_name,
+        }
+
+    def export(self) -> Dict[str, Any]:
+        """Export rows for copying to another node (vectors are normalized)."""
+        return {
+            "vectors": self.matrix.tolist(),
+            "documents": list(self.documents),
+            "tags": [self.tags_for_row(row) for row in range(self.size)],
+            "versions": list(self.versions),
+            "removed_tags": dict(self.removed_tags),
+        }
+
+    def _ids_in_order(self) -> List[str]:
+        """Document ids sorted, extended with rows added since the last call."""
+        if self._sorted_upto < self.size:
+            self._sorted_ids.extend(self.ids[self._sorted_upto:self.size])
+            self._sorted_ids.sort()  # Already-sorted prefix plus a short tail merges in linear time
+            self._sorted_upto = self.size
+        return self._sorted_ids
+
+    def export_page(self, cursor: Optional[str] = None, limit: int = 256) -> Dict[str, Any]:
+        """
+        Export one page of rows for a paged shard transfer.
+
+        Pages follow document id order, so a cursor stays valid however the
+        shard changes between pages; rows written meanwhile are mirrored to
+        the target separately.
+
+        Args:
+            cursor: Last document id of the previous page (None for the first page)
+            limit: Maximum rows in the page
+
+        Returns:
+            Page with vectors, documents, per-row tags and versions, checksum
+            and the next cursor (None when the shard is exhausted)
+        """
+        ids = self._ids_in_order()
+        start = bisect.bisect_right(ids, cursor) if cursor is not None else 0
+        page_ids = ids[start:start + max(1, limit)]
+        rows = [self._rows[document_id] for document_id in page_ids]
+        page = self._rows_page(rows)
+        page["next_cursor"] = page_ids[-1] if start + len(page_ids) < len(ids) else None
+        page["total"] = self.size
+        return page
+
+    def copy_to(self, target: "ShardSegment", document_ids: Iterable[str]) -> int:
+        """
+        Copy rows with their tags and versions into another segment on this
+        node (shard splits and merges); newer rows already in the target win.
+
+        Returns:
+            Number of rows written to the target
+        """
+        rows = [self._rows[document_id] for document_id in document_ids if document_id in self._rows]
+        target.apply_tag_removals(self.removed_tags)
+        if not rows:
+            return 0
+        return target.upsert(
+            self._matrix[rows],
+            [self.documents[row] for row in rows],
+            document_tags=[self.tags_for_row(row) for row in rows],
+            versions=[self.versions[row] for row in rows]
+        )
+
+    def export_rows(self, document_ids: Iterable[str]) -> Dict[str, Any]:
+        """Export specific rows (for replica repair) in the transfer page format."""
+        return self._rows_page([self._rows[document_id] for document_id in document_ids if document_id in self._rows])
+
+    def _rows_page(self, rows: List[int]) -> Dict[str, Any]:
+        vectors = self._matrix[rows].tolist() if rows else []
+        documents = [self.documents[row] for row in rows]
+        tags = [self.tags_for_row(row) for row in rows]
+        versions = [self.versions[row] for row in rows]
+        return {
+            "vectors": vectors,
+            "documents": documents,
+            "tags": tags,
+            "versions": versions,
+            "removed_tags": dict(self.removed_tags),
+            "checksum": page_checksum(vectors, documents, tags, versions),
+        }
+
+    def bucket_versions(self, buckets: Iterable[int]) -> Dict[str, Dict[str, Any]]:
+        """Version and row hash of every document in the given digest leaf buckets."""
+        return {
+            document_id: {"version": self.versions[self._rows[document_id]], "hash": format(value, "016x")}
+            for document_id, value in self.digest.bucket_entries(buckets).items()
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        content_bytes = sum(len(document.get("content") or "") for document in self.documents)
+        return {
+            "vector_count": self.size,
+            "collections": [self.collection_name],
+            "tags": self.tag_counts(),
+            "size_bytes": self.nbytes + content_bytes,
+            "qps": self.queries.rate(),
+            "digest": format(self.digest.root, "016x"),
+        }
@@ -0,0 +1,206 @@
+"""
+Shard Transfer
+
+Paged, throttled and resumable shard copies between nodes. The target
+node pulls checksummed pages straight from the source node; the
+coordinator only drives the cursor, so shard data never has to be held in
+coordinator memory. A byte-rate limit and a concurrency cap keep
+rebalancing from starving foreground searches. Requests go through the
+coordinator's node RPC function, bypassing circuit breakers since a long
+copy must not trip them.
+"""
+
+import asyncio
+import json
+import time
+from dataclasses import dataclass, asdict, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from core.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+# (node, method, path, payload, params, timeout, bypass_breaker) -> JSON body for HTTP 200, else None
+CallNodeFunction = Callable[..., Awaitable[Optional[Dict[str, Any]]]]
+
+
+class TransferStatus:
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+@dataclass
+class TransferProgress:
+    """Resumable progress of one shard copy."""
+    shard_id: str
+    source_node: str
+    target_node: str
+    cursor: Optional[str] = None  # Last document id imported (pages follow document id order)
+    transferred: int = 0
+    total: Optional[int] = None
+    bytes_transferred: int = 0
+    status: str = TransferStatus.PENDING
+    error: Optional[str] = None
+    started_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class _ByteRateLimiter:
+    """Token bucket over bytes per second."""
+
+    def __init__(self, bytes_per_second: float):
+        self.rate = bytes_per_second
+        self.allowance = bytes_per_second
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def consume(self, nbytes: int) -> None:
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            self.allowance = min(self.rate, self.allowance + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            self.allowance -= nbytes
+            if self.allowance < 0:
+                # Pay the debt off before the next page goes out
+                await asyncio.sleep(-self.allowance / self.rate)
+
+
+class ShardTransferManager:
+    """
+    Copies shards page by page with checksums, throttling and resume.
+    """
+
+    def __init__(self,
+                 call_node: CallNodeFunction,
+                 page_size: int = 256,
+                 max_concurrent_transfers: int = 2,
+                 max_bytes_per_second: float = 20 * 1024 * 1024,
+                 max_page_retries: int = 3,
+                 request_timeout: float = 60.0):
+        """
+        Initialize shard transfer manager.
+
+        Args:
+            call_node: Coroutine sending one RPC to a node
+            page_size: Rows per page
+            max_concurrent_transfers: Shards copied at the same time across the cluster
+            max_bytes_per_second: Cluster-wide transfer bandwidth (<= 0 disables it)
+            max_page_retries: Attempts per page before the transfer is marked failed
+            request_timeout: Timeout per page request in seconds
+        """
+        self.call_node = call_node
+        self.page_size = page_size
+        self.max_page_retries = max_page_retries
+        self.request_timeout = request_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrent_transfers)
+        self._limiter = _ByteRateLimiter(max_bytes_per_second)
+        self.progress: Dict[Tuple[str, str], TransferProgress] = {}
+
+    async def transfer(self, shard_id: str, collection_name: str, source_node: Any, target_node: Any) -> bool:
+        """
+        Copy a shard from ``source_node`` to ``target_node``.
+
+        An interrupted or failed copy of the same shard to the same target
+        resumes from its last acknowledged page; imports are idempotent, so
+        replaying a page is harmless.
+
+        Returns:
+            True once every page has been imported on the target
+        """
+        key = (shard_id, target_node.id)
+        progress = self.progress.get(key)
+        if progress is None or progress.status == TransferStatus.COMPLETED or progress.source_node != source_node.id:
+            progress = TransferProgress(shard_id=shard_id, source_node=source_node.id, target_node=target_node.id)
+            self.progress[key] = progress
+        elif progress.status == TransferStatus.RUNNING:
+            logger.info(f"Transfer of shard {shard_id} to {target_node.id} already running")
+            return False
+
+        async with self._semaphore:
+            progress.status = TransferStatus.RUNNING
+            progress.error = None
+            try:
+                pull_supported = True
+                while True:
+                    page = None
+                    for attempt in range(1, self.max_page_retries + 1):
+                        try:
+                            if pull_supported:
+                                page = await self._pull_page(shard_id, source_node, target_node, progress.cursor)
+                            if page is None:
+                                # Target could not pull; relay the page through the coordinator
+                                page = await self._relay_page(shard_id, collection_name,
+                                                              source_node, target_node, progress.cursor)
+                                pull_supported = False
+                            break
+                        except Exception as e:
+                            progress.error = str(e)
+                            logger.warning(f"Shard {shard_id} page at cursor {progress.cursor} failed",
+                                           attempt=attempt, error=str(e))
+                            if attempt == self.max_page_retries:
+                                raise
+                            await asyncio.sleep(min(2 ** attempt, 10))
+
+                    progress.transferred += page["imported_count"]
+                    progress.bytes_transferred += page["bytes"]
+                    progress.total = page.get("total", progress.total)
+                    progress.updated_at = time.time()
+                    await self._limiter.consume(page["bytes"])
+
+                    if page.get("next_cursor") is None:
+                        break
+                    progress.cursor = page["next_cursor"]
+
+                progress.status = TransferStatus.COMPLETED
+                progress.error = None
+                logger.info(f"Transferred shard {shard_id} from {source_node.id} to {target_node.id}",
+                            rows=progress.transferred, bytes=progress.bytes_transferred)
+                return True
+
+            except Exception as e:
+                progress.status = TransferStatus.FAILED
+                progress.error = str(e)
+                logger.warning(f"Shard transfer {shard_id} to {target_node.id} failed at cursor {progress.cursor}: {e}")
+                return False
+
+    async def _pull_page(self, shard_id: str, source_node: Any, target_node: Any,
+                         cursor: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Ask the target to pull one page from the source; None if the target could not."""
+        payload = {"source_url": source_node.url, "cursor": cursor, "limit": self.page_size}
+        return await self.call_node(target_node, "POST", f"/shards/{shard_id}/pull", payload,
+                                    timeout=self.request_timeout, bypass_breaker=True)
+
+    async def _relay_page(self, shard_id: str, collection_name: str,
+                          source_node: Any, target_node: Any, cursor: Optional[str]) -> Dict[str, Any]:
+        """Fetch one page from the source and import it on the target."""
+        params = {"limit": self.page_size}
+        if cursor is not None:
+            params["cursor"] = cursor
+        page = await self.call_node(source_node, "GET", f"/shards/{shard_id}/export", params=params,
+                                    timeout=self.request_timeout, bypass_breaker=True)
+        if page is None:
+            raise RuntimeError(f"Export from {source_node.id} failed")
+        page.setdefault("collection_name", collection_name)
+
+        result = await self.call_node(target_node, "POST", f"/shards/{shard_id}/import", page,
+                                      timeout=self.request_timeout, bypass_breaker=True)
+        if result is None:
+            raise RuntimeError(f"Import on {target_node.id} failed")
+
+        return {
+            "imported_count": result.get("imported_count", 0),
+            "next_cursor": page.get("next_cursor"),
+            "total": page.get("total"),
+            "bytes": len(json.dumps(page)),
+        }
+
+    def get_progress(self) -> List[Dict[str, Any]]:
+        """Get progress of all known transfers."""
+        return [progress.to_dict() for progress in self.progress.values()]
@@ -11,14 +11,14 @@ Each node handles:
 
 import asyncio
 import json
+import os
+import shutil
 import time
-import uuid
-from typing import List, Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
 from pathlib import Path
 import pickle
-import numpy as np
-from dataclasses import dataclass, asdict
-from collections import defaultdict
+from dataclasses import asdict
+import aiohttp
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
@@ -26,22 +26,43 @@ import uvicorn
 
 from core.utils.logging import get_logger
 from core.models.base import BaseDocument
+from data.storage.shard_segment import ShardSegment, RateWindow, page_checksum, decode_matrix
+from data.storage.segment_snapshots import SnapshotSearchPool
+from data.storage.shard_ranges import key_hash
 
 logger = get_logger(__name__)
 
-@dataclass
-class VectorData:
-    """Represents a vector with metadata."""
-    id: str
-    vector: List[float]
-    document: Dict[str, Any]
-    shard_id: str
-    collection_name: str
-    created_at: float = 0.0
-    
-    def __post_init__(self):
-        if self.created_at == 0.0:
-            self.created_at = time.time()
+def _host_memory_total() -> Optional[int]:
+    """Host memory in bytes (Linux /proc/meminfo); None where unavailable."""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                key, value = line.split(":", 1)
+                if key == "MemTotal":
+                    return int(value.split()[0]) * 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+def _process_stats(pid: int) -> Optional[Tuple[float, int, int]]:
+    """
+    CPU seconds, resident bytes and anonymous resident bytes of a process
+    (Linux /proc); None where unavailable or the process is gone.
+    """
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # Fields after the parenthesized command name; utime and stime are the 12th and 13th
+            fields = f.read().rsplit(")", 1)[1].split()
+        cpu_seconds = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+        status = {}
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                key, value = line.split(":", 1)
+                if key in ("VmRSS", "RssAnon"):
+                    status[key] = int(value.split()[0]) * 1024
+        return cpu_seconds, status["VmRSS"], status["RssAnon"]
+    except (OSError, IndexError, KeyError, ValueError):
+        return None
 
 class CollectionInfo(BaseModel):
     name: str
@@ -52,7 +73,8 @@ class CollectionInfo(BaseModel):
 class VectorNodeServer:
     """Individual vector storage node."""
     
-    def __init__(self, node_id: str, host: str = "localhost", port: int = 8001, data_dir: str = "./node_data"):
+    def __init__(self, node_id: str, host: str = "localhost", port: int = 8001, data_dir: str = "./node_data",
+                 search_workers: int = 0):
         self.node_id = node_id
         self.host = host
         self.port = port
@@ -61,13 +83,22 @@ class VectorNodeServer:
         
         # In-memory storage (in production, use persistent storage)
         self.collections: Dict[str, CollectionInfo] = {}
-        self.vectors: Dict[str, VectorData] = {}  # vector_id -> VectorData
-        self.shards: Dict[str, List[str]] = defaultdict(list)  # shard_id -> vector_ids
+        self.segments: Dict[str, ShardSegment] = {}  # shard_id -> ShardSegment
         
         # Load balancing metrics
         self.start_time = time.time()
         self.request_count = 0
         self.last_request_time = time.time()
+        self.request_rate = RateWindow()
+        # CPU seconds of this process and each search worker at the previous resource sample
+        self._cpu_sample: Tuple[float, Dict[Any, float]] = (time.monotonic(), {"node": time.process_time()})
+        
+        # Rows copied between event loop yields during shard splits and merges
+        self.copy_chunk_size = 2048
+        
+        # Optional search worker processes scoring memory-mapped shard snapshots (0 = in-process only)
+        self.search_pool = (SnapshotSearchPool(self.data_dir / "snapshots", search_workers)
+                            if search_workers > 0 else None)
         
         # Create FastAPI app
         self.app = FastAPI(title=f"Vector Node {node_id}", version="1.0.0")
@@ -87,6 +118,16 @@ class VectorNodeServer:
     def _setup_routes(self):
         """Setup API routes."""
         
+        @self.app.on_event("startup")
+        async def start_search_pool():
+            if self.search_pool:
+                self.search_pool.start()
+        
+        @self.app.on_event("shutdown")
+        async def stop_search_pool():
+            if self.search_pool:
+                self.search_pool.shutdown()
+        
         @self.app.get("/health")
         async def health_check():
             """Health check endpoint."""
@@ -95,9 +136,10 @@ class VectorNodeServer:
                 "node_id": self.node_id,
                 "uptime": time.time() - self.start_time,
                 "load": self._calculate_load(),
-                "vector_count": len(self.vectors),
+                "vector_count": self._vector_count(),
                 "collection_count": len(self.collections),
-                "request_count": self.request_count
+                "request_count": self.request_count,
+                "resources": self._resource_usage()
             }
         
         @self.app.post("/collections")
@@ -133,18 +175,11 @@ class VectorNodeServer:
                 if collection_name not in self.collections:
                     return {"status": "not_found", "message": "Collection not found"}
                 
-                # Remove all vectors in this collection
-                vectors_to_remove = []
-                for vector_id, vector_data in self.vectors.items():
-                    if vector_data.collection_name == collection_name:
-                        vectors_to_remove.append(vector_id)
-                
-                for vector_id in vectors_to_remove:
-                    del self.vectors[vector_id]
-                
-                # Remove from shards
-                for shard_id, vector_ids in self.shards.items():
-                    self.shards[shard_id] = [vid for vid in vector_ids if vid not in vectors_to_remove]
+                # Remove all shard segments of this collection
+                for shard_id in [sid for sid, seg in self.segments.items() if seg.collection_name == collection_name]:
+                    del self.segments[shard_id]
+                    if self.search_pool:
+                        self.search_pool.discard(shard_id)
                 
                 # Remove collection
                 del self.collections[collection_name]
@@ -166,45 +201,47 @@ class VectorNodeServer:
                 documents_data = request["documents"]
                 
                 # Initialize shard if it doesn't exist
-                if shard_id not in self.shards:
-                    self.shards[shard_id] = []
+                segment = self.segments.get(shard_id)
+                if segment is None:
+                    segment = ShardSegment(shard_id, collection_name)
+                    self.segments[shard_id] = segment
                     logger.info(f"Initialized shard: {shard_id}")
                 
-                upserted_count = 0
+                # Rows are keyed by document id, so re-upserts overwrite instead of duplicating
+                request_tags = set(request.get("tags") or [])
+                for document_tags in request.get("document_tags") or []:
+                    request_tags.update(document_tags or [])
+                size_before = len(segment)
+                tagged_before = segment.tag_counts(request_tags)
+                upserted_count = segment.upsert(
+                    vectors_data,
+                    documents_data,
+                    tags=request.get("tags"),
+                    document_tags=request.get("document_tags"),
+                    versions=request.get("versions")
+                )
+                # What the write added, so the coordinator's counts ignore re-upserts
+                tag_counts = {
+                    tag: count - tagged_before.get(tag, 0)
+                    for tag, count in segment.tag_counts(request_tags).items()
+                }
                 
-                for i, (vector, document) in enumerate(zip(vectors_data, documents_data)):
-                    # Create unique vector ID using timestamp and random component
-                    unique_id = str(uuid.uuid4())
-                    vector_id = f"{shard_id}_{document['id']}_{unique_id}_{i}"
-                    
-                    vector_data = VectorData(
-                        id=vector_id,
-                        vector=vector,
-                        document=document,
-                        shard_id=shard_id,
-                        collection_name=collection_name
+                if collection_name in self.collections:
+                    self.collections[collection_name].vector_count = sum(
+                        len(seg) for seg in self.segments.values() if seg.collection_name == collection_name
                     )
-                    
-                    self.vectors[vector_id] = vector_data
-                    self.shards[shard_id].append(vector_id)
-                    upserted_count += 1
-                
-                # Update collection counts properly
-                collection_counts = {}
-                for vector_data in self.vectors.values():
-                    coll_name = vector_data.collection_name
-                    collection_counts[coll_name] = collection_counts.get(coll_name, 0) + 1
-                
-                # Update collection objects
-                for coll_name, count in collection_counts.items():
-                    if coll_name in self.collections:
-                        self.collections[coll_name].vector_count = count
                 
                 self.request_count += 1
+                self.request_rate.record()
                 self.last_request_time = time.time()
                 
                 logger.info(f"Upserted {upserted_count} vectors to shard {shard_id}")
-                return {"status": "success", "upserted_count": upserted_count}
+                return {
+                    "status": "success",
+                    "upserted_count": upserted_count,
+                    "inserted_count": len(segment) - size_before,
+                    "tag_counts": tag_counts
+                }
                 
             except Exception as e:
                 logger.error(f"Failed to upsert vectors: {e}")
@@ -218,65 +255,109 @@ class VectorNodeServer:
                 query_vector = request["query_vector"]
                 limit = request.get("limit", 10)
                 score_threshold = request.get("score_threshold", 0.0)
+                # Virtual collections: restrict the scan to rows carrying any of these tags
+                tags = request.get("tags")
                 
-                # Get vectors in this shard
-                shard_vector_ids = self.shards.get(shard_id, [])
-                shard_vectors = [self.vectors[vid] for vid in shard_vector_ids if vid in self.vectors]
+                # Compact mode returns [document_id, score(, tags)] only; payloads come from /multi_get
+                compact = request.get("compact", False)
                 
-                if not shard_vectors:
-                    return {"results": []}
+                segment = self.segments.get(shard_id)
+                if segment is None:
+                    return {"hits": []} if compact else {"results": []}
                 
-                # Calculate similarities
-                results = []
-                query_np = np.array(query_vector)
-                
-                for vector_data in shard_vectors:
-                    vector_np = np.array(vector_data.vector)
-                    
-                    # Cosine similarity
-                    similarity = np.dot(query_np, vector_np) / (np.linalg.norm(query_np) * np.linalg.norm(vector_np))
-                    
-                    if similarity >= score_threshold:
-                        results.append({
-                            "document_id": vector_data.document["id"],
-                            "content": vector_data.document.get("content", ""),
-                            "score": float(similarity),
-                            "metadata": vector_data.document.get("metadata", {}),
-                            "source_index": vector_data.collection_name
-                        })
-                
-                # Sort by score and limit
-                results.sort(key=lambda x: x["score"], reverse=True)
-                results = results[:limit]
+                hits = None
+                if self.search_pool:
+                    hits = await self.search_pool.search(segment, query_vector, limit, score_threshold, tags)
+                if hits is None:
+                    hits = segment.search(query_vector, limit, score_threshold, tags=tags)
                 
                 self.request_count += 1
+                self.request_rate.record()
                 self.last_request_time = time.time()
                 
-                return {"results": results}
+                if compact:
+                    if tags is None:
+                        return {"hits": [[segment.ids[row], score] for row, score in hits]}
+                    return {"hits": [[segment.ids[row], score, segment.tags_for_row(row)] for row, score in hits]}
+                return {"results": [segment.to_result(row, score) for row, score in hits]}
                 
             except Exception as e:
                 logger.error(f"Failed to search vectors: {e}")
                 raise HTTPException(status_code=500, detail=str(e))
         
+        @self.app.post("/search_batch")
+        async def search_vectors_batch(request: Dict[str, Any]):
+            """Search a shard for many queries with one matrix multiply; compact hits per query."""
+            try:
+                shard_id = request["shard_id"]
+                # Packed float32 matrix from the coordinator, or plain vector lists
+                if "query_matrix" in request:
+                    query_vectors = decode_matrix(request["query_matrix"])
+                else:
+                    query_vectors = request["query_vectors"]
+                limit = request.get("limit", 10)
+                score_threshold = request.get("score_threshold", 0.0)
+                tags = request.get("tags")
+
+                segment = self.segments.get(shard_id)
+                if segment is None:
+                    return {"hits": [[] for _ in query_vectors]}
+
+                # Scored in the node process: one GEMM over the batch already
+                # amortizes the scan that the worker pool parallelizes per query
+                batch_hits = segment.search_batch(query_vectors, limit, score_threshold, tags=tags)
+
+                self.request_count += 1
+                self.request_rate.record()
+                self.last_request_time = time.time()
+
+                if tags is None:
+                    return {"hits": [[[segment.ids[row], score] for row, score in hits] for hits in batch_hits]}
+                return {"hits": [[[segment.ids[row], score, segment.tags_for_row(row)] for row, score in hits]
+                                 for hits in batch_hits]}
+
+            except Exception as e:
+                logger.error(f"Failed to search vector batch: {e}")
+                raise HTTPException(status_code=500, detail=str(e))
+
+        @self.app.post("/multi_get")
+        async def multi_get(request: Dict[str, Any]):
+            """Fetch document payloads for search hits, grouped by shard."""
+            documents = {}
+            for shard_id, document_ids in request.get("shards", {}).items():
+                segment = self.segments.get(shard_id)
+                if segment is None:
+                    continue
+                for document_id in document_ids:
+                    result = segment.get_result(document_id)
+                    if result is not None:
+                        documents[document_id] = result
+            
+            self.request_count += 1
+            self.request_rate.record()
+            self.last_request_time = time.time()
+            return {"documents": documents}
+        
         @self.app.get("/collections")
         async def list_collections():
             """List all collections on this node."""
             return {
                 "collections": [collection.dict() for collection in self.collections.values()],
-                "total_vectors": len(self.vectors)
+                "total_vectors": self._vector_count()
             }
         
         @self.app.get("/shards")
         async def list_shards():
             """List all shards on this node."""
-            shard_info = {}
-            for shard_id, vector_ids in self.shards.items():
-                shard_info[shard_id] = {
-                    "vector_count": len(vector_ids),
-                    "collections": list(set(self.vectors[vid].collection_name for vid in vector_ids if vid in self.vectors))
-                }
+            shard_info = {shard_id: segment.get_stats() for shard_id, segment in self.segments.items()}
             return {"shards": shard_info}
         
+        @self.app.delete("/tags/{tag}")
+        async def delete_tag(tag: str, version: Optional[int] = None):
+            """Remove a virtual collection tag from every shard on this node (as of ``version``)."""
+            removed = sum(1 for segment in self.segments.values() if segment.remove_tag(tag, version))
+            return {"status": "deleted", "shards": removed}
+        
         @self.app.get("/stats")
         async def get_stats():
             """Get node statistics."""
@@ -284,39 +365,233 @@ class VectorNodeServer:
                 "node_id": self.node_id,
                 "uptime": time.time() - self.start_time,
                 "load": self._calculate_load(),
-                "vector_count": len(self.vectors),
+                "vector_count": self._vector_count(),
                 "collection_count": len(self.collections),
-                "shard_count": len(self.shards),
+                "shard_count": len(self.segments),
                 "request_count": self.request_count,
-                "last_request_time": self.last_request_time
+                "last_request_time": self.last_request_time,
+                "search_pool": self.search_pool.get_stats() if self.search_pool else None
             }
         @self.app.get("/shards/{shard_id}/vectors")
         async def get_shard_vectors(shard_id: str):
             """Get all vectors and documents for a shard."""
-            vector_ids = self.shards.get(shard_id, [])
-            vectors = []
-            documents = []
-            for vid in vector_ids:
-                vdata = self.vectors.get(vid)
-                if vdata:
-                    vectors.append(vdata.vector)
-                    documents.append(vdata.document)
-            return {"vectors": vectors, "documents": documents}
+            segment = self.segments.get(shard_id)
+            if segment is None:
+                return {"vectors": [], "documents": [], "tags": []}
+            return segment.export()
+    
+        @self.app.get("/shards/{shard_id}/export")
+        async def export_shard_page(shard_id: str, cursor: Optional[str] = None, limit: int = 256):
+            """Export one page of a shard for a paged transfer."""
+            segment = self.segments.get(shard_id)
+            if segment is None:
+                raise HTTPException(status_code=404, detail=f"Shard {shard_id} not found")
+            page = segment.export_page(cursor, limit)
+            page["collection_name"] = segment.collection_name
+            return page
+        
+        @self.app.post("/shards/{shard_id}/import")
+        async def import_shard_page(shard_id: str, request: Dict[str, Any]):
+            """Import one checksummed page of a shard."""
+            try:
+                return {"status": "success", "imported_count": self._import_page(shard_id, request)}
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            except Exception as e:
+                logger.error(f"Failed to import shard page: {e}")
+                raise HTTPException(status_code=500, detail=str(e))
+        
+        @self.app.post("/shards/{shard_id}/pull")
+        async def pull_shard_page(shard_id: str, request: Dict[str, Any]):
+            """
+            Pull one page of a shard directly from another node and import it,
+            so shard data never passes through the coordinator.
+            """
+            source_url = request["source_url"]
+            params = {"limit": request.get("limit", 256)}
+            if request.get("cursor") is not None:
+                params["cursor"] = request["cursor"]
+            try:
+                async with aiohttp.ClientSession() as session:
+                    async with session.get(f"{source_url}/shards/{shard_id}/export", params=params, timeout=60) as response:
+                        if response.status != 200:
+                            raise HTTPException(status_code=502, detail=f"Source returned HTTP {response.status}")
+                        body = await response.read()
+                page = json.loads(body)
+                imported_count = self._import_page(shard_id, page)
+                return {
+                    "status": "success",
+                    "imported_count": imported_count,
+                    "next_cursor": page.get("next_cursor"),
+                    "total": page.get("total"),
+                    "bytes": len(body)
+                }
+            except HTTPException:
+                raise
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            except Exception as e:
+                logger.error(f"Failed to pull shard page: {e}")
+                raise HTTPException(status_code=502, detail=str(e))
+        
+        @self.app.post("/shards/{shard_id}/copy_range")
+        async def copy_shard_range(shard_id: str, request: Dict[str, Any]):
+            """
+            Copy the rows of a shard whose routing key falls in [start, end) into
+            another shard on this node (hash-range splits and merges).
+            
+            Rows are copied in chunks, yielding between them so writes and
+            searches keep being served; writes arriving meanwhile are mirrored
+            to the target by the coordinator and win by version.
+            """
+            target_shard_id = request["target_shard_id"]
+            start, end = int(request["start"]), int(request["end"])
+            segment = self.segments.get(shard_id)
+            if segment is None:
+                target = self.segments.get(target_shard_id)
+                return {"status": "success", "copied_count": 0, "target_count": len(target) if target else 0}
+            
+            target = self.segments.get(target_shard_id)
+            if target is None:
+                target = ShardSegment(target_shard_id, segment.collection_name)
+                self.segments[target_shard_id] = target
+            
+            document_ids = [
+                document_id for document_id in list(segment.ids)
+                if start <= key_hash(segment.collection_name, document_id) < end
+            ]
+            copied_count = 0
+            for i in range(0, len(document_ids), self.copy_chunk_size):
+                copied_count += segment.copy_to(target, document_ids[i:i + self.copy_chunk_size])
+                await asyncio.sleep(0)
+            
+            logger.info(f"Copied {copied_count} rows of shard {shard_id} to {target_shard_id}")
+            return {"status": "success", "copied_count": copied_count, "target_count": len(target)}
+        
+        @self.app.get("/shards/{shard_id}/digest")
+        async def get_shard_digest(shard_id: str, level: int = 0, indices: str = ""):
+            """Get Merkle digest hashes at one tree level (comma-separated node indices)."""
+            segment = self.segments.get(shard_id)
+            if segment is None:
+                return {"exists": False, "hashes": {}}
+            wanted = [int(i) for i in indices.split(",") if i] if indices else None
+            hashes = segment.digest.hashes(level, wanted)
+            return {
+                "exists": True,
+                "fanout": segment.digest.fanout,
+                "depth": segment.digest.depth,
+                "hashes": {str(i): format(value, "016x") for i, value in hashes.items()}
+            }
+        
+        @self.app.post("/shards/{shard_id}/buckets")
+        async def get_shard_buckets(shard_id: str, request: Dict[str, Any]):
+            """Get document versions and row hashes in the given digest leaf buckets."""
+            segment = self.segments.get(shard_id)
+            if segment is None:
+                return {"entries": {}}
+            return {"entries": segment.bucket_versions(request.get("buckets", []))}
+        
+        @self.app.post("/shards/{shard_id}/rows")
+        async def export_shard_rows(shard_id: str, request: Dict[str, Any]):
+            """Export specific rows of a shard for replica repair."""
+            segment = self.segments.get(shard_id)
+            if segment is None:
+                raise HTTPException(status_code=404, detail=f"Shard {shard_id} not found")
+            page = segment.export_rows(request.get("ids", []))
+            page["collection_name"] = segment.collection_name
+            return page
+        
+        @self.app.delete("/shards/{shard_id}")
+        async def delete_shard(shard_id: str):
+            """Drop a shard this node no longer owns."""
+            if self.segments.pop(shard_id, None) is None:
+                return {"status": "not_found", "message": "Shard not found"}
+            if self.search_pool:
+                self.search_pool.discard(shard_id)
+            logger.info(f"Dropped shard: {shard_id}")
+            return {"status": "deleted", "message": f"Shard {shard_id} deleted"}
+    
+    def _import_page(self, shard_id: str, page: Dict[str, Any]) -> int:
+        """Verify a transfer page's checksum and upsert it into the shard."""
+        vectors = page.get("vectors", [])
+        documents = page.get("documents", [])
+        tags, versions = page.get("tags"), page.get("versions")
+        if "checksum" in page and page_checksum(vectors, documents, tags, versions) != page["checksum"]:
+            raise ValueError(f"Checksum mismatch for shard {shard_id} page")
+        
+        segment = self.segments.get(shard_id)
+        if segment is None:
+            segment = ShardSegment(shard_id, page.get("collection_name", "default"))
+            self.segments[shard_id] = segment
+        
+        # Tombstones first, so tags the source still carries from before a removal are not copied back
+        segment.apply_tag_removals(page.get("removed_tags") or {})
+        imported_count = segment.upsert(vectors, documents, document_tags=tags, versions=versions)
+        self.request_count += 1
+        self.request_rate.record()
+        self.last_request_time = time.time()
+        return imported_count
+    
+    def _vector_count(self) -> int:
+        return sum(len(segment) for segment in self.segments.values())
     
     def _calculate_load(self) -> float:
         """Calculate current load (0.0 to 1.0)."""
-        # Simple load calculation based on request rate and vector count
-        time_since_start = time.time() - self.start_time
-        if time_since_start == 0:
-            return 0.0
-        
-        request_rate = self.request_count / time_since_start
-        vector_load = min(len(self.vectors) / 10000, 1.0)  # Normalize to 10k vectors
+        # Simple load calculation based on recent request rate and vector count
+        request_rate = self.request_rate.rate()
+        vector_load = min(self._vector_count() / 10000, 1.0)  # Normalize to 10k vectors
         
         # Combine factors
         load = (request_rate * 0.3) + (vector_load * 0.7)
         return min(load, 1.0)
     
+    def _resource_usage(self) -> Dict[str, Optional[float]]:
+        """
+        CPU, memory and storage utilization (0.0 to 1.0) for auto-scaling.
+        
+        CPU is the busier of this process's share of one core (the event
+        loop is single-threaded) and the search workers' mean share of a
+        core each, since the previous sample. Memory is this node's resident
+        memory as a share of host memory: this process plus the anonymous
+        memory of its search workers (their snapshot mappings are file
+        pages). Storage is the used share of the data directory's filesystem.
+        """
+        now = time.monotonic()
+        last_now, last_cpu = self._cpu_sample
+        elapsed = now - last_now
+        cpu_seconds: Dict[Any, float] = {"node": time.process_time()}
+        
+        own = _process_stats(os.getpid())
+        resident = own[1] if own else None
+        worker_cpu: List[float] = []
+        for pid in self.search_pool.worker_pids() if self.search_pool else []:
+            stats = _process_stats(pid)
+            if stats is None:
+                continue
+            cpu_seconds[pid] = stats[0]
+            if pid in last_cpu and elapsed > 0:
+                worker_cpu.append((stats[0] - last_cpu[pid]) / elapsed)
+            if resident is not None:
+                resident += stats[2]
+        self._cpu_sample = (now, cpu_seconds)
+        
+        cpu = (cpu_seconds["node"] - last_cpu["node"]) / elapsed if elapsed > 0 else 0.0
+        pool_cpu = sum(worker_cpu) / len(worker_cpu) if worker_cpu else None
+        try:
+            disk = shutil.disk_usage(self.data_dir)
+            storage = disk.used / disk.total if disk.total else None
+        except OSError:
+            storage = None
+        total_memory = _host_memory_total()
+        memory = resident / total_memory if resident is not None and total_memory else None
+        return {
+            "cpu": round(min(max(cpu, pool_cpu or 0.0), 1.0), 4),
+            "node_cpu": round(min(cpu, 1.0), 4),
+            "search_pool_cpu": round(min(pool_cpu, 1.0), 4) if pool_cpu is not None else None,
+            "memory": round(memory, 4) if memory is not None else None,
+            "storage": round(storage, 4) if storage is not None else None
+        }
+    
     def run(self):
         """Run the node server."""
         logger.info(f"Starting vector node {self.node_id} on {self.host}:{self.port}")
@@ -327,20 +602,22 @@ class VectorNodeServer:
             log_level="info"
         )
 
-def create_node_server(node_id: str, host: str = "localhost", port: int = 8001, data_dir: str = "./node_data"):
+def create_node_server(node_id: str, host: str = "localhost", port: int = 8001, data_dir: str = "./node_data",
+                       search_workers: int = 0):
     """Factory function to create a vector node server."""
-    return VectorNodeServer(node_id, host, port, data_dir)
+    return VectorNodeServer(node_id, host, port, data_dir, search_workers)
 
 if __name__ == "__main__":
     import sys
     
     if len(sys.argv) < 4:
-        print("Usage: python vector_node_server.py <node_id> <host> <port>")
+        print("Usage: python vector_node_server.py <node_id> <host> <port> [search_workers]")
         sys.exit(1)
     
     node_id = sys.argv[1]
     host = sys.argv[2]
     port = int(sys.argv[3])
+    search_workers = int(sys.argv[4]) if len(sys.argv) > 4 else 0
     
-    server = create_node_server(node_id, host, port)
+    server = create_node_server(node_id, host, port, search_workers=search_workers)
     server.run() 
\ No newline at end of file
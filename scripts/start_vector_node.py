@@ -21,7 +21,7 @@ sys.path.insert(0, str(project_root))
 
 from data.storage.vector_node_server import create_node_server
 
-def start_node(node_id: str, host: str, port: int, data_dir: str = None):
+def start_node(node_id: str, host: str, port: int, data_dir: str = None, search_workers: int = 0):
     """Start a vector storage node."""
     if data_dir is None:
         data_dir = f"./node_data/{node_id}"
@@ -33,7 +33,7 @@ def start_node(node_id: str, host: str, port: int, data_dir: str = None):
     Path(data_dir).mkdir(parents=True, exist_ok=True)
     
     # Start the node server
-    server = create_node_server(node_id, host, port, data_dir)
+    server = create_node_server(node_id, host, port, data_dir, search_workers)
     server.run()
 
 async def start_node_server(node_id: int, port: int, host: str = "localhost") -> None:
@@ -110,12 +110,14 @@ if __name__ == "__main__":
     parser.add_argument("--host", type=str, default="localhost", help="Host")
     parser.add_argument("--port", type=int, help="Port")
     parser.add_argument("--data-dir", type=str, default=None, help="Data directory")
+    parser.add_argument("--search-workers", type=int, default=0,
+                        help="Search worker processes serving shard snapshots (0 = search in the node process)")
 
     args = parser.parse_args()
 
     if args.node_id and args.port:
         # Khởi động một node duy nhất với tham số truyền vào
-        start_node(args.node_id, args.host, args.port, args.data_dir)
+        start_node(args.node_id, args.host, args.port, args.data_dir, args.search_workers)
     else:
         # Nếu không có tham số, chạy main() để khởi động nhiều node (mặc định)
         main()
\ No newline at end of file
@@ -0,0 +1,10 @@
+"""
+Shared pytest setup: make the project root importable, as example_usage.py does.
+"""
+
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
@@ -0,0 +1,80 @@
+"""
+Node processes started by scale-up are stopped when the node is removed
+or never joins the cluster.
+"""
+
+import asyncio
+import subprocess
+import sys
+
+from data.storage import auto_scaler
+from data.storage.auto_scaler import NODE_PIDS_SETTING, AutoScaler
+
+
+class FakeStorageManager:
+    def __init__(self):
+        self.settings = {}
+
+    def get_shared_setting(self, key, default=None):
+        return self.settings.get(key, default)
+
+    def set_shared_setting(self, key, value):
+        self.settings[key] = value
+        return True
+
+    async def get_cluster_status(self):
+        return {"nodes": []}
+
+
+def start_sleeper() -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+
+
+def test_scale_down_terminates_node_process():
+    manager = FakeStorageManager()
+    scaler = AutoScaler(manager)
+    process = start_sleeper()
+    scaler._remember_node_process("node4", process)
+    assert manager.settings[NODE_PIDS_SETTING] == {"node4": process.pid}
+
+    asyncio.run(scaler._stop_node_process("node4"))
+    assert process.poll() is not None
+    assert manager.settings[NODE_PIDS_SETTING] == {}
+
+
+def test_node_started_by_another_worker_is_stopped_by_pid():
+    manager = FakeStorageManager()
+    starter, stopper = AutoScaler(manager), AutoScaler(manager)
+    process = start_sleeper()
+    starter._remember_node_process("node4", process)
+
+    asyncio.run(stopper._stop_node_process("node4"))
+    assert process.wait(timeout=10) is not None
+
+
+def test_failed_scale_up_reaps_node_that_ignores_sigterm(monkeypatch):
+    scaler = AutoScaler(FakeStorageManager())
+    scaler.node_stop_timeout = 0.5
+    started = []
+    real_popen = subprocess.Popen
+
+    def popen(args):
+        process = real_popen([
+            sys.executable, "-c",
+            "import signal, sys, time; signal.signal(signal.SIGTERM, signal.SIG_IGN); "
+            "print('ready', flush=True); time.sleep(60)",
+        ], stdout=subprocess.PIPE)
+        process.stdout.readline()
+        started.append(process)
+        return process
+
+    async def unhealthy(host, port, timeout):
+        return False
+
+    monkeypatch.setattr(auto_scaler.subprocess, "Popen", popen)
+    monkeypatch.setattr(scaler, "_wait_for_node", unhealthy)
+
+    assert asyncio.run(scaler._scale_up("test", 0)) is False
+    # Killed after the stop timeout and reaped, not left as a zombie
+    assert started[0].returncode is not None
+    started[0].stdout.close()
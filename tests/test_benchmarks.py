@@ -0,0 +1,87 @@
+"""
+The benchmark suite is reproducible: the same seed yields the same corpus,
+the fake Gemini model answers the real client's prompts deterministically,
+and reports compare metric by metric.
+"""
+
+import asyncio
+
+import numpy as np
+
+from benchmarks.corpus import TOPICS, SyntheticCorpus, parse_corpus_size, topic_for_text
+from benchmarks.embeddings import HashingEmbeddingModel
+from benchmarks.fake_gemini import install_fake_gemini
+from benchmarks.report import StageStats, build_report, compare_reports
+from core.services.inference.gemini_client import GeminiClient
+
+
+def test_same_seed_same_corpus():
+    first, second = SyntheticCorpus(200, seed=7), SyntheticCorpus(200, seed=7)
+    documents = list(first.iter_documents("music"))
+    assert [(d.id, d.content) for d in documents] == [(d.id, d.content) for d in second.iter_documents("music")]
+    assert first.queries(20) == second.queries(20)
+    assert first.csv_files(2, rows=20) == second.csv_files(2, rows=20)
+    assert SyntheticCorpus(200, seed=8).chunk_text(0) != first.chunk_text(0)
+
+
+def test_topics_partition_the_corpus():
+    corpus = SyntheticCorpus(103, seed=0)
+    assert sum(corpus.topic_size(topic) for topic in TOPICS) == 103
+    for topic in TOPICS:
+        documents = list(corpus.iter_documents(topic))
+        assert len(documents) == corpus.topic_size(topic)
+        assert all(topic_for_text(d.content) == topic for d in documents)
+    # Lazy paging over a topic
+    page = list(corpus.iter_documents("finance", offset=3, count=4))
+    assert [d.metadata["chunk_index"] for d in page] == [
+        d.metadata["chunk_index"] for d in list(corpus.iter_documents("finance"))[3:7]]
+    assert parse_corpus_size("100k") == 100_000 and parse_corpus_size("2_500") == 2500
+
+
+def test_topical_queries_have_topical_nearest_neighbours():
+    corpus = SyntheticCorpus(400, seed=0)
+    model = HashingEmbeddingModel(dimension=128)
+    chunks = model.encode([corpus.chunk_text(i) for i in range(corpus.chunk_count)])
+    queries = corpus.queries(40)
+    scores = model.encode(queries) @ chunks.T
+    nearest = np.argsort(-scores, axis=1)[:, :5]
+    hits = sum(corpus.topic_of(int(j)) == corpus.topic_of(i) for i, row in enumerate(nearest) for j in row)
+    assert hits / nearest.size > 0.9
+    assert np.allclose(model.encode(queries[:3]), HashingEmbeddingModel(dimension=128).encode(queries[:3]))
+
+
+def test_fake_gemini_drives_the_real_client():
+    client = GeminiClient(api_key="benchmark")
+    model = install_fake_gemini(client, latency=0.0)
+    content = SyntheticCorpus(16, seed=0).chunk_text(2)
+
+    async def run():
+        metadata = await client.extract_metadata(content)
+        again = await client.extract_metadata(content)
+        answer = await client.generate_text('Question: "Which comet passed the telescope?"')
+        streamed = [chunk async for chunk in client.stream_text('Question: "Which comet passed the telescope?"')]
+        return metadata, again, answer, streamed
+
+    metadata, again, answer, streamed = asyncio.run(run())
+    assert metadata == again
+    assert metadata["topics"] == [topic_for_text(content)]
+    assert answer.text.startswith("Based on the astronomy sources")
+    assert "".join(streamed).strip() == answer.text
+    assert model.calls == 4
+
+
+def stage(name, qps, p99_ms):
+    stats = StageStats.from_latencies(name, [0.01] * 10, errors=0, empty=0, concurrency=1, wall_seconds=1.0)
+    stats.qps, stats.p99_ms = qps, p99_ms
+    return stats
+
+
+def test_compare_reports_flags_regressions():
+    baseline = build_report({"nodes": 3}, {}, [stage("search", 100.0, 20.0), stage("ask", 10.0, 500.0)])
+    candidate = build_report({"nodes": 3}, {}, [stage("search", 80.0, 25.0)])
+
+    rows = {(row["stage"], row["metric"]): row for row in compare_reports(baseline, candidate)}
+    assert {stage_name for stage_name, _ in rows} == {"search"}
+    assert rows[("search", "qps")]["change_pct"] == -20.0
+    assert rows[("search", "qps")]["worse_pct"] == 20.0
+    assert rows[("search", "p99_ms")]["worse_pct"] == 25.0
@@ -0,0 +1,160 @@
+"""
+Catalog persistence across restarts, and state shared by API workers: sync
+barriers, new topic names and stale replicas.
+"""
+
+import asyncio
+
+import numpy as np
+
+from data.storage.cluster_catalog import CatalogShard, ClusterCatalog
+from data.storage.distributed_vector_store import DistributedVectorStore
+
+
+def test_catalog_round_trip(tmp_path):
+    path = str(tmp_path / "catalog.db")
+    catalog = ClusterCatalog(path)
+    catalog.save_collection("index_document", 384)
+    catalog.save_virtual_collection("index_sports", "index_document", vector_count=3)
+    catalog.save_shard("shard_a", "index_document", ["node1", "node2"], vector_count=10, epoch=4,
+                       created_at=100.0, pinned=True)
+    catalog.save_shard("shard_b", "index_document", ["node2", "node3"], vector_count=0, epoch=1,
+                       created_at=101.0, state="pending")
+    catalog.save_node("node1", "localhost", 8001, weight=2.0, tags={"zone": "a"})
+    catalog.start_migration("shard_a", "node3")
+    catalog.add_counts({"shard_a": 5}, {"index_sports": 2})
+    catalog.close()
+
+    snapshot = ClusterCatalog(path).load()
+    assert snapshot.collections == {"index_document": 384}
+    assert snapshot.virtual_collections == {"index_sports": "index_document"}
+    assert snapshot.virtual_counts == {"index_sports": 5}
+    assert snapshot.shards == [
+        CatalogShard("shard_a", "index_document", ["node1", "node2"], 15, 4, 100.0, "active", True),
+        CatalogShard("shard_b", "index_document", ["node2", "node3"], 0, 1, 101.0, "pending", False),
+    ]
+    assert [(n.node_id, n.host, n.port, n.weight, n.tags) for n in snapshot.nodes] == [
+        ("node1", "localhost", 8001, 2.0, {"zone": "a"})]
+    assert snapshot.migrations == {"shard_a": ["node3"]}
+
+
+def test_restarted_store_routes_to_the_saved_placement(monkeypatch, tmp_path):
+    path = str(tmp_path / "catalog.db")
+    catalog = ClusterCatalog(path)
+    catalog.save_collection("index_document", 384)
+    catalog.save_shard("shard_a", "index_document", ["node2", "node1"], vector_count=7, epoch=3, created_at=100.0)
+    catalog.save_shard("shard_b", "index_document", ["node3"], vector_count=0, epoch=1, created_at=100.0,
+                       state="pending")
+    catalog.close()
+
+    monkeypatch.setattr(DistributedVectorStore, "_start_background_tasks", lambda self: None)
+    store = DistributedVectorStore(catalog_path=path)
+    shard = store.shards["shard_a"]
+    assert (shard.node_ids, shard.primary_node, shard.epoch, shard.vector_count) == (["node2", "node1"], "node2", 3, 7)
+    # A pending shard (interrupted split or merge) is loaded but not routed
+    assert "shard_b" in store.shards
+    assert store.collections["index_document"] == ["shard_a"]
+
+
+def test_barrier_waits_for_live_workers_only(tmp_path):
+    leader, follower = ClusterCatalog(str(tmp_path / "catalog.db")), ClusterCatalog(str(tmp_path / "catalog.db"))
+    leader.heartbeat_worker("leader", 0)
+    follower.heartbeat_worker("follower", 0)
+
+    barrier = leader.raise_barrier()
+    leader.heartbeat_worker("leader", barrier)
+    assert leader.pending_workers(barrier, max_age=60) == ["follower"]
+
+    # The follower acknowledges once it has loaded a snapshot with the barrier
+    assert follower.load().barrier == barrier
+    follower.heartbeat_worker("follower", barrier)
+    assert leader.pending_workers(barrier, max_age=60) == []
+
+    # A worker without heartbeats is dropped instead of blocking the barrier forever
+    barrier = leader.raise_barrier()
+    leader.heartbeat_worker("leader", barrier)
+    assert leader.pending_workers(barrier, max_age=-1) == []
+
+
+def test_similar_topics_get_the_claimed_names(monkeypatch, tmp_path):
+    monkeypatch.setattr(DistributedVectorStore, "_start_background_tasks", lambda self: None)
+    first, second = DistributedVectorStore(), DistributedVectorStore()
+    first.catalog = ClusterCatalog(str(tmp_path / "catalog.db"))
+    second.catalog = ClusterCatalog(str(tmp_path / "catalog.db"))
+    rng = np.random.default_rng(0)
+    topic = rng.normal(size=16)
+
+    assert first.claim_collection_names(["index_tennis"], topic.tolist(), 0.8) == ["index_tennis"]
+    similar = topic + 0.05 * rng.normal(size=16)
+    assert second.claim_collection_names(["index_sports"], similar.tolist(), 0.8) == ["index_tennis"]
+    unrelated = rng.normal(size=16)
+    assert second.claim_collection_names(["index_cooking"], unrelated.tolist(), 0.8) == ["index_cooking"]
+
+
+def make_workers(monkeypatch, tmp_path):
+    monkeypatch.setattr(DistributedVectorStore, "_start_background_tasks", lambda self: None)
+    workers = []
+    for _ in range(2):
+        store = DistributedVectorStore()
+        store.catalog = ClusterCatalog(str(tmp_path / "catalog.db"))
+        store.catalog_sync_interval = 0.02
+        store._sync_from_catalog(initial=True)
+        workers.append(store)
+    return workers
+
+
+def start_repairs(leader, follower) -> bool:
+    async def follow():
+        while True:
+            await asyncio.sleep(0.01)
+            follower._sync_from_catalog()
+
+    async def run():
+        task = asyncio.create_task(follow())
+        try:
+            return await leader._start_stale_repairs()
+        finally:
+            task.cancel()
+
+    return asyncio.run(run())
+
+
+def test_follower_stale_mark_is_cleared_by_the_leaders_repair(monkeypatch, tmp_path):
+    leader, follower = make_workers(monkeypatch, tmp_path)
+    key = ("node-1", "docs_shard_0")
+
+    # A follower's replication queue overflowed
+    follower.replication_log.mark_stale(*key)
+    follower.flush_catalog()
+    leader._sync_from_catalog()
+    assert leader.replication_log.stale_replicas() == [key]
+
+    # Once repairing, every worker queues the replica's writes again but does not read from it
+    assert start_repairs(leader, follower)
+    assert follower.replication_log.repairing_replicas() == [key]
+    assert not follower.replication_log.is_caught_up(*key)
+
+    leader.catalog.begin_replica_repair(*key)
+    leader._finish_stale_repair(*key)
+    follower._sync_from_catalog()
+    assert follower.replication_log.is_caught_up(*key)
+    assert leader.replication_log.is_caught_up(*key)
+
+
+def test_write_dropped_during_repair_keeps_the_replica_stale(monkeypatch, tmp_path):
+    leader, follower = make_workers(monkeypatch, tmp_path)
+    key = ("node-1", "docs_shard_0")
+    follower.replication_log.mark_stale(*key)
+    follower.flush_catalog()
+    leader._sync_from_catalog()
+    assert start_repairs(leader, follower)
+
+    leader.catalog.begin_replica_repair(*key)
+    # The digests may have been compared before this drop
+    follower.replication_log.mark_stale(*key)
+    follower.flush_catalog()
+    leader._finish_stale_repair(*key)
+
+    follower._sync_from_catalog()
+    assert follower.replication_log.stale_replicas() == [key]
+    assert leader.replication_log.stale_replicas() == [key]
@@ -0,0 +1,73 @@
+"""
+Latency histogram accuracy and merging metrics windows across workers.
+"""
+
+import json
+
+import numpy as np
+import pytest
+
+from data.storage.cluster_metrics import ClusterMetrics, LatencyHistogram
+
+
+def test_percentiles_are_within_bucket_precision():
+    latencies = np.random.default_rng(0).lognormal(mean=-4, sigma=1.0, size=20_000)
+    histogram = LatencyHistogram()
+    for latency in latencies:
+        histogram.record(float(latency))
+
+    for q in (50, 90, 99, 99.9):
+        assert histogram.percentile(q) == pytest.approx(np.percentile(latencies, q), rel=0.04)
+    assert histogram.mean() == pytest.approx(latencies.mean(), rel=1e-3)
+    assert histogram.percentile(100) <= latencies.max()
+
+
+def test_buckets_are_bounded_and_monotonic():
+    indices = [LatencyHistogram.bucket_index(value) for value in range(0, 1 << 20, 97)]
+    assert indices == sorted(indices)
+    assert LatencyHistogram.bucket_index(1 << 60) < LatencyHistogram.BUCKET_COUNT
+
+
+def test_merge_equals_recording_everything_in_one():
+    rng = np.random.default_rng(1)
+    first, second, combined = LatencyHistogram(), LatencyHistogram(), LatencyHistogram()
+    for i, latency in enumerate(rng.exponential(0.05, size=2_000)):
+        (first if i % 2 else second).record(float(latency))
+        combined.record(float(latency))
+    first.merge(second)
+    assert first.counts == combined.counts
+    assert first.total == combined.total
+    assert first.percentile(99) == combined.percentile(99)
+
+
+def test_empty_histogram():
+    histogram = LatencyHistogram()
+    assert histogram.percentile(99) == 0.0
+    assert histogram.mean() == 0.0
+
+
+def test_worker_windows_merge_into_one_snapshot():
+    rng = np.random.default_rng(2)
+    workers = [ClusterMetrics(export=False) for _ in range(3)]
+    combined = ClusterMetrics(export=False)
+    for i, metrics in enumerate(workers):
+        for latency in rng.lognormal(mean=-3, sigma=0.5, size=200):
+            for target in (metrics, combined):
+                target.record_rpc(f"node-{i % 2}", "search", float(latency), error=latency > 0.1,
+                                  shard_id="docs_shard_0", collection="docs")
+                target.record_query(float(latency), shards=1)
+
+    # States travel through the catalog as JSON
+    others = [json.loads(json.dumps(metrics.export_state())) for metrics in workers[1:]]
+    merged = workers[0].snapshot(others=others)
+    expected = combined.snapshot()
+
+    assert merged["rpc"]["requests"] == 600
+    for section in ("rpc", "query"):
+        assert merged[section]["requests"] == expected[section]["requests"]
+        assert merged[section]["errors"] == expected[section]["errors"]
+        assert merged[section]["latency_ms"] == expected[section]["latency_ms"]
+    assert merged["nodes"].keys() == {"node-0", "node-1"}
+    assert merged["nodes"]["node-0"]["requests"] == expected["nodes"]["node-0"]["requests"] == 400
+    # The worker's own window is untouched by the merge
+    assert workers[0].snapshot()["rpc"]["requests"] == 200
@@ -0,0 +1,94 @@
+"""
+Documents join existing collections by centroid similarity; only new topics
+are named by the LLM, in batches.
+"""
+
+import asyncio
+import json
+import re
+
+from core.models.base import BaseDocument, DataType
+from core.services.inference.collection_assigner import BatchedCollectionNamer, CollectionAssigner
+
+CENTROIDS = {"index_sports": [1.0, 0.0], "index_music": [0.0, 1.0]}
+
+
+async def embed_text(text):
+    return [1.0, 0.0] if "football" in text else [0.6, 0.8] if "concert" in text else [-1.0, 0.0]
+
+
+def score_collections(vector, candidates):
+    scored = [(name, sum(a * b for a, b in zip(vector, CENTROIDS[name]))) for name in candidates]
+    return sorted(scored, key=lambda item: item[1], reverse=True)
+
+
+class StubLLM:
+    def __init__(self, names):
+        self.names = names
+        self.prompts = []
+
+    async def __call__(self, prompt):
+        self.prompts.append(prompt)
+        numbers = re.findall(r"^\s*(\d+)\. ", prompt, re.MULTILINE)
+        return json.dumps({number: [self.names] for number in numbers})
+
+
+def make_assigner(llm, claim_names=None, threshold=0.7):
+    namer = BatchedCollectionNamer(llm, batch_window=0.01)
+    return CollectionAssigner(embed_text, score_collections, namer, claim_names=claim_names,
+                              similarity_threshold=threshold)
+
+
+def document(content):
+    return BaseDocument(type=DataType.DOCUMENT, content=content)
+
+
+def test_match_above_threshold_joins_existing_collection():
+    llm = StubLLM("cooking")
+    assigner = make_assigner(llm)
+
+    collections = asyncio.run(assigner.assign(document("football results"),
+                                              existing_collections=list(CENTROIDS)))
+    assert collections == ["index_sports", "index_document"]
+    assert llm.prompts == []
+
+
+def test_match_below_threshold_asks_the_namer():
+    llm = StubLLM("live shows")
+    assigner = make_assigner(llm, threshold=0.9)
+
+    collections = asyncio.run(assigner.assign(document("concert review"),
+                                              existing_collections=list(CENTROIDS)))
+    assert collections == ["index_live_shows", "index_document"]
+    assert len(llm.prompts) == 1
+
+
+def test_concurrent_documents_share_one_llm_call():
+    llm = StubLLM("cooking")
+    assigner = make_assigner(llm)
+
+    async def run():
+        return await asyncio.gather(*(
+            assigner.assign(document(f"recipe {i}"), existing_collections=list(CENTROIDS))
+            for i in range(5)
+        ))
+
+    results = asyncio.run(run())
+    assert results == [["index_cooking", "index_document"]] * 5
+    assert len(llm.prompts) == 1
+    assert assigner.namer.llm_calls == 1
+
+
+def test_claimed_name_replaces_the_proposed_one():
+    claims = []
+
+    def claim_names(names, vector, threshold):
+        claims.append((names, vector, threshold))
+        return ["index_food"]
+
+    assigner = make_assigner(StubLLM("cooking"), claim_names=claim_names)
+
+    collections = asyncio.run(assigner.assign(document("recipe"), existing_collections=[]))
+    assert collections == ["index_food", "index_document"]
+    # No candidates to match against, so the summary is embedded only for the claim
+    assert claims == [(["index_cooking"], [-1.0, 0.0], 0.7)]
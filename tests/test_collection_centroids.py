@@ -0,0 +1,78 @@
+"""
+Collection centroids persisted in the cluster catalog and shared by workers.
+"""
+
+import numpy as np
+
+from data.storage.cluster_catalog import ClusterCatalog
+from data.storage.collection_centroids import CollectionCentroids
+
+VECTOR_SIZE = 8
+
+
+def flush(catalog: ClusterCatalog, centroids: CollectionCentroids) -> None:
+    merged = catalog.merge_centroids(centroids.pending_collections(), centroids.merge_record)
+    centroids.mark_flushed(merged)
+
+
+def test_flushes_from_two_workers_are_merged(tmp_path):
+    path = str(tmp_path / "catalog.db")
+    first_catalog, second_catalog = ClusterCatalog(path), ClusterCatalog(path)
+    first_catalog.save_collection("docs", VECTOR_SIZE)
+    rng = np.random.default_rng(0)
+
+    first = CollectionCentroids(vector_size=VECTOR_SIZE)
+    second = CollectionCentroids(vector_size=VECTOR_SIZE)
+    first.observe("docs", rng.normal(size=(10, VECTOR_SIZE)))
+    second.observe("docs", rng.normal(size=(7, VECTOR_SIZE)))
+    flush(first_catalog, first)
+    flush(second_catalog, second)
+
+    restarted = CollectionCentroids(vector_size=VECTOR_SIZE)
+    restarted.load_records(ClusterCatalog(path).load().centroids)
+    stats = restarted.get_stats()["docs"]
+    assert stats["vectors_observed"] == 17
+    assert stats["clusters"] <= restarted.clusters_per_collection
+
+
+def test_flush_does_not_recreate_deleted_collections(tmp_path):
+    catalog = ClusterCatalog(str(tmp_path / "catalog.db"))
+    catalog.save_collection("docs", VECTOR_SIZE)
+    centroids = CollectionCentroids(vector_size=VECTOR_SIZE)
+    centroids.observe("docs", np.ones((2, VECTOR_SIZE)))
+    centroids.observe("deleted", np.ones((2, VECTOR_SIZE)))
+
+    flush(catalog, centroids)
+
+    assert set(catalog.load().centroids) == {"docs"}
+    assert not centroids.has_collection("deleted")
+
+
+def test_pending_additions_survive_loading_other_workers_records(tmp_path):
+    path = str(tmp_path / "catalog.db")
+    catalog = ClusterCatalog(path)
+    catalog.save_collection("docs", VECTOR_SIZE)
+    rng = np.random.default_rng(1)
+
+    other = CollectionCentroids(vector_size=VECTOR_SIZE)
+    other.observe("docs", rng.normal(size=(5, VECTOR_SIZE)))
+    flush(ClusterCatalog(path), other)
+
+    local = CollectionCentroids(vector_size=VECTOR_SIZE)
+    local.observe("docs", rng.normal(size=(3, VECTOR_SIZE)))
+    local.load_records(catalog.load().centroids)
+    assert local.get_stats()["docs"] == {"clusters": 4, "vectors_observed": 8, "pending_vectors": 3}
+
+    flush(catalog, local)
+    assert local.get_stats()["docs"]["vectors_observed"] == 8
+    assert local.get_stats()["docs"]["pending_vectors"] == 0
+
+
+def test_route_keeps_candidates_without_centroids():
+    centroids = CollectionCentroids(vector_size=VECTOR_SIZE)
+    centroids.observe("ranked", np.eye(VECTOR_SIZE)[:2])
+
+    routed = centroids.route(np.eye(VECTOR_SIZE)[0], candidates=["ranked", "unseen"], top_n=1)
+
+    assert routed[0][0] == "ranked"
+    assert routed[1] == ("unseen", None)
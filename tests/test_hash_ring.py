@@ -0,0 +1,85 @@
+"""
+Ring placement and the movement plans derived from it.
+"""
+
+from data.storage.hash_ring import HashRing
+
+REPLICATION_FACTOR = 2
+
+
+def make_ring(*node_ids: str) -> HashRing:
+    ring = HashRing()
+    for node_id in node_ids:
+        ring.add_node(node_id)
+    return ring
+
+
+def placed(ring: HashRing, shard_count: int = 64):
+    return {f"shard_{i}": ring.get_nodes(f"shard_{i}", REPLICATION_FACTOR) for i in range(shard_count)}
+
+
+def apply(placements, moves):
+    placements = {shard_id: list(nodes) for shard_id, nodes in placements.items()}
+    for move in moves:
+        nodes = placements[move.shard_id]
+        if move.release_node in nodes:
+            nodes.remove(move.release_node)
+        if move.target_node is not None:
+            nodes.append(move.target_node)
+    return placements
+
+
+def test_placement_in_line_with_ring_needs_no_moves():
+    ring = make_ring("a", "b", "c")
+    assert ring.plan_movement(placed(ring), REPLICATION_FACTOR) == []
+
+
+def test_adding_a_node_only_moves_shards_onto_it():
+    ring = make_ring("a", "b", "c")
+    placements = placed(ring)
+    ring.add_node("d")
+
+    moves = ring.plan_movement(placements, REPLICATION_FACTOR)
+    assert moves
+    assert {move.target_node for move in moves} == {"d"}
+    assert all(move.source_node in placements[move.shard_id] for move in moves)
+    assert all(move.release_node in placements[move.shard_id] for move in moves)
+    after = apply(placements, moves)
+    assert all(sorted(nodes) == sorted(ring.get_nodes(shard_id, REPLICATION_FACTOR))
+               for shard_id, nodes in after.items())
+
+
+def test_removed_node_is_released_from_every_shard():
+    ring = make_ring("a", "b", "c", "d")
+    placements = placed(ring)
+    ring.remove_node("b")
+
+    moves = ring.plan_movement(placements, REPLICATION_FACTOR)
+    held = {shard_id for shard_id, nodes in placements.items() if "b" in nodes}
+    assert {move.shard_id for move in moves if move.release_node == "b"} == held
+    assert all("b" not in nodes for nodes in apply(placements, moves).values())
+
+
+def test_pinned_shard_keeps_live_holders():
+    ring = make_ring("a", "b", "c", "d")
+    shard_id = "shard_0"
+    off_ring = [n for n in ("a", "b", "c", "d") if n not in ring.get_nodes(shard_id, REPLICATION_FACTOR)]
+    placements = {shard_id: off_ring}
+
+    assert ring.plan_movement(placements, REPLICATION_FACTOR, pinned=[shard_id]) == []
+    assert len(ring.plan_movement(placements, REPLICATION_FACTOR)) == REPLICATION_FACTOR
+
+    # A pinned holder that leaves is replaced, and the drained node is the one released
+    ring.remove_node(off_ring[0])
+    moves = ring.plan_movement(placements, REPLICATION_FACTOR, pinned=[shard_id])
+    assert [move.release_node for move in moves] == [off_ring[0]]
+    assert moves[0].target_node not in off_ring
+
+
+def test_surplus_holders_are_released_without_a_copy():
+    ring = make_ring("a", "b", "c")
+    desired = ring.get_nodes("shard_0", REPLICATION_FACTOR)
+    extra = next(n for n in ("a", "b", "c") if n not in desired)
+
+    moves = ring.plan_movement({"shard_0": desired + [extra]}, REPLICATION_FACTOR)
+    assert [(move.target_node, move.release_node) for move in moves] == [(None, extra)]
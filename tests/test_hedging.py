@@ -0,0 +1,51 @@
+"""
+Slow shard reads are hedged to a second replica, but never beyond the hedge budget.
+"""
+
+import asyncio
+
+from data.storage.distributed_vector_store import DistributedVectorStore
+from data.storage.hedging import HedgePolicy
+
+
+def test_budget_caps_hedges_per_request():
+    policy = HedgePolicy(budget=0.05)
+    for _ in range(1000):
+        policy.on_request()
+        policy.try_hedge()
+
+    assert policy.stats["hedges"] == 50
+    assert policy.stats["denied"] == 950
+
+
+def test_saved_budget_is_bounded():
+    policy = HedgePolicy(budget=0.5, max_tokens=3.0)
+    for _ in range(100):
+        policy.on_request()
+
+    assert sum(policy.try_hedge() for _ in range(10)) == 3
+
+
+def test_burst_of_slow_reads_sends_at_most_the_budgeted_backups(monkeypatch):
+    monkeypatch.setattr(DistributedVectorStore, "_start_background_tasks", lambda self: None)
+    store = DistributedVectorStore()
+    store.hedge_policy = HedgePolicy(budget=0.1, min_samples=1, min_delay=0.001, max_delay=0.005, max_tokens=10.0)
+    store.hedge_policy.record_latency(0.001)
+    calls = {"primary": 0, "backup": 0}
+
+    async def search(node_id):
+        calls[node_id] += 1
+        if node_id == "primary":
+            await asyncio.sleep(0.05)
+        return node_id, []
+
+    async def run():
+        return await asyncio.gather(*(store._hedged_search("primary", "backup", search) for _ in range(200)))
+
+    results = asyncio.run(run())
+    assert len(results) == 200
+    assert calls["primary"] == 200
+    # 200 requests earn 20 hedges, but only max_tokens can be spent at once
+    assert calls["backup"] == 10
+    assert [node_id for node_id, _ in results].count("backup") == 10
+    assert store.hedge_policy.stats["denied"] == 190
@@ -0,0 +1,59 @@
+"""
+Merkle digests locate the rows two replicas disagree on.
+"""
+
+from data.storage.merkle import MerkleTree, row_hash
+
+
+def build(rows) -> MerkleTree:
+    tree = MerkleTree(fanout=4, depth=3)
+    for document_id, version in rows.items():
+        tree.update(document_id, row_hash(document_id, version))
+    return tree
+
+
+def differing_buckets(first: MerkleTree, second: MerkleTree):
+    """Descend from the root into differing subtrees only, as anti-entropy does."""
+    frontier = [0]
+    for level in range(first.depth + 1):
+        ours, theirs = first.hashes(level, frontier), second.hashes(level, frontier)
+        differing = [i for i in frontier if ours[i] != theirs[i]]
+        if level == first.depth or not differing:
+            return differing
+        frontier = [child for i in differing for child in first.children(i)]
+    return []
+
+
+def test_root_depends_only_on_contents():
+    rows = {f"doc-{i}": i for i in range(100)}
+    reordered = dict(reversed(list(rows.items())))
+    assert build(rows).root == build(reordered).root
+
+
+def test_descent_finds_exactly_the_changed_rows():
+    rows = {f"doc-{i}": 1 for i in range(500)}
+    first, second = build(rows), build(rows)
+    second.update("doc-7", row_hash("doc-7", 2))
+    second.update("doc-new", row_hash("doc-new", 1))
+
+    buckets = differing_buckets(first, second)
+    assert sorted(buckets) == sorted({first.bucket_for("doc-7"), first.bucket_for("doc-new")})
+    changed = {document_id for document_id, value in second.bucket_entries(buckets).items()
+               if first.bucket_entries(buckets).get(document_id) != value}
+    assert changed == {"doc-7", "doc-new"}
+
+
+def test_remove_restores_previous_digest():
+    tree = build({f"doc-{i}": 1 for i in range(50)})
+    root = tree.root
+    tree.update("doc-extra", row_hash("doc-extra", 1))
+    assert tree.root != root
+    tree.remove("doc-extra")
+    assert tree.root == root
+    assert len(tree) == 50
+
+
+def test_row_hash_covers_version_and_tags():
+    assert row_hash("a", 1) != row_hash("a", 2)
+    assert row_hash("a", 1, ["x"]) != row_hash("a", 1)
+    assert row_hash("a", 1, ["x", "y"]) == row_hash("a", 1, ["y", "x"])
@@ -0,0 +1,96 @@
+"""
+Two-phase search: shards return ids and scores, payloads are fetched for the
+merged top-k only, with misses retried on other replicas.
+"""
+
+import asyncio
+
+from data.storage.distributed_vector_store import DistributedVectorStore, NodeStatus, VectorNode, VectorShard
+
+SCORES = {"a1": 0.9, "a2": 0.8, "a3": 0.3, "b1": 0.85, "b2": 0.2}
+
+
+def document_payload(document_id):
+    return {"document_id": document_id, "content": f"text of {document_id}", "metadata": {}, "source_index": "docs"}
+
+
+class FakeCluster:
+    """Answers node RPCs from fixed shard contents and records every call."""
+
+    def __init__(self, holdings, down=()):
+        self.holdings = holdings  # node -> shard -> document ids it holds
+        self.down = set(down)
+        self.calls = []
+
+    async def call_node(self, node, method, path, payload=None, params=None, timeout=30.0, bypass_breaker=False):
+        self.calls.append((node.id, path, payload))
+        if node.id in self.down:
+            return None
+        shards = self.holdings[node.id]
+        if path == "/search":
+            ids = sorted(shards.get(payload["shard_id"], []), key=SCORES.get, reverse=True)
+            return {"hits": [[document_id, SCORES[document_id]] for document_id in ids][:payload["limit"]]}
+        if path == "/multi_get":
+            return {"documents": {
+                document_id: document_payload(document_id)
+                for shard_id, ids in payload["shards"].items()
+                for document_id in ids if document_id in shards.get(shard_id, [])
+            }}
+        raise AssertionError(f"unexpected RPC {path}")
+
+    def multi_gets(self):
+        return [(node_id, body["shards"]) for node_id, path, body in self.calls if path == "/multi_get"]
+
+
+def make_store(monkeypatch, cluster, placement):
+    monkeypatch.setattr(DistributedVectorStore, "_start_background_tasks", lambda self: None)
+    store = DistributedVectorStore()
+    for i, node_id in enumerate(cluster.holdings):
+        store.nodes[node_id] = VectorNode(node_id, "localhost", 18000 + i, status=NodeStatus.HEALTHY)
+    for shard_id, node_ids in placement.items():
+        store.shards[shard_id] = VectorShard(id=shard_id, collection_name="docs", node_ids=node_ids,
+                                             primary_node=node_ids[0], replica_nodes=node_ids[1:])
+        store.collections["docs"].append(shard_id)
+    store._call_node = cluster.call_node
+    return store
+
+
+def test_only_the_merged_top_k_is_fetched(monkeypatch):
+    cluster = FakeCluster({"node-1": {"shard_a": ["a1", "a2", "a3"]}, "node-2": {"shard_b": ["b1", "b2"]}})
+    store = make_store(monkeypatch, cluster, {"shard_a": ["node-1"], "shard_b": ["node-2"]})
+
+    results = asyncio.run(store.search_collections(["docs"], [1.0, 0.0], limit=3, score_threshold=0.0))
+    assert [(hit["document_id"], hit["score"]) for hit in results] == [("a1", 0.9), ("b1", 0.85), ("a2", 0.8)]
+    assert all(hit["content"] == f"text of {hit['document_id']}" for hit in results)
+    # One multi-get per node, for its part of the top-k only
+    assert sorted(cluster.multi_gets()) == [("node-1", {"shard_a": ["a1", "a2"]}), ("node-2", {"shard_b": ["b1"]})]
+
+
+def test_missing_payloads_are_fetched_from_other_replicas(monkeypatch):
+    cluster = FakeCluster({
+        "node-1": {"shard_a": ["a1"]},  # Lost a2 after answering the first phase
+        "node-2": {"shard_a": ["a1", "a2"], "shard_b": ["b1"]},
+        "node-3": {"shard_b": ["b1"]},
+    }, down={"node-3"})
+    store = make_store(monkeypatch, cluster, {"shard_a": ["node-1", "node-2"], "shard_b": ["node-3", "node-2"]})
+    hits = [(0.9, "a1", None, "shard_a", "node-1"), (0.85, "b1", None, "shard_b", "node-3"),
+            (0.8, "a2", None, "shard_a", "node-1")]
+
+    payloads = asyncio.run(store._fetch_payloads(hits))
+    assert sorted(payloads) == ["a1", "a2", "b1"]
+    first_phase, retries = cluster.multi_gets()[:2], cluster.multi_gets()[2:]
+    assert sorted(first_phase) == [("node-1", {"shard_a": ["a1", "a2"]}), ("node-3", {"shard_b": ["b1"]})]
+    # Retried per hit, in rank order
+    assert retries == [("node-2", {"shard_b": ["b1"]}), ("node-2", {"shard_a": ["a2"]})]
+
+
+def test_hit_without_any_payload_is_dropped(monkeypatch):
+    cluster = FakeCluster({"node-1": {"shard_a": ["a1"]}, "node-2": {"shard_a": ["a1"]}})
+    store = make_store(monkeypatch, cluster, {"shard_a": ["node-1", "node-2"]})
+    # The node that answered the first phase has left the cluster since
+    hits = [(0.9, "a1", None, "shard_a", "node-gone"), (0.8, "a2", None, "shard_a", "node-1")]
+
+    payloads = asyncio.run(store._fetch_payloads(hits))
+    assert list(payloads) == ["a1"]
+    results = store._format_hits(hits, payloads, ["docs"])
+    assert [hit["document_id"] for hit in results] == ["a1"]
@@ -0,0 +1,65 @@
+"""
+Reads go to the cheaper of two sampled replicas; stale and lagging replicas come last.
+"""
+
+import random
+from collections import Counter
+
+from data.storage.distributed_vector_store import DistributedVectorStore, NodeStatus, VectorNode, VectorShard
+from data.storage.replica_selector import ReplicaSelector
+
+
+def selector_with_costs(costs):
+    selector = ReplicaSelector(rng=random.Random(0))
+    for node_id, latency in costs.items():
+        selector.record(node_id, latency)
+    return selector
+
+
+def test_two_choices_never_pick_the_most_expensive_replica():
+    selector = selector_with_costs({"fast": 0.01, "medium": 0.02, "slow": 0.5})
+
+    picks = Counter(selector.choose(["fast", "medium", "slow"]) for _ in range(1000))
+    assert picks["slow"] == 0
+    # Load still spreads: the medium replica wins whenever it is sampled with the slow one
+    assert 250 < picks["medium"] < 420
+
+
+def test_in_flight_requests_raise_the_cost():
+    selector = selector_with_costs({"a": 0.01, "b": 0.015})
+    with selector.track("a"), selector.track("a"):
+        assert selector.choose(["a", "b"]) == "b"
+    assert selector.choose(["a", "b"]) == "a"
+
+
+def test_order_puts_the_pick_first_then_cheapest():
+    selector = selector_with_costs({"a": 0.03, "b": 0.01, "c": 0.02, "d": 0.04})
+
+    for _ in range(50):
+        order = selector.order(["a", "b", "c", "d"])
+        assert sorted(order) == ["a", "b", "c", "d"]
+        assert order[1:] == sorted(order[1:], key=selector.cost)
+        assert order[0] != "d"
+
+
+def test_read_order_tries_stale_and_lagging_replicas_last(monkeypatch):
+    monkeypatch.setattr(DistributedVectorStore, "_start_background_tasks", lambda self: None)
+    store = DistributedVectorStore()
+    node_ids = ["node-1", "node-2", "node-3", "node-4", "node-5"]
+    for i, node_id in enumerate(node_ids):
+        store.nodes[node_id] = VectorNode(node_id, "localhost", 18000 + i, status=NodeStatus.HEALTHY)
+    shard = VectorShard(id="docs_shard_0", collection_name="docs", node_ids=node_ids,
+                        primary_node="node-1", replica_nodes=node_ids[1:])
+    store.shards[shard.id] = shard
+    store.replica_selector = selector_with_costs({"node-1": 0.01, "node-2": 0.02, "node-3": 0.001,
+                                                  "node-4": 0.002, "node-5": 0.003})
+
+    store.replication_log.mark_stale("node-3", shard.id)
+    store.replication_log._pending_by_shard[("node-4", shard.id)] = 10
+    store.nodes["node-5"].status = NodeStatus.UNHEALTHY
+
+    for _ in range(20):
+        order = store._read_order(shard)
+        # The cheapest nodes are not caught up, so they follow every readable replica
+        assert sorted(order[:2]) == ["node-1", "node-2"]
+        assert order[2:] == ["node-3", "node-4"]
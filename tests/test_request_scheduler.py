@@ -0,0 +1,157 @@
+"""
+GeminiRequestScheduler driven by local coroutine stubs instead of Gemini.
+"""
+
+import asyncio
+
+import pytest
+
+from core.services.inference.request_scheduler import GeminiRequestScheduler, RequestPriority
+
+
+def make_scheduler(**overrides) -> GeminiRequestScheduler:
+    options = dict(max_concurrency=1, requests_per_minute=0, tokens_per_minute=0,
+                   max_retries=3, base_delay=0, max_delay=0)
+    options.update(overrides)
+    return GeminiRequestScheduler(**options)
+
+
+def test_interactive_requests_are_served_before_background():
+    async def scenario():
+        scheduler = make_scheduler()
+        order = []
+        release_blocker = asyncio.Event()
+
+        async def blocker():
+            await release_blocker.wait()
+            return "blocker"
+
+        def recorder(name):
+            async def call():
+                order.append(name)
+                return name
+            return call
+
+        blocking = asyncio.create_task(scheduler.submit(blocker))
+        await asyncio.sleep(0)
+        # Queued while the only slot is busy; background first, so FIFO would be wrong
+        background = asyncio.create_task(scheduler.submit(recorder("background"),
+                                                          priority=RequestPriority.BACKGROUND))
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(scheduler.submit(recorder("interactive"),
+                                                           priority=RequestPriority.INTERACTIVE))
+        await asyncio.sleep(0)
+        assert scheduler.get_stats()["queued"] == 2
+
+        release_blocker.set()
+        await asyncio.gather(blocking, background, interactive)
+        return order
+
+    assert asyncio.run(scenario()) == ["interactive", "background"]
+
+
+def test_retryable_errors_are_retried_until_success():
+    async def scenario():
+        scheduler = make_scheduler()
+        attempts = []
+
+        async def flaky():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise ConnectionError("connection reset")
+            return "ok"
+
+        return await scheduler.submit(flaky), len(attempts), scheduler.get_stats()
+
+    result, attempts, stats = asyncio.run(scenario())
+    assert result == "ok"
+    assert attempts == 3
+    assert stats["retries"] == 2
+    assert stats["completed"] == 1
+    assert stats["failed"] == 0
+
+
+def test_retries_stop_after_max_retries():
+    async def scenario():
+        scheduler = make_scheduler(max_retries=2)
+        attempts = []
+
+        async def unavailable():
+            attempts.append(1)
+            error = RuntimeError("service unavailable")
+            error.status_code = 503
+            raise error
+
+        with pytest.raises(RuntimeError):
+            await scheduler.submit(unavailable)
+        return len(attempts), scheduler.get_stats()
+
+    attempts, stats = asyncio.run(scenario())
+    assert attempts == 3
+    assert stats["failed"] == 1
+
+
+def test_non_retryable_errors_fail_immediately():
+    async def scenario():
+        scheduler = make_scheduler()
+        attempts = []
+
+        async def invalid():
+            attempts.append(1)
+            raise ValueError("bad prompt")
+
+        with pytest.raises(ValueError):
+            await scheduler.submit(invalid)
+        return len(attempts), scheduler.get_stats()
+
+    attempts, stats = asyncio.run(scenario())
+    assert attempts == 1
+    assert stats["retries"] == 0
+    assert stats["failed"] == 1
+
+
+def test_identical_in_flight_requests_are_coalesced():
+    async def scenario():
+        scheduler = make_scheduler(max_concurrency=4)
+        calls = []
+        release = asyncio.Event()
+
+        async def slow_call():
+            calls.append(1)
+            await release.wait()
+            return {"answer": 42}
+
+        first = asyncio.create_task(scheduler.submit(slow_call, key="same prompt"))
+        second = asyncio.create_task(scheduler.submit(slow_call, key="same prompt"))
+        other = asyncio.create_task(scheduler.submit(slow_call, key="other prompt"))
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(first, second, other)
+        return results, len(calls), scheduler.get_stats()
+
+    results, calls, stats = asyncio.run(scenario())
+    assert results[0] is results[1]
+    assert results[2] == {"answer": 42}
+    assert calls == 2
+    assert stats["coalesced"] == 1
+    assert stats["in_flight_keys"] == 0
+
+
+def test_cancelling_one_caller_does_not_cancel_the_shared_request():
+    async def scenario():
+        scheduler = make_scheduler()
+        release = asyncio.Event()
+
+        async def slow_call():
+            await release.wait()
+            return "done"
+
+        first = asyncio.create_task(scheduler.submit(slow_call, key="k"))
+        second = asyncio.create_task(scheduler.submit(slow_call, key="k"))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        return await second
+
+    assert asyncio.run(scenario()) == "done"
@@ -0,0 +1,110 @@
+"""
+A batch of queries scored with one matrix multiply returns what the same
+queries return one at a time.
+"""
+
+import asyncio
+
+import numpy as np
+import pytest
+
+from data.storage.distributed_vector_store import DistributedVectorStore, NodeStatus, VectorNode, VectorShard
+from data.storage.shard_segment import ShardSegment, decode_matrix
+
+VECTOR_SIZE = 16
+TAGS = ["index_sports", "index_music", "index_finance"]
+
+
+def build_segment(shard_id: str, count: int, seed: int) -> ShardSegment:
+    segment = ShardSegment(shard_id, "docs", block_size=32)
+    rng = np.random.default_rng(seed)
+    segment.upsert(rng.normal(size=(count, VECTOR_SIZE)).tolist(),
+                   [{"id": f"{shard_id}-d{i}", "content": f"doc {i}"} for i in range(count)],
+                   document_tags=[[TAGS[i % len(TAGS)]] for i in range(count)])
+    return segment
+
+
+def queries(count: int, seed: int = 99):
+    return np.random.default_rng(seed).normal(size=(count, VECTOR_SIZE)).tolist()
+
+
+@pytest.mark.parametrize("tags", [None, ["index_music"], ["index_sports", "index_finance"]])
+@pytest.mark.parametrize("score_threshold", [-1.0, 0.2])
+def test_segment_batch_equals_single_searches(tags, score_threshold):
+    segment = build_segment("shard_0", 300, seed=0)
+    batch = queries(12)
+
+    batch_hits = segment.search_batch(batch, limit=7, score_threshold=score_threshold, tags=tags)
+    assert len(batch_hits) == len(batch)
+    for query, hits in zip(batch, batch_hits):
+        single = segment.search(query, limit=7, score_threshold=score_threshold, tags=tags)
+        assert [row for row, _ in hits] == [row for row, _ in single]
+        assert [score for _, score in hits] == pytest.approx([score for _, score in single], abs=1e-6)
+
+
+def test_empty_segment_and_empty_batch():
+    segment = ShardSegment("shard_0", "docs")
+    assert segment.search_batch(queries(3), limit=5) == [[], [], []]
+    assert build_segment("shard_1", 10, seed=1).search_batch([], limit=5) == []
+
+
+def make_store(monkeypatch, segments) -> DistributedVectorStore:
+    """A store whose node RPCs are answered by in-process segments, one node per shard."""
+    monkeypatch.setattr(DistributedVectorStore, "_start_background_tasks", lambda self: None)
+    store = DistributedVectorStore()
+    owners = {}
+    for i, shard_id in enumerate(segments):
+        node_id = f"node-{i}"
+        owners[node_id] = shard_id
+        store.nodes[node_id] = VectorNode(node_id, "localhost", 18000 + i, status=NodeStatus.HEALTHY)
+        store.shards[shard_id] = VectorShard(id=shard_id, collection_name="docs", node_ids=[node_id],
+                                             primary_node=node_id, replica_nodes=[])
+        store.collections["docs"].append(shard_id)
+
+    def compact(segment, hits, tags):
+        if tags is None:
+            return [[segment.ids[row], score] for row, score in hits]
+        return [[segment.ids[row], score, segment.tags_for_row(row)] for row, score in hits]
+
+    async def call_node(node, method, path, payload=None, params=None, timeout=30.0, bypass_breaker=False):
+        segment = segments[owners[node.id]]
+        if path == "/search":
+            hits = segment.search(payload["query_vector"], payload["limit"], payload["score_threshold"],
+                                  tags=payload["tags"])
+            return {"hits": compact(segment, hits, payload["tags"])}
+        if path == "/search_batch":
+            batch_hits = segment.search_batch(decode_matrix(payload["query_matrix"]), payload["limit"],
+                                              payload["score_threshold"], tags=payload["tags"])
+            return {"hits": [compact(segment, hits, payload["tags"]) for hits in batch_hits]}
+        if path == "/multi_get":
+            return {"documents": {
+                document_id: segment.get_result(document_id)
+                for document_id in payload["shards"].get(segment.shard_id, [])
+            }}
+        raise AssertionError(f"unexpected RPC {path}")
+
+    store._call_node = call_node
+    return store
+
+
+def test_store_batch_equals_single_searches(monkeypatch):
+    segments = {shard_id: build_segment(shard_id, 100 + 50 * i, seed=i)
+                for i, shard_id in enumerate(["shard_0", "shard_1", "shard_2"])}
+    store = make_store(monkeypatch, segments)
+    store.virtual_collections["index_music"] = "docs"
+    batch = queries(8)
+
+    async def run(collections):
+        batched = await store.search_collections_batch(collections, batch, limit=5, score_threshold=-1.0)
+        singles = [await store.search_collections(collections, query, limit=5, score_threshold=-1.0)
+                   for query in batch]
+        return batched, singles
+
+    for collections in (["docs"], ["index_music"]):
+        batched, singles = asyncio.run(run(collections))
+        assert len(batched) == len(batch) and all(len(results) == 5 for results in batched)
+        for batch_results, single_results in zip(batched, singles):
+            assert [hit["document_id"] for hit in batch_results] == [hit["document_id"] for hit in single_results]
+            assert [hit["score"] for hit in batch_results] == pytest.approx(
+                [hit["score"] for hit in single_results], abs=1e-6)
+            assert [hit["source_index"] for hit in batch_results] == [hit["source_index"] for hit in single_results]
@@ -0,0 +1,90 @@
+"""
+Wave search over shards returns the same top-k as searching every shard in full.
+"""
+
+import asyncio
+
+import numpy as np
+import pytest
+
+from data.storage.distributed_vector_store import DistributedVectorStore, VectorShard
+from data.storage.shard_segment import ShardSegment
+
+VECTOR_SIZE = 16
+TAGS = ["sports", "music", "finance"]
+
+
+def build_segments(shard_count: int = 6, seed: int = 0):
+    """Shards of different sizes, with clustered rows so block pruning has something to skip."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(8, VECTOR_SIZE))
+    segments = {}
+    for s in range(shard_count):
+        segment = ShardSegment(f"shard_{s}_docs", "docs", block_size=32)
+        count = 40 + 60 * s
+        cluster = rng.integers(len(centers), size=count)
+        vectors = centers[cluster] + 0.3 * rng.normal(size=(count, VECTOR_SIZE))
+        segment.upsert(vectors.tolist(), [{"id": f"s{s}-d{i}"} for i in range(count)],
+                       document_tags=[[TAGS[i % len(TAGS)]] for i in range(count)])
+        segments[segment.shard_id] = segment
+    return segments
+
+
+def make_store(monkeypatch, segments, first_wave_shards: int) -> DistributedVectorStore:
+    monkeypatch.setattr(DistributedVectorStore, "_start_background_tasks", lambda self: None)
+    store = DistributedVectorStore(first_wave_shards=first_wave_shards)
+    for shard_id, segment in segments.items():
+        store.shards[shard_id] = VectorShard(id=shard_id, collection_name="docs", node_ids=["node-1"],
+                                             primary_node="node-1", replica_nodes=[],
+                                             vector_count=len(segment))
+
+    async def search_shard(shard_id, query_vector, limit, score_threshold, tags=None):
+        segment = segments[shard_id]
+        hits = segment.search(query_vector, limit, score_threshold, tags=tags)
+        return "node-1", [[segment.ids[row], score, segment.tags_for_row(row)] for row, score in hits]
+
+    store._search_shard = search_shard
+    return store
+
+
+def exhaustive_top_k(segments, query, limit, tags=None):
+    query = np.asarray(query, dtype=np.float32)
+    query = query / np.linalg.norm(query)
+    best = {}
+    for segment in segments.values():
+        scores = segment.matrix @ query
+        for row, score in enumerate(scores):
+            if tags is None or set(segment.tags_for_row(row)) & set(tags):
+                best[segment.ids[row]] = max(float(score), best.get(segment.ids[row], -2.0))
+    scored = sorted(((score, document_id) for document_id, score in best.items()), reverse=True)
+    return scored[:limit]
+
+
+def with_duplicate_largest_shard(segments):
+    """The same documents in two shards, e.g. rows written to a topic collection before tagging."""
+    largest = max(segments.values(), key=len)
+    copy = ShardSegment("shard_copy_docs", "docs", block_size=32)
+    page = largest.export_rows(largest.ids)
+    copy.upsert(page["vectors"], page["documents"], document_tags=page["tags"], versions=page["versions"])
+    return {**segments, copy.shard_id: copy}
+
+
+@pytest.mark.parametrize("first_wave_shards", [0, 1, 2])
+@pytest.mark.parametrize("tags", [None, {"sports"}, {"music", "finance"}])
+@pytest.mark.parametrize("duplicates", [False, True])
+def test_wave_search_matches_exhaustive_top_k(monkeypatch, first_wave_shards, tags, duplicates):
+    segments = build_segments()
+    if duplicates:
+        segments = with_duplicate_largest_shard(segments)
+    store = make_store(monkeypatch, segments, first_wave_shards)
+    rng = np.random.default_rng(1)
+    targets = [(shard_id, tags) for shard_id in segments]
+
+    for _ in range(5):
+        query = rng.normal(size=VECTOR_SIZE).tolist()
+        for limit in (1, 10):
+            streams = asyncio.run(store._search_shards_in_waves(targets, query, limit, score_threshold=-1.0))
+            top = store._merge_hits(streams, limit)
+            expected = exhaustive_top_k(segments, query, limit, tags)
+            assert [document_id for _, document_id, *_ in top] == [document_id for _, document_id in expected]
+            assert [score for score, *_ in top] == pytest.approx([score for score, _ in expected], abs=1e-5)
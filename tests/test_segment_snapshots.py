@@ -0,0 +1,66 @@
+"""
+Snapshot searches match the live segment while only changed blocks are republished.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from data.storage.segment_snapshots import SnapshotSearchPool
+from data.storage.shard_segment import ShardSegment
+
+VECTOR_SIZE = 8
+TAGS = ["sports", "music"]
+
+
+def add_rows(segment: ShardSegment, start: int, count: int, seed: int) -> None:
+    vectors = np.random.default_rng(seed).normal(size=(count, VECTOR_SIZE))
+    segment.upsert(vectors.tolist(), [{"id": f"d{start + i}"} for i in range(count)],
+                   document_tags=[[TAGS[(start + i) % len(TAGS)]] for i in range(count)])
+
+
+async def publish(pool: SnapshotSearchPool, segment: ShardSegment, query) -> None:
+    """Search until the pool has published the segment's current generation."""
+    for _ in range(100):
+        await pool.search(segment, query, 5, -1.0)
+        published = pool._published.get(segment.shard_id)
+        if published is not None and not published.stale_blocks(segment):
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("snapshot was not published")
+
+
+def test_pool_search_matches_segment_through_incremental_publishes(tmp_path):
+    segment = ShardSegment("docs_shard_0", "docs", block_size=16)
+    add_rows(segment, 0, 100, seed=0)
+    pool = SnapshotSearchPool(tmp_path / "snapshots", workers=1, publish_delay=0.0, min_rows=1)
+    pool.start()
+    pool._executor.shutdown()
+    # Threads run the same worker entry point without spawning processes
+    pool._executor = ThreadPoolExecutor(max_workers=1)
+    queries = np.random.default_rng(1).normal(size=(5, VECTOR_SIZE)).tolist()
+
+    async def run():
+        await publish(pool, segment, queries[0])
+        assert pool.stats["blocks_written"] == 7
+
+        # Overwrite one row and append into the last block: only those blocks are stale
+        add_rows(segment, 20, 1, seed=2)
+        add_rows(segment, 100, 3, seed=3)
+        assert pool._published[segment.shard_id].stale_blocks(segment) == [1, 6]
+        for query in queries:
+            for tags in (None, ["music"]):
+                expected = segment.search(query, limit=10, score_threshold=-1.0, tags=tags)
+                assert await pool.search(segment, query, 10, -1.0, tags) == expected
+
+        await publish(pool, segment, queries[0])
+        assert pool.stats["blocks_written"] == 9
+        for query in queries:
+            expected = segment.search(query, limit=10, score_threshold=0.2)
+            assert await pool.search(segment, query, 10, 0.2) == expected
+
+    try:
+        asyncio.run(run())
+    finally:
+        pool.shutdown()
@@ -0,0 +1,57 @@
+"""
+Range shard selection after catalog loss, and document routing over ranges.
+"""
+
+import pytest
+
+from data.storage.shard_ranges import HASH_SPACE, RangeRouter, initial_ranges, key_hash, range_shard_id, select_cover
+
+HALF = HASH_SPACE // 2
+QUARTER = HASH_SPACE // 4
+
+
+def shard(start: int, end: int) -> str:
+    return range_shard_id("docs", start, end)
+
+
+def test_select_cover_keeps_disjoint_ranges():
+    candidates = {shard(0, HALF): 10, shard(HALF, HASH_SPACE): 12}
+    assert select_cover(candidates) == [shard(0, HALF), shard(HALF, HASH_SPACE)]
+
+
+@pytest.mark.parametrize("parent_count, children_counts, keep_children", [
+    (100, (60, 50), True),  # Split finished: the halves hold more
+    (100, (30, 20), False),  # Split still filling: the parent holds more
+    (100, (50, 50), False),  # Tie goes to the coarser shard
+])
+def test_select_cover_picks_the_fuller_side_of_a_split(parent_count, children_counts, keep_children):
+    parent = shard(0, HALF)
+    children = [shard(0, QUARTER), shard(QUARTER, HALF)]
+    candidates = {parent: parent_count, **dict(zip(children, children_counts))}
+    assert select_cover(candidates) == (children if keep_children else [parent])
+
+
+def test_select_cover_keeps_parent_when_children_leave_a_gap():
+    parent = shard(0, HALF)
+    candidates = {parent: 10, shard(0, QUARTER): 500}
+    assert select_cover(candidates) == [parent]
+
+
+def test_router_sends_every_document_to_the_range_owning_its_key():
+    shard_ids = [shard(start, end) for start, end in initial_ranges(4)]
+    router = RangeRouter("docs", shard_ids)
+    assert router.gaps() == []
+    for i in range(200):
+        document_id = f"doc-{i}"
+        shard_id = router.lookup(document_id)
+        start, end = initial_ranges(4)[shard_ids.index(shard_id)]
+        assert start <= key_hash("docs", document_id) < end
+
+
+def test_router_reports_gaps_and_overlaps():
+    router = RangeRouter("docs", [shard(0, QUARTER), shard(HALF, HASH_SPACE)])
+    assert router.gaps() == [(QUARTER, HALF)]
+    assert router.lookup_key(QUARTER) is None
+    assert router.lookup_key(HALF) == shard(HALF, HASH_SPACE)
+    assert router.overlapping(QUARTER - 1, HALF + 1) == [shard(0, QUARTER), shard(HALF, HASH_SPACE)]
+    assert router.overlapping(QUARTER, HALF) == []
@@ -0,0 +1,134 @@
+"""
+Shard segment row versions, tag sets and tag tombstones.
+"""
+
+import numpy as np
+
+from data.storage.shard_segment import ShardSegment
+
+VECTOR_SIZE = 4
+
+
+def make_segment(shard_id: str = "docs_shard_0") -> ShardSegment:
+    return ShardSegment(shard_id, "docs", initial_capacity=4, block_size=4)
+
+
+def documents(*ids):
+    return [{"id": document_id, "content": document_id} for document_id in ids]
+
+
+def vectors(count: int, seed: int = 0):
+    return np.random.default_rng(seed).normal(size=(count, VECTOR_SIZE)).tolist()
+
+
+def test_stale_write_keeps_row_but_adds_its_tags():
+    segment = make_segment()
+    segment.upsert(vectors(1, seed=1), documents("a"), tags=["sports"], versions=[20])
+    written = segment.upsert(vectors(1, seed=2), documents("a"), tags=["music"], versions=[10])
+
+    assert written == 0
+    assert segment.versions[0] == 20
+    assert sorted(segment.tags_for_row(0)) == ["music", "sports"]
+
+
+def test_newer_copy_replaces_tag_set_and_tie_merges():
+    segment = make_segment()
+    segment.upsert(vectors(1), documents("a"), tags=["sports"], versions=[10])
+
+    segment.upsert(vectors(1), documents("a"), document_tags=[["music"]], versions=[20])
+    assert segment.tags_for_row(0) == ["music"]
+
+    segment.upsert(vectors(1), documents("a"), document_tags=[["cooking"]], versions=[20])
+    assert sorted(segment.tags_for_row(0)) == ["cooking", "music"]
+
+    segment.upsert(vectors(1), documents("a"), document_tags=[["finance"]], versions=[5])
+    assert sorted(segment.tags_for_row(0)) == ["cooking", "music"]
+
+
+def test_repair_from_replica_that_missed_removal_does_not_resurrect_tag():
+    current, lagging = make_segment(), make_segment()
+    for segment in (current, lagging):
+        segment.upsert(vectors(2), documents("a", "b"), tags=["sports"], versions=[10, 10])
+    current.remove_tag("sports", version=15)
+    assert current.tag_counts() == {}
+
+    # Copy both ways, as anti-entropy does for rows whose hashes differ at equal versions
+    page = lagging.export_rows(["a", "b"])
+    current.apply_tag_removals(page["removed_tags"])
+    current.upsert(page["vectors"], page["documents"], document_tags=page["tags"], versions=page["versions"])
+    page = current.export_rows(["a", "b"])
+    lagging.apply_tag_removals(page["removed_tags"])
+    lagging.upsert(page["vectors"], page["documents"], document_tags=page["tags"], versions=page["versions"])
+
+    assert current.tag_counts() == {}
+    assert lagging.tag_counts() == {}
+    assert current.digest.root == lagging.digest.root
+
+
+def test_writes_after_removal_can_tag_again():
+    segment = make_segment()
+    segment.upsert(vectors(1), documents("a"), tags=["sports"], versions=[10])
+    segment.remove_tag("sports", version=15)
+
+    segment.upsert(vectors(1), documents("a"), tags=["sports"], versions=[12])
+    assert segment.tag_counts() == {}
+
+    segment.upsert(vectors(1), documents("a"), tags=["sports"], versions=[20])
+    assert segment.tag_counts() == {"sports": 1}
+
+
+def test_pages_follow_document_ids_while_the_shard_changes():
+    source, target = make_segment(), make_segment()
+    ids = [f"doc-{i:02d}" for i in range(10)]
+    source.upsert(vectors(10), documents(*ids), tags=["sports"])
+
+    cursor, pages = None, 0
+    while True:
+        page = source.export_page(cursor, limit=3)
+        target.upsert(page["vectors"], page["documents"], document_tags=page["tags"], versions=page["versions"])
+        pages += 1
+        if pages == 1:
+            # A row sorting before the cursor and one after it arrive mid-transfer
+            source.upsert(vectors(2, seed=3), documents("doc-00a", "doc-99"))
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert "doc-99" in target
+    assert all(document_id in target for document_id in ids)
+    assert target.tag_counts() == {"sports": 10}
+
+
+def test_page_checksum_covers_tags_and_versions():
+    segment = make_segment()
+    segment.upsert(vectors(1), documents("a"), tags=["sports"], versions=[10])
+    checksum = segment.export_rows(["a"])["checksum"]
+
+    segment.upsert(vectors(1), documents("a"), tags=["music"], versions=[10])
+    assert segment.export_rows(["a"])["checksum"] != checksum
+    checksum = segment.export_rows(["a"])["checksum"]
+
+    segment.upsert(vectors(1), documents("a"), versions=[11])
+    assert segment.export_rows(["a"])["checksum"] != checksum
+
+
+def test_block_pruned_search_matches_exhaustive_search():
+    rng = np.random.default_rng(4)
+    centers = rng.normal(size=(6, VECTOR_SIZE * 4))
+    count = 300
+    # Rows grouped by cluster, so most blocks are tight and fall below the threshold
+    clusters = np.sort(rng.integers(len(centers), size=count))
+    rows = centers[clusters] + 0.2 * rng.normal(size=(count, VECTOR_SIZE * 4))
+    segment = ShardSegment("docs_shard_0", "docs", block_size=16)
+    segment.upsert(rows.tolist(), [{"id": f"d{i}"} for i in range(count)],
+                   document_tags=[["even" if i % 2 == 0 else "odd"] for i in range(count)])
+
+    for _ in range(10):
+        query = rng.normal(size=VECTOR_SIZE * 4).tolist()
+        for tags in (None, ["even"]):
+            exhaustive = segment.search(query, limit=10, score_threshold=-1.0, tags=tags)
+            # Threshold at the 10th best score, as a later search wave would send it
+            pruned = segment.search(query, limit=10, score_threshold=exhaustive[-1][1], tags=tags)
+            assert pruned == exhaustive
+            if tags:
+                assert all(row % 2 == 0 for row, _ in pruned)
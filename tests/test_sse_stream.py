@@ -0,0 +1,147 @@
+"""
+Streaming /ask and /ask_csv answers: server-sent event framing and event order.
+"""
+
+import asyncio
+import importlib
+import json
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+import data.storage.distributed_storage_manager as distributed_storage_manager
+
+CSV = {"document_id": "csv-1", "filename": "sales.csv", "column_headers": ["region", "total"],
+       "total_rows": 10, "total_columns": 2, "score": 0.7}
+DOCUMENT_HIT = {"document_id": "doc-1", "content": "Sales grew in the north.", "score": 0.8,
+                "metadata": {}, "source_index": "index_sales"}
+
+
+class FakeStorageManager:
+    """Just enough of the storage manager for the API module to import."""
+
+    def __init__(self):
+        self.collection_centroids = SimpleNamespace(score=lambda vector, candidates: [])
+
+    async def embed_query(self, text):
+        return []
+
+    def claim_collection_names(self, names, vector, threshold):
+        return names
+
+    async def index_exists(self, name):
+        return True
+
+
+@pytest.fixture
+def api(monkeypatch):
+    if "core.api.main" not in sys.modules:
+        monkeypatch.setattr(distributed_storage_manager, "create_distributed_storage_manager",
+                            lambda **kwargs: FakeStorageManager())
+    return importlib.import_module("core.api.main")
+
+
+def parse_events(chunks):
+    """Split SSE chunks into (event, data), checking each is one complete event."""
+    events = []
+    for chunk in chunks:
+        assert chunk.endswith("\n\n")
+        event_line, data_line = chunk[:-2].split("\n")
+        assert event_line.startswith("event: ") and data_line.startswith("data: ")
+        events.append((event_line[len("event: "):], json.loads(data_line[len("data: "):])))
+    return events
+
+
+def collect(generator):
+    async def run():
+        return [chunk async for chunk in generator]
+    return parse_events(asyncio.run(run()))
+
+
+def test_sse_event_framing(api):
+    chunk = api._sse_event("token", {"text": "line one\nline two"})
+    # Newlines in the payload are JSON-escaped, so an event never spans extra lines
+    assert chunk == 'event: token\ndata: {"text": "line one\\nline two"}\n\n'
+    assert api.SSE_HEADERS["Cache-Control"] == "no-cache"
+
+
+def test_ask_csv_sends_sql_between_tokens_as_soon_as_it_is_ready(api, monkeypatch):
+    sql_ready = asyncio.Event()
+
+    async def find_relevant_csvs(question, score_threshold):
+        return [CSV], []
+
+    async def query_best_csv(question, best_csv):
+        await sql_ready.wait()
+        return [{"region": "north", "total": 42}]
+
+    async def stream_text(prompt, temperature=0.7):
+        for i, text in enumerate(["The ", "north ", "sold ", "42."]):
+            if i == 2:
+                sql_ready.set()
+                await asyncio.sleep(0.01)
+            yield text
+
+    monkeypatch.setattr(api, "_find_relevant_csvs", find_relevant_csvs)
+    monkeypatch.setattr(api, "_query_best_csv", query_best_csv)
+    monkeypatch.setattr(api.gemini_client, "stream_text", stream_text)
+
+    events = collect(api._ask_csv_events(api.AskCSVRequest(question="Which region sold most?")))
+    assert [event for event, _ in events] == ["sources", "token", "token", "token", "sql", "token", "done"]
+    assert events[0][1] == {"origin": "csv", "sources": [CSV]}
+    assert "".join(data["text"] for event, data in events if event == "token") == "The north sold 42."
+    assert events[4][1] == [{"region": "north", "total": 42}]
+    done = events[-1][1]
+    assert done["confidence"] == pytest.approx(0.84)
+    assert done["reasoning"]["sql_results"] == [{"region": "north", "total": 42}]
+
+
+def test_ask_sends_every_source_before_the_answer(api, monkeypatch):
+    async def retrieve_documents(request):
+        await asyncio.sleep(0.01)
+        return [DOCUMENT_HIT], {"strategy": "semantic"}
+
+    async def find_relevant_csvs(question, score_threshold):
+        return [CSV], []
+
+    async def query_best_csv(question, best_csv):
+        return [{"region": "north", "total": 42}]
+
+    async def stream_text(prompt, temperature=0.7):
+        for text in ["North ", "leads."]:
+            yield text
+
+    monkeypatch.setattr(api, "_retrieve_documents", retrieve_documents)
+    monkeypatch.setattr(api, "_find_relevant_csvs", find_relevant_csvs)
+    monkeypatch.setattr(api, "_query_best_csv", query_best_csv)
+    monkeypatch.setattr(api.gemini_client, "stream_text", stream_text)
+
+    events = collect(api._ask_events(api.AskRequest(question="Which region leads?")))
+    names = [event for event, _ in events]
+    first_token = names.index("token")
+    assert sorted(names[:first_token]) == ["sources", "sources", "sql"]
+    assert sorted(data["origin"] for event, data in events if event == "sources") == ["csv", "documents"]
+    assert names[first_token:] == ["token", "token", "done"]
+    assert events[-1][1]["sources_used"] == ["csv", "documents"]
+    assert events[-1][1]["query_analysis"] == {"strategy": "semantic"}
+
+
+def test_failure_mid_answer_ends_with_an_error_event(api, monkeypatch):
+    async def find_relevant_csvs(question, score_threshold):
+        return [CSV], []
+
+    async def query_best_csv(question, best_csv):
+        return []
+
+    async def stream_text(prompt, temperature=0.7):
+        yield "Partial "
+        raise RuntimeError("model unavailable")
+
+    monkeypatch.setattr(api, "_find_relevant_csvs", find_relevant_csvs)
+    monkeypatch.setattr(api, "_query_best_csv", query_best_csv)
+    monkeypatch.setattr(api.gemini_client, "stream_text", stream_text)
+
+    events = collect(api._ask_csv_events(api.AskCSVRequest(question="Which region sold most?")))
+    assert [event for event, _ in events] == ["sources", "token", "error"]
+    assert "model unavailable" in events[-1][1]["detail"]
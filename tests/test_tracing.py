@@ -0,0 +1,25 @@
+"""
+Traces kept by one API worker can be looked up from another.
+"""
+
+from core.utils.tracing import Tracer, span
+
+
+def test_trace_lookup_across_workers(tmp_path):
+    path = str(tmp_path / "traces.db")
+    serving, other = Tracer(store_path=path, buffer_size=2), Tracer(store_path=path, buffer_size=2)
+
+    trace_ids = []
+    for i in range(3):
+        with serving.start_trace("POST /search", status=200) as trace:
+            with span("embed", texts=i):
+                pass
+        trace_ids.append(trace.trace_id)
+
+    found = other.get(trace_ids[-1])
+    assert found["spans"][1]["name"] == "embed"
+    assert found["spans"][1]["attributes"] == {"texts": 2}
+    # The shared buffer keeps the newest traces only
+    assert other.get(trace_ids[0]) is None
+    assert [summary["trace_id"] for summary in other.recent()] == trace_ids[:0:-1]
+    assert other.recent()[0]["status"] == 200